@@ -10,7 +10,8 @@ import sys
 import time
 import json
 import logging
-import schedule
+import threading
+from functools import partial
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 
@@ -19,92 +20,97 @@ PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PARENT_DIR not in sys.path:
     sys.path.insert(0, PARENT_DIR)
 
-from app.config import Config
+from app.config import ORDER_LISTENER_ENABLED, ORDER_LISTENER_POLL_FACTOR
+from app.utils.browser_pool import get_browser_pool, shutdown_browser_pool
+from app.utils.job_scheduler import JobScheduler
+from app.utils.order_listener import get_order_listener
+from app.utils.rate_governor import governor_stats, format_governor_stats
+from app.utils.logging_setup import setup_logging
 
-# Import tất cả hàm từ Service Manager
-from app.services.service_manager import (
-    # FTTH Service
-    get_data_ftth, lookup_ftth,
-    
-    # EVN Service  
-    get_data_evn, debt_electric,
-    
-    # Topup Multi Service
-    get_data_multi_network, payment_phone_multi,
-    
-    # Topup Viettel Service
-    get_data_viettel, payment_phone_viettel,
-    
-    # TV-Internet Service
-    get_data_tv_internet, payment_internet,
-    
-    # Postpaid Service
-    get_data_postpaid, payment_phone_postpaid,
-    
-    # Selenium Control Functions
-    navigate_to_page, wait_for_element, click_element, fill_input
-)
+# API dịch vụ thuần dữ liệu (không cần tkinter/display)
+from app.services.service_api import SERVICE_TYPES, claim_work_items, execute_work_items
 
-# Cấu hình logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Cấu hình logging (không làm gì nếu cron_runner/main đã cấu hình trước)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Hệ số interval trong giờ cao điểm khi time_windows.peak_hours.reduced_interval = true
+DEFAULT_PEAK_INTERVAL_FACTOR = 0.5
+
+
+def parse_hhmm(value: Optional[str]) -> Optional[int]:
+    """'HH:MM' -> số phút từ 00:00 (None nếu không hợp lệ)"""
+    try:
+        hours, minutes = str(value).strip().split(':')
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+
+
+def in_time_window(window: Optional[Dict[str, Any]], ts: float) -> bool:
+    """ts (time.time()) có nằm trong khung giờ {start, end, enabled} không; hỗ trợ khung qua đêm"""
+    if not window or not window.get('enabled', False):
+        return False
+    start, end = parse_hhmm(window.get('start')), parse_hhmm(window.get('end'))
+    if start is None or end is None:
+        return False
+    now = datetime.fromtimestamp(ts)
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def next_aligned_run(start_time: Optional[str], interval_seconds: float, ts: float) -> float:
+    """Lượt chạy đầu tiên >= ts trên lưới start_time + k * interval (không có start_time => sau 1 interval)"""
+    start = parse_hhmm(start_time)
+    if start is None or interval_seconds <= 0:
+        return ts + interval_seconds
+    day = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    anchor = day.timestamp() + start * 60
+    steps = -(-(ts - anchor) // interval_seconds)  # làm tròn lên
+    return anchor + steps * interval_seconds
+
 class CronManager:
     """Quản lý cron jobs cho các service"""
     
     def __init__(self, test_mode: bool = False, test_interval: int = 10):
         self.config = self.load_config()
         self.running_services = set()
+        self._running_lock = threading.Lock()
         self.global_lock = False
-        self.max_concurrent = self.config.get('global_settings', {}).get('max_concurrent_services', 2)
+        global_settings = self.config.get('global_settings', {})
+        self.max_concurrent = global_settings.get('max_concurrent_services', 2)
+        if global_settings.get('sequential_execution', False):
+            self.max_concurrent = 1
+        self.health_check_interval = global_settings.get('health_check_interval', 300)
+        
+        # Hàng đợi ưu tiên + max_concurrent worker thread
+        self.scheduler = JobScheduler(max_workers=self.max_concurrent)
+        
+        # LISTEN/NOTIFY: đơn mới đánh thức service ngay, lịch định kỳ chỉ còn là lưới an toàn
+        self.order_listener = get_order_listener() if ORDER_LISTENER_ENABLED else None
         
         # Chế độ test
         self.test_mode = test_mode
         self.test_interval = test_interval
         
-        # Khởi động Chrome sẵn
-        self.chrome_driver = None
-        self.init_chrome_driver()
-        
-        # Mapping service names với functions
+        # Mapping service names với functions (get_data: claim WorkItem, action: chạy pipeline)
+        descriptions = {
+            'ftth': 'Tra cứu FTTH',
+            'evn': 'Gạch điện EVN',
+            'topup_multi': 'Nạp tiền đa mạng',
+            'topup_viettel': 'Nạp tiền Viettel',
+            'tv_internet': 'Thanh toán TV-Internet',
+            'postpaid': 'Tra cứu nợ trả sau',
+        }
         self.service_functions = {
-            'ftth': {
-                'get_data': get_data_ftth,
-                'action': lookup_ftth,
-                'description': 'Tra cứu FTTH'
-            },
-            'evn': {
-                'get_data': get_data_evn,
-                'action': debt_electric,
-                'description': 'Gạch điện EVN'
-            },
-            'topup_multi': {
-                'get_data': get_data_multi_network,
-                'action': payment_phone_multi,
-                'description': 'Nạp tiền đa mạng'
-            },
-            'topup_viettel': {
-                'get_data': get_data_viettel,
-                'action': payment_phone_viettel,
-                'description': 'Nạp tiền Viettel'
-            },
-            'tv_internet': {
-                'get_data': get_data_tv_internet,
-                'action': payment_internet,
-                'description': 'Thanh toán TV-Internet'
-            },
-            'postpaid': {
-                'get_data': get_data_postpaid,
-                'action': payment_phone_postpaid,
-                'description': 'Tra cứu nợ trả sau'
+            name: {
+                'get_data': claim_work_items,
+                'action': execute_work_items,
+                'description': description,
             }
+            for name, description in descriptions.items()
         }
         
         logger.info("🚀 CronManager đã khởi tạo với Service Manager mới")
@@ -112,53 +118,6 @@ class CronManager:
         logger.info(f"🔧 Max concurrent: {self.max_concurrent}")
         if self.test_mode:
             logger.info(f"🧪 Chế độ TEST: lặp sau {self.test_interval} giây")
-        if self.chrome_driver:
-            logger.info("🌐 Chrome driver đã sẵn sàng")
-        else:
-            logger.warning("⚠️ Chrome driver chưa sẵn sàng")
-    
-    def init_chrome_driver(self):
-        """Khởi động Chrome driver sẵn"""
-        try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options
-            from selenium.webdriver.chrome.service import Service
-            from webdriver_manager.chrome import ChromeDriverManager
-            
-            # Cấu hình Chrome options
-            chrome_options = Options()
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--start-maximized")
-            
-            # Khởi động Chrome
-            logger.info("🌐 Đang khởi động Chrome...")
-            self.chrome_driver = webdriver.Chrome(
-                service=Service(ChromeDriverManager().install()),
-                options=chrome_options
-            )
-            
-            # Test Chrome
-            self.chrome_driver.get("https://www.google.com")
-            time.sleep(2)
-            logger.info("✅ Chrome đã khởi động thành công")
-            
-            # Đóng tab test
-            self.chrome_driver.close()
-            self.chrome_driver.switch_to.window(self.chrome_driver.window_handles[0])
-            
-        except Exception as e:
-            logger.error(f"❌ Lỗi khởi động Chrome: {e}")
-            self.chrome_driver = None
-    
-    def get_chrome_driver(self):
-        """Lấy Chrome driver"""
-        if self.chrome_driver is None:
-            logger.warning("⚠️ Chrome driver chưa sẵn sàng, thử khởi động lại...")
-            self.init_chrome_driver()
-        return self.chrome_driver
     
     def load_config(self) -> Dict[str, Any]:
         """Load cấu hình từ file"""
@@ -189,7 +148,7 @@ class CronManager:
             },
             "global_settings": {
                 "max_concurrent_services": 2,
-                "sequential_execution": True
+                "sequential_execution": False
             }
         }
     
@@ -205,6 +164,10 @@ class CronManager:
     
     def can_run_service(self, service_name: str) -> bool:
         """Kiểm tra service có thể chạy không"""
+        with self._running_lock:
+            return self._can_run_locked(service_name)
+    
+    def _can_run_locked(self, service_name: str) -> bool:
         if self.global_lock:
             return False
         
@@ -216,118 +179,116 @@ class CronManager:
         
         return True
     
-    def mark_service_running(self, service_name: str):
-        """Đánh dấu service đang chạy"""
-        self.running_services.add(service_name)
+    def mark_service_running(self, service_name: str) -> bool:
+        """Đánh dấu service đang chạy (False nếu không còn slot hoặc service đang chạy)"""
+        with self._running_lock:
+            if not self._can_run_locked(service_name):
+                return False
+            self.running_services.add(service_name)
         logger.info(f"🟢 Service {service_name} đã bắt đầu chạy")
+        return True
     
     def mark_service_finished(self, service_name: str):
         """Đánh dấu service đã hoàn thành"""
-        self.running_services.discard(service_name)
+        with self._running_lock:
+            self.running_services.discard(service_name)
         logger.info(f"🔴 Service {service_name} đã hoàn thành")
     
-    def run_service(self, service_name: str):
-        """Chạy service cụ thể"""
-        if not self.can_run_service(service_name):
+    def get_batch_limit(self, service_name: str) -> Optional[int]:
+        """max_codes_per_batch của service (None = không giới hạn)"""
+        limit = self.config.get('services', {}).get(service_name, {}).get('max_codes_per_batch')
+        return int(limit) if limit else None
+    
+    def run_service(self, service_name: str) -> bool:
+        """
+        Chạy service cụ thể (được gọi từ worker thread của scheduler).
+        
+        Trả về True nếu batch đầy (còn backlog) để scheduler xếp thêm 1 lượt
+        nối tiếp sau các service khác đang chờ.
+        """
+        if not self.mark_service_running(service_name):
             logger.warning(f"⚠️ Service {service_name} không thể chạy ngay bây giờ")
-            return
+            return False
         
+        has_more = False
         try:
-            self.mark_service_running(service_name)
-            
             # Lấy thông tin service
             service_info = self.service_functions.get(service_name)
             if not service_info:
                 logger.error(f"❌ Không tìm thấy thông tin service: {service_name}")
-                return
+                return False
             
             logger.info(f"🚀 Bắt đầu chạy {service_info['description']}")
             
-            # Kiểm tra Chrome driver
-            if not self.get_chrome_driver():
-                logger.error(f"❌ Chrome driver không sẵn sàng, bỏ qua {service_name}")
-                return
+            # Lấy tối đa max_codes_per_batch mã đang chờ
+            limit = self.get_batch_limit(service_name)
+            items = service_info['get_data'](service_name, limit)
+            if not items:
+                logger.info(f"💤 {service_info['description']}: không có mã chờ xử lý")
+                return False
             
-            # Gọi hàm get_data trước
-            self._call_get_data(service_name, service_info['get_data'])
+            # Xử lý trên pipeline (BrowserPool), kết quả đã được ghi DB qua ResultWriter
+            results = service_info['action'](service_name, items)
+            succeeded = len([r for r in results if r.ok])
             
-            # Gọi hàm action chính
-            self._call_action(service_name, service_info['action'])
-            
-            logger.info(f"✅ Hoàn thành {service_info['description']}")
+            has_more = bool(limit) and len(items) >= limit
+            logger.info(f"✅ Hoàn thành {service_info['description']}: {succeeded}/{len(items)} mã thành công"
+                        f"{', còn backlog' if has_more else ''}")
             
         except Exception as e:
             logger.error(f"❌ Lỗi chạy service {service_name}: {e}")
         finally:
             self.mark_service_finished(service_name)
+        return has_more
     
-    def _call_get_data(self, service_name: str, get_data_func):
-        """Gọi hàm get_data của service"""
-        try:
-            logger.info(f"📥 Gọi get_data cho {service_name}")
-            
-            # Tạo mock UI elements cho get_data
-            from tkinter import Text, Entry
-            mock_text = Text()
-            mock_entry = Entry()
-            
-            # Gọi get_data function với mock UI
-            if service_name == 'ftth':
-                get_data_func(mock_text, None)
-            elif service_name == 'evn':
-                get_data_func(mock_text, mock_entry, mock_entry)
-            elif service_name in ['topup_multi', 'topup_viettel']:
-                get_data_func(mock_text, mock_entry)
-            elif service_name == 'tv_internet':
-                get_data_func(mock_text, mock_entry)
-            elif service_name == 'postpaid':
-                get_data_func(mock_text)
-            
-            logger.info(f"✅ get_data cho {service_name} thành công")
-            
-        except Exception as e:
-            logger.error(f"❌ Lỗi get_data cho {service_name}: {e}")
+    def get_interval_seconds(self, service_name: str, ts: Optional[float] = None) -> float:
+        """Interval hiện tại của service: interval_minutes, rút ngắn trong peak_hours nếu reduced_interval"""
+        service_config = self.config.get('services', {}).get(service_name, {})
+        interval = float(service_config.get('interval_minutes', 60)) * 60
+        peak = self.config.get('time_windows', {}).get('peak_hours')
+        reduced = (peak or {}).get('reduced_interval')
+        if reduced and in_time_window(peak, ts if ts is not None else time.time()):
+            if isinstance(reduced, bool):
+                interval *= float(peak.get('interval_factor', DEFAULT_PEAK_INTERVAL_FACTOR))
+            else:
+                # reduced_interval là số => interval (phút) dùng trong giờ cao điểm
+                interval = min(interval, float(reduced) * 60)
+        if self.order_listener is not None and self.order_listener.connected:
+            interval *= max(1.0, ORDER_LISTENER_POLL_FACTOR)
+        return max(interval, 60.0)
     
-    def _call_action(self, service_name: str, action_func):
-        """Gọi hàm action chính của service"""
-        try:
-            logger.info(f"🚀 Gọi action cho {service_name}")
-            
-            # Tạo mock UI elements cho action
-            from tkinter import Text, Entry
-            mock_text_input = Text()
-            mock_text_output = Text()
-            mock_entry = Entry()
-            
-            # Gọi action function với mock UI
-            if service_name == 'ftth':
-                action_func(mock_text_input, mock_text_output, None)
-            elif service_name == 'evn':
-                action_func(mock_text_input, mock_text_output, mock_entry, mock_entry)
-            elif service_name in ['topup_multi', 'topup_viettel']:
-                action_func(mock_text_input, mock_text_output, mock_entry, mock_entry, mock_entry)
-            elif service_name == 'tv_internet':
-                action_func(mock_text_input, mock_text_output, mock_entry)
-            elif service_name == 'postpaid':
-                action_func(mock_text_input, mock_text_output, mock_entry, mock_entry, mock_entry)
-            
-            logger.info(f"✅ action cho {service_name} thành công")
-            
-        except Exception as e:
-            logger.error(f"❌ Lỗi action cho {service_name}: {e}")
+    def is_service_active(self, service_name: str, ts: Optional[float] = None) -> bool:
+        """Service có business_hours_only = true thì chỉ chạy trong time_windows.business_hours"""
+        service_config = self.config.get('services', {}).get(service_name, {})
+        if not service_config.get('business_hours_only', False):
+            return True
+        business = self.config.get('time_windows', {}).get('business_hours')
+        if not business or not business.get('enabled', False):
+            return True
+        return in_time_window(business, ts if ts is not None else time.time())
     
     def setup_schedule(self):
         """Thiết lập lịch chạy"""
         try:
             # Xóa tất cả job cũ
-            schedule.clear()
+            self.scheduler.clear()
             
-            # Thiết lập job cho từng service
+            # Thiết lập job cho từng service (priority nhỏ chạy trước khi nhiều job cùng chờ)
             for service_name, service_config in self.config.get('services', {}).items():
                 if service_config.get('enabled', False):
                     interval = service_config.get('interval_minutes', 60)
-                    schedule.every(interval).minutes.do(self.run_service, service_name)
-                    logger.info(f"⏰ Đã lên lịch {service_name}: mỗi {interval} phút")
+                    priority = service_config.get('priority', 100)
+                    start_time = service_config.get('start_time')
+                    first_run = next_aligned_run(start_time, interval * 60, time.time())
+                    self.scheduler.add_job(
+                        service_name, partial(self.run_service, service_name), interval * 60, priority,
+                        first_run=first_run,
+                        interval_fn=partial(self.get_interval_seconds, service_name),
+                        active_fn=partial(self.is_service_active, service_name),
+                    )
+                    logger.info(f"⏰ Đã lên lịch {service_name}: mỗi {interval} phút (ưu tiên {priority}, "
+                                f"batch {service_config.get('max_codes_per_batch') or 'không giới hạn'}, "
+                                f"lượt đầu {datetime.fromtimestamp(first_run).strftime('%H:%M')})")
             
             logger.info("✅ Đã thiết lập lịch chạy cho tất cả service")
             
@@ -343,17 +304,23 @@ class CronManager:
         logger.info(f"🧪 Bắt đầu chế độ TEST - lặp sau {self.test_interval} giây")
         
         try:
+            # Đăng ký tất cả service (không tự chạy theo lịch, chỉ trigger mỗi vòng)
+            self.scheduler.clear()
+            services = self.config.get('services', {})
+            for service_name in ['ftth', 'evn', 'topup_multi', 'topup_viettel', 'tv_internet', 'postpaid']:
+                priority = services.get(service_name, {}).get('priority', 100)
+                self.scheduler.add_job(service_name, partial(self.run_service, service_name), 0, priority,
+                                       first_run=float('inf'))
+            self.scheduler.start()
+            
             while True:
                 logger.info("🔄 Bắt đầu vòng test mới...")
                 
-                # Chạy tất cả service theo thứ tự
+                # Đưa tất cả service vào hàng đợi, worker chạy song song theo ưu tiên
                 for service_name in ['ftth', 'evn', 'topup_multi', 'topup_viettel', 'tv_internet', 'postpaid']:
-                    if self.can_run_service(service_name):
-                        logger.info(f"🧪 Test service: {service_name}")
-                        self.run_service(service_name)
-                        time.sleep(2)  # Chờ giữa các service
-                    else:
-                        logger.info(f"⏸️ Service {service_name} không thể chạy ngay")
+                    logger.info(f"🧪 Test service: {service_name}")
+                    self.scheduler.trigger(service_name)
+                self.scheduler.wait_idle()
                 
                 logger.info(f"⏳ Chờ {self.test_interval} giây trước vòng tiếp theo...")
                 time.sleep(self.test_interval)
@@ -374,32 +341,80 @@ class CronManager:
             else:
                 # Chế độ cron bình thường
                 self.setup_schedule()
+                self.scheduler.start()
+                self.start_order_listener()
                 
+                last_report = time.monotonic()
                 while True:
-                    schedule.run_pending()
                     time.sleep(1)
+                    if time.monotonic() - last_report >= self.health_check_interval:
+                        self.log_queue_metrics()
+                        last_report = time.monotonic()
                     
         except KeyboardInterrupt:
             logger.info("⏹️ Dừng Cron Manager...")
         except Exception as e:
             logger.error(f"❌ Lỗi Cron Manager: {e}")
         finally:
-            # Đóng Chrome driver
-            if self.chrome_driver:
-                try:
-                    self.chrome_driver.quit()
-                    logger.info("🌐 Đã đóng Chrome driver")
-                except:
-                    pass
+            if self.order_listener is not None:
+                self.order_listener.stop()
+            self.scheduler.stop(timeout=30)
+            # Đóng các Chrome của BrowserPool (tạo lười khi service cần)
+            shutdown_browser_pool()
+            logger.info("🌐 Đã đóng Chrome của BrowserPool")
+    
+    def start_order_listener(self):
+        """Bật LISTEN đơn mới (nếu ORDER_LISTENER_ENABLED); lỗi kết nối thì vẫn chạy theo lịch"""
+        if self.order_listener is None:
+            logger.info("🔕 Order listener tắt (ORDER_LISTENER_ENABLED=0), chỉ chạy theo lịch")
+            return
+        self.order_listener.subscribe(self.on_new_orders)
+        self.order_listener.start()
+    
+    def on_new_orders(self, service_type: Optional[str], order_ids: List[str]):
+        """Callback của order listener: trigger các service ứng với service_type (None = tất cả)"""
+        services = self.config.get('services', {})
+        for service_name, db_type in SERVICE_TYPES.items():
+            if service_type is not None and db_type != service_type:
+                continue
+            if not services.get(service_name, {}).get('enabled', False):
+                continue
+            if not self.is_service_active(service_name):
+                logger.info(f"🔔 {service_name}: có đơn mới nhưng ngoài khung giờ chạy")
+                continue
+            logger.info(f"🔔 {service_name}: {len(order_ids)} đơn mới, chạy ngay")
+            self.scheduler.trigger(service_name, rerun_if_running=True)
+    
+    def log_queue_metrics(self):
+        """Ghi log độ sâu hàng đợi và thống kê từng service"""
+        metrics = self.scheduler.metrics()
+        logger.info(f"📊 Hàng đợi: {metrics['queue_depth']} job chờ (cao nhất {metrics['max_queue_depth']}) | "
+                    f"đang chạy: {', '.join(self.scheduler.running()) or 'không'}")
+        for name, job in metrics['jobs'].items():
+            duration = f"{job['last_duration']:.1f}s" if job['last_duration'] is not None else "-"
+            wait = f"{job['last_wait']:.1f}s" if job['last_wait'] is not None else "-"
+            logger.info(f"   • {name}: {job['runs']} lượt, {job['failures']} lỗi, gộp {job['coalesced']} | "
+                        f"lần cuối {duration}, chờ {wait}")
+        for stats in governor_stats().values():
+            logger.info(f"🚦 {format_governor_stats(stats)}")
     
     def get_status(self) -> Dict[str, Any]:
         """Lấy trạng thái hiện tại"""
+        metrics = self.scheduler.metrics()
+        with self._running_lock:
+            running = list(self.running_services)
         return {
-            'active_count': len(self.running_services),
+            'active_count': len(running),
             'max_concurrent': self.max_concurrent,
-            'running_services': list(self.running_services),
+            'running_services': running,
+            'queue_depth': metrics['queue_depth'],
+            'max_queue_depth': metrics['max_queue_depth'],
+            'queued_services': metrics['queued'],
+            'jobs': metrics['jobs'],
             'test_mode': self.test_mode,
-            'chrome_ready': self.chrome_driver is not None,
+            'browser_pool': get_browser_pool().utilisation(),
+            'order_listener': self.order_listener.stats() if self.order_listener is not None else None,
+            'governors': governor_stats(),
             'timestamp': datetime.now().isoformat()
         }
     
@@ -1,6 +1,6 @@
 import os
-import psycopg2
-from typing import List, Optional, Dict, Any
+import logging
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 import json as pyjson
 import sys
@@ -10,11 +10,46 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from app.config import DB_DATABASE_URL
+from psycopg2.extras import execute_values
+
+from app.utils.db_pool import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Danh sách các dịch vụ được phép gọi API mark_bill_completed khi status=success
+MARK_BILL_COMPLETED_SERVICES = (
+    'gach_dien_evn',         # env
+    'nap_tien_da_mang',      # deposit
+    'nap_tien_viettel',      # deposit_viettel
+    'thanh_toan_tv_internet' # payment_tv
+)
+
+def _order_status(status: str) -> str:
+    return 'completed' if status == 'success' else status
+
+def _transaction_status(status: str) -> str:
+    return 'success' if status == 'success' else 'failed' if status == 'failed' else status
+
+def _code_filter(service_type: str, payment_type: Optional[str]) -> str:
+    # Topup đa mạng: "sđt|số tiền" = trả trước, "sđt" = trả sau
+    if service_type == "nap_tien_da_mang" and payment_type == "prepaid":
+        return "AND st.code LIKE '%%|%%'"
+    if service_type == "nap_tien_da_mang" and payment_type == "postpaid":
+        return "AND st.code NOT LIKE '%%|%%'"
+    return ""
+
+def _result_json(code: str, status: str, amount: Any, notes: str, details: Optional[Dict[str, Any]]) -> str:
+    return pyjson.dumps({
+        'code': code,
+        'status': _order_status(status),
+        'amount': str(amount) if amount is not None else None,
+        'notes': notes,
+        'details': details or None,
+    }, ensure_ascii=False)
 
 def db_ensure_user(user_id: str, user: str) -> None:
     try:
-        with psycopg2.connect(DB_DATABASE_URL) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1 FROM users WHERE id = %s", (user_id,))
                 exists = cur.fetchone()
@@ -37,16 +72,9 @@ def update_database_immediately(order_id: str, code: str, status: str, amount: A
         order_id = (order_id or "").strip()
         code = (code or "").strip()
 
-        with psycopg2.connect(os.getenv('DATABASE_URL', DB_DATABASE_URL)) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
-                result_obj = {
-                    'code': code,
-                    'status': 'completed' if status == 'success' else status,
-                    'amount': str(amount) if amount is not None else None,
-                    'notes': notes,
-                    'details': details or None,
-                }
-                result_json = pyjson.dumps(result_obj, ensure_ascii=False)
+                result_json = _result_json(code, status, amount, notes, details)
 
                 # Lấy service_type từ orders để kiểm tra có cần gọi API mark_bill_completed không
                 cur.execute(
@@ -70,13 +98,13 @@ def update_database_immediately(order_id: str, code: str, status: str, amount: A
                     WHERE id = %s
                     RETURNING id
                     """,
-                    ('completed' if status == 'success' else status, result_json, order_id)
+                    (_order_status(status), result_json, order_id)
                 )
                 row_order = cur.fetchone()
                 if row_order:
-                    print(f"   ✅ Đã cập nhật orders (id={row_order[0]}) với trạng thái {status}")
+                    logger.debug("[DB] Đã cập nhật orders (id=%s) với trạng thái %s", row_order[0], status)
                 else:
-                    print(f"   ⚠️ Không update được bảng orders (id={order_id})")
+                    logger.warning("[DB] Không update được bảng orders (id=%s)", order_id)
 
                 # 2) Update service_transactions theo order_id (bỏ điều kiện status/code)
                 cur.execute(
@@ -91,7 +119,7 @@ def update_database_immediately(order_id: str, code: str, status: str, amount: A
                     RETURNING id
                     """,
                     (
-                        'success' if status == 'success' else 'failed' if status == 'failed' else status,
+                        _transaction_status(status),
                         str(amount) if isinstance(amount, (int, float)) else None,
                         notes,
                         result_json,
@@ -100,80 +128,129 @@ def update_database_immediately(order_id: str, code: str, status: str, amount: A
                 )
                 tran_rows = cur.fetchall()  # có thể có nhiều giao dịch cùng order_id
                 if tran_rows:
-                    updated_ids = ", ".join(r[0] for r in tran_rows if r and r[0])
-                    print(f"   ✅ Đã cập nhật {len(tran_rows)} service_transactions (id: {updated_ids}) với trạng thái {status}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        updated_ids = ", ".join(r[0] for r in tran_rows if r and r[0])
+                        logger.debug("[DB] Đã cập nhật %d service_transactions (id: %s) với trạng thái %s",
+                                     len(tran_rows), updated_ids, status)
                 else:
-                    print(f"   ⚠️ Không update được service_transactions cho order_id={order_id}")
+                    logger.warning("[DB] Không update được service_transactions cho order_id=%s", order_id)
 
-                # Commit (with-conn sẽ commit nếu không có exception, nhưng gọi tường minh cho chắc)
+                # Commit ngay để giải phóng lock trước khi gọi API (pool sẽ commit lại khi trả connection)
                 conn.commit()
 
                 # 3) Chỉ gọi API mark_bill_completed cho các dịch vụ cụ thể khi status=success
+                #    Xếp hàng cho worker nền, không chờ thuhohpk.com trong transaction/vòng lặp Selenium
                 if status == 'success':
-                    # Danh sách các dịch vụ được phép gọi API mark_bill_completed
-                    allowed_services = [
-                        'gach_dien_evn',        # env
-                        'nap_tien_da_mang',     # deposit
-                        'nap_tien_viettel',     # deposit_viettel
-                        'thanh_toan_tv_internet' # payment_tv
-                    ]
-                    
-                    if service_type in allowed_services:
-                        print(f"   🚀 Status=success và service_type={service_type} được phép, tự động gọi API mark_bill_completed cho {code}")
+                    if service_type in MARK_BILL_COMPLETED_SERVICES:
                         try:
-                            # Import và gọi hàm mark_bill_completed
-                            from .test1 import mark_bill_completed
-                            
-                            # Gọi API với order_id (hàm sẽ tự lấy code từ database)
-                            result = mark_bill_completed(order_id)
-                            if result and result.get('success'):
-                                print(f"   ✅ API mark_bill_completed thành công cho {code}")
-                            else:
-                                print(f"   ⚠️ API mark_bill_completed thất bại cho {code}: {result.get('msg', 'Unknown error')}")
+                            from app.utils.completion_dispatcher import enqueue_bill_completed
+                            enqueue_bill_completed(order_id, code)
+                            logger.debug("[DB] Đã xếp hàng mark_bill_completed cho %s (service_type=%s)", code, service_type)
                         except Exception as e:
-                            print(f"   ❌ Lỗi khi gọi API mark_bill_completed: {e}")
+                            logger.error(f"[DB] Lỗi xếp hàng mark_bill_completed: {e}")
                     else:
-                        print(f"   ℹ️ Service_type={service_type} không trong danh sách được phép gọi API mark_bill_completed")
+                        logger.debug("[DB] service_type=%s không trong danh sách được phép gọi API mark_bill_completed",
+                                     service_type)
 
                 return bool(row_order or tran_rows)
 
     except Exception as e:
-        print(f"   ❌ Lỗi cập nhật DB trực tiếp: {e}")
+        logger.error(f"[DB] Lỗi cập nhật DB trực tiếp: {e}")
         return False
-    
+
+def db_update_results_batch(records: List[Dict[str, Any]]) -> List[tuple]:
+    """
+    Cập nhật kết quả của nhiều order trong 1 transaction bằng UPDATE ... FROM (VALUES ...).
+
+    Args:
+        records: Danh sách dict có các key order_id, code, status, amount, notes, details
+
+    Returns:
+        Danh sách (order_id, service_type) đã cập nhật bảng orders. Lỗi DB sẽ raise để caller giữ lại batch.
+    """
+    # Mỗi order_id chỉ giữ kết quả cuối cùng (UPDATE ... FROM không xác định khi trùng khóa)
+    latest: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        order_id = (rec.get('order_id') or "").strip()
+        if order_id:
+            latest[order_id] = rec
+    if not latest:
+        return []
+
+    order_values = []
+    tran_values = []
+    for order_id, rec in latest.items():
+        code = (rec.get('code') or "").strip()
+        status = rec.get('status')
+        amount = rec.get('amount')
+        result_json = _result_json(code, status, amount, rec.get('notes'), rec.get('details'))
+        order_values.append((order_id, _order_status(status), result_json))
+        tran_values.append((
+            order_id,
+            _transaction_status(status),
+            str(amount) if isinstance(amount, (int, float)) else None,
+            rec.get('notes'),
+            result_json,
+        ))
+
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            updated_orders = execute_values(
+                cur,
+                """
+                UPDATE orders AS o
+                SET status = v.status::order_status,
+                    result_data = v.result_data,
+                    updated_at = NOW()
+                FROM (VALUES %s) AS v(id, status, result_data)
+                WHERE o.id = v.id
+                RETURNING o.id, o.service_type
+                """,
+                order_values,
+                page_size=len(order_values),
+                fetch=True,
+            )
+            execute_values(
+                cur,
+                """
+                UPDATE service_transactions AS st
+                SET status = v.status::transaction_status,
+                    amount = COALESCE(v.amount::numeric, st.amount),
+                    notes = v.notes,
+                    processing_data = v.processing_data,
+                    updated_at = NOW()
+                FROM (VALUES %s) AS v(order_id, status, amount, notes, processing_data)
+                WHERE st.order_id = v.order_id
+                """,
+                tran_values,
+                page_size=len(tran_values),
+            )
+    logger.debug("[DB] Đã cập nhật batch %d/%d orders", len(updated_orders), len(latest))
+    return [(row[0], row[1]) for row in updated_orders]
+
+def _pending_orders_for_code_query(service_type: str, code: str, user_id: Optional[str] = None,
+                                   latest_only: bool = False) -> Tuple[str, tuple]:
+    """SQL + tham số tìm order_id còn pending/processing của 1 mã (dùng idx_service_transactions_pending_code)"""
+    user_filter = "AND o.user_id = %s" if user_id else ""
+    sql = f"""
+        SELECT st.order_id
+        FROM service_transactions st
+        JOIN orders o ON o.id = st.order_id
+        WHERE st.code = %s
+          AND o.service_type = %s
+          {user_filter}
+          AND st.status IN ('pending','processing')
+        ORDER BY st.created_at DESC
+        {"LIMIT 1" if latest_only else ""}
+    """
+    params = (code, service_type, user_id) if user_id else (code, service_type)
+    return sql, params
+
 def db_find_order_id(service_type: str, code: str, user_id: Optional[str] = None) -> Optional[str]:
     try:
-        with psycopg2.connect(DB_DATABASE_URL) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
-                if user_id:
-                    cur.execute(
-                        """
-                        SELECT st.order_id
-                        FROM service_transactions st
-                        JOIN orders o ON o.id = st.order_id
-                        WHERE st.code = %s
-                          AND o.service_type = %s
-                          AND o.user_id = %s
-                          AND st.status IN ('pending','processing')
-                        ORDER BY st.created_at DESC
-                        LIMIT 1
-                        """,
-                        (code, service_type, user_id)
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT st.order_id
-                        FROM service_transactions st
-                        JOIN orders o ON o.id = st.order_id
-                        WHERE st.code = %s
-                          AND o.service_type = %s
-                          AND st.status IN ('pending','processing')
-                        ORDER BY st.created_at DESC
-                        LIMIT 1
-                        """,
-                        (code, service_type)
-                    )
+                cur.execute(*_pending_orders_for_code_query(service_type, code, user_id, latest_only=True))
                 row = cur.fetchone()
                 return row[0] if row else None
     except Exception as e:
@@ -182,121 +259,107 @@ def db_find_order_id(service_type: str, code: str, user_id: Optional[str] = None
 
 def db_check_pending_orders_for_code(service_type: str, code: str, user_id: Optional[str] = None) -> List[str]:
     try:
-        with psycopg2.connect(DB_DATABASE_URL) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
-                if user_id:
-                    cur.execute(
-                        """
-                        SELECT st.order_id
-                        FROM service_transactions st
-                        JOIN orders o ON o.id = st.order_id
-                        WHERE st.code = %s
-                          AND o.service_type = %s
-                          AND o.user_id = %s
-                          AND st.status IN ('pending','processing')
-                        ORDER BY st.created_at DESC
-                        """,
-                        (code, service_type, user_id)
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT st.order_id
-                        FROM service_transactions st
-                        JOIN orders o ON o.id = st.order_id
-                        WHERE st.code = %s
-                          AND o.service_type = %s
-                          AND st.status IN ('pending','processing')
-                        ORDER BY st.created_at DESC
-                        """,
-                        (code, service_type)
-                    )
+                cur.execute(*_pending_orders_for_code_query(service_type, code, user_id))
                 rows = cur.fetchall()
                 return [r[0] for r in rows]
     except Exception as e:
         print(f"[DB] Lỗi kiểm tra pending cho code='{code}': {e}")
         return []
 
-def db_insert_orders_from_lines(service_type: str, user_id: str, lines: List[str]) -> int:
-    codes = [ln.strip() for ln in lines if ln and ln.strip()]
+def db_bulk_insert_orders(service_type: str, user_id: str, codes: List[str]) -> List[Dict[str, Any]]:
+    """
+    Tạo order + service_transaction pending cho nhiều mã trong 1 câu lệnh (1 round-trip).
+
+    Bỏ mã trùng trong danh sách và mã đang pending/processing của cùng dịch vụ.
+    Trả về [{'orderId', 'code'}] theo thứ tự đầu vào; lỗi DB sẽ raise.
+    """
+    codes = [c.strip() for c in codes if c and c.strip()]
     if not codes:
-        return 0
-    try:
-        with psycopg2.connect(DB_DATABASE_URL) as conn:
-            with conn.cursor() as cur:
-                count = 0
-                for code in codes:
-                    cur.execute(
-                        """
-                        INSERT INTO orders (user_id, service_type, status, input_data)
-                        VALUES (%s, %s, 'pending', %s)
-                        RETURNING id
-                        """,
-                        (user_id, service_type, code)
+        return []
+    with db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH input AS (
+                    SELECT DISTINCT ON (code) code, ord
+                    FROM unnest(%s::text[]) WITH ORDINALITY AS i(code, ord)
+                    ORDER BY code, ord
+                ), fresh AS (
+                    SELECT i.code, i.ord
+                    FROM input i
+                    WHERE NOT EXISTS (
+                        SELECT 1
+                        FROM service_transactions st
+                        JOIN orders o ON o.id = st.order_id
+                        WHERE st.code = i.code
+                          AND o.service_type = %s
+                          AND st.status IN ('pending','processing')
                     )
-                    cur.fetchone()
-                    count += 1
-                print(f"[DB] Đã tạo {count} orders cho service '{service_type}'.")
-                return count
+                ), new_orders AS (
+                    INSERT INTO orders (user_id, service_type, status, input_data)
+                    SELECT %s, %s::service_type, 'pending'::order_status, code FROM fresh ORDER BY ord
+                    RETURNING id, input_data
+                ), new_transactions AS (
+                    INSERT INTO service_transactions (order_id, code, status)
+                    SELECT id, input_data, 'pending'::transaction_status FROM new_orders
+                    RETURNING order_id, code
+                )
+                SELECT t.order_id, t.code
+                FROM new_transactions t
+                JOIN fresh f ON f.code = t.code
+                ORDER BY f.ord
+                """,
+                (codes, service_type, user_id, service_type)
+            )
+            rows = cur.fetchall()
+    skipped = len(codes) - len(rows)
+    logger.info(f"[DB] Đã tạo {len(rows)} orders cho service '{service_type}'"
+                f"{f' (bỏ {skipped} mã trùng/đang chờ)' if skipped else ''}.")
+    return [{'orderId': r[0], 'code': r[1]} for r in rows]
+
+def db_insert_orders_from_lines(service_type: str, user_id: str, lines: List[str]) -> int:
+    """Tạo order cho các dòng mã (bulk, bỏ mã trùng/đang chờ), trả về số order đã tạo"""
+    try:
+        return len(db_bulk_insert_orders(service_type, user_id, lines))
     except Exception as e:
         print(f"[DB] Lỗi insert orders: {e}")
         return 0
 
-def db_fetch_service_data(service_type: str, payment_type: str = None) -> Optional[Dict[str, Any]]:
+def _pending_work_query(service_type: str, payment_type: str = None, limit: Optional[int] = None) -> Tuple[str, tuple]:
+    """SQL + tham số đọc mã pending/processing của 1 dịch vụ (mỗi code lấy giao dịch mới nhất)"""
+    code_filter = _code_filter(service_type, payment_type)
+    sql = f"""
+        SELECT DISTINCT ON (st.code) st.code, st.order_id, st.created_at
+        FROM service_transactions st
+        JOIN orders o ON o.id = st.order_id
+        WHERE o.service_type = %s
+          AND st.status IN ('pending','processing')
+          {code_filter}
+        ORDER BY st.code, st.created_at DESC
+    """
+    params: List[Any] = [service_type]
+    if limit:
+        sql = f"""
+            SELECT code, order_id, created_at FROM ({sql}) pending
+            ORDER BY created_at ASC
+            LIMIT %s
+        """
+        params.append(int(limit))
+    return sql, tuple(params)
+
+def db_fetch_service_data(service_type: str, payment_type: str = None, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Lấy các mã đang pending/processing của 1 dịch vụ.
+
+    limit: giới hạn số mã mỗi batch (max_codes_per_batch), lấy mã cũ nhất trước
+    để backlog lớn được xử lý dần theo từng phần.
+    """
     try:
-        with psycopg2.connect(os.getenv('DATABASE_URL', DB_DATABASE_URL)) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
-                if service_type == "nap_tien_da_mang" and payment_type:
-                    if payment_type == "prepaid":
-                        cur.execute(
-                            """
-                            SELECT DISTINCT ON (st.code) st.code, st.order_id, st.created_at
-                            FROM service_transactions st
-                            JOIN orders o ON o.id = st.order_id
-                            WHERE o.service_type = %s
-                              AND st.status IN ('pending','processing')
-                              AND st.code LIKE '%%|%%'
-                            ORDER BY st.code, st.created_at DESC
-                            """,
-                            (service_type,)
-                        )
-                    elif payment_type == "postpaid":
-                        cur.execute(
-                            """
-                            SELECT DISTINCT ON (st.code) st.code, st.order_id, st.created_at
-                            FROM service_transactions st
-                            JOIN orders o ON o.id = st.order_id
-                            WHERE o.service_type = %s
-                              AND st.status IN ('pending','processing')
-                              AND st.code NOT LIKE '%%|%%'
-                            ORDER BY st.code, st.created_at DESC
-                            """,
-                            (service_type,)
-                        )
-                    else:
-                        cur.execute(
-                            """
-                            SELECT DISTINCT ON (st.code) st.code, st.order_id, st.created_at
-                            FROM service_transactions st
-                            JOIN orders o ON o.id = st.order_id
-                            WHERE o.service_type = %s
-                              AND st.status IN ('pending','processing')
-                            ORDER BY st.code, st.created_at DESC
-                            """,
-                            (service_type,)
-                        )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT ON (st.code) st.code, st.order_id, st.created_at
-                        FROM service_transactions st
-                        JOIN orders o ON o.id = st.order_id
-                        WHERE o.service_type = %s
-                          AND st.status IN ('pending','processing')
-                        ORDER BY st.code, st.created_at DESC
-                        """,
-                        (service_type,)
-                    )
+                cur.execute(*_pending_work_query(service_type, payment_type, limit))
                 rows = cur.fetchall()
                 codes = []
                 code_order_map = []
@@ -310,15 +373,16 @@ def db_fetch_service_data(service_type: str, payment_type: str = None) -> Option
                 if rows:
                     latest_row = max(rows, key=lambda r: r[2] or datetime.min)
                     latest_order_id = latest_row[1]
+                cap = int(limit) if limit else 10
                 result: Dict[str, Any] = {}
                 if service_type in ("tra_cuu_ftth", "thanh_toan_tv_internet"):
-                    result["subscriber_codes"] = codes[:10]
+                    result["subscriber_codes"] = codes[:cap]
                 elif service_type == "gach_dien_evn":
-                    result["bill_codes"] = codes[:10]
+                    result["bill_codes"] = codes[:cap]
                 elif service_type in ("nap_tien_da_mang", "nap_tien_viettel", "tra_cuu_no_tra_sau"):
-                    result["subscriber_codes"] = codes[:10]
+                    result["subscriber_codes"] = codes[:cap]
                 else:
-                    result["codes"] = codes[:10]
+                    result["codes"] = codes[:cap]
                 result["order_id"] = latest_order_id
                 result["code_order_map"] = code_order_map
                 return result
@@ -326,6 +390,161 @@ def db_fetch_service_data(service_type: str, payment_type: str = None) -> Option
         print(f"[DB] Lỗi đọc DB cho {service_type}: {e}")
         return None
 
+# Giao dịch processing được coi là bỏ dở khi lease đã hết; dòng processing cũ (không có lease,
+# do luồng GUI cũ đặt) thì tính theo updated_at + lease_seconds
+_LEASE_EXPIRED = """st.status = 'processing'
+              AND COALESCE(st.lease_expires_at, st.updated_at + make_interval(secs => %s)) < NOW()"""
+
+def _claim_query(service_type: str, worker_id: str, limit: Optional[int] = None,
+                 lease_seconds: float = 900, payment_type: str = None) -> Tuple[str, tuple]:
+    """SQL + tham số claim (dùng idx_service_transactions_pending_created)"""
+    cap = int(limit) if limit else 10
+    sql = f"""
+        WITH picked AS (
+            SELECT st.id
+            FROM service_transactions st
+            JOIN orders o ON o.id = st.order_id
+            WHERE o.service_type = %s
+              AND st.status IN ('pending','processing')
+              AND (st.status = 'pending' OR ({_LEASE_EXPIRED}))
+              {_code_filter(service_type, payment_type)}
+            ORDER BY st.created_at ASC
+            LIMIT %s
+            FOR UPDATE OF st SKIP LOCKED
+        ), claimed AS (
+            UPDATE service_transactions st
+            SET status = 'processing',
+                claimed_by = %s,
+                lease_expires_at = NOW() + make_interval(secs => %s),
+                updated_at = NOW()
+            FROM picked
+            WHERE st.id = picked.id
+            RETURNING st.id, st.code, st.order_id, st.created_at
+        ), touched AS (
+            UPDATE orders o
+            SET status = 'processing', updated_at = NOW()
+            FROM (SELECT DISTINCT order_id FROM claimed) c
+            WHERE o.id = c.order_id AND o.status = 'pending'
+        )
+        SELECT id, code, order_id FROM claimed ORDER BY created_at ASC
+    """
+    return sql, (service_type, float(lease_seconds), cap, worker_id, float(lease_seconds))
+
+def db_claim_service_work(service_type: str, worker_id: str, limit: Optional[int] = None,
+                          lease_seconds: float = 900, payment_type: str = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Nhận nguyên tử tối đa limit giao dịch (cũ nhất trước) của 1 dịch vụ: pending hoặc processing
+    đã hết lease -> processing, gắn claimed_by = worker_id và lease_expires_at.
+
+    FOR UPDATE SKIP LOCKED => các worker chạy song song (nhiều tiến trình/máy) không bao giờ
+    nhận cùng 1 giao dịch. Trả về [{'id', 'code', 'orderId'}], None nếu lỗi DB.
+    """
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(*_claim_query(service_type, worker_id, limit, lease_seconds, payment_type))
+                rows = cur.fetchall()
+        if rows:
+            logger.info(f"[DB] {worker_id} nhận {len(rows)} giao dịch {service_type} (lease {int(lease_seconds)}s)")
+        return [{'id': r[0], 'code': r[1], 'orderId': r[2]} for r in rows if r[1]]
+    except Exception as e:
+        logger.error(f"[DB] Lỗi nhận việc {service_type}: {e}")
+        return None
+
+def db_renew_leases(worker_id: str, lease_seconds: float = 900) -> Optional[List[Tuple[str, str]]]:
+    """
+    Gia hạn lease cho mọi giao dịch worker_id đang giữ (heartbeat khi batch chạy lâu).
+    Trả về [(order_id, code)] worker còn giữ sau khi gia hạn, None nếu lỗi DB.
+    """
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE service_transactions
+                    SET lease_expires_at = NOW() + make_interval(secs => %s)
+                    WHERE claimed_by = %s AND status = 'processing'
+                    RETURNING order_id, code
+                    """,
+                    (float(lease_seconds), worker_id)
+                )
+                return [(r[0], (r[1] or '').strip()) for r in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"[DB] Lỗi gia hạn lease cho {worker_id}: {e}")
+        return None
+
+def db_reap_expired_leases(lease_seconds: float = 900) -> int:
+    """Trả các giao dịch processing đã hết lease (worker chết/treo) về pending"""
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    UPDATE service_transactions
+                    SET status = 'pending', claimed_by = NULL, lease_expires_at = NULL, updated_at = NOW()
+                    WHERE id IN (
+                        SELECT st.id FROM service_transactions st
+                        WHERE {_LEASE_EXPIRED}
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    """,
+                    (float(lease_seconds),)
+                )
+                reaped = cur.rowcount
+        if reaped:
+            logger.info(f"[DB] Đã trả {reaped} giao dịch hết lease về pending")
+        return reaped
+    except Exception as e:
+        logger.error(f"[DB] Lỗi thu hồi lease: {e}")
+        return 0
+
+# claimed_by của giao dịch chờ đối soát tay: lease vô hạn => reaper và claim đều bỏ qua
+RECONCILE_OWNER = 'reconcile'
+
+def db_release_claims(order_ids: List[str]) -> int:
+    """Trả các giao dịch processing chưa được xử lý (vd. shard dừng trước khi tới lượt) về pending ngay"""
+    if not order_ids:
+        return 0
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE service_transactions
+                    SET status = 'pending', claimed_by = NULL, lease_expires_at = NULL, updated_at = NOW()
+                    WHERE order_id = ANY(%s) AND status = 'processing'
+                    """,
+                    (list(order_ids),)
+                )
+                return cur.rowcount
+    except Exception as e:
+        logger.error("[DB] Lỗi trả giao dịch về pending: %s", e)
+        return 0
+
+def db_hold_for_reconciliation(order_ids: List[str], note: str) -> int:
+    """
+    Giữ các giao dịch processing không rõ kết quả (tiến trình chết giữa lúc xử lý, giao dịch có thể
+    đã thành công trên portal) để đối soát tay: claimed_by = RECONCILE_OWNER, lease không hết hạn
+    nên không bị chạy lại tự động. Tìm: WHERE claimed_by = 'reconcile'.
+    """
+    if not order_ids:
+        return 0
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE service_transactions
+                    SET claimed_by = %s, lease_expires_at = 'infinity', notes = %s, updated_at = NOW()
+                    WHERE order_id = ANY(%s) AND status = 'processing'
+                    """,
+                    (RECONCILE_OWNER, note, list(order_ids))
+                )
+                return cur.rowcount
+    except Exception as e:
+        logger.error("[DB] Lỗi đánh dấu đối soát: %s", e)
+        return 0
+
 def db_get_account_credentials(order_id: str) -> Optional[tuple[str, str]]:
     """
     Lấy thông tin đăng nhập (user, password) từ order_id.
@@ -337,7 +556,7 @@ def db_get_account_credentials(order_id: str) -> Optional[tuple[str, str]]:
         Tuple (user, password) hoặc None nếu không tìm thấy
     """
     try:
-        with psycopg2.connect(os.getenv('DATABASE_URL', DB_DATABASE_URL)) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 # Tìm user_id từ order_id
                 cur.execute(
@@ -383,7 +602,7 @@ def db_get_code_by_order_id(order_id: str) -> Optional[str]:
         Code tương ứng hoặc None nếu không tìm thấy
     """
     try:
-        with psycopg2.connect(os.getenv('DATABASE_URL', DB_DATABASE_URL)) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -409,15 +628,57 @@ def db_get_code_by_order_id(order_id: str) -> Optional[str]:
         print(f"   ❌ Lỗi lấy code cho order_id {order_id}: {e}")
         return None
 
+def db_iter_transaction_results(service_type: Optional[str] = None, since: Optional[datetime] = None,
+                                until: Optional[datetime] = None, itersize: int = 2000) -> Iterator[tuple]:
+    """
+    Duyệt kết quả đã xử lý (code, amount, notes, status, service_type, updated_at) theo thời gian cập nhật,
+    bằng server-side cursor: mỗi lần chỉ kéo itersize dòng về nên báo cáo lịch sử lớn không nạp hết vào bộ nhớ.
+    """
+    conditions = ["st.status NOT IN ('pending','processing')"]
+    params: List[Any] = []
+    if service_type:
+        conditions.append("o.service_type = %s")
+        params.append(service_type)
+    if since:
+        conditions.append("st.updated_at >= %s")
+        params.append(since)
+    if until:
+        conditions.append("st.updated_at < %s")
+        params.append(until)
+    sql = f"""
+        SELECT st.code, st.amount, st.notes, st.status, o.service_type, st.updated_at
+        FROM service_transactions st
+        JOIN orders o ON o.id = st.order_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY st.updated_at ASC
+    """
+    with db_connection() as conn:
+        # Cursor có tên = server-side cursor của PostgreSQL (chỉ sống trong transaction của connection này)
+        with conn.cursor(name=f"export_results_{os.getpid()}_{id(conn)}") as cur:
+            cur.itersize = max(1, itersize)
+            cur.execute(sql, tuple(params))
+            for row in cur:
+                yield row
+
 __all__ = [
+    "MARK_BILL_COMPLETED_SERVICES",
     "db_ensure_user",
     "update_database_immediately",
+    "db_update_results_batch",
     "db_find_order_id",
     "db_check_pending_orders_for_code",
+    "db_bulk_insert_orders",
     "db_insert_orders_from_lines",
     "db_fetch_service_data",
+    "db_claim_service_work",
+    "db_renew_leases",
+    "db_reap_expired_leases",
+    "RECONCILE_OWNER",
+    "db_release_claims",
+    "db_hold_for_reconciliation",
     "db_get_account_credentials",
     "db_get_code_by_order_id",
+    "db_iter_transaction_results",
 ]
 
 
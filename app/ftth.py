@@ -1,5 +1,4 @@
 import os
-import re
 import time
 import json 
 import tkinter as tk
@@ -18,7 +17,6 @@ from selenium.common.exceptions import StaleElementReferenceException, NoSuchEle
 from cryptography.fernet import Fernet
 import psycopg2
 
-from bs4 import BeautifulSoup
 import sys
 import logging
 import requests
@@ -26,6 +24,10 @@ import threading
 from typing import List, Tuple, Optional, Dict, Any
 from dataclasses import dataclass
 
+# Thêm thư mục gốc vào sys.path để dùng chung parser kết quả với app/services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.result_parsers import amount_by_cbil as _amount_by_cbil, extract_ftth_details_from_driver
+
 # Cấu hình logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1010,39 +1012,8 @@ def handle_choose_amount(am: str) -> str:
         return "0"
 
 def amount_by_cbil(cbil: str, element, lookup: bool = False) -> Tuple[bool, Any, Optional[str]]:
-    """Lấy số tiền theo mã thuê bao"""
-    try:
-        amount = "Không tìm thấy mã thuê bao"
-        payment_id = None
-        
-        html_content = element.get_attribute('outerHTML')
-        soup = BeautifulSoup(html_content, 'html.parser')
-        pay_content_groups = soup.find_all("div", class_="row pay-content mb-3")
-        
-        for group in pay_content_groups:
-            p_tags = group.find_all("p")
-            is_found = any(cbil in p_tag.text for p_tag in p_tags)
-            
-            if lookup and is_found:
-                button_tag = group.find("button", {"id": re.compile(r'payMoneyForm:btnView\d*')})
-                if button_tag:
-                    payment_id = button_tag['id']
-            
-            if is_found:
-                for p_tag in p_tags:
-                    if "VND" in p_tag.text:
-                        str_price = p_tag.text.split("VND")[0].strip()
-                        amount = int(str_price.replace(",", ""))
-                        if amount >= 5000:
-                            return True, amount, payment_id
-                        else:
-                            return False, amount, payment_id
-                            
-        return False, amount, payment_id
-        
-    except Exception as e:
-        logger.error(f"Lỗi lấy số tiền: {e}")
-        return False, "Lỗi thanh toán", None
+    """Lấy số tiền theo mã thuê bao (1 lần execute_script, xem app/services/result_parsers.py)"""
+    return _amount_by_cbil(cbil, element, lookup)
 
 def navigate_to_ftth_page_and_select_radio():
     """Đi tới trang FTTH và chọn radio 'Số thuê bao'"""
@@ -1071,47 +1042,7 @@ def navigate_to_ftth_page_and_select_radio():
 
 def extract_ftth_details_from_page() -> Dict[str, Any]:
     """Trích thông tin chi tiết FTTH từ trang hiện tại sau khi nhấn KIỂM TRA."""
-    details: Dict[str, Any] = {}
-    try:
-        html_content = driver.page_source
-        soup = BeautifulSoup(html_content, 'html.parser')
-        label_to_key = {
-            'Mã hợp đồng:': 'contract_code',
-            'Chủ hợp đồng:': 'contract_owner',
-            'Số thuê bao đại diện:': 'representative_subscriber',
-            'Dịch vụ:': 'service',
-            'Số điện thoại liên hệ:': 'contact_phone',
-            'Nợ cước:': 'debt_amount',
-        }
-        # Duyệt các hàng hiển thị label-value
-        for row in soup.find_all('div', class_='row'):
-            cols = row.find_all('div', class_='col-6')
-            if len(cols) != 2:
-                continue
-            label_tag = cols[0].find('label')
-            value_p = cols[1].find('p')
-            if not label_tag or not value_p:
-                continue
-            label_text = label_tag.get_text(strip=True)
-            value_text = value_p.get_text(strip=True)
-            key = label_to_key.get(label_text)
-            if not key:
-                continue
-            if key == 'debt_amount':
-                try:
-                    # Lấy số từ chuỗi "170,000 VND"
-                    num_str = re.findall(r"[\d\.,]+", value_text)
-                    if num_str:
-                        details[key] = int(num_str[0].replace('.', '').replace(',', ''))
-                    else:
-                        details[key] = None
-                except Exception:
-                    details[key] = None
-            else:
-                details[key] = value_text
-    except Exception as e:
-        logger.warning(f"Lỗi trích chi tiết FTTH: {e}")
-    return details
+    return extract_ftth_details_from_driver(driver)
 
 def get_error_alert_text() -> Optional[str]:
     """Trả về nội dung thông báo lỗi (role="alert") nếu có."""
@@ -12,19 +12,13 @@ PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PARENT_DIR not in sys.path:
 	sys.path.insert(0, PARENT_DIR)
 
-from app.config import Config, LOGIN_USERNAME
-from app.utils.browser import driver, initialize_browser, cleanup, login_process, ensure_driver_and_login
+from app.config import Config, LOGIN_USERNAME, ORDER_LISTENER_ENABLED, ORDER_LISTENER_POLL_FACTOR
+from app.utils.browser import driver, initialize_browser, cleanup, ensure_driver_and_login
 from app.utils.ui_helpers import show_services_form, set_root, get_root, maybe_update_ui
+from app.utils.logging_setup import setup_logging
 
-# Cấu hình logging
-logging.basicConfig(
-	level=logging.INFO,
-	format='%(asctime)s - %(levelname)s - %(message)s',
-	handlers=[
-		logging.FileHandler('app.log', encoding='utf-8'),
-		logging.StreamHandler()
-	]
-)
+# Cấu hình logging (console + app.log JSON lines, ghi qua QueueListener)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Global variables
@@ -34,6 +28,19 @@ auto_mode_thread = None
 auto_mode_stop_flag = False
 auto_mode_loop_enabled = False  # Thêm biến cho chế độ lặp
 auto_mode_loop_interval = 10  # Khoảng thời gian lặp lại (giây)
+auto_mode_wake_event = threading.Event()  # Order listener báo có đơn mới => bỏ chờ, chạy ngay
+auto_mode_notified_types = set()  # service_type (DB) có đơn mới từ NOTIFY; None = quét tất cả
+auto_mode_notified_lock = threading.Lock()
+
+# Tên dịch vụ trên GUI -> service_type trong DB (để lọc theo NOTIFY)
+AUTO_MODE_SERVICE_TYPES = {
+	"Tra cứu FTTH": "tra_cuu_ftth",
+	"Gạch điện EVN": "gach_dien_evn",
+	"Nạp tiền đa mạng": "nap_tien_da_mang",
+	"Nạp tiền mạng Viettel": "nap_tien_viettel",
+	"Thanh toán TV - Internet": "thanh_toan_tv_internet",
+	"Tra cứu nợ thuê bao trả sau": "tra_cuu_no_tra_sau",
+}
 ui_initialized = False
 
 def initialize_main_ui():
@@ -508,10 +515,34 @@ def _monitor_processing_progress(service_display_name):
         logger.error(f"Lỗi monitor progress: {e}")
         return False
 		
+def on_new_orders(service_type, order_ids):
+	"""Callback của order listener: ghi nhận dịch vụ có đơn mới và đánh thức auto_cron_worker"""
+	with auto_mode_notified_lock:
+		auto_mode_notified_types.add(service_type)
+	logger.info(f"🔔 Có {len(order_ids)} đơn mới ({service_type or 'tất cả dịch vụ'})")
+	auto_mode_wake_event.set()
+
+def _take_notified_types():
+	"""Lấy và xoá danh sách service_type đã được NOTIFY (None trong set = chạy tất cả)"""
+	with auto_mode_notified_lock:
+		notified = set(auto_mode_notified_types)
+		auto_mode_notified_types.clear()
+	auto_mode_wake_event.clear()
+	return notified
+
+def _auto_mode_wait_seconds():
+	"""Đang LISTEN được thì chu kỳ quét định kỳ chỉ là lưới an toàn => chờ lâu hơn"""
+	if ORDER_LISTENER_ENABLED:
+		from app.utils.order_listener import get_order_listener
+		if get_order_listener().connected:
+			return int(auto_mode_loop_interval * max(1.0, ORDER_LISTENER_POLL_FACTOR))
+	return auto_mode_loop_interval
+
 def auto_cron_worker():
 	"""Worker thread cho auto mode - xử lý tuần tự 6 dịch vụ với 2 loại cho Nạp tiền đa mạng"""
 	global auto_mode_stop_flag, auto_mode_loop_enabled, auto_mode_loop_interval
 	try:
+		notified = set()
 		while auto_mode_loop_enabled and not auto_mode_stop_flag:
 			logger.info(f"🔄 Bắt đầu chu kỳ auto mode mới (lặp lại mỗi {auto_mode_loop_interval} giây)")
 			
@@ -525,6 +556,13 @@ def auto_cron_worker():
 				("Thanh toán TV - Internet", None),
 				("Tra cứu nợ thuê bao trả sau", None)
 			]
+			# Được đánh thức bởi NOTIFY => chỉ chạy các dịch vụ có đơn mới
+			if notified and None not in notified:
+				services_with_types = [
+					(service, service_type) for service, service_type in services_with_types
+					if AUTO_MODE_SERVICE_TYPES.get(service) in notified
+				]
+				logger.info(f"🔔 Chu kỳ theo NOTIFY: {', '.join(sorted(notified))}")
 			
 			completed_services = 0
 			skipped_services = 0
@@ -595,19 +633,20 @@ def auto_cron_worker():
 			
 			# Kiểm tra xem có cần lặp lại không
 			if auto_mode_loop_enabled and not auto_mode_stop_flag:
-				logger.info(f"⏰ Chờ {auto_mode_loop_interval} giây trước khi lặp lại...")
-				update_auto_mode_status(f"⏰ Chờ {auto_mode_loop_interval}s để lặp lại...")
+				wait_seconds = _auto_mode_wait_seconds()
+				logger.info(f"⏰ Chờ tối đa {wait_seconds} giây (hoặc đến khi có đơn mới) trước khi lặp lại...")
+				update_auto_mode_status(f"⏰ Chờ {wait_seconds}s hoặc đơn mới...")
 				
-				# Chờ với kiểm tra stop flag mỗi giây
-				for i in range(auto_mode_loop_interval):
-					if auto_mode_stop_flag:
+				# Chờ đến khi hết giờ, có NOTIFY đơn mới hoặc bị dừng (kiểm tra mỗi giây để cập nhật UI)
+				for i in range(wait_seconds):
+					if auto_mode_stop_flag or auto_mode_wake_event.wait(1):
 						break
-					time.sleep(1)
 					maybe_update_ui()
 				
 				if auto_mode_stop_flag:
 					break
-					
+				
+				notified = _take_notified_types()
 				logger.info("🔄 Bắt đầu chu kỳ auto mode tiếp theo...")
 			else:
 				break
@@ -633,6 +672,17 @@ def start_auto_mode():
 	auto_mode_enabled = True
 	auto_mode_stop_flag = False
 	auto_mode_loop_enabled = True  # Bật chế độ lặp tự động
+	_take_notified_types()
+	
+	# Đơn mới (NOTIFY từ DB) đánh thức worker ngay thay vì chờ hết chu kỳ
+	if ORDER_LISTENER_ENABLED:
+		try:
+			from app.utils.order_listener import get_order_listener
+			listener = get_order_listener()
+			listener.subscribe(on_new_orders)
+			listener.start()
+		except Exception as e:
+			logger.warning(f"⚠️ Không bật được order listener, chỉ lặp theo chu kỳ: {e}")
 	
 	# Khởi tạo thread cho auto mode
 	auto_mode_thread = threading.Thread(target=auto_cron_worker, daemon=True)
@@ -649,6 +699,13 @@ def stop_auto_mode():
 	auto_mode_stop_flag = True
 	auto_mode_enabled = False
 	auto_mode_loop_enabled = False  # Tắt chế độ lặp tự động
+	auto_mode_wake_event.set()  # Bỏ chờ chu kỳ để thread thoát ngay
+	if ORDER_LISTENER_ENABLED:
+		try:
+			from app.utils.order_listener import get_order_listener
+			get_order_listener().unsubscribe(on_new_orders)
+		except Exception:
+			pass
 	
 	logger.info("🛑 Đã dừng Auto Mode")
 	update_auto_mode_status("🛑 Đã dừng Auto Mode")
@@ -785,12 +842,8 @@ def main():
 		# Khởi tạo UI chính
 		initialize_main_ui()
 		
-		# Khởi tạo trình duyệt và đăng nhập tự động bằng tài khoản mặc định
+		# Khởi tạo trình duyệt; ensure_driver_and_login khôi phục phiên đã lưu hoặc tự điền form đăng nhập
 		ensure_driver_and_login()
-		try:
-			login_process()
-		except Exception:
-			pass
 			
 	except Exception as e:
 		logger.error(f"Lỗi khởi tạo: {e}")
@@ -1,86 +1,114 @@
-def navigate_to_ftth_page_and_select_radio():
-    """Đi tới trang FTTH và chọn radio 'Số thuê bao'"""
+"""Điều hướng tới trang của từng dịch vụ trên kpp.bankplus.vn"""
+
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from .utils import browser
+from .utils.waits import wait_ajax_idle, wait_page_ready
+
+logger = logging.getLogger(__name__)
+
+FTTH_URL = "https://kpp.bankplus.vn/pages/newInternetTelevisionViettel.jsf?serviceCode=000003&serviceType=INTERNET"
+EVN_URL = "https://kpp.bankplus.vn/pages/collectElectricBill.jsf?serviceCode=EVN"
+CHARGECARD_URL = "https://kpp.bankplus.vn/pages/chargecard.jsf"
+TV_INTERNET_URL = FTTH_URL
+
+
+def open_service_page(driver, url: str, ready_id: str, step: str, timeout: int = 10):
+    """Mở trang dịch vụ, chờ input chính xuất hiện và trang ổn định"""
+    driver.get(url)
+    WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.ID, ready_id)))
+    wait_page_ready(driver, step)
+
+
+def select_ftth_subscriber_radio(driver):
+    """Chọn radio 'Số thuê bao' (id payMoneyForm:console:3) trên trang FTTH"""
     try:
-        # Bỏ qua kiểm tra đăng nhập theo yêu cầu
-        target_url = "https://kpp.bankplus.vn/pages/newInternetTelevisionViettel.jsf?serviceCode=000003&serviceType=INTERNET"
-        driver.get(target_url)
-        # Chờ input mã thuê bao xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:contractCode")))
-        # Chọn radio Số thuê bao (id payMoneyForm:console:3)
+        radio_input = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "payMoneyForm:console:3")))
+        radio_box = radio_input.find_element(By.XPATH, "../../div[contains(@class,'ui-radiobutton-box')]")
+        radio_box.click()
+        wait_ajax_idle(driver, "ftth.navigate.radio")
+    except Exception:
+        # fallback click vào label
         try:
-            radio_input = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "payMoneyForm:console:3")))
-            radio_box = radio_input.find_element(By.XPATH, "../../div[contains(@class,'ui-radiobutton-box')]")
-            radio_box.click()
+            label = driver.find_element(By.XPATH, "//label[@for='payMoneyForm:console:3']")
+            label.click()
+            wait_ajax_idle(driver, "ftth.navigate.radio")
         except Exception:
-            # fallback click vào label
-            try:
-                label = driver.find_element(By.XPATH, "//label[@for='payMoneyForm:console:3']")
-                label.click()
-            except Exception:
-                pass
+            pass
+
+
+def navigate_to_ftth_page_and_select_radio(driver=None):
+    """Đi tới trang FTTH và chọn radio 'Số thuê bao'"""
+    driver = driver or browser.driver
+    try:
+        # Bỏ qua kiểm tra đăng nhập theo yêu cầu
+        open_service_page(driver, FTTH_URL, "payMoneyForm:contractCode", "ftth.navigate")
+        select_ftth_subscriber_radio(driver)
     except Exception as e:
         logger.warning(f"Không thể điều hướng FTTH hoặc chọn radio: {e}")
         raise  # Re-raise để caller biết có lỗi
 
-def navigate_to_evn_page():
+def navigate_to_evn_page(driver=None):
     """Điều hướng đến trang thanh toán điện EVN."""
+    driver = driver or browser.driver
     try:
-        
-        target_url = "https://kpp.bankplus.vn/pages/collectElectricBill.jsf?serviceCode=EVN"
-        driver.get(target_url)
-        # Chờ input mã thuê bao xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "collectElectricBillForm:j_idt29")))
-        time.sleep(2)
+        open_service_page(driver, EVN_URL, "collectElectricBillForm:j_idt29", "evn.navigate")
     except Exception as e:
         logger.warning(f"Không thể điều hướng EVN: {e}")
         raise
 
-def navigate_to_topup_multinetwork_page():
+def navigate_to_topup_multinetwork_page(driver=None):
     """Điều hướng đến trang nạp tiền đa mạng."""
+    driver = driver or browser.driver
     try:
-        
-        target_url = "https://kpp.bankplus.vn/pages/chargecard.jsf"
-        driver.get(target_url)
-        # Chờ input số điện thoại xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "indexForm:phoneNumberId")))
-        time.sleep(2)
+        open_service_page(driver, CHARGECARD_URL, "indexForm:phoneNumberId", "topup_multi.navigate")
     except Exception as e:
         logger.warning(f"Không thể điều hướng Topup đa mạng: {e}")
         raise
 
-def navigate_to_topup_viettel_page():
+def navigate_to_topup_viettel_page(driver=None):
     """Điều hướng đến trang nạp tiền Viettel."""
+    driver = driver or browser.driver
     try:
-        
-        target_url = "https://kpp.bankplus.vn/pages/chargecard.jsf"
-        driver.get(target_url)
-        # Chờ input số điện thoại xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:phoneNumber")))
-        time.sleep(2)
+        open_service_page(driver, CHARGECARD_URL, "payMoneyForm:phoneNumber", "topup_viettel.navigate")
     except Exception as e:
         logger.warning(f"Không thể điều hướng Topup Viettel: {e}")
         raise
 
-def navigate_to_tv_internet_page():
+def navigate_to_tv_internet_page(driver=None):
     """Điều hướng đến trang thanh toán TV-Internet."""
+    driver = driver or browser.driver
     try:
-        target_url = "https://kpp.bankplus.vn/pages/newInternetTelevisionViettel.jsf?serviceCode=000003&serviceType=INTERNET"
-        driver.get(target_url)
-        # Chờ input mã thuê bao xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:contractCode")))
-        time.sleep(2)
+        open_service_page(driver, TV_INTERNET_URL, "payMoneyForm:contractCode", "tv_internet.navigate")
     except Exception as e:
         logger.warning(f"Không thể điều hướng TV-Internet: {e}")
         raise
 
-def navigate_to_postpaid_lookup_page():
+def navigate_to_postpaid_lookup_page(driver=None):
     """Điều hướng đến trang tra cứu trả sau."""
+    driver = driver or browser.driver
     try:
-        target_url = "https://kpp.bankplus.vn/pages/chargecard.jsf"
-        driver.get(target_url)
-        # Chờ input mã thuê bao xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "indexForm:phoneNumberId")))
-        time.sleep(2)
+        open_service_page(driver, CHARGECARD_URL, "indexForm:phoneNumberId", "postpaid_lookup.navigate")
     except Exception as e:
         logger.warning(f"Không thể điều hướng Postpaid: {e}")
         raise
+
+
+__all__ = [
+    "FTTH_URL",
+    "EVN_URL",
+    "CHARGECARD_URL",
+    "TV_INTERNET_URL",
+    "open_service_page",
+    "select_ftth_subscriber_radio",
+    "navigate_to_ftth_page_and_select_radio",
+    "navigate_to_evn_page",
+    "navigate_to_topup_multinetwork_page",
+    "navigate_to_topup_viettel_page",
+    "navigate_to_tv_internet_page",
+    "navigate_to_postpaid_lookup_page",
+]
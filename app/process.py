@@ -1,811 +1,272 @@
+"""Xử lý hàng loạt mã cho 6 dịch vụ (không cần GUI): mỗi dịch vụ là 1 ServiceSpec chạy trên pipeline chung"""
+
+import logging
+from typing import List, Optional
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from .config import Config, AUTOMATION_MAX_RETRIES
+from .navigate import FTTH_URL, EVN_URL, CHARGECARD_URL, TV_INTERNET_URL, select_ftth_subscriber_radio
+from .services.result_parsers import (
+    RESULT_BLOCK_ID,
+    amount_from_groups,
+    details_from_pairs,
+    parse_result_html,
+    snapshot_result,
+)
+from .services.pipeline import (
+    CodeJob,
+    CodeRejected,
+    FieldSpec,
+    ParsedResult,
+    ServiceSpec,
+    run_service_pipeline,
+)
+
+logger = logging.getLogger(__name__)
+
+VALID_TOPUP_AMOUNTS = [10000, 20000, 30000, 50000, 100000, 200000, 300000, 500000]
+
+CONTRACT_CODE_FIELD = FieldSpec('code', [(By.ID, "payMoneyForm:contractCode")], "mã thuê bao")
+PHONE_FIELD = FieldSpec('code', [(By.ID, "payMoneyForm:phoneNumber")], "số điện thoại")
+BTN_CHECK = (By.ID, "payMoneyForm:btnPay0")
+BTN_CONTINUE = (By.ID, "payMoneyForm:btnContinue")
+
+
+def _parse_bill_amount(driver, job: CodeJob, details: bool = False) -> ParsedResult:
+    """Đọc số tiền từ khối kết quả payMoneyForm:j_idt41 (+ chi tiết thuê bao) bằng 1 lần execute_script"""
+    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, RESULT_BLOCK_ID)))
+    groups, pairs = snapshot_result(driver, RESULT_BLOCK_ID, labels=details)
+    _is_amount, amount, _pid = amount_from_groups(job.code, groups or [], False)
+    return ParsedResult(amount=amount, details=details_from_pairs(pairs) if details else None)
+
+
+def _parse_ftth(driver, job: CodeJob) -> ParsedResult:
+    """Số tiền + chi tiết thuê bao FTTH"""
+    return _parse_bill_amount(driver, job, details=True)
+
+
+def _parse_bill_amount_html(html: str, job: CodeJob, details: bool = False) -> ParsedResult:
+    """Như _parse_bill_amount nhưng đọc từ HTML của partial-response (lookup qua HTTP)"""
+    groups, pairs = parse_result_html(html, RESULT_BLOCK_ID, labels=details)
+    if groups is None:
+        # Không có khối kết quả => không chắc server đã xử lý, để Selenium làm lại
+        raise ValueError(f"Partial-response không có {RESULT_BLOCK_ID}")
+    _is_amount, amount, _pid = amount_from_groups(job.code, groups, False)
+    return ParsedResult(amount=amount, details=details_from_pairs(pairs) if details else None)
+
+
+def _parse_ftth_html(html: str, job: CodeJob) -> ParsedResult:
+    return _parse_bill_amount_html(html, job, details=True)
+
+
+def _parse_no_result(driver, job: CodeJob) -> ParsedResult:
+    """Topup Viettel không có khối kết quả: qua được modal là thành công"""
+    return ParsedResult()
+
+
+# ----------------------------------------------------------------------
+# Topup đa mạng: "sđt|số tiền" = nạp trả trước, "sđt" = gạch nợ trả sau
+# ----------------------------------------------------------------------
+
+def _prepare_multinetwork(raw: str) -> CodeJob:
+    raw = (raw or "").strip()
+    if '|' not in raw:
+        return CodeJob(raw=raw, code=raw, values={'code': raw, 'pin': Config.DEFAULT_PIN}, kind="Gạch nợ trả sau")
+
+    parts = raw.split('|')
+    if len(parts) != 2:
+        raise CodeRejected(f"Sai định dạng: {raw} (cần: sđt|số tiền)")
+    phone_number = parts[0].strip()
+    amount_str = parts[1].strip()
+    try:
+        amount = int(amount_str)
+    except ValueError:
+        raise CodeRejected(f"Số tiền không hợp lệ: {amount_str}")
+    if amount not in VALID_TOPUP_AMOUNTS:
+        raise CodeRejected(f"Số tiền {amount} không hợp lệ (chỉ cho phép: {VALID_TOPUP_AMOUNTS})")
+    return CodeJob(
+        raw=raw,
+        code=phone_number,
+        values={'code': phone_number, 'amount': amount, 'pin': Config.DEFAULT_PIN},
+        amount=amount,
+        kind="Nạp trả trước",
+    )
+
+
+def _parse_multinetwork(driver, job: CodeJob) -> ParsedResult:
+    try:
+        result_element = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".result-info, .payment-result, .success-message, [class*='result'], [class*='success']"))
+        )
+        return ParsedResult(text=result_element.text.strip())
+    except Exception as result_error:
+        logger.warning(f"⚠️ Không thể lấy thông tin kết quả: {result_error}")
+        return ParsedResult()
+
+
+def _multinetwork_success(parsed: ParsedResult) -> bool:
+    # Không đọc được khối kết quả nhưng cũng không có thông báo lỗi => coi là thành công
+    if parsed.text is None:
+        return True
+    text = parsed.text.lower()
+    return "thành công" in text or "success" in text
+
+
+def _multinetwork_notes(job: CodeJob, parsed: ParsedResult, status: str) -> str:
+    notes = f"Multi-network: {job.kind} - {job.raw}"
+    if job.amount:
+        notes += f" | Số tiền: {job.amount:,}đ"
+    if parsed.text:
+        notes += f" | Kết quả: {parsed.text}"
+    return notes
+
+
+def _multinetwork_failure_notes(job: CodeJob, error: str) -> str:
+    return f"Multi-network: {job.kind} - {job.raw} | Lỗi: {error}"
+
+
+# ----------------------------------------------------------------------
+# Khai báo dịch vụ
+# ----------------------------------------------------------------------
+
+FTTH_SPEC = ServiceSpec(
+    key="ftth",
+    label="FTTH",
+    url=FTTH_URL,
+    ready_id="payMoneyForm:contractCode",
+    after_navigate=select_ftth_subscriber_radio,
+    fields=[CONTRACT_CODE_FIELD],
+    submit=BTN_CHECK,
+    parse=_parse_ftth,
+    http_parse=_parse_ftth_html,
+    http_check_ids=["payMoneyForm:console:3"],
+    notes=lambda job, parsed, status: "FTTH lookup ok",
+    max_retries=AUTOMATION_MAX_RETRIES,
+)
+
+EVN_SPEC = ServiceSpec(
+    key="evn",
+    label="EVN",
+    url=EVN_URL,
+    ready_id="collectElectricBillForm:j_idt29",
+    fields=[FieldSpec('code', [(By.ID, "collectElectricBillForm:j_idt29")], "mã hóa đơn")],
+    submit=(By.ID, "collectElectricBillForm:j_idt31"),
+    parse=_parse_bill_amount,
+    notes=lambda job, parsed, status: "EVN payment ok",
+    # Gạch nợ thật: lần thử sau có thể trả tiền lần 2 => giữ đúng AUTOMATION_MAX_RETRIES như vòng lặp cũ
+    max_retries=AUTOMATION_MAX_RETRIES,
+)
+
+TOPUP_MULTI_SPEC = ServiceSpec(
+    key="topup_multi",
+    label="Topup đa mạng",
+    url=CHARGECARD_URL,
+    ready_id="indexForm:phoneNumberId",
+    prepare=_prepare_multinetwork,
+    fields=[
+        PHONE_FIELD,
+        FieldSpec('amount', [
+            (By.ID, "payMoneyForm:amount"),
+            (By.CSS_SELECTOR, "input[type='number'], input[name*='amount'], .amount-input"),
+        ], "số tiền"),
+        FieldSpec('pin', [
+            (By.ID, "payMoneyForm:pin"),
+            (By.CSS_SELECTOR, "input[type='password'], input[name*='pin'], .pin-input, input[placeholder*='PIN'], input[placeholder*='pin']"),
+        ], "PIN", optional=True),
+    ],
+    submit=BTN_CONTINUE,
+    check_error_alert=True,
+    parse=_parse_multinetwork,
+    success_rule=_multinetwork_success,
+    notes=_multinetwork_notes,
+    failure_notes=_multinetwork_failure_notes,
+)
+
+TOPUP_VIETTEL_SPEC = ServiceSpec(
+    key="topup_viettel",
+    label="Topup Viettel",
+    url=CHARGECARD_URL,
+    ready_id="payMoneyForm:phoneNumber",
+    fields=[PHONE_FIELD],
+    submit=BTN_CONTINUE,
+    parse=_parse_no_result,
+    notes=lambda job, parsed, status: "Topup Viettel ok",
+)
+
+TV_INTERNET_SPEC = ServiceSpec(
+    key="tv_internet",
+    label="TV-Internet",
+    url=TV_INTERNET_URL,
+    ready_id="payMoneyForm:contractCode",
+    fields=[CONTRACT_CODE_FIELD],
+    submit=BTN_CHECK,
+    parse=_parse_bill_amount,
+    notes=lambda job, parsed, status: "TV-Internet payment ok",
+)
+
+POSTPAID_LOOKUP_SPEC = ServiceSpec(
+    key="postpaid_lookup",
+    label="Postpaid",
+    url=CHARGECARD_URL,
+    ready_id="indexForm:phoneNumberId",
+    fields=[CONTRACT_CODE_FIELD],
+    submit=BTN_CHECK,
+    parse=_parse_bill_amount,
+    http_parse=_parse_bill_amount_html,
+    notes=lambda job, parsed, status: "Postpaid lookup ok",
+)
+
+# Theo service_type trong DB (enum service_type ở shared/schema.ts)
+SERVICE_SPECS = {
+    'tra_cuu_ftth': FTTH_SPEC,
+    'gach_dien_evn': EVN_SPEC,
+    'nap_tien_da_mang': TOPUP_MULTI_SPEC,
+    'nap_tien_viettel': TOPUP_VIETTEL_SPEC,
+    'thanh_toan_tv_internet': TV_INTERNET_SPEC,
+    'tra_cuu_no_tra_sau': POSTPAID_LOOKUP_SPEC,
+}
+
+
 def process_lookup_ftth_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý tra cứu FTTH không cần GUI, điều khiển selenium trực tiếp."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý FTTH cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    
-    print("   ✅ Bắt đầu xử lý (bỏ qua đăng nhập)")
-    
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang FTTH...")
-            navigate_to_ftth_page_and_select_radio()
-            print("   ✅ Đã điều hướng thành công đến trang FTTH")
-            
-            # Hiển thị tiến trình cho từng order nếu có
-            if order_id:
-                print("   📋 Danh sách mã sẽ xử lý:")
-                for idx, cb in enumerate(codes, 1):
-                    print(f"      {idx}. {cb}")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                success = False
-                for attempt in range(AUTOMATION_MAX_RETRIES):  # Retry tối đa cấu hình
-                    try:
-                        cbil = (cbil or "").strip()
-                        if not cbil:
-                            print(f"   ⚠️  Mã rỗng, bỏ qua")
-                            break
-                        
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/{AUTOMATION_MAX_RETRIES} cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_ftth_page_and_select_radio()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền mã thuê bao: {cbil}")
-                        customer = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:contractCode")))
-                        customer.clear()
-                        customer.send_keys(cbil)
-                        
-                        print(f"   🔍 Nhấn nút KIỂM TRA...")
-                        payment_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:btnPay0")))
-                        payment_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        print(f"   📊 Lấy thông tin kết quả...")
-                        element41 = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:j_idt41")))
-                        _is_amount, amount, _pid = amount_by_cbil(cbil, element41, False)
-                        details = extract_ftth_details_from_page()
-                        
-                        print(f"   ✅ Xử lý thành công: Amount = {amount}")
-                        if details:
-                            print(f"   📋 Chi tiết FTTH:")
-                            for key, value in details.items():
-                                print(f"      • {key}: {value}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": amount, "status": "success"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            db_success = update_database_immediately(order_id, cbil, "success", amount, "FTTH lookup ok", details)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {cbil}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < (AUTOMATION_MAX_RETRIES - 1):  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"FTTH code {cbil} thất bại sau {AUTOMATION_MAX_RETRIES} lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                db_success = update_database_immediately(order_id, cbil, "failed", None, str(e), None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {cbil}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý FTTH:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            logger.info(f"FTTH processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_lookup_ftth_codes error: {e}")
+    return run_service_pipeline(FTTH_SPEC, codes, order_id)
 
 def process_evn_payment_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý thanh toán điện EVN không cần GUI, điều khiển selenium trực tiếp."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý EVN cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang EVN...")
-            navigate_to_evn_page()
-            print("   ✅ Đã điều hướng thành công đến trang EVN")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                success = False
-                for attempt in range(AUTOMATION_MAX_RETRIES):  # Retry tối đa theo cấu hình
-                    try:
-                        cbil = (cbil or "").strip()
-                        if not cbil:
-                            print(f"   ⚠️  Mã rỗng, bỏ qua")
-                            break
-                        
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/3 cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_evn_page()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền mã hóa đơn: {cbil}")
-                        customer = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "collectElectricBillForm:j_idt29")))
-                        customer.clear()
-                        customer.send_keys(cbil)
-                        
-                        print(f"   🔍 Nhấn nút KIỂM TRA...")
-                        payment_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "collectElectricBillForm:j_idt31")))
-                        payment_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        print(f"   📊 Lấy thông tin kết quả...")
-                        element41 = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:j_idt41")))
-                        _is_amount, amount, _pid = amount_by_cbil(cbil, element41, False)
-                        
-                        print(f"   ✅ Xử lý thành công: Amount = {amount}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": amount, "status": "success"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            db_success = update_database_immediately(order_id, cbil, "success", amount, "EVN payment ok", None)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {cbil}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < 2:  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"EVN code {cbil} thất bại sau 3 lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                db_success = update_database_immediately(order_id, cbil, "failed", None, str(e), None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {cbil}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý EVN:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            logger.info(f"EVN processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_evn_payment_codes error: {e}")
+    return run_service_pipeline(EVN_SPEC, codes, order_id)
 
 def process_topup_multinetwork_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý nạp tiền đa mạng - hỗ trợ cả nạp trả trước và gạch nợ trả sau."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý Topup đa mạng cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang Topup đa mạng...")
-            navigate_to_topup_multinetwork_page()
-            print("   ✅ Đã điều hướng thành công đến trang Topup đa mạng")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                
-                # Hiển thị tiến trình tương tự FTTH
-                print(f"   🔄 Đang xử lý {cbil} | Order ID: {order_id or 'Không có'}")
-                print(f"   📍 Loại dịch vụ: {'Nạp trả trước' if '|' in cbil else 'Gạch nợ trả sau'}")
-                
-                # Phân tích dữ liệu để xác định loại dịch vụ
-                is_prepaid = '|' in cbil  # Nạp trả trước: có dấu | (sđt|số tiền)
-                if is_prepaid:
-                    # Nạp trả trước: sđt|số tiền
-                    parts = cbil.split('|')
-                    if len(parts) != 2:
-                        print(f"   ❌ Sai định dạng: {cbil} (cần: sđt|số tiền)")
-                        results.append({"code": cbil, "amount": None, "status": "failed", "message": "Sai định dạng"})
-                        continue
-                    
-                    phone_number = parts[0].strip()
-                    amount_str = parts[1].strip()
-                    try:
-                        amount = int(amount_str)
-                        valid_amounts = [10000, 20000, 30000, 50000, 100000, 200000, 300000, 500000]
-                        if amount not in valid_amounts:
-                            print(f"   ❌ Số tiền không hợp lệ: {amount} (chỉ cho phép: {valid_amounts})")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": f"Số tiền {amount} không hợp lệ"})
-                            continue
-                    except ValueError:
-                        print(f"   ❌ Số tiền không hợp lệ: {amount_str}")
-                        results.append({"code": cbil, "amount": None, "status": "failed", "message": "Số tiền không hợp lệ"})
-                        continue
-                    
-                    print(f"   🎯 Nạp trả trước: {phone_number} | Số tiền: {amount:,}đ")
-                    process_code = phone_number
-                else:
-                    # Gạch nợ trả sau: chỉ số điện thoại
-                    phone_number = cbil.strip()
-                    print(f"   🎯 Gạch nợ trả sau: {phone_number}")
-                    process_code = phone_number
-                
-                success = False
-                for attempt in range(3):  # Retry tối đa 3 lần
-                    try:
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/3 cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_topup_multinetwork_page()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền số điện thoại: {process_code}")
-                        print(f"   🔄 Tiến trình: {cbil} - Bước 1/4: Điền số điện thoại")
-                        phone_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:phoneNumber")))
-                        phone_input.clear()
-                        phone_input.send_keys(process_code)
-                        
-                        # Nếu là nạp trả trước, nhập số tiền
-                        if is_prepaid:  # Nạp trả trước
-                            print(f"   🔄 Tiến trình: {cbil} - Bước 2/4: Điền số tiền")
-                            try:
-                                print(f"   💰 Điền số tiền: {amount:,}đ")
-                                amount_input = WebDriverWait(driver, 10).until(
-                                    EC.presence_of_element_located((By.ID, "payMoneyForm:amount"))
-                                )
-                                amount_input.clear()
-                                amount_input.send_keys(str(amount))
-                                time.sleep(1)
-                            except:
-                                # Nếu không tìm thấy input số tiền, thử tìm element khác
-                                amount_input = WebDriverWait(driver, 10).until(
-                                    EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='number'], input[name*='amount'], .amount-input"))
-                                )
-                                amount_input.clear()
-                                amount_input.send_keys(str(amount))
-                                time.sleep(1)
-                        
-                        # Tự động điền mã PIN từ config
-                        print(f"   🔄 Tiến trình: {cbil} - Bước 3/4: Điền mã PIN")
-                        try:
-                            print(f"   🔐 Điền mã PIN: {Config.DEFAULT_PIN}")
-                            pin_input = WebDriverWait(driver, 10).until(
-                                EC.presence_of_element_located((By.ID, "payMoneyForm:pin"))
-                            )
-                            pin_input.clear()
-                            pin_input.send_keys(Config.DEFAULT_PIN)
-                            time.sleep(1)
-                        except:
-                            # Nếu không tìm thấy input PIN theo ID, thử tìm element khác
-                            try:
-                                pin_input = WebDriverWait(driver, 10).until(
-                                    EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='password'], input[name*='pin'], .pin-input, input[placeholder*='PIN'], input[placeholder*='pin']"))
-                                )
-                                pin_input.clear()
-                                pin_input.send_keys(Config.DEFAULT_PIN)
-                                time.sleep(1)
-                                print(f"   🔐 Điền mã PIN thành công (fallback): {Config.DEFAULT_PIN}")
-                            except Exception as pin_error:
-                                print(f"   ⚠️ Không thể tìm thấy input PIN: {pin_error}")
-                        
-                        print(f"   🔄 Tiến trình: {cbil} - Bước 4/4: Xử lý giao dịch")
-                        print(f"   🔍 Nhấn nút TIẾP TỤC...")
-                        continue_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "payMoneyForm:btnContinue")))
-                        continue_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        # Kiểm tra thông báo lỗi
-                        error_text = get_error_alert_text()
-                        if error_text:
-                            print(f"   ❌ Có thông báo lỗi: {error_text}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": error_text})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                # Lưu thông tin loại dịch vụ vào notes
-                                if is_prepaid:
-                                    notes = f"Multi-network: Nạp trả trước - {cbil} | Lỗi: {error_text}"
-                                else:
-                                    notes = f"Multi-network: Gạch nợ trả sau - {cbil} | Lỗi: {error_text}"
-                                
-                                db_success = update_database_immediately(order_id, process_code, "failed", None, notes, None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {process_code}")
-                            break
-                        
-                        # Lấy thông tin kết quả từ trang
-                        print(f"   📊 Lấy thông tin kết quả...")
-                        try:
-                            # Tìm element chứa thông tin kết quả
-                            result_element = WebDriverWait(driver, 10).until(
-                                EC.presence_of_element_located((By.CSS_SELECTOR, ".result-info, .payment-result, .success-message, [class*='result'], [class*='success']"))
-                            )
-                            result_text = result_element.text.strip()
-                            print(f"   📋 Kết quả: {result_text}")
-                            
-                            # Phân tích kết quả để tạo notes chi tiết
-                            if "thành công" in result_text.lower() or "success" in result_text.lower():
-                                result_status = "success"
-                                if is_prepaid:
-                                    notes = f"Multi-network: Nạp trả trước - {cbil} | Số tiền: {amount:,}đ | Kết quả: {result_text}"
-                                else:
-                                    notes = f"Multi-network: Gạch nợ trả sau - {cbil} | Kết quả: {result_text}"
-                            else:
-                                result_status = "failed"
-                                if is_prepaid:
-                                    notes = f"Multi-network: Nạp trả trước - {cbil} | Số tiền: {amount:,}đ | Kết quả: {result_text}"
-                                else:
-                                    notes = f"Multi-network: Gạch nợ trả sau - {cbil} | Kết quả: {result_text}"
-                                
-                        except Exception as result_error:
-                            print(f"   ⚠️ Không thể lấy thông tin kết quả: {result_error}")
-                            result_status = "success"
-                            if is_prepaid:
-                                notes = f"Multi-network: Nạp trả trước - {cbil} | Số tiền: {amount:,}đ"
-                            else:
-                                notes = f"Multi-network: Gạch nợ trả sau - {cbil}"
-                        
-                        print(f"   ✅ Xử lý thành công cho {'nạp trả trước' if is_prepaid else 'gạch nợ trả sau'} {process_code}")
-                        
-                        # Hiển thị kết quả chi tiết tương tự FTTH
-                        if 'result_text' in locals():
-                            print(f"   📋 Kết quả chi tiết:")
-                            print(f"      • Mã: {cbil}")
-                            print(f"      • Loại dịch vụ: {'Nạp trả trước' if is_prepaid else 'Gạch nợ trả sau'}")
-                            if is_prepaid:
-                                print(f"      • Số tiền: {amount:,}đ")
-                            print(f"      • Kết quả: {result_text}")
-                            print(f"      • Trạng thái: {result_status}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": amount if is_prepaid else None, "status": result_status, "message": result_text if 'result_text' in locals() else "Thành công"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            amount_for_db = amount if is_prepaid else None
-                            db_success = update_database_immediately(order_id, process_code, result_status, amount_for_db, notes, None)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {process_code}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {process_code}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < 2:  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"Topup đa mạng code {cbil} thất bại sau 3 lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                # Lưu thông tin loại dịch vụ vào notes
-                                if is_prepaid:
-                                    notes = f"Multi-network: Nạp trả trước - {cbil} | Lỗi: {str(e)}"
-                                else:
-                                    notes = f"Multi-network: Gạch nợ trả sau - {cbil} | Lỗi: {str(e)}"
-                                
-                                db_success = update_database_immediately(order_id, process_code, "failed", None, notes, None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {process_code}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {process_code}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý Topup đa mạng:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            # Hiển thị chi tiết từng mã tương tự FTTH
-            print(f"\n📋 [CHI TIẾT] Kết quả xử lý từng mã:")
-            for result in results:
-                status_icon = "✅" if result['status'] == 'success' else "❌"
-                amount_info = f" | Số tiền: {result['amount']:,}đ" if result.get('amount') else ""
-                message_info = f" | {result.get('message', '')}" if result.get('message') else ""
-                print(f"   {status_icon} {result['code']}{amount_info}{message_info}")
-            
-            logger.info(f"Topup multinetwork processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_topup_multinetwork_codes error: {e}")
+    return run_service_pipeline(TOPUP_MULTI_SPEC, codes, order_id)
 
 def process_topup_viettel_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý nạp tiền Viettel không cần GUI, điều khiển selenium trực tiếp."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý Topup Viettel cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang Topup Viettel...")
-            navigate_to_topup_viettel_page()
-            print("   ✅ Đã điều hướng thành công đến trang Topup Viettel")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                success = False
-                for attempt in range(3):  # Retry tối đa 3 lần
-                    try:
-                        cbil = (cbil or "").strip()
-                        if not cbil:
-                            print(f"   ⚠️  Mã rỗng, bỏ qua")
-                            break
-                        
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/3 cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_topup_viettel_page()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền số điện thoại: {cbil}")
-                        phone_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:phoneNumber")))
-                        phone_input.clear()
-                        phone_input.send_keys(cbil)
-                        
-                        print(f"   🔍 Nhấn nút TIẾP TỤC...")
-                        continue_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "payMoneyForm:btnContinue")))
-                        continue_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        print(f"   ✅ Xử lý thành công cho số điện thoại {cbil}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": None, "status": "success"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            db_success = update_database_immediately(order_id, cbil, "success", None, "Topup Viettel ok", None)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {cbil}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < 2:  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"Topup Viettel code {cbil} thất bại sau 3 lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                db_success = update_database_immediately(order_id, cbil, "failed", None, str(e), None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {cbil}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý Topup Viettel:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            logger.info(f"Topup Viettel processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_topup_viettel_codes error: {e}")
+    return run_service_pipeline(TOPUP_VIETTEL_SPEC, codes, order_id)
 
 def process_tv_internet_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý thanh toán TV-Internet không cần GUI, điều khiển selenium trực tiếp."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý TV-Internet cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang TV-Internet...")
-            navigate_to_tv_internet_page()
-            print("   ✅ Đã điều hướng thành công đến trang TV-Internet")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                success = False
-                for attempt in range(3):  # Retry tối đa 3 lần
-                    try:
-                        cbil = (cbil or "").strip()
-                        if not cbil:
-                            print(f"   ⚠️  Mã rỗng, bỏ qua")
-                            break
-                        
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/3 cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_tv_internet_page()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền mã thuê bao: {cbil}")
-                        customer = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:contractCode")))
-                        customer.clear()
-                        customer.send_keys(cbil)
-                        
-                        print(f"   🔍 Nhấn nút KIỂM TRA...")
-                        payment_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:btnPay0")))
-                        payment_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        print(f"   📊 Lấy thông tin kết quả...")
-                        element41 = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:j_idt41")))
-                        _is_amount, amount, _pid = amount_by_cbil(cbil, element41, False)
-                        
-                        print(f"   ✅ Xử lý thành công: Amount = {amount}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": amount, "status": "success"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            db_success = update_database_immediately(order_id, cbil, "success", amount, "TV-Internet payment ok", None)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {cbil}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < 2:  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"TV-Internet code {cbil} thất bại sau 3 lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                db_success = update_database_immediately(order_id, cbil, "failed", None, str(e), None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {cbil}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý TV-Internet:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            logger.info(f"TV-Internet processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_tv_internet_codes error: {e}")
+    return run_service_pipeline(TV_INTERNET_SPEC, codes, order_id)
 
 def process_postpaid_lookup_codes(codes: List[str], order_id: Optional[str] = None):
     """Xử lý tra cứu trả sau không cần GUI, điều khiển selenium trực tiếp."""
-    print(f"🚀 [AUTOMATION] Bắt đầu xử lý Postpaid cho {len(codes)} mã")
-    print(f"   📋 Order ID: {order_id or 'Không có'}")
-    
-    if not ensure_driver_and_login():
-        print("   ❌ Không thể khởi tạo driver hoặc đăng nhập")
-        logger.error("Không thể khởi tạo driver hoặc đăng nhập")
-        return
-    
-    try:
-        with automation_lock:
-            print("   🔒 Đã khóa automation, điều hướng đến trang Postpaid...")
-            navigate_to_postpaid_lookup_page()
-            print("   ✅ Đã điều hướng thành công đến trang Postpaid")
-            
-            results = []
-            for idx, cbil in enumerate(codes, 1):
-                print(f"\n📱 [MÃ {idx}/{len(codes)}] Xử lý mã: {cbil}")
-                success = False
-                for attempt in range(3):  # Retry tối đa 3 lần
-                    try:
-                        cbil = (cbil or "").strip()
-                        if not cbil:
-                            print(f"   ⚠️  Mã rỗng, bỏ qua")
-                            break
-                        
-                        if attempt > 0:
-                            print(f"   🔄 Retry lần {attempt + 1}/3 cho mã {cbil}")
-                            logger.info(f"Retry lần {attempt + 1} cho mã {cbil}")
-                            driver.refresh()
-                            time.sleep(2)
-                            navigate_to_postpaid_lookup_page()
-                        else:
-                            print(f"   🎯 Lần thử đầu tiên cho mã {cbil}")
-                        
-                        root.update() if 'root' in globals() else None
-                        time.sleep(0.5)
-                        
-                        print(f"   📝 Điền mã thuê bao: {cbil}")
-                        customer = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:contractCode")))
-                        customer.clear()
-                        customer.send_keys(cbil)
-                        
-                        print(f"   🔍 Nhấn nút KIỂM TRA...")
-                        payment_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:btnPay0")))
-                        payment_button.click()
-                        time.sleep(1)
-                        
-                        print(f"   ⏳ Chờ modal loading...")
-                        WebDriverWait(driver, 16).until(EC.invisibility_of_element_located((By.ID, "payMoneyForm:j_idt6_modal")))
-                        
-                        print(f"   📊 Lấy thông tin kết quả...")
-                        element41 = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "payMoneyForm:j_idt41")))
-                        _is_amount, amount, _pid = amount_by_cbil(cbil, element41, False)
-                        
-                        print(f"   ✅ Xử lý thành công: Amount = {amount}")
-                        
-                        # Thành công, thoát khỏi retry loop
-                        success = True
-                        results.append({"code": cbil, "amount": amount, "status": "success"})
-                        
-                        # Update database ngay lập tức cho từng đơn xử lý xong
-                        if order_id:
-                            print(f"   💾 Bắt đầu update database...")
-                            db_success = update_database_immediately(order_id, cbil, "success", amount, "Postpaid lookup ok", None)
-                            if not db_success:
-                                logger.warning(f"Database update thất bại cho {cbil}")
-                        else:
-                            print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                        
-                        print(f"   🎉 Hoàn thành xử lý mã {cbil}")
-                        break
-                        
-                    except Exception as e:
-                        print(f"   ❌ Lần thử {attempt + 1} thất bại: {e}")
-                        logger.warning(f"Lần thử {attempt + 1} thất bại cho {cbil}: {e}")
-                        if attempt < 2:  # Còn cơ hội retry
-                            print(f"   ⏳ Chờ 1s trước khi retry...")
-                            time.sleep(1)  # Delay thông minh
-                            continue
-                        else:  # Hết retry
-                            print(f"   💥 Hết retry, mã {cbil} thất bại hoàn toàn")
-                            logger.error(f"Postpaid code {cbil} thất bại sau 3 lần thử: {e}")
-                            results.append({"code": cbil, "amount": None, "status": "failed", "message": str(e)})
-                            
-                            # Update database cho trường hợp thất bại
-                            if order_id:
-                                print(f"   💾 Update database cho trường hợp thất bại...")
-                                db_success = update_database_immediately(order_id, cbil, "failed", None, str(e), None)
-                                if not db_success:
-                                    logger.warning(f"Database update thất bại cho {cbil}")
-                            else:
-                                print(f"⚠️  [WARNING] Không có order_id, bỏ qua database update cho {cbil}")
-                
-                if not success:
-                    print(f"   💥 Mã {cbil} không thể xử lý sau 3 lần thử")
-                    logger.error(f"Mã {cbil} không thể xử lý sau 3 lần thử")
-            
-            print(f"\n📊 [KẾT QUẢ] Tổng kết xử lý Postpaid:")
-            print(f"   ✅ Thành công: {len([r for r in results if r['status'] == 'success'])} mã")
-            print(f"   ❌ Thất bại: {len([r for r in results if r['status'] == 'failed'])} mã")
-            print(f"   📋 Tổng cộng: {len(results)} mã")
-            
-            logger.info(f"Postpaid processed: {len(results)} items")
-    except Exception as e:
-        print(f"   💥 Lỗi tổng thể: {e}")
-        logger.error(f"process_postpaid_lookup_codes error: {e}")
+    return run_service_pipeline(POSTPAID_LOOKUP_SPEC, codes, order_id)
+
+
+__all__ = [
+    "FTTH_SPEC",
+    "EVN_SPEC",
+    "TOPUP_MULTI_SPEC",
+    "TOPUP_VIETTEL_SPEC",
+    "TV_INTERNET_SPEC",
+    "POSTPAID_LOOKUP_SPEC",
+    "SERVICE_SPECS",
+    "process_lookup_ftth_codes",
+    "process_evn_payment_codes",
+    "process_topup_multinetwork_codes",
+    "process_topup_viettel_codes",
+    "process_tv_internet_codes",
+    "process_postpaid_lookup_codes",
+]
@@ -7,6 +7,10 @@ __all__ = [
 	"topup_viettel",
 	"tv_internet",
 	"postpaid",
+	"pipeline",
+	"result_parsers",
+	"service_api",
+	"sharded_executor",
 ]
 
 
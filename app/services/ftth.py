@@ -1,9 +1,7 @@
 import logging
-import re
 import time
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any
 
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -29,6 +27,12 @@ from ..utils.ui_helpers import (
 	get_root,
 )
 from ..utils.excel_export import export_excel
+from .result_parsers import (
+	amount_by_cbil,
+	amount_by_cbil_html,
+	extract_ftth_details_from_html,
+	extract_ftth_details_from_driver,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -47,34 +51,6 @@ def get_driver():
 		from ..utils.browser import driver
 		return driver
 
-def amount_by_cbil(cbil: str, element, lookup: bool = False) -> Tuple[bool, Any, Optional[str]]:
-	try:
-		amount = "Không tìm thấy mã thuê bao"
-		payment_id = None
-		html_content = element.get_attribute('outerHTML')
-		soup = BeautifulSoup(html_content, 'html.parser')
-		pay_content_groups = soup.find_all("div", class_="row pay-content mb-3")
-		for group in pay_content_groups:
-			p_tags = group.find_all("p")
-			is_found = any(cbil in p_tag.text for p_tag in p_tags)
-			if lookup and is_found:
-				button_tag = group.find("button", {"id": re.compile(r'payMoneyForm:btnView\d*')})
-				if button_tag:
-					payment_id = button_tag['id']
-			if is_found:
-				for p_tag in p_tags:
-					if "VND" in p_tag.text:
-						str_price = p_tag.text.split("VND")[0].strip()
-						amount = int(str_price.replace(",", ""))
-						if amount >= 5000:
-							return True, amount, payment_id
-						else:
-							return False, amount, payment_id
-		return False, amount, payment_id
-	except Exception as e:
-		logger.error(f"Lỗi lấy số tiền: {e}")
-		return False, "Lỗi thanh toán", None
-
 def navigate_to_ftth_page_and_select_radio():
 	try:
 		# FIXED: Get driver instance properly
@@ -103,50 +79,16 @@ def navigate_to_ftth_page_and_select_radio():
 		raise
 
 
-def extract_ftth_details_from_page() -> Dict[str, Any]:
+def extract_ftth_details_from_page(drv=None) -> Dict[str, Any]:
 	details: Dict[str, Any] = {}
 	try:
 		# FIXED: Get driver instance properly
-		driver = get_driver()
+		driver = drv or get_driver()
 		if driver is None:
 			logger.error("Driver is None in extract_ftth_details_from_page")
 			return details
 			
-		html_content = driver.page_source
-		soup = BeautifulSoup(html_content, 'html.parser')
-		label_to_key = {
-			'Mã hợp đồng:': 'contract_code',
-			'Chủ hợp đồng:': 'contract_owner',
-			'Số thuê bao đại diện:': 'representative_subscriber',
-			'Dịch vụ:': 'service',
-			'Số điện thoại liên hệ:': 'contact_phone',
-			'Nợ cước:': 'debt_amount',
-		}
-		for row in soup.find_all('div', class_='row'):
-			cols = row.find_all('div', class_='col-6')
-			if len(cols) != 2:
-				continue
-			label_tag = cols[0].find('label')
-			value_p = cols[1].find('p')
-			if not label_tag or not value_p:
-				continue
-			label_text = label_tag.get_text(strip=True)
-			value_text = value_p.get_text(strip=True)
-			key = label_to_key.get(label_text)
-			if not key:
-				continue
-			if key == 'debt_amount':
-				try:
-					import re as _re
-					num_str = _re.findall(r"[\d\.,]+", value_text)
-					if num_str:
-						details[key] = int(num_str[0].replace('.', '').replace(',', ''))
-					else:
-						details[key] = None
-				except Exception:
-					details[key] = None
-			else:
-				details[key] = value_text
+		return extract_ftth_details_from_driver(driver)
 	except Exception as e:
 		logger.warning(f"Lỗi trích chi tiết FTTH: {e}")
 	return details
@@ -217,7 +159,7 @@ def lookup_ftth(tkinp_ctm, tkinp_ctmed, tkinp_order: Optional[ttk.Entry] = None)
                 order_id_val = None
 
             try:
-                print(f"   🔧 Đang xử lý {cbil} | Order ID: {order_id_val or 'Không có'}")
+                logger.debug("[FTTH] 🔧 Đang xử lý %s | Order ID: %s", cbil, order_id_val or 'Không có')
                 navigate_to_ftth_page_and_select_radio()
                 time.sleep(3)
                 update_database_immediately(order_id_val, cbil, "processing", None, f"Đang xử lý {cbil}", None)
@@ -238,7 +180,7 @@ def lookup_ftth(tkinp_ctm, tkinp_ctmed, tkinp_order: Optional[ttk.Entry] = None)
                 # Chờ alert xuất hiện
                 error_text = get_error_alert_text()
                 if error_text:
-                    print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                    logger.warning("[FTTH] ❌ Thanh toán thất bại (alert): %s", error_text)
                     note_text = f"TV-Internet payment failed - {cbil} | {error_text}"
                     data_rows.append([cbil, 0, note_text])
                     insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi: {error_text}")
@@ -317,6 +259,8 @@ __all__ = [
 	"lookup_ftth",
 	"navigate_to_ftth_page_and_select_radio",
 	"extract_ftth_details_from_page",
+	"extract_ftth_details_from_html",
 	"amount_by_cbil",
+	"amount_by_cbil_html",
 	"form_lookup_ftth",
 ]
\ No newline at end of file
@@ -0,0 +1,452 @@
+"""Engine chạy chung cho các dịch vụ Selenium: mỗi dịch vụ chỉ khai báo ServiceSpec (URL, input, nút, parser, rule)"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from ..config import PIPELINE_CONCURRENCY, LOOKUP_HTTP_ENABLED, LOOKUP_HTTP_CONCURRENCY, RESULT_EXPORT_FORMAT
+from ..navigate import open_service_page
+from ..utils.browser import get_error_alert_text
+from ..utils.browser_pool import get_browser_pool, BrowserPoolError
+from ..utils.jsf_client import JsfClient, JsfLookupError
+from ..utils.page_state import get_page_tracker
+from ..utils.rate_governor import PORTAL_BANKPLUS, get_governor, format_governor_stats
+from ..utils.result_writer import get_result_writer
+from ..utils.timing import get_span_recorder, span
+from ..utils.waits import get_wait_report, wait_ajax_idle, wait_after_action
+
+logger = logging.getLogger(__name__)
+
+Locator = Tuple[str, str]
+
+
+class CodeRejected(Exception):
+    """Mã sai định dạng/không hợp lệ: ghi thất bại luôn, không retry"""
+
+
+@dataclass
+class FieldSpec:
+    """1 input trên form; locators được thử lần lượt (locator đầu là chính, sau là fallback)"""
+    key: str
+    locators: List[Locator]
+    label: str = ""
+    optional: bool = False
+
+
+@dataclass
+class CodeJob:
+    """1 mã cần xử lý sau khi đã phân tích (prepare)"""
+    raw: str
+    code: str
+    values: Dict[str, Any]
+    amount: Optional[int] = None
+    kind: str = ""
+
+
+@dataclass
+class ParsedResult:
+    """Kết quả đọc từ trang sau khi submit"""
+    amount: Any = None
+    text: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class ServiceSpec:
+    """Khai báo 1 dịch vụ cho pipeline"""
+    key: str
+    label: str
+    url: str
+    ready_id: str
+    fields: List[FieldSpec]
+    submit: Locator
+    parse: Callable[[Any, CodeJob], ParsedResult]
+    success_rule: Callable[[ParsedResult], bool] = lambda parsed: True
+    prepare: Optional[Callable[[str], CodeJob]] = None
+    after_navigate: Optional[Callable[[Any], None]] = None
+    notes: Callable[[CodeJob, ParsedResult, str], str] = lambda job, parsed, status: parsed.text or status
+    failure_notes: Callable[[CodeJob, str], str] = lambda job, error: error
+    check_error_alert: bool = False
+    max_retries: int = 3
+    # Lookup chỉ-đọc: parse HTML từ partial-response để chạy nhanh qua HTTP (LOOKUP_HTTP_ENABLED)
+    http_parse: Optional[Callable[[str, CodeJob], ParsedResult]] = None
+    http_check_ids: List[str] = field(default_factory=list)
+
+
+def default_prepare(raw: str) -> CodeJob:
+    """Mặc định: 1 mã = 1 giá trị điền vào field 'code'"""
+    code = (raw or "").strip()
+    return CodeJob(raw=raw, code=code, values={'code': code})
+
+
+# (idx, code, order_id): vị trí trong đầu vào, mã, đơn hàng của mã
+PipelineTask = Tuple[int, str, Optional[str]]
+
+
+@dataclass
+class PipelineRun:
+    """Trạng thái 1 lần chạy pipeline (dùng chung giữa các worker)"""
+    spec: ServiceSpec
+    pending: "queue.Queue[PipelineTask]" = field(default_factory=queue.Queue)
+    results: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    exporter: Optional[Any] = None  # ResultExporter khi bật RESULT_EXPORT_FORMAT
+
+
+class ServicePipeline:
+    """
+    Chạy 1 ServiceSpec trên danh sách mã.
+
+    Engine lo phần chung: mượn Chrome từ BrowserPool (N worker song song),
+    điều hướng, điền form, submit, chờ modal, retry, đo thời gian từng mã và
+    ghi kết quả qua ResultWriter (flush khi xong).
+    """
+
+    def __init__(self, spec: ServiceSpec, concurrency: Optional[int] = None):
+        self.spec = spec
+        self.concurrency = max(1, concurrency or PIPELINE_CONCURRENCY)
+        self.result_writer = get_result_writer()
+        self.governor = get_governor(PORTAL_BANKPLUS)
+
+    # ------------------------------------------------------------------
+    # Bước trên trang
+    # ------------------------------------------------------------------
+
+    def _open_page(self, driver) -> None:
+        open_service_page(driver, self.spec.url, self.spec.ready_id, f"{self.spec.key}.navigate")
+
+    def _input_ids(self) -> List[str]:
+        return [loc[1] for fs in self.spec.fields for loc in fs.locators if loc[0] == By.ID]
+
+    def _navigate(self, driver, force: bool = False) -> bool:
+        """Mở form của dịch vụ; nếu trang đã mở sẵn thì chỉ reset tại chỗ (True = đã tải lại trang)"""
+        return get_page_tracker().load_form(
+            driver, self.spec.key, self.spec.url, self.spec.ready_id, self._open_page,
+            after_open=self.spec.after_navigate, input_ids=self._input_ids(),
+            step=f"{self.spec.key}.form", force=force,
+        )
+
+    def _fill(self, driver, job: CodeJob) -> None:
+        for fs in self.spec.fields:
+            value = job.values.get(fs.key)
+            if value is None:
+                continue
+            last_error: Optional[Exception] = None
+            for locator in fs.locators:
+                try:
+                    element = WebDriverWait(driver, 10).until(EC.presence_of_element_located(locator))
+                    element.clear()
+                    element.send_keys(str(value))
+                    wait_ajax_idle(driver, f"{self.spec.key}.fill.{fs.key}")
+                    last_error = None
+                    break
+                except Exception as e:
+                    last_error = e
+            if last_error is not None:
+                if fs.optional:
+                    logger.debug("[PIPELINE] Không thể tìm thấy input %s: %s", fs.label or fs.key, last_error)
+                    continue
+                raise last_error
+
+    def _submit(self, driver, code: Optional[str] = None) -> None:
+        with span(self.spec.key, "click", code=code):
+            button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable(self.spec.submit))
+            button.click()
+        with span(self.spec.key, "modal_wait", code=code):
+            wait_after_action(driver, f"{self.spec.key}.submit")
+
+    # ------------------------------------------------------------------
+    # Xử lý 1 mã
+    # ------------------------------------------------------------------
+
+    def _record(self, run: PipelineRun, idx: int, order_id: Optional[str], job_code: str, status: str, amount: Any,
+                message: Optional[str], db_code: str, notes: str, details: Optional[Dict[str, Any]]) -> None:
+        with run.lock:
+            run.results[idx] = {"code": job_code, "amount": amount, "status": status, "message": message,
+                                "order_id": order_id}
+            if run.exporter is not None:
+                run.exporter.write(job_code, amount, message or status)
+        if order_id:
+            with span(self.spec.key, "db_update", code=db_code):
+                self.result_writer.write(order_id, db_code, status, amount, notes, details)
+        else:
+            logger.warning("[PIPELINE] Không có order_id, bỏ qua database update cho %s", db_code)
+
+    def _record_parsed(self, run: PipelineRun, idx: int, order_id: Optional[str], job: CodeJob,
+                       parsed: ParsedResult) -> None:
+        spec = self.spec
+        status = "success" if spec.success_rule(parsed) else "failed"
+        amount = parsed.amount if parsed.amount is not None else job.amount
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PIPELINE] %s %s: amount=%s %s", '✅' if status == 'success' else '❌',
+                         job.raw, amount, parsed.text or '')
+            for key, value in (parsed.details or {}).items():
+                logger.debug("[PIPELINE]    • %s: %s", key, value)
+        self._record(run, idx, order_id, job.raw, status, amount, parsed.text, job.code,
+                     spec.notes(job, parsed, status), parsed.details)
+
+    def _process_code(self, driver, run: PipelineRun, idx: int, raw: str, order_id: Optional[str],
+                      total: int) -> None:
+        spec = self.spec
+        logger.debug("📱 [%s %d/%d] Xử lý mã: %s", spec.label, idx + 1, total, raw)
+        try:
+            job = (spec.prepare or default_prepare)(raw)
+        except CodeRejected as e:
+            logger.info("[PIPELINE] %s: mã %s bị loại: %s", spec.key, raw, e)
+            self._record(run, idx, order_id, raw, "failed", None, str(e), (raw or "").strip(), str(e), None)
+            return
+        if not job.code:
+            logger.debug("[PIPELINE] %s: mã rỗng, bỏ qua", spec.key)
+            return
+
+        started = time.monotonic()
+        try:
+            for attempt in range(spec.max_retries):
+                try:
+                    if attempt > 0:
+                        logger.info("🔄 Retry lần %d/%d cho mã %s", attempt + 1, spec.max_retries, job.raw)
+                    else:
+                        wait_ajax_idle(driver, f"{spec.key}.before_code")
+                    # Mỗi lượt gửi form đi qua governor của portal (lỗi/alert quá tải => tự giảm tốc)
+                    with self.governor.slot() as slot:
+                        # Reset form tại chỗ; lần retry thứ 2 trở đi mới ép tải lại trang
+                        with span(spec.key, "navigate", code=job.raw, attempt=attempt + 1):
+                            self._navigate(driver, force=attempt >= 2)
+
+                        with span(spec.key, "fill", code=job.raw):
+                            self._fill(driver, job)
+                        self._submit(driver, job.raw)
+
+                        with span(spec.key, "parse", code=job.raw):
+                            error_text = get_error_alert_text(driver) if spec.check_error_alert else None
+                            slot.alert(error_text)
+                            parsed = None if error_text else spec.parse(driver, job)
+
+                    if error_text and slot.reason and attempt < spec.max_retries - 1:
+                        # Portal báo quá tải: governor đã giảm tốc, thử lại mã này thay vì ghi thất bại
+                        logger.warning("🚦 [PIPELINE] Portal báo quá tải (mã %s): %s", job.raw, error_text)
+                        continue
+                    if error_text:
+                        logger.info("[PIPELINE] %s: mã %s có thông báo lỗi: %s", spec.key, job.raw, error_text)
+                        self._record(run, idx, order_id, job.raw, "failed", None, error_text, job.code,
+                                     spec.failure_notes(job, error_text), None)
+                        return
+
+                    self._record_parsed(run, idx, order_id, job, parsed)
+                    return
+
+                except Exception as e:
+                    logger.warning("Lần thử %d thất bại cho %s: %s", attempt + 1, job.raw, e)
+                    if attempt < spec.max_retries - 1:
+                        continue
+                    logger.error(f"{spec.label} code {job.raw} thất bại sau {spec.max_retries} lần thử: {e}")
+                    self._record(run, idx, order_id, job.raw, "failed", None, str(e), job.code,
+                                 spec.failure_notes(job, str(e)), None)
+        finally:
+            elapsed = time.monotonic() - started
+            get_wait_report().record(f"{spec.key}.code_total", elapsed)
+            get_span_recorder().record(spec.key, "code_total", elapsed, code=job.raw, order_id=order_id)
+
+    def process_one(self, driver, idx: int, raw: str, order_id: Optional[str] = None,
+                    total: int = 1) -> Optional[Dict[str, Any]]:
+        """Xử lý 1 mã trên driver có sẵn (cho worker bên ngoài engine, vd. tiến trình shard); None = mã rỗng"""
+        run = PipelineRun(spec=self.spec)
+        self._process_code(driver, run, idx, raw, order_id, total)
+        return run.results.get(idx)
+
+    # ------------------------------------------------------------------
+    # Lookup nhanh qua HTTP (không qua Selenium)
+    # ------------------------------------------------------------------
+
+    def _http_values(self, job: CodeJob) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for fs in self.spec.fields:
+            value = job.values.get(fs.key)
+            by, field_id = fs.locators[0]
+            if value is not None and by == By.ID:
+                values[field_id] = value
+        return values
+
+    def _http_lookup_code(self, client: JsfClient, run: PipelineRun, task: PipelineTask, total: int) -> bool:
+        """Lookup 1 mã qua HTTP; False = cần chạy lại bằng Selenium"""
+        spec = self.spec
+        idx, raw, order_id = task
+        form_id = spec.submit[1].split(':')[0]
+        try:
+            job = (spec.prepare or default_prepare)(raw)
+        except CodeRejected as e:
+            logger.info("[PIPELINE] %s: mã %s bị loại: %s", spec.key, raw, e)
+            self._record(run, idx, order_id, raw, "failed", None, str(e), (raw or "").strip(), str(e), None)
+            return True
+        if not job.code:
+            return True
+
+        started = time.monotonic()
+        try:
+            with self.governor.slot():
+                view = client.thread_view(spec.url, form_id, spec.http_check_ids)
+                updates = client.partial_submit(view, spec.submit[1], self._http_values(job))
+            html = "".join(v for k, v in updates.items() if "javax.faces.ViewState" not in k)
+            parsed = spec.http_parse(html, job)
+        except Exception as e:
+            # View có thể đã hỏng => luồng này GET lại trang cho mã sau
+            client.drop_thread_view(spec.url, form_id)
+            logger.info(f"[PIPELINE] {spec.key}: lookup HTTP mã {job.raw} lỗi, chuyển Selenium: {e}")
+            return False
+        finally:
+            elapsed = time.monotonic() - started
+            get_wait_report().record(f"{spec.key}.http_lookup", elapsed)
+            get_span_recorder().record(spec.key, "http_lookup", elapsed, code=job.raw)
+
+        logger.debug("⚡ [%s %d/%d] HTTP lookup: %s", spec.label, idx + 1, total, job.raw)
+        self._record_parsed(run, idx, order_id, job, parsed)
+        return True
+
+    def _run_http_lookups(self, run: PipelineRun, items: List[PipelineTask], total: int) -> List[PipelineTask]:
+        """Chạy song song các lookup qua HTTP, trả về các mã phải xử lý lại bằng Selenium"""
+        spec = self.spec
+        try:
+            with get_browser_pool().lease() as driver:
+                client = JsfClient.from_driver(driver)
+        except (BrowserPoolError, JsfLookupError) as e:
+            logger.warning(f"[PIPELINE] {spec.key}: không dùng được lookup HTTP ({e}), chạy Selenium")
+            return items
+
+        logger.info("⚡ [PIPELINE] %s: lookup qua HTTP (%d luồng)", spec.key, LOOKUP_HTTP_CONCURRENCY)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, LOOKUP_HTTP_CONCURRENCY),
+                                    thread_name_prefix=f"http-{spec.key}") as executor:
+                done = list(executor.map(lambda item: self._http_lookup_code(client, run, item, total), items))
+        finally:
+            client.close()
+
+        fallback = [item for item, ok in zip(items, done) if not ok]
+        if fallback:
+            logger.info("↩️ [PIPELINE] %s: %d/%d mã lookup HTTP lỗi, chạy lại bằng Selenium",
+                        spec.key, len(fallback), len(items))
+        return fallback
+
+    # ------------------------------------------------------------------
+    # Worker / chạy
+    # ------------------------------------------------------------------
+
+    def _open_exporter(self):
+        """File kết quả ghi dần trong lúc chạy (None nếu không mở được, pipeline vẫn chạy tiếp)"""
+        try:
+            from ..utils.excel_export import open_result_exporter
+            return open_result_exporter(self.spec.label, RESULT_EXPORT_FORMAT)
+        except Exception as e:
+            logger.warning(f"[PIPELINE] {self.spec.key}: không mở được file xuất kết quả: {e}")
+            return None
+
+    def _worker(self, run: PipelineRun, total: int) -> None:
+        try:
+            with get_browser_pool().lease() as driver:
+                while True:
+                    try:
+                        idx, raw, order_id = run.pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    self._process_code(driver, run, idx, raw, order_id, total)
+        except BrowserPoolError as e:
+            logger.error(f"[PIPELINE] {self.spec.key}: không mượn được Chrome từ pool: {e}")
+        except Exception as e:
+            logger.exception(f"[PIPELINE] {self.spec.key} worker error: {e}")
+
+    def run(self, codes: List[str], order_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Xử lý toàn bộ mã của 1 đơn, trả về danh sách kết quả theo thứ tự đầu vào"""
+        return self.run_tasks([(code, order_id) for code in codes])
+
+    def run_tasks(self, tasks: List[Tuple[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        Xử lý [(code, order_id)] của nhiều đơn trong 1 lần chạy (chung pool Chrome, ResultWriter,
+        phiên HTTP và file xuất), trả về kết quả theo thứ tự đầu vào (mỗi dòng có key order_id)
+        """
+        spec = self.spec
+        orders = {order_id for _, order_id in tasks if order_id}
+        logger.info("🚀 [AUTOMATION] Bắt đầu xử lý %s cho %d mã (%d đơn)", spec.label, len(tasks), len(orders))
+
+        run = PipelineRun(spec=spec)
+        items: List[PipelineTask] = [(i, code, order_id) for i, (code, order_id) in enumerate(tasks)]
+        if RESULT_EXPORT_FORMAT:
+            run.exporter = self._open_exporter()
+
+        workers = 0
+        try:
+            if LOOKUP_HTTP_ENABLED and spec.http_parse and items:
+                items = self._run_http_lookups(run, items, len(tasks))
+            for item in items:
+                run.pending.put(item)
+
+            workers = min(self.concurrency, get_browser_pool().size, len(items))
+            if workers == 1:
+                self._worker(run, len(tasks))
+            elif workers > 1:
+                threads = [
+                    threading.Thread(target=self._worker, args=(run, len(tasks)), name=f"pipeline-{spec.key}-{i + 1}", daemon=True)
+                    for i in range(workers)
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+
+            # Mã còn lại trong hàng đợi (không worker nào mượn được Chrome) => thất bại
+            while True:
+                try:
+                    idx, raw, order_id = run.pending.get_nowait()
+                except queue.Empty:
+                    break
+                self._record(run, idx, order_id, raw, "failed", None, "Không có Chrome để xử lý", (raw or "").strip(),
+                             "Không có Chrome để xử lý", None)
+        finally:
+            self.result_writer.flush()
+            get_span_recorder().flush()
+            if run.exporter is not None:
+                logger.info("📄 [PIPELINE] Đã xuất %d dòng ra %s", run.exporter.rows, run.exporter.close())
+
+        results = [run.results[i] for i in sorted(run.results)]
+        succeeded = len([r for r in results if r['status'] == 'success'])
+        logger.info("📊 [KẾT QUẢ] %s: ✅ %d thành công | ❌ %d thất bại | 📋 %d mã (%d worker)", spec.label,
+                    succeeded, len([r for r in results if r['status'] == 'failed']), len(results), workers)
+        if logger.isEnabledFor(logging.INFO):
+            page_stats = get_page_tracker().stats()
+            logger.info("⏱️ [WAIT] Thời gian chờ theo bước:\n%s", get_wait_report().format(f"{spec.key}."))
+            logger.info("📄 Form: %d lần tải trang | %d lần reset tại chỗ | %d lần tải lại do hết hạn",
+                        page_stats['loads'], page_stats['resets'], page_stats['expired_reloads'])
+            logger.info("🚦 %s", format_governor_stats(self.governor.stats()))
+            logger.info("⏱️ [SPAN] Thời gian theo bước (p50/p95/p99):\n%s", get_span_recorder().format(spec.key))
+        return results
+
+
+def run_service_pipeline(spec: ServiceSpec, codes: List[str], order_id: Optional[str] = None,
+                         concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Chạy pipeline cho 1 dịch vụ"""
+    return ServicePipeline(spec, concurrency).run(codes, order_id)
+
+
+def run_service_tasks(spec: ServiceSpec, tasks: List[Tuple[str, Optional[str]]],
+                      concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Chạy pipeline cho 1 dịch vụ trên [(code, order_id)] thuộc nhiều đơn"""
+    return ServicePipeline(spec, concurrency).run_tasks(tasks)
+
+
+__all__ = [
+    "CodeRejected",
+    "FieldSpec",
+    "CodeJob",
+    "ParsedResult",
+    "ServiceSpec",
+    "default_prepare",
+    "ServicePipeline",
+    "run_service_pipeline",
+    "run_service_tasks",
+]
@@ -127,7 +127,7 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
             time.sleep(1)
             if not stop_flag:
                 # Điều hướng đến trang tra cứu trả sau trước khi xử lý
-                print(f"   🔧 Đang xử lý {cbil} | Order ID: {order_id_val or 'Không có'}")
+                logger.debug("[POSTPAID] 🔧 Đang xử lý %s | Order ID: %s", cbil, order_id_val or 'Không có')
                 navigate_to_postpaid_lookup_page()
                 time.sleep(2)
                 update_database_immediately(order_id_val, cbil, "processing", None, f"Đang xử lý {cbil}", None)
@@ -176,7 +176,7 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                     # Chờ alert xuất hiện
                     error_text = get_error_alert_text()
                     if error_text:
-                        print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                        logger.warning("[POSTPAID] ❌ Thanh toán thất bại (alert): %s", error_text)
                         note_text = f"Postpaid payment failed - {cbil} | {error_text}"
                         data_rows.append([cbil, 0, note_text])
                         insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi: {error_text}")
@@ -187,8 +187,8 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                     # Kiểm tra thông báo info
                     info_text = get_info_alert_text()
                     if info_text and ("không còn nợ cước" in info_text.lower()):
-                        print(f"   ℹ️  Có thông báo info: {info_text}")
-                        print(f"   ✅ Không còn nợ cước: Amount = 0")
+                        logger.debug("[POSTPAID] ℹ️ Có thông báo info: %s", info_text)
+                        logger.debug("[POSTPAID] ✅ Không còn nợ cước: Amount = 0")
                         
                         note_text = info_text.strip()
                         data_rows.append([cbil, 0, Config.STATUS_COMPLETE])
@@ -199,11 +199,11 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                             try:
                                 notes_db = f"Postpaid: Không nợ cước - {cbil} | {note_text}"
                                 _ = update_database_immediately(order_id_val, cbil, "success", 0, notes_db, None)
-                                print(f"      ✅ Database update thành công cho {cbil} (không nợ cước)")
+                                logger.debug("[POSTPAID] ✅ Database update thành công cho %s (không nợ cước)", cbil)
                             except Exception as _e:
                                 logger.warning(f"DB update lỗi (Postpaid no debt) cho {cbil}: {_e}")
                         else:
-                            print(f"      ⚠️  Không có Order ID cho {cbil} - bỏ qua database update")
+                            logger.warning("[POSTPAID] ⚠️ Không có Order ID cho %s - bỏ qua database update", cbil)
                         
                         continue
 
@@ -213,7 +213,7 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                         debt_str = lbl_debt.get_attribute('value')
                         debt = int(debt_str.replace(".", "").replace(",", ""))
                         
-                        print(f"   💰 Có nợ cước: {debt:,}đ")
+                        logger.debug("[POSTPAID] 💰 Có nợ cước: %sđ", debt)
                         data_rows.append([cbil, debt, Config.STATUS_COMPLETE])
                         insert_ctmed(tkinp_ctmed, f"{cbil} - {debt:,}đ")
                         
@@ -222,15 +222,15 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                             try:
                                 notes_db = f"Postpaid: Có nợ cước - {cbil} | Số tiền: {debt:,}đ"
                                 _ = update_database_immediately(order_id_val, cbil, "success", debt, notes_db, None)
-                                print(f"      ✅ Database update thành công cho {cbil} (có nợ cước)")
+                                logger.debug("[POSTPAID] ✅ Database update thành công cho %s (có nợ cước)", cbil)
                             except Exception as _e:
                                 logger.warning(f"DB update lỗi (Postpaid debt) cho {cbil}: {_e}")
                         else:
-                            print(f"      ⚠️  Không có Order ID cho {cbil} - bỏ qua database update")
+                            logger.warning("[POSTPAID] ⚠️ Không có Order ID cho %s - bỏ qua database update", cbil)
                         
                         continue
                     except Exception as debt_error:
-                        print(f"   ⚠️  Không thể lấy thông tin nợ cước: {debt_error}")
+                        logger.warning("[POSTPAID] ⚠️ Không thể lấy thông tin nợ cước: %s", debt_error)
                         data_rows.append([cbil, "Lỗi", Config.STATUS_INCOMPLETE])
                         insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi | Không thể lấy nợ cước")
                         
@@ -239,20 +239,20 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                             try:
                                 notes_db = f"Postpaid: Lỗi lấy nợ cước - {cbil} | {str(debt_error)}"
                                 _ = update_database_immediately(order_id_val, cbil, "failed", None, notes_db, None)
-                                print(f"      ✅ Database update thành công cho {cbil} (failed)")
+                                logger.debug("[POSTPAID] ✅ Database update thành công cho %s (failed)", cbil)
                             except Exception as _e:
                                 logger.warning(f"DB update lỗi (Postpaid failed) cho {cbil}: {_e}")
                         else:
-                            print(f"      ⚠️  Không có Order ID cho {cbil} - bỏ qua database update")
+                            logger.warning("[POSTPAID] ⚠️ Không có Order ID cho %s - bỏ qua database update", cbil)
                         
                         continue
                 except Exception as general_error:
-                    print(f"   ❌ Lỗi xử lý chung: {general_error}")
+                    logger.warning("[POSTPAID] ❌ Lỗi xử lý chung: %s", general_error)
                     
                     # Nếu có thông báo info/alert khác thì lưu notes giống hiển thị
                     note_text = get_info_alert_text() or get_error_alert_text() or ""
                     if note_text:
-                        print(f"   ℹ️  Thông báo hệ thống: {note_text}")
+                        logger.debug("[POSTPAID] ℹ️ Thông báo hệ thống: %s", note_text)
                     
                     data_rows.append([cbil, "Lỗi xử lý", Config.STATUS_INCOMPLETE])
                     display_line = f"{cbil} - Lỗi xử lý{(' | ' + note_text) if note_text else ''}"
@@ -263,11 +263,11 @@ def lookup_card(tkinp_ctm, tkinp_ctmed):
                         try:
                             notes_db = f"Postpaid: Lỗi xử lý - {cbil} | {str(general_error)}{(' | ' + note_text) if note_text else ''}"
                             _ = update_database_immediately(order_id_val, cbil, "failed", None, notes_db, None)
-                            print(f"      ✅ Database update thành công cho {cbil} (failed)")
+                            logger.debug("[POSTPAID] ✅ Database update thành công cho %s (failed)", cbil)
                         except Exception as _e:
                             logger.warning(f"DB update lỗi (Postpaid failed) cho {cbil}: {_e}")
                     else:
-                        print(f"      ⚠️  Không có Order ID cho {cbil} - bỏ qua database update")
+                        logger.warning("[POSTPAID] ⚠️ Không có Order ID cho %s - bỏ qua database update", cbil)
                     
                     continue
         time.sleep(2)
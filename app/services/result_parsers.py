@@ -0,0 +1,291 @@
+"""Đọc kết quả tra cứu/thanh toán (dùng chung cho GUI, pipeline Selenium và lookup HTTP; không phụ thuộc tkinter)
+
+Trên Chrome: 1 lần execute_script trả về JSON gọn (các nhóm pay-content + cặp nhãn/giá trị) thay cho
+outerHTML/page_source + BeautifulSoup. Với HTML (lookup HTTP, hoặc khi JS lỗi): selectolax > lxml > BeautifulSoup,
+tùy thư viện nào có cài.
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:  # selectolax không bắt buộc (bản cũ chỉ có backend Modest)
+    try:
+        from selectolax.parser import HTMLParser as _SelectolaxParser
+    except ImportError:
+        _SelectolaxParser = None
+
+try:
+    import lxml.html as _lxml_html
+except ImportError:  # lxml không bắt buộc
+    _lxml_html = None
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Khối kết quả tra cứu/gạch nợ trên form payMoneyForm
+RESULT_BLOCK_ID = "payMoneyForm:j_idt41"
+
+HTML_PARSER = "selectolax" if _SelectolaxParser is not None else ("lxml" if _lxml_html is not None else "html.parser")
+
+FTTH_LABELS = {
+    'Mã hợp đồng:': 'contract_code',
+    'Chủ hợp đồng:': 'contract_owner',
+    'Số thuê bao đại diện:': 'representative_subscriber',
+    'Dịch vụ:': 'service',
+    'Số điện thoại liên hệ:': 'contact_phone',
+    'Nợ cước:': 'debt_amount',
+}
+
+# (text các thẻ <p>, id các nút xem chi tiết) của 1 nhóm "row pay-content mb-3"
+ResultGroup = Tuple[List[str], List[str]]
+LabelPair = Tuple[str, str]
+
+_PAY_CONTENT_CLASS = "row pay-content mb-3"
+_BTN_VIEW_RE = re.compile(r'payMoneyForm:btnView\d*')
+_SPACE_RE = re.compile(r'\s+')
+
+# arguments: [element gốc | null, id khối kết quả, danh sách nhãn cần lấy | null]
+_RESULT_SNAPSHOT_JS = """
+var root = arguments[0] || document.getElementById(arguments[1]);
+var labels = arguments[2];
+var clean = function (el) { return (el.textContent || '').replace(/\\s+/g, ' ').trim(); };
+var out = {found: !!root, groups: [], pairs: []};
+if (root) {
+    var groups = root.querySelectorAll('div[class="row pay-content mb-3"]');
+    for (var i = 0; i < groups.length; i++) {
+        var texts = [], buttons = [];
+        var ps = groups[i].querySelectorAll('p');
+        for (var j = 0; j < ps.length; j++) { texts.push(clean(ps[j])); }
+        var bs = groups[i].querySelectorAll('button[id]');
+        for (var k = 0; k < bs.length; k++) { buttons.push(bs[k].id); }
+        out.groups.push([texts, buttons]);
+    }
+}
+if (labels) {
+    var rows = document.querySelectorAll('div.row');
+    for (var r = 0; r < rows.length; r++) {
+        var cols = rows[r].querySelectorAll('div.col-6');
+        if (cols.length !== 2) { continue; }
+        var label = cols[0].querySelector('label'), value = cols[1].querySelector('p');
+        if (!label || !value) { continue; }
+        var text = clean(label);
+        if (labels.indexOf(text) >= 0) { out.pairs.push([text, clean(value)]); }
+    }
+}
+return JSON.stringify(out);
+"""
+
+
+# ----------------------------------------------------------------------
+# Luật nghiệp vụ (dùng chung cho mọi nguồn dữ liệu)
+# ----------------------------------------------------------------------
+
+def amount_from_groups(cbil: str, groups: Iterable[ResultGroup], lookup: bool = False) -> Tuple[bool, Any, Optional[str]]:
+    """(đủ tiền?, số tiền, id nút xem chi tiết) của mã cbil trong các nhóm pay-content"""
+    try:
+        amount = "Không tìm thấy mã thuê bao"
+        payment_id = None
+        for texts, buttons in groups:
+            is_found = any(cbil in text for text in texts)
+            if lookup and is_found:
+                payment_id = next((b for b in buttons if _BTN_VIEW_RE.search(b)), None) or payment_id
+            if is_found:
+                for text in texts:
+                    if "VND" in text:
+                        str_price = text.split("VND")[0].strip()
+                        amount = int(str_price.replace(",", ""))
+                        if amount >= 5000:
+                            return True, amount, payment_id
+                        else:
+                            return False, amount, payment_id
+        return False, amount, payment_id
+    except Exception as e:
+        logger.error(f"Lỗi lấy số tiền: {e}")
+        return False, "Lỗi thanh toán", None
+
+
+def details_from_pairs(pairs: Iterable[LabelPair]) -> Dict[str, Any]:
+    """Cặp (nhãn, giá trị) -> chi tiết thuê bao FTTH"""
+    details: Dict[str, Any] = {}
+    for label_text, value_text in pairs:
+        key = FTTH_LABELS.get(label_text)
+        if not key:
+            continue
+        if key == 'debt_amount':
+            try:
+                num_str = re.findall(r"[\d\.,]+", value_text)
+                if num_str:
+                    details[key] = int(num_str[0].replace('.', '').replace(',', ''))
+                else:
+                    details[key] = None
+            except Exception:
+                details[key] = None
+        else:
+            details[key] = value_text
+    return details
+
+
+# ----------------------------------------------------------------------
+# Đọc HTML: selectolax > lxml > BeautifulSoup
+# ----------------------------------------------------------------------
+
+def _clean(text: Optional[str]) -> str:
+    return _SPACE_RE.sub(' ', text or '').strip()
+
+
+def _parse_selectolax(html: str, block_id: Optional[str], labels: bool) -> Tuple[Optional[List[ResultGroup]], List[LabelPair]]:
+    tree = _SelectolaxParser(html)
+    root = tree.css_first(f'[id="{block_id}"]') if block_id else tree.root
+    groups = None
+    if root is not None:
+        groups = [
+            ([_clean(p.text()) for p in g.css('p')], [b.attributes.get('id') or '' for b in g.css('button[id]')])
+            for g in root.css(f'div[class="{_PAY_CONTENT_CLASS}"]')
+        ]
+    pairs: List[LabelPair] = []
+    if labels:
+        for row in tree.css('div.row'):
+            cols = row.css('div.col-6')
+            if len(cols) != 2:
+                continue
+            label, value = cols[0].css_first('label'), cols[1].css_first('p')
+            if label is not None and value is not None:
+                pairs.append((_clean(label.text()), _clean(value.text())))
+    return groups, pairs
+
+
+_XP_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+
+def _parse_lxml(html: str, block_id: Optional[str], labels: bool) -> Tuple[Optional[List[ResultGroup]], List[LabelPair]]:
+    doc = _lxml_html.fromstring(html)
+    if block_id:
+        found = doc.xpath('//*[@id=$id]', id=block_id)
+        root = found[0] if found else None
+    else:
+        root = doc
+    groups = None
+    if root is not None:
+        groups = [
+            ([_clean(p.text_content()) for p in g.iter('p')], [b.get('id') for b in g.iter('button') if b.get('id')])
+            for g in root.xpath(f'descendant-or-self::div[@class="{_PAY_CONTENT_CLASS}"]')
+        ]
+    pairs: List[LabelPair] = []
+    if labels:
+        for row in doc.xpath(f'//div[{_XP_CLASS.format("row")}]'):
+            cols = row.xpath(f'.//div[{_XP_CLASS.format("col-6")}]')
+            if len(cols) != 2:
+                continue
+            label, value = next(cols[0].iter('label'), None), next(cols[1].iter('p'), None)
+            if label is not None and value is not None:
+                pairs.append((_clean(label.text_content()), _clean(value.text_content())))
+    return groups, pairs
+
+
+def _parse_bs4(html: str, block_id: Optional[str], labels: bool) -> Tuple[Optional[List[ResultGroup]], List[LabelPair]]:
+    soup = BeautifulSoup(html, 'html.parser')
+    root = soup.find(id=block_id) if block_id else soup
+    groups = None
+    if root is not None:
+        groups = [
+            ([_clean(p.text) for p in g.find_all("p")], [b['id'] for b in g.find_all("button", id=True)])
+            for g in root.find_all("div", class_=_PAY_CONTENT_CLASS)
+        ]
+    pairs: List[LabelPair] = []
+    if labels:
+        for row in soup.find_all('div', class_='row'):
+            cols = row.find_all('div', class_='col-6')
+            if len(cols) != 2:
+                continue
+            label, value = cols[0].find('label'), cols[1].find('p')
+            if label is not None and value is not None:
+                pairs.append((_clean(label.get_text()), _clean(value.get_text())))
+    return groups, pairs
+
+
+_HTML_BACKENDS = {"selectolax": _parse_selectolax, "lxml": _parse_lxml, "html.parser": _parse_bs4}
+
+
+def parse_result_html(html: str, block_id: Optional[str] = None, labels: bool = False,
+                      parser: Optional[str] = None) -> Tuple[Optional[List[ResultGroup]], List[LabelPair]]:
+    """HTML -> (nhóm pay-content trong block_id (None nếu không có block), cặp nhãn/giá trị nếu labels=True)"""
+    return _HTML_BACKENDS[parser or HTML_PARSER](html, block_id, labels)
+
+
+# ----------------------------------------------------------------------
+# Đọc trực tiếp trên Chrome: 1 lần execute_script
+# ----------------------------------------------------------------------
+
+def snapshot_result(driver, block_id: str = RESULT_BLOCK_ID, element=None,
+                    labels: bool = False) -> Tuple[Optional[List[ResultGroup]], List[LabelPair]]:
+    """Như parse_result_html nhưng chạy trong trình duyệt; lỗi JS thì đọc HTML (outerHTML / page_source)"""
+    try:
+        raw = driver.execute_script(_RESULT_SNAPSHOT_JS, element, block_id, list(FTTH_LABELS) if labels else None)
+        data = json.loads(raw)
+        groups = [(list(texts), list(buttons)) for texts, buttons in data['groups']] if data['found'] else None
+        return groups, [(label, value) for label, value in data['pairs']]
+    except Exception as e:
+        logger.debug(f"Snapshot JS lỗi, đọc HTML: {e}")
+    if element is not None and not labels:
+        return parse_result_html(element.get_attribute('outerHTML'))
+    return parse_result_html(driver.page_source, None if element is not None else block_id, labels)
+
+
+def amount_by_cbil(cbil: str, element, lookup: bool = False) -> Tuple[bool, Any, Optional[str]]:
+    """(đủ tiền?, số tiền, id nút xem chi tiết) của mã cbil trong khối kết quả Selenium element"""
+    try:
+        groups, _pairs = snapshot_result(element.parent, element=element)
+    except Exception as e:
+        logger.error(f"Lỗi lấy số tiền: {e}")
+        return False, "Lỗi thanh toán", None
+    return amount_from_groups(cbil, groups or [], lookup)
+
+
+def amount_by_cbil_html(cbil: str, html_content: str, lookup: bool = False) -> Tuple[bool, Any, Optional[str]]:
+    """Như amount_by_cbil nhưng đọc từ HTML (dùng cho lookup HTTP không qua Selenium)"""
+    try:
+        groups, _pairs = parse_result_html(html_content)
+    except Exception as e:
+        logger.error(f"Lỗi lấy số tiền: {e}")
+        return False, "Lỗi thanh toán", None
+    return amount_from_groups(cbil, groups or [], lookup)
+
+
+def extract_ftth_details_from_html(html_content: str) -> Dict[str, Any]:
+    """Trích chi tiết thuê bao FTTH từ HTML (trang đầy đủ hoặc đoạn partial-response)"""
+    try:
+        _groups, pairs = parse_result_html(html_content, labels=True)
+        return details_from_pairs(pairs)
+    except Exception as e:
+        logger.warning(f"Lỗi trích chi tiết FTTH: {e}")
+    return {}
+
+
+def extract_ftth_details_from_driver(driver) -> Dict[str, Any]:
+    """Trích chi tiết thuê bao FTTH trên trang Chrome đang mở (không lấy page_source)"""
+    try:
+        _groups, pairs = snapshot_result(driver, labels=True)
+        return details_from_pairs(pairs)
+    except Exception as e:
+        logger.warning(f"Lỗi trích chi tiết FTTH: {e}")
+    return {}
+
+
+__all__ = [
+    "RESULT_BLOCK_ID",
+    "HTML_PARSER",
+    "FTTH_LABELS",
+    "amount_from_groups",
+    "details_from_pairs",
+    "parse_result_html",
+    "snapshot_result",
+    "amount_by_cbil",
+    "amount_by_cbil_html",
+    "extract_ftth_details_from_html",
+    "extract_ftth_details_from_driver",
+]
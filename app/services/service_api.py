@@ -0,0 +1,237 @@
+"""API dịch vụ thuần dữ liệu (không tkinter): lấy mã chờ xử lý thành WorkItem, chạy pipeline và trả về WorkResult"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import (
+    WORK_CLAIM_ENABLED,
+    CLAIM_WORKER_ID,
+    CLAIM_LEASE_SECONDS,
+    CLAIM_REAP_INTERVAL,
+    SHARD_PROCESSES,
+    SHARD_MIN_CODES,
+)
+from ..db import db_fetch_service_data, db_claim_service_work, db_renew_leases, db_reap_expired_leases
+from ..process import SERVICE_SPECS
+from .pipeline import run_service_tasks
+from .sharded_executor import run_sharded
+
+logger = logging.getLogger(__name__)
+
+# Tên service trong cron_config.json -> service_type trong DB
+SERVICE_TYPES: Dict[str, str] = {
+    'ftth': 'tra_cuu_ftth',
+    'evn': 'gach_dien_evn',
+    'topup_multi': 'nap_tien_da_mang',
+    'topup_viettel': 'nap_tien_viettel',
+    'tv_internet': 'thanh_toan_tv_internet',
+    'postpaid': 'tra_cuu_no_tra_sau',
+}
+
+
+@dataclass
+class WorkItem:
+    """1 mã cần xử lý (code giữ nguyên định dạng của dịch vụ, vd. 'sđt|số tiền' cho nạp trả trước)"""
+    service: str
+    code: str
+    order_id: Optional[str] = None
+
+    def to_line(self) -> str:
+        """Dòng hiển thị trên GUI: code|order_id"""
+        return f"{self.code}|{self.order_id}" if self.order_id else self.code
+
+
+@dataclass
+class WorkResult:
+    """Kết quả xử lý 1 WorkItem"""
+    service: str
+    code: str
+    order_id: Optional[str]
+    status: str
+    amount: Any = None
+    message: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "success"
+
+
+def _service_type(service: str) -> str:
+    if service in SERVICE_TYPES:
+        return SERVICE_TYPES[service]
+    if service in SERVICE_SPECS:
+        return service
+    raise ValueError(f"Service không hợp lệ: {service}")
+
+
+def parse_work_line(service: str, line: str) -> Optional[WorkItem]:
+    """
+    Dòng 'code|order_id' (hoặc chỉ 'code') -> WorkItem.
+
+    Mã nạp trả trước có dạng 'sđt|số tiền' nên phần sau '|' cuối cùng chỉ được
+    coi là order_id khi không phải toàn chữ số.
+    """
+    line = (line or "").strip()
+    if not line:
+        return None
+    code, order_id = line, None
+    if '|' in line:
+        head, tail = line.rsplit('|', 1)
+        if tail.strip() and not tail.strip().isdigit():
+            code, order_id = head.strip(), tail.strip()
+    return WorkItem(service=service, code=code, order_id=order_id)
+
+
+def fetch_work_items(service: str, limit: Optional[int] = None, payment_type: Optional[str] = None) -> List[WorkItem]:
+    """Các mã đang pending/processing của service (tối đa limit mã, cũ nhất trước)"""
+    data = db_fetch_service_data(_service_type(service), payment_type, limit=limit)
+    if not data:
+        return []
+    items = []
+    for m in data.get("code_order_map", []):
+        code = (m.get("code") or "").strip()
+        if code:
+            items.append(WorkItem(service=service, code=code, order_id=m.get("orderId")))
+    return items[:limit] if limit else items
+
+
+_reap_lock = threading.Lock()
+_last_reap = 0.0
+
+
+def _maybe_reap_leases() -> None:
+    """Thu hồi lease hết hạn, tối đa 1 lần mỗi CLAIM_REAP_INTERVAL giây trong tiến trình"""
+    global _last_reap
+    with _reap_lock:
+        if time.monotonic() - _last_reap < CLAIM_REAP_INTERVAL:
+            return
+        _last_reap = time.monotonic()
+    db_reap_expired_leases(CLAIM_LEASE_SECONDS)
+
+
+def claim_work_items(service: str, limit: Optional[int] = None, payment_type: Optional[str] = None,
+                     worker_id: str = CLAIM_WORKER_ID) -> List[WorkItem]:
+    """
+    Nhận (claim) tối đa limit mã cho worker_id: các mã này chuyển sang processing kèm lease nên
+    worker khác (cron, auto mode GUI, máy khác) không lấy trùng. WORK_CLAIM_ENABLED=0 hoặc DB
+    chưa có cột lease (chưa chạy claim_leases.sql) thì quay về fetch_work_items như trước.
+    """
+    if not WORK_CLAIM_ENABLED:
+        return fetch_work_items(service, limit, payment_type)
+    service_type = _service_type(service)
+    _maybe_reap_leases()
+    rows = db_claim_service_work(service_type, worker_id, limit, CLAIM_LEASE_SECONDS, payment_type)
+    if rows is None:
+        logger.warning(f"[SERVICE API] Không claim được {service}, đọc không khóa (đã chạy claim_leases.sql?)")
+        return fetch_work_items(service, limit, payment_type)
+    return [WorkItem(service=service, code=row["code"].strip(), order_id=row.get("orderId")) for row in rows]
+
+
+def _drop_lost_claims(service: str, items: List[WorkItem],
+                      worker_id: str = CLAIM_WORKER_ID) -> Tuple[List[WorkItem], List[WorkItem]]:
+    """
+    Gia hạn lease ngay trước khi chạy, trả về (mã còn giữ, mã đã mất). GUI claim lúc bấm "Get data"
+    nhưng có thể bấm Run sau CLAIM_LEASE_SECONDS: khi đó mã đã bị thu hồi về pending và worker
+    khác (cron) có thể đã nhận => không được xử lý (trả tiền) lần nữa.
+    Dòng không có order_id (nhập tay) không phải giao dịch trong DB nên vẫn chạy.
+    """
+    if not WORK_CLAIM_ENABLED or not any(item.order_id for item in items):
+        return items, []
+    owned = db_renew_leases(worker_id, CLAIM_LEASE_SECONDS)
+    if owned is None:
+        # DB chưa có cột lease (claim_work_items đã đọc không khóa) => giữ hành vi cũ
+        logger.warning(f"[SERVICE API] {service}: không kiểm tra được lease, chạy cả {len(items)} mã")
+        return items, []
+    owned_keys = set(owned)
+    kept: List[WorkItem] = []
+    lost: List[WorkItem] = []
+    for item in items:
+        (kept if item.order_id is None or (item.order_id, item.code) in owned_keys else lost).append(item)
+    if lost:
+        logger.warning(f"[SERVICE API] {service}: bỏ {len(lost)} mã không còn do {worker_id} giữ "
+                       f"(lease hết hạn / đã có worker khác nhận): "
+                       f"{', '.join(item.code for item in lost[:10])}")
+    return kept, lost
+
+
+@contextmanager
+def _lease_heartbeat(worker_id: str = CLAIM_WORKER_ID) -> Iterator[None]:
+    """Gia hạn lease của worker mỗi 1/3 CLAIM_LEASE_SECONDS trong lúc batch đang chạy"""
+    if not WORK_CLAIM_ENABLED:
+        yield
+        return
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(max(CLAIM_LEASE_SECONDS / 3, 1.0)):
+            db_renew_leases(worker_id, CLAIM_LEASE_SECONDS)
+
+    thread = threading.Thread(target=beat, name="lease-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def execute_work_items(service: str, items: List[WorkItem]) -> List[WorkResult]:
+    """
+    Chạy pipeline Selenium cho các WorkItem, trả kết quả theo thứ tự đầu vào.
+
+    Backlog từ SHARD_MIN_CODES mã trở lên và SHARD_PROCESSES > 1 => chia cho nhiều tiến trình
+    (sharded_executor); còn lại chạy 1 lần pipeline trong tiến trình cho cả batch (nhiều đơn).
+    Mã worker không còn giữ lease không được chạy, kết quả status "skipped".
+    """
+    service_type = _service_type(service)
+    spec = SERVICE_SPECS[service_type]
+
+    kept, lost = _drop_lost_claims(service, items)
+    tasks = [(item.code, item.order_id) for item in kept]
+    rows: List[Dict[str, Any]] = []
+    if tasks:
+        with _lease_heartbeat():
+            if SHARD_PROCESSES > 1 and len(tasks) >= SHARD_MIN_CODES:
+                rows = run_sharded(service_type, tasks)
+            else:
+                rows = run_service_tasks(spec, tasks)
+    by_key: Dict[tuple, Dict[str, Any]] = {(row.get("order_id"), row.get("code")): row for row in rows}
+    lost_ids = {id(item) for item in lost}
+
+    results = []
+    for item in items:
+        if id(item) in lost_ids:
+            results.append(WorkResult(service, item.code, item.order_id, "skipped",
+                                      message="Mã đã được worker khác nhận (lease hết hạn), không xử lý lại"))
+            continue
+        row = by_key.get((item.order_id, item.code))
+        if row is None:
+            results.append(WorkResult(service, item.code, item.order_id, "failed", message="Không có kết quả"))
+            continue
+        results.append(WorkResult(service, item.code, item.order_id, row.get("status", "failed"),
+                                  row.get("amount"), row.get("message")))
+    return results
+
+
+def run_service_batch(service: str, limit: Optional[int] = None) -> List[WorkResult]:
+    """Nhận tối đa limit mã đang chờ rồi xử lý (dùng cho cron)"""
+    items = claim_work_items(service, limit)
+    if not items:
+        return []
+    logger.info(f"[SERVICE API] {service}: xử lý {len(items)} mã")
+    return execute_work_items(service, items)
+
+
+__all__ = [
+    "SERVICE_TYPES",
+    "WorkItem",
+    "WorkResult",
+    "parse_work_line",
+    "fetch_work_items",
+    "claim_work_items",
+    "execute_work_items",
+    "run_service_batch",
+]
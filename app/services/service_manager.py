@@ -1,5 +1,6 @@
 """
 Service Manager - Quản lý tất cả 6 dịch vụ với 12 hàm chính
+Các hàm ở đây chỉ là lớp GUI (tkinter) bọc quanh app/services/service_api.py
 """
 
 import logging
@@ -12,9 +13,7 @@ from ..config import Config
 from ..db import (
     update_database_immediately, 
     db_find_order_id, 
-    db_fetch_service_data
 )
-from ..utils.api_client import fetch_api_data
 from ..utils.browser import driver, automation_lock, get_error_alert_text, get_info_alert_text
 from ..utils.ui_helpers import (
     populate_text_widget,
@@ -29,429 +28,141 @@ from ..utils.ui_helpers import (
     stop_tool,
 )
 from ..utils.excel_export import export_excel
+from .service_api import claim_work_items, execute_work_items, parse_work_line
 
 logger = logging.getLogger(__name__)
 
 # ============================================================================
-# 1. FTTH SERVICE - 2 hàm chính
+# HÀM CHUNG: GUI bọc quanh service_api (pure-data)
 # ============================================================================
 
-def get_data_ftth(text_widget, order_entry: Optional[ttk.Entry] = None):
-    """Get dữ liệu FTTH"""
+def _load_work_items(service: str, label: str, text_widget, limit: Optional[int] = None,
+                     payment_type: Optional[str] = None) -> int:
+    """Claim WorkItem qua service_api rồi hiển thị code|order_id lên text widget"""
     try:
-        data = db_fetch_service_data("tra_cuu_ftth")
-        if data and "subscriber_codes" in data:
-            codes = [c.strip() for c in data.get("subscriber_codes", [])]
-            
-            # Ghép code|order_id từ code_order_map
-            code_order_map = data.get("code_order_map", [])
-            display_codes = []
-            for m in code_order_map:
-                code_clean = (m.get("code") or "").strip()
-                oid = m.get("orderId") or ""
-                display_codes.append(f"{code_clean}|{oid}")
-            populate_text_widget(text_widget, display_codes)
-            
-            # Thông báo
-            count = len(codes)
-            info_msg = f"Đã tải {count} mã thuê bao FTTH"
-            logger.info(info_msg)
-        else:
-            logger.info("Không có dữ liệu FTTH từ DB")
+        items = claim_work_items(service, limit, payment_type)
+        if not items:
+            logger.info(f"Không có dữ liệu {label} từ DB")
+            return 0
+        populate_text_widget(text_widget, [item.to_line() for item in items])
+        logger.info(f"Đã tải {len(items)} mã {label}")
+        return len(items)
     except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu FTTH: {e}")
+        logger.error(f"Lỗi lấy dữ liệu {label}: {e}")
+        return 0
 
-def lookup_ftth(tkinp_ctm, tkinp_ctmed, tkinp_order: Optional[ttk.Entry] = None):
-    """Bắt đầu tra cứu FTTH"""
+def _run_work_items(service: str, label: str, tkinp_ctm, tkinp_ctmed, excel_title: str):
+    """Đọc mã từ text widget, chạy qua service_api và hiển thị/xuất kết quả"""
     try:
         delete_ctmed(tkinp_ctmed)
         update_stop_flag()
         
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
+        lines = tkinp_ctm.get("1.0", "end-1c").splitlines()
+        if not valid_data([lines]):
             return False
         
-        # Xử lý từng mã
+        items = [item for item in (parse_work_line(service, line) for line in lines) if item]
+        logger.info(f"Đang xử lý {len(items)} mã {label}")
+        results = execute_work_items(service, items)
+        
         data_rows = []
-        for raw in cbils:
-            raw = (raw or "").strip()
-            if not raw:
-                continue
-            
-            # Tách code|order_id
-            if "|" in raw:
-                cbil, order_id_val = raw.split("|", 1)
-                cbil = cbil.strip()
-                order_id_val = order_id_val.strip()
+        for result in results:
+            if result.ok:
+                data_rows.append([result.code, result.amount, result.message or f"{label} ok"])
+                insert_ctmed(tkinp_ctmed, f"{result.code} - {result.amount}")
+            elif result.status == "skipped":
+                # Lease hết hạn trước khi bấm Run, mã đã được cron/worker khác nhận
+                data_rows.append([result.code, 0, result.message])
+                insert_ctmed(tkinp_ctmed, f"{result.code} - Bỏ qua (worker khác đã nhận)")
             else:
-                cbil = raw
-                order_id_val = None
-            
-            try:
-                logger.info(f"Đang xử lý FTTH: {cbil}")
-                # TODO: Gọi hàm xử lý FTTH cụ thể
-                data_rows.append([cbil, "Đã xử lý", "FTTH lookup ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý FTTH {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
+                data_rows.append([result.code, 0, f"Lỗi: {result.message}"])
+                insert_ctmed(tkinp_ctmed, f"{result.code} - Lỗi")
         
         # Xuất Excel
         if data_rows:
-            export_excel(data_rows, "Tra cứu FTTH")
+            export_excel(data_rows, excel_title)
+        return True
             
     except Exception as e:
-        logger.error(f"Lỗi tra cứu FTTH: {e}")
+        logger.error(f"Lỗi {excel_title}: {e}")
+        return False
+
+# ============================================================================
+# 1. FTTH SERVICE - 2 hàm chính
+# ============================================================================
+
+def get_data_ftth(text_widget, order_entry: Optional[ttk.Entry] = None, limit: Optional[int] = None) -> int:
+    """Get dữ liệu FTTH (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    return _load_work_items("ftth", "thuê bao FTTH", text_widget, limit)
+
+def lookup_ftth(tkinp_ctm, tkinp_ctmed, tkinp_order: Optional[ttk.Entry] = None):
+    """Bắt đầu tra cứu FTTH"""
+    return _run_work_items("ftth", "FTTH", tkinp_ctm, tkinp_ctmed, "Tra cứu FTTH")
 
 # ============================================================================
 # 2. EVN SERVICE - 2 hàm chính
 # ============================================================================
 
-def get_data_evn(text_widget, phone_widget, pin_widget):
-    """Get dữ liệu EVN"""
-    try:
-        data = fetch_api_data("gach_dien_evn")
-        if data:
-            if "bill_codes" in data:
-                populate_text_widget(text_widget, data["bill_codes"])
-            if "receiver_phone" in data:
-                populate_entry_widget(phone_widget, data["receiver_phone"])
-            populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
-            
-            count = len(data.get("bill_codes", []))
-            logger.info(f"Đã tải {count} mã hóa đơn điện EVN")
-        else:
-            logger.info("Không có dữ liệu EVN từ DB")
-    except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu EVN: {e}")
+def get_data_evn(text_widget, phone_widget, pin_widget, limit: Optional[int] = None) -> int:
+    """Get dữ liệu EVN (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
+    return _load_work_items("evn", "hóa đơn điện EVN", text_widget, limit)
 
 def debt_electric(tkinp_ctm, tkinp_ctmed, tkinp_phone, tkinp_pin):
     """Bắt đầu gạch điện EVN"""
-    try:
-        delete_ctmed(tkinp_ctmed)
-        update_stop_flag()
-        
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
-            return False
-        
-        # Xử lý từng mã
-        data_rows = []
-        for cbil in cbils:
-            cbil = cbil.strip()
-            if not cbil:
-                continue
-            
-            try:
-                logger.info(f"Đang xử lý EVN: {cbil}")
-                # TODO: Gọi hàm xử lý EVN cụ thể
-                data_rows.append([cbil, "Đã xử lý", "EVN payment ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý EVN {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
-        
-        # Xuất Excel
-        if data_rows:
-            export_excel(data_rows, "Thanh toán điện EVN")
-            
-    except Exception as e:
-        logger.error(f"Lỗi thanh toán điện EVN: {e}")
+    return _run_work_items("evn", "EVN", tkinp_ctm, tkinp_ctmed, "Thanh toán điện EVN")
 
 # ============================================================================
 # 3. TOPUP MULTI SERVICE - 2 hàm chính
 # ============================================================================
 
-def get_data_multi_network(text_widget, pin_widget, form_widget, amount_widget, payment_type: str = None):
-    """Get dữ liệu Topup Multi"""
-    try:
-        data = db_fetch_service_data("nap_tien_da_mang", payment_type)
-        if data and "subscriber_codes" in data:
-            codes = [c.strip() for c in data.get("subscriber_codes", [])]
-            
-            # Ghép code|order_id từ code_order_map
-            code_order_map = data.get("code_order_map", [])
-            display_codes = []
-            for m in code_order_map:
-                code_clean = (m.get("code") or "").strip()
-                oid = m.get("orderId") or ""
-                display_codes.append(f"{code_clean}|{oid}")
-            
-            populate_text_widget(text_widget, display_codes)
-            populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
-            
-            count = len(codes)
-            logger.info(f"Đã tải {count} mã topup multi")
-        else:
-            logger.info("Không có dữ liệu topup multi từ DB")
-    except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu topup multi: {e}")
+def get_data_multi_network(text_widget, pin_widget, form_widget, amount_widget, payment_type: str = None,
+                           limit: Optional[int] = None) -> int:
+    """Get dữ liệu Topup Multi (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
+    return _load_work_items("topup_multi", "topup multi", text_widget, limit, payment_type)
 
 def payment_phone_multi(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkinp_form, tkinp_amount):
     """Bắt đầu nạp tiền đa mạng"""
-    try:
-        delete_ctmed(tkinp_ctmed)
-        update_stop_flag()
-        
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
-            return False
-        
-        # Xử lý từng mã
-        data_rows = []
-        for raw in cbils:
-            raw = (raw or "").strip()
-            if not raw:
-                continue
-            
-            # Tách code|order_id
-            if "|" in raw:
-                cbil, order_id_val = raw.split("|", 1)
-                cbil = cbil.strip()
-                order_id_val = order_id_val.strip()
-            else:
-                cbil = raw
-                order_id_val = None
-            
-            try:
-                logger.info(f"Đang xử lý topup multi: {cbil}")
-                # TODO: Gọi hàm xử lý topup multi cụ thể
-                data_rows.append([cbil, "Đã xử lý", "Topup multi ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý topup multi {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
-        
-        # Xuất Excel
-        if data_rows:
-            export_excel(data_rows, "Nạp tiền đa mạng")
-            
-    except Exception as e:
-        logger.error(f"Lỗi nạp tiền đa mạng: {e}")
+    return _run_work_items("topup_multi", "Topup multi", tkinp_ctm, tkinp_ctmed, "Nạp tiền đa mạng")
 
 # ============================================================================
 # 4. TOPUP VIETTEL SERVICE - 2 hàm chính
 # ============================================================================
 
-def get_data_viettel(text_widget, pin_widget):
-    """Get dữ liệu Topup Viettel"""
-    try:
-        data = fetch_api_data("nap_tien_viettel")
-        if data and "subscriber_codes" in data:
-            codes = [c.strip() for c in data.get("subscriber_codes", [])]
-            
-            # Ghép code|order_id từ code_order_map
-            code_order_map = data.get("code_order_map", [])
-            display_codes = []
-            for m in code_order_map:
-                code_clean = (m.get("code") or "").strip()
-                oid = m.get("orderId") or ""
-                display_codes.append(f"{code_clean}|{oid}")
-            
-            populate_text_widget(text_widget, display_codes)
-            populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
-            
-            count = len(codes)
-            logger.info(f"Đã tải {count} mã topup viettel")
-        else:
-            logger.info("Không có dữ liệu topup viettel từ DB")
-    except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu topup viettel: {e}")
+def get_data_viettel(text_widget, pin_widget, limit: Optional[int] = None) -> int:
+    """Get dữ liệu Topup Viettel (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
+    return _load_work_items("topup_viettel", "topup viettel", text_widget, limit)
 
 def payment_phone_viettel(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkinp_amount):
     """Bắt đầu nạp tiền Viettel"""
-    try:
-        delete_ctmed(tkinp_ctmed)
-        update_stop_flag()
-        
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
-            return False
-        
-        # Xử lý từng mã
-        data_rows = []
-        for raw in cbils:
-            raw = (raw or "").strip()
-            if not raw:
-                continue
-            
-            # Tách code|order_id
-            if "|" in raw:
-                cbil, order_id_val = raw.split("|", 1)
-                cbil = cbil.strip()
-                order_id_val = order_id_val.strip()
-            else:
-                cbil = raw
-                order_id_val = None
-            
-            try:
-                logger.info(f"Đang xử lý topup viettel: {cbil}")
-                # TODO: Gọi hàm xử lý topup viettel cụ thể
-                data_rows.append([cbil, "Đã xử lý", "Topup viettel ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý topup viettel {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
-        
-        # Xuất Excel
-        if data_rows:
-            export_excel(data_rows, "Nạp tiền Viettel")
-            
-    except Exception as e:
-        logger.error(f"Lỗi nạp tiền Viettel: {e}")
+    return _run_work_items("topup_viettel", "Topup viettel", tkinp_ctm, tkinp_ctmed, "Nạp tiền Viettel")
 
 # ============================================================================
 # 5. TV-INTERNET SERVICE - 2 hàm chính
 # ============================================================================
 
-def get_data_tv_internet(text_widget, pin_widget):
-    """Get dữ liệu TV-Internet"""
-    try:
-        data = db_fetch_service_data("thanh_toan_tv_internet")
-        if data and "subscriber_codes" in data:
-            codes = [c.strip() for c in data.get("subscriber_codes", [])]
-            
-            # Ghép code|order_id từ code_order_map
-            code_order_map = data.get("code_order_map", [])
-            display_codes = []
-            for m in code_order_map:
-                code_clean = (m.get("code") or "").strip()
-                oid = m.get("orderId") or ""
-                display_codes.append(f"{code_clean}|{oid}")
-            
-            populate_text_widget(text_widget, display_codes)
-            populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
-            
-            count = len(codes)
-            logger.info(f"Đã tải {count} mã TV-Internet")
-        else:
-            logger.info("Không có dữ liệu TV-Internet từ DB")
-    except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu TV-Internet: {e}")
+def get_data_tv_internet(text_widget, pin_widget, limit: Optional[int] = None) -> int:
+    """Get dữ liệu TV-Internet (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    populate_entry_widget(pin_widget, Config.DEFAULT_PIN)
+    return _load_work_items("tv_internet", "TV-Internet", text_widget, limit)
 
 def payment_internet(tkinp_ctm, tkinp_ctmed, tkinp_pin):
     """Bắt đầu thanh toán TV-Internet"""
-    try:
-        delete_ctmed(tkinp_ctmed)
-        update_stop_flag()
-        
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
-            return False
-        
-        # Xử lý từng mã
-        data_rows = []
-        for raw in cbils:
-            raw = (raw or "").strip()
-            if not raw:
-                continue
-            
-            # Tách code|order_id
-            if "|" in raw:
-                cbil, order_id_val = raw.split("|", 1)
-                cbil = cbil.strip()
-                order_id_val = order_id_val.strip()
-            else:
-                cbil = raw
-                order_id_val = None
-            
-            try:
-                logger.info(f"Đang xử lý TV-Internet: {cbil}")
-                # TODO: Gọi hàm xử lý TV-Internet cụ thể
-                data_rows.append([cbil, "Đã xử lý", "TV-Internet payment ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý TV-Internet {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
-        
-        # Xuất Excel
-        if data_rows:
-            export_excel(data_rows, "Thanh toán TV-Internet")
-            
-    except Exception as e:
-        logger.error(f"Lỗi thanh toán TV-Internet: {e}")
+    return _run_work_items("tv_internet", "TV-Internet", tkinp_ctm, tkinp_ctmed, "Thanh toán TV-Internet")
 
 # ============================================================================
 # 6. POSTPAID SERVICE - 2 hàm chính
 # ============================================================================
 
-def get_data_postpaid(text_widget):
-    """Get dữ liệu Postpaid"""
-    try:
-        data = db_fetch_service_data("tra_cuu_no_tra_sau")
-        if data and "subscriber_codes" in data:
-            codes = [c.strip() for c in data.get("subscriber_codes", [])]
-            
-            # Ghép code|order_id từ code_order_map
-            code_order_map = data.get("code_order_map", [])
-            display_codes = []
-            for m in code_order_map:
-                code_clean = (m.get("code") or "").strip()
-                oid = m.get("orderId") or ""
-                display_codes.append(f"{code_clean}|{oid}")
-            
-            populate_text_widget(text_widget, display_codes)
-            
-            count = len(codes)
-            logger.info(f"Đã tải {count} mã postpaid")
-        else:
-            logger.info("Không có dữ liệu postpaid từ DB")
-    except Exception as e:
-        logger.error(f"Lỗi lấy dữ liệu postpaid: {e}")
+def get_data_postpaid(text_widget, limit: Optional[int] = None) -> int:
+    """Get dữ liệu Postpaid (limit = số mã tối đa mỗi batch), trả về số mã đã tải"""
+    return _load_work_items("postpaid", "postpaid", text_widget, limit)
 
 def payment_phone_postpaid(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkinp_form, tkinp_amount):
     """Bắt đầu tra cứu nợ trả sau"""
-    try:
-        delete_ctmed(tkinp_ctmed)
-        update_stop_flag()
-        
-        cbils = tkinp_ctm.get("1.0", "end-1c").splitlines()
-        if not valid_data([cbils]):
-            return False
-        
-        # Xử lý từng mã
-        data_rows = []
-        for raw in cbils:
-            raw = (raw or "").strip()
-            if not raw:
-                continue
-            
-            # Tách code|order_id
-            if "|" in raw:
-                cbil, order_id_val = raw.split("|", 1)
-                cbil = cbil.strip()
-                order_id_val = order_id_val.strip()
-            else:
-                cbil = raw
-                order_id_val = None
-            
-            try:
-                logger.info(f"Đang xử lý postpaid: {cbil}")
-                # TODO: Gọi hàm xử lý postpaid cụ thể
-                data_rows.append([cbil, "Đã xử lý", "Postpaid lookup ok"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Đã xử lý")
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý postpaid {cbil}: {e}")
-                data_rows.append([cbil, 0, f"Lỗi: {e}"])
-                insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi")
-        
-        # Xuất Excel
-        if data_rows:
-            export_excel(data_rows, "Tra cứu nợ trả sau")
-            
-    except Exception as e:
-        logger.error(f"Lỗi tra cứu nợ trả sau: {e}")
+    return _run_work_items("postpaid", "Postpaid", tkinp_ctm, tkinp_ctmed, "Tra cứu nợ trả sau")
 
 # ============================================================================
 # HÀM ĐIỀU KHIỂN SELENIUM CHUNG
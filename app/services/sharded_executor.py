@@ -0,0 +1,302 @@
+"""Chia backlog 1 dịch vụ cho K tiến trình (mỗi tiến trình 1 Chrome + 1 phiên đăng nhập), có work stealing và giới hạn tốc độ chung"""
+
+import glob
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import LOG_FILE, RESULT_WAL_FILE, SHARD_PROCESSES, SHARD_RATE_PER_MINUTE
+from ..db import db_hold_for_reconciliation, db_release_claims
+from ..utils.browser_pool import BrowserPool, BrowserPoolError
+from ..utils.logging_setup import setup_logging
+from ..utils.result_writer import ResultWriter
+from ..utils.timing import get_span_recorder
+
+logger = logging.getLogger(__name__)
+
+# (idx, code, order_id)
+ShardTask = Tuple[int, str, Optional[str]]
+
+_RESULT_POLL = 1.0
+_NOT_STARTED = "Shard dừng trước khi xử lý, trả về hàng chờ"
+_UNKNOWN = "Shard dừng giữa lúc xử lý, kết quả không rõ - cần đối soát"
+
+# Mã không có kết quả: chưa shard nào bắt đầu => pending (chạy lại được);
+# đã bắt đầu mà shard chết => unknown (giao dịch có thể đã thành công trên portal)
+STATUS_PENDING = "pending"
+STATUS_UNKNOWN = "unknown"
+
+
+def shard_wal_path(service_type: str, shard: int) -> str:
+    """WAL riêng của shard k cho 1 dịch vụ (các dịch vụ chạy song song không dùng chung file)"""
+    return f"{RESULT_WAL_FILE}.shard.{service_type}.{shard}"
+
+
+def replay_shard_wals(service_type: str) -> int:
+    """
+    Ghi xuống DB mọi kết quả còn trong WAL shard của dịch vụ (mọi chỉ số k, kể cả từ lần chạy trước
+    có SHARD_PROCESSES lớn hơn). Chỉ gọi khi không có shard nào của dịch vụ đang chạy.
+    """
+    base = glob.escape(RESULT_WAL_FILE)
+    # .shard{k}: tên WAL của bản cũ (chưa tách theo dịch vụ)
+    paths = glob.glob(f"{base}.shard.{glob.escape(service_type)}.*") + glob.glob(f"{base}.shard[0-9]*")
+    replayed = 0
+    for path in sorted(paths):
+        if path.endswith(".tmp"):
+            continue
+        try:
+            writer = ResultWriter(wal_path=path)
+            replayed += writer.recover()
+            writer.close()
+        except Exception as e:
+            logger.error(f"[SHARD] Lỗi ghi lại WAL {path}: {e}")
+    if replayed:
+        logger.info(f"[SHARD] {service_type}: đã ghi lại {replayed} kết quả từ WAL shard")
+    return replayed
+
+
+class SharedRateLimiter:
+    """
+    Giới hạn tốc độ chung cho mọi tiến trình shard: các lượt gửi cách nhau tối thiểu
+    60/rate_per_minute giây (lịch dùng chung qua mp.Value). rate_per_minute <= 0 = không giới hạn.
+    """
+
+    def __init__(self, rate_per_minute: float, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next = ctx.Value('d', 0.0, lock=False)
+        self._lock = ctx.Lock()
+
+    def acquire(self) -> float:
+        """Chờ tới lượt của mình, trả về số giây đã chờ"""
+        if self.interval <= 0:
+            return 0.0
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.value)
+            self._next.value = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+@dataclass
+class ShardStats:
+    """Thống kê 1 tiến trình shard"""
+    shard: int
+    assigned: int = 0
+    processed: int = 0
+    stolen: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    rate_wait_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def _next_task(shard: int, queues: List[Any]) -> Tuple[Optional[ShardTask], bool]:
+    """Lấy mã từ hàng đợi của shard; hết thì lấy trộm (steal) của shard khác. (None, False) = hết việc"""
+    order = [shard] + [i for i in range(len(queues)) if i != shard]
+    for i in order:
+        try:
+            return queues[i].get_nowait(), i != shard
+        except queue.Empty:
+            continue
+    return None, False
+
+
+def _shard_main(shard: int, service_type: str, queues: List[Any], results: Any,
+                limiter: SharedRateLimiter, total: int) -> None:
+    """Tiến trình shard: 1 BrowserPool 1 slot riêng, lấy mã đến khi mọi hàng đợi đều rỗng"""
+    # Import trong tiến trình con (spawn): spec chứa lambda nên không pickle được
+    from ..process import SERVICE_SPECS
+    from .pipeline import ServicePipeline
+
+    # Tiến trình spawn không kế thừa handler của cha: mỗi shard 1 file log riêng (app.shard{k}.log)
+    if LOG_FILE:
+        base, ext = os.path.splitext(LOG_FILE)
+        setup_logging(log_file=f"{base}.shard{shard}{ext}")
+    else:
+        setup_logging(log_file=None)
+
+    stats = ShardStats(shard=shard)
+    # WAL còn sót của lần trước đã được tiến trình cha ghi lại (replay_shard_wals) trước khi chia việc
+    writer = ResultWriter(wal_path=shard_wal_path(service_type, shard))
+    pool = BrowserPool(size=1, first_slot=shard)
+    try:
+        pipeline = ServicePipeline(SERVICE_SPECS[service_type], concurrency=1)
+        pipeline.result_writer = writer
+        while True:
+            task, stolen = _next_task(shard, queues)
+            if task is None:
+                break
+            idx, code, order_id = task
+            stats.rate_wait_seconds += limiter.acquire()
+            started = time.monotonic()
+            try:
+                with pool.lease() as driver:
+                    # Báo cha trước khi gửi form: shard chết sau điểm này => mã này "unknown"
+                    results.put(("start", idx, None))
+                    row = pipeline.process_one(driver, idx, code, order_id, total)
+            except BrowserPoolError as e:
+                # Chrome của shard này hỏng => trả mã lại cho shard khác lấy
+                queues[shard].put(task)
+                stats.error = str(e)
+                logger.error(f"[SHARD {shard}] Không mượn được Chrome, dừng shard: {e}")
+                break
+            finally:
+                stats.busy_seconds += time.monotonic() - started
+            stats.processed += 1
+            stats.stolen += int(stolen)
+            if row is not None:
+                if row.get("status") == "success":
+                    stats.succeeded += 1
+                else:
+                    stats.failed += 1
+            # row None = mã rỗng (engine bỏ qua, không có kết quả)
+            results.put(("result", idx, row))
+    except Exception as e:
+        stats.error = str(e)
+        logger.error(f"[SHARD {shard}] Lỗi: {e}")
+    finally:
+        try:
+            writer.close()
+        except Exception as e:
+            logger.error(f"[SHARD {shard}] Lỗi flush kết quả: {e}")
+        pool.shutdown()
+        get_span_recorder().flush()
+        results.put(("done", shard, stats))
+
+
+def _split(tasks: List[ShardTask], shards: int) -> List[List[ShardTask]]:
+    """Chia liên tiếp (mã cùng order nằm gần nhau) thành shards phần gần bằng nhau"""
+    size, rest = divmod(len(tasks), shards)
+    parts, start = [], 0
+    for k in range(shards):
+        end = start + size + (1 if k < rest else 0)
+        parts.append(tasks[start:end])
+        start = end
+    return parts
+
+
+def format_shard_summary(stats: List[ShardStats], elapsed: float) -> str:
+    """Bảng tổng hợp các shard + throughput"""
+    processed = sum(s.processed for s in stats)
+    lines = [f"   ⏱️ {processed} mã / {elapsed:.1f}s ({processed / elapsed * 60 if elapsed > 0 else 0:.1f} mã/phút)"]
+    for s in sorted(stats, key=lambda s: s.shard):
+        per_code = s.busy_seconds / s.processed if s.processed else 0.0
+        lines.append(f"   • shard {s.shard}: {s.processed}/{s.assigned} mã (trộm {s.stolen}), "
+                     f"✅ {s.succeeded} ❌ {s.failed}, {per_code:.1f}s/mã, chờ rate {s.rate_wait_seconds:.1f}s"
+                     f"{f', lỗi: {s.error}' if s.error else ''}")
+    return "\n".join(lines)
+
+
+def run_sharded(service_type: str, tasks: List[Tuple[str, Optional[str]]], shards: Optional[int] = None,
+                rate_per_minute: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Xử lý [(code, order_id)] trên nhiều tiến trình, trả về kết quả theo thứ tự đầu vào
+    (như run_service_pipeline, thêm key order_id). Mỗi tiến trình ghi DB qua ResultWriter + WAL riêng;
+    sau khi các shard dừng, tiến trình cha ghi lại mọi WAL shard rồi mới xét mã thiếu kết quả.
+    """
+    shards = max(1, min(shards or SHARD_PROCESSES, len(tasks)))
+    rate = SHARD_RATE_PER_MINUTE if rate_per_minute is None else rate_per_minute
+    indexed: List[ShardTask] = [(i, code, order_id) for i, (code, order_id) in enumerate(tasks)]
+    logger.info(f"🚀 [SHARD] {service_type}: {len(tasks)} mã trên {shards} tiến trình"
+                f"{f', tối đa {rate:g} mã/phút' if rate > 0 else ''}")
+
+    replay_shard_wals(service_type)
+    ctx = mp.get_context("spawn")
+    started = time.monotonic()
+    rows: Dict[int, Dict[str, Any]] = {}
+    handled = set()
+    begun = set()
+    stats: Dict[int, ShardStats] = {}
+    parts = _split(indexed, shards)
+    assigned = {k: len(part) for k, part in enumerate(parts)}
+    with ctx.Manager() as manager:
+        queues = [manager.Queue() for _ in range(shards)]
+        for k, part in enumerate(parts):
+            for task in part:
+                queues[k].put(task)
+        results = ctx.Queue()
+        limiter = SharedRateLimiter(rate, ctx)
+        processes = [
+            ctx.Process(target=_shard_main, args=(k, service_type, queues, results, limiter, len(tasks)),
+                        name=f"shard-{service_type}-{k}", daemon=False)
+            for k in range(shards)
+        ]
+        for p in processes:
+            p.start()
+
+        while len(stats) < shards:
+            try:
+                kind, key, payload = results.get(timeout=_RESULT_POLL)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    # Tiến trình chết không kịp gửi "done" (crash Chrome/driver)
+                    break
+                continue
+            if kind == "start":
+                begun.add(key)
+            elif kind == "result":
+                handled.add(key)
+                if payload is not None:
+                    rows[key] = {**payload, "order_id": indexed[key][2]}
+            else:
+                payload.assigned = assigned.get(key, 0)
+                stats[key] = payload
+        for p in processes:
+            p.join(timeout=30)
+
+        leftovers = []
+        for q in queues:
+            while True:
+                try:
+                    leftovers.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+    # Shard chết (crash Chrome/driver) có thể để kết quả trong WAL mà chưa flush / chưa gửi về cha
+    replay_shard_wals(service_type)
+    missing = [t for t in indexed if t[0] not in handled]
+    if missing:
+        not_started = [t for t in missing if t[0] not in begun]
+        unknown = [t for t in missing if t[0] in begun]
+        for idx, code, order_id in not_started:
+            rows[idx] = {"code": code, "amount": None, "status": STATUS_PENDING, "message": _NOT_STARTED,
+                         "order_id": order_id}
+        for idx, code, order_id in unknown:
+            rows[idx] = {"code": code, "amount": None, "status": STATUS_UNKNOWN, "message": _UNKNOWN,
+                         "order_id": order_id}
+        # Kết quả đã ghi lại từ WAL thì giao dịch không còn processing nên 2 lệnh dưới bỏ qua
+        db_release_claims([order_id for _, _, order_id in not_started if order_id])
+        db_hold_for_reconciliation([order_id for _, _, order_id in unknown if order_id], _UNKNOWN)
+        logger.warning(f"[SHARD] {service_type}: {len(missing)} mã không có kết quả: {len(not_started)} chưa xử lý "
+                       f"(trả về pending, {len(leftovers)} còn trong hàng đợi), {len(unknown)} không rõ kết quả "
+                       f"(giữ để đối soát: {', '.join(code for _, code, _ in unknown[:10])})")
+
+    elapsed = time.monotonic() - started
+    summary = [stats.get(k) or ShardStats(shard=k, assigned=assigned.get(k, 0), error="Tiến trình dừng bất thường")
+               for k in range(shards)]
+    results_list = [rows[i] for i in sorted(rows)]
+    logger.info(f"📊 [SHARD] Tổng kết {service_type}: ✅ {len([r for r in results_list if r['status'] == 'success'])} "
+                f"❌ {len([r for r in results_list if r['status'] == 'failed'])} / {len(results_list)} mã, "
+                f"{shards} tiến trình\n{format_shard_summary(summary, elapsed)}")
+    return results_list
+
+
+__all__ = [
+    "STATUS_PENDING",
+    "STATUS_UNKNOWN",
+    "shard_wal_path",
+    "replay_shard_wals",
+    "SharedRateLimiter",
+    "ShardStats",
+    "format_shard_summary",
+    "run_sharded",
+]
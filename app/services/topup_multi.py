@@ -27,10 +27,15 @@ from ..utils.ui_helpers import (
     stop_tool,
 )
 from ..utils.api_client import fetch_api_data
+from ..utils.page_state import get_page_tracker
+from ..navigate import CHARGECARD_URL, open_service_page
 from ..utils.excel_export import export_excel
 
 logger = logging.getLogger(__name__)
 
+# Input trên form chargecard.jsf cần xoá khi dùng lại trang cho mã tiếp theo
+CHARGECARD_INPUT_IDS = ["indexForm:phoneNumberId", "indexForm:transAmountId_input", "indexForm:pinId"]
+
 # Biến global để lưu Order ID hiện tại
 current_order_id = None
 stt_complete = "Đã xử lý"
@@ -96,15 +101,14 @@ def get_data_multi_network(text_widget, pin_widget, form_widget, amount_widget,
         logger.error(f"Lỗi lấy dữ liệu đa mạng: {e}")
         #messagebox.showerror(Config.TITLE, f"Lỗi lấy dữ liệu đa mạng: {e}")
 
-def navigate_to_topup_multinetwork_page():
-    """Điều hướng đến trang nạp tiền đa mạng."""
+def navigate_to_topup_multinetwork_page(force: bool = False):
+    """Điều hướng đến trang nạp tiền đa mạng (đang mở sẵn thì chỉ reset form tại chỗ)."""
     try:
-        
-        target_url = "https://kpp.bankplus.vn/pages/chargecard.jsf"
-        driver.get(target_url)
-        # Chờ input số điện thoại xuất hiện
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "indexForm:phoneNumberId")))
-        time.sleep(2)
+        get_page_tracker().load_form(
+            driver, "topup_multi", CHARGECARD_URL, "indexForm:phoneNumberId",
+            lambda d: open_service_page(d, CHARGECARD_URL, "indexForm:phoneNumberId", "topup_multi.navigate"),
+            input_ids=CHARGECARD_INPUT_IDS, step="topup_multi.form", force=force,
+        )
     except Exception as e:
         logger.warning(f"Không thể điều hướng Topup đa mạng: {e}")
         raise
@@ -161,7 +165,7 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                 amount = amount.strip()
                 order_id_val = order_id_val.strip()
                 rsl_amount = handle_choose_amount(amount)
-                print(f"sdt: {cbil}, amount: {amount}, order_id: {order_id_val}")
+                logger.debug("[TOPUP_MULTI] sdt: %s, amount: %s, order_id: %s", cbil, amount, order_id_val)
             else:
                 if "|" in raw:
                     cbil, order_id_val = raw.split("|", 1)
@@ -172,10 +176,9 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                     order_id_val = None
 
             if not stop_flag and cbil.strip() != "":
-                print(f"   🔧 Đang xử lý {cbil} | Order ID: {order_id_val or 'Không có'}")
+                logger.debug("[TOPUP_MULTI] 🔧 Đang xử lý %s | Order ID: %s", cbil, order_id_val or 'Không có')
                 update_database_immediately(order_id_val, cbil, "processing", None, f"Đang xử lý {cbil}", None)
                 navigate_to_topup_multinetwork_page()
-                time.sleep(3)
                 phonenum = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "indexForm:phoneNumberId")))
                 phonenum.clear()
                 phonenum.send_keys(cbil)
@@ -236,7 +239,7 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                         # Chờ alert xuất hiện
                         error_text = get_error_alert_text()
                         if error_text:
-                            print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                            logger.warning("[TOPUP_MULTI] ❌ Thanh toán thất bại (alert): %s", error_text)
                             note_text = f"Postpaid payment failed - {cbil} | {error_text}"
                             data_rows.append([cbil, 0, note_text])
                             insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi: {error_text}")
@@ -247,8 +250,8 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                         # Kiểm tra thông báo info
                         info_text = get_info_alert_text()
                         if info_text and ("không còn nợ cước" in info_text.lower()):
-                            print(f"   ℹ️  Có thông báo info: {info_text}")
-                            print(f"   ✅ Không còn nợ cước: Amount = 0")
+                            logger.debug("[TOPUP_MULTI] ℹ️ Có thông báo info: %s", info_text)
+                            logger.debug("[TOPUP_MULTI] ✅ Không còn nợ cước: Amount = 0")
                             
                             note_text = info_text.strip()
                             data_rows.append([cbil, 0, Config.STATUS_COMPLETE])
@@ -259,11 +262,11 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                                 try:
                                     notes_db = f"Postpaid: Không nợ cước - {cbil} | {note_text}"
                                     _ = update_database_immediately(order_id_val, cbil, "success", 0, notes_db, None)
-                                    print(f"      ✅ Database update thành công cho {cbil} (không nợ cước)")
+                                    logger.debug("[TOPUP_MULTI] ✅ Database update thành công cho %s (không nợ cước)", cbil)
                                 except Exception as _e:
                                     logger.warning(f"DB update lỗi (Postpaid no debt) cho {cbil}: {_e}")
                             else:
-                                print(f"      ⚠️  Không có Order ID cho {cbil} - bỏ qua database update")
+                                logger.warning("[TOPUP_MULTI] ⚠️ Không có Order ID cho %s - bỏ qua database update", cbil)
                             
                             continue
 
@@ -305,7 +308,7 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                     # Chờ alert xuất hiện
                     error_text = get_error_alert_text()
                     if error_text:
-                        print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                        logger.warning("[TOPUP_MULTI] ❌ Thanh toán thất bại (alert): %s", error_text)
                         note_text = f"Nạp tiền đa mạng payment failed - {cbil} | {error_text}"
                         data_rows.append([cbil, 0, note_text])
                         if type_sub == 1:
@@ -324,8 +327,8 @@ def payment_phone(tkinp_ctm, tkinp_ctmed, tkinp_pin, tkcbb_form, tkcbb_amount):
                     # Kiểm tra thông báo info
                     info_text = get_info_alert_text()
                     if info_text or ("không còn nợ cước" in info_text.lower()):
-                        print(f"   ℹ️  Có thông báo info: {info_text}")
-                        print(f"   ✅ Không còn nợ cước: Amount = 0")
+                        logger.debug("[TOPUP_MULTI] ℹ️ Có thông báo info: %s", info_text)
+                        logger.debug("[TOPUP_MULTI] ✅ Không còn nợ cước: Amount = 0")
                         
                         note_text = info_text.strip()
                         if type_sub == 1:
@@ -160,7 +160,7 @@ def payment_internet(tkinp_ctm, tkinp_ctmed, tkinp_pin: Optional[ttk.Entry] = No
                 order_id_val = None
 
             try:
-                print(f"   🔧 Đang xử lý {cbil} | Order ID: {order_id_val or 'Không có'}")
+                logger.debug("[TV_INTERNET] 🔧 Đang xử lý %s | Order ID: %s", cbil, order_id_val or 'Không có')
                 
                 navigate_to_tv_internet_page_and_select_radio()
                 time.sleep(3)
@@ -186,7 +186,7 @@ def payment_internet(tkinp_ctm, tkinp_ctmed, tkinp_pin: Optional[ttk.Entry] = No
                  # Chờ alert xuất hiện
                 error_text = get_error_alert_text()
                 if error_text:
-                    print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                    logger.warning("[TV_INTERNET] ❌ Thanh toán thất bại (alert): %s", error_text)
                     note_text = f"TV-Internet payment failed - {cbil} | {error_text}"
                     data_rows.append([cbil, 0, note_text])
                     insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi: {error_text}")
@@ -215,35 +215,35 @@ def payment_internet(tkinp_ctm, tkinp_ctmed, tkinp_pin: Optional[ttk.Entry] = No
                     continue
 
                 # Thực hiện thanh toán
-                print(f"   💳 Nhấn nút thanh toán: {payment_id}")
+                logger.debug("[TV_INTERNET] 💳 Nhấn nút thanh toán: %s", payment_id)
                 payment_btn1 = WebDriverWait(driver, 15).until(
                     EC.element_to_be_clickable((By.ID, payment_id))
                 )
                 payment_btn1.click()
 
-                print(f"   🔐 Điền mã PIN...")
+                logger.debug("[TV_INTERNET] 🔐 Điền mã PIN...")
                 pin_id = WebDriverWait(driver, 15).until(
                     EC.element_to_be_clickable((By.ID, "payMoneyForm:pinId"))
                 )
                 pin_id.clear()
                 pin_id.send_keys(pin)
 
-                print(f"   ✅ Xác nhận thanh toán...")
+                logger.debug("[TV_INTERNET] ✅ Xác nhận thanh toán...")
                 pay_btn = WebDriverWait(driver, 15).until(
                     EC.element_to_be_clickable((By.ID, "payMoneyForm:btnPay"))
                 )
                 pay_btn.click()
 
                 try:
-                    print(f"   ⏳ Kiểm tra modal xác nhận...")
+                    logger.debug("[TV_INTERNET] ⏳ Kiểm tra modal xác nhận...")
                     cfm_modal = WebDriverWait(driver, 3).until(
                         EC.presence_of_element_located((By.ID, "payMoneyForm:dlgConfirm_modal"))
                     )
                     driver.execute_script("arguments[0].style.zIndex = '-99';", cfm_modal)
                 except:
-                    print(f"   ℹ️ Không tìm thấy modal xác nhận, tiếp tục...")
+                    logger.debug("[TV_INTERNET] ℹ️ Không tìm thấy modal xác nhận, tiếp tục...")
 
-                print(f"   ✔️ Nhấn nút xác nhận cuối cùng...")
+                logger.debug("[TV_INTERNET] ✔️ Nhấn nút xác nhận cuối cùng...")
                 confirm_btn = WebDriverWait(driver, 15).until(
                     EC.element_to_be_clickable((By.ID, "payMoneyForm:yesId0"))
                 )
@@ -253,7 +253,7 @@ def payment_internet(tkinp_ctm, tkinp_ctmed, tkinp_pin: Optional[ttk.Entry] = No
                 time.sleep(2)  # Chờ alert xuất hiện
                 error_text = get_error_alert_text()
                 if error_text:
-                    print(f"   ❌ Thanh toán thất bại (alert): {error_text}")
+                    logger.warning("[TV_INTERNET] ❌ Thanh toán thất bại (alert): %s", error_text)
                     note_text = f"TV-Internet payment failed - {cbil} | {error_text}"
                     data_rows.append([cbil, 0, note_text])
                     insert_ctmed(tkinp_ctmed, f"{cbil} - Lỗi: {error_text}")
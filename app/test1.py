@@ -1,3 +1,4 @@
+import logging
 import requests
 from requests.auth import HTTPBasicAuth
 import sys
@@ -9,10 +10,14 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
 from app.db import db_get_account_credentials, db_get_code_by_order_id
+from app.utils.rate_governor import PORTAL_THUHO, get_governor
+from app.utils.timing import span
+
+logger = logging.getLogger(__name__)
 
 API_URL = "https://thuhohpk.com/api/tool-bill-completed"
 
-def mark_bill_completed(order_id: str, auth: tuple = None, timeout: int = 10):
+def mark_bill_completed(order_id: str, auth: tuple = None, timeout: int = 10, session: requests.Session = None):
     """
     Gọi API tool-bill-completed bằng Basic Auth và in ra toàn bộ phản hồi từ server.
     
@@ -20,43 +25,51 @@ def mark_bill_completed(order_id: str, auth: tuple = None, timeout: int = 10):
         order_id: ID của đơn hàng để lấy credentials và code
         auth: Tuple (username, password) - nếu None sẽ lấy từ database
         timeout: Timeout cho request
+        session: requests.Session keep-alive (None thì mở kết nối mới mỗi lần)
     """
     # Lấy code từ database dựa vào order_id
     code = db_get_code_by_order_id(order_id)
     if not code:
-        print(f"   ❌ Không tìm thấy code cho order_id: {order_id}")
+        logger.warning("[MARK_BILL] Không tìm thấy code cho order_id: %s", order_id)
         return {"success": False, "msg": "Không tìm thấy code"}
     
-    print(f"   📋 Lấy được code: {code} cho order_id: {order_id}")
+    logger.debug("[MARK_BILL] Lấy được code: %s cho order_id: %s", code, order_id)
     
-    credentials = db_get_account_credentials(order_id)
-    email, password = credentials
-    auth = (email, password)
-    print(f"📧 Sử dụng credentials từ database: {email}")
+    if auth is None:
+        credentials = db_get_account_credentials(order_id)
+        if not credentials:
+            return {"success": False, "msg": "Không tìm thấy credentials"}
+        email, password = credentials
+        auth = (email, password)
+        logger.debug("[MARK_BILL] Sử dụng credentials từ database: %s", email)
     
     headers = {"Content-Type": "application/json"}
     payload = {"account": code}  # Sử dụng code từ database
 
     try:
-        print(f"🔐 Gọi API với auth: {auth[0]} và code: {code}")
-        resp = requests.post(
-            API_URL,
-            auth=HTTPBasicAuth(*auth),
-            json=payload,
-            headers=headers,
-            timeout=timeout
-        )
+        logger.debug("[MARK_BILL] Gọi API với auth: %s và code: %s", auth[0], code)
+        # Governor chung cho thuhohpk.com: 429/5xx/timeout => tự giảm tốc cho mọi caller
+        with get_governor(PORTAL_THUHO).slot() as slot, span(PORTAL_THUHO, "mark_bill_completed", order_id=order_id):
+            resp = (session or requests).post(
+                API_URL,
+                auth=HTTPBasicAuth(*auth),
+                json=payload,
+                headers=headers,
+                timeout=timeout
+            )
+            slot.http(resp.status_code)
         # Nếu là JSON hợp lệ
         try:
             data = resp.json()
             msg = data.get("msg", "").strip()
             return {
                 "success": (msg == "Cập nhật thành công"),
-                "msg": msg
+                "msg": msg,
+                "status_code": resp.status_code
             }
         except ValueError:
             # Không phải JSON
-            return {"success": False, "msg": f"Không phải JSON: {resp.text}"}
+            return {"success": False, "msg": f"Không phải JSON: {resp.text}", "status_code": resp.status_code}
 
     except requests.RequestException as e:
         return {"success": False, "msg": f"Lỗi gọi API: {e}"}
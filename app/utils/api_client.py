@@ -72,6 +72,6 @@ def check_api_health():
     except Exception:
         return False
 
-def fetch_api_data(service_type: str) -> Optional[Dict]:
+def fetch_api_data(service_type: str, limit: Optional[int] = None) -> Optional[Dict]:
     """Đã chuyển sang đọc trực tiếp DB (bỏ API)."""
-    return db_fetch_service_data(service_type)
+    return db_fetch_service_data(service_type, limit=limit)
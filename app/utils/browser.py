@@ -9,31 +9,69 @@ from selenium.webdriver.support import expected_conditions as EC
 import os
 import threading
 
-from ..config import Config, LOGIN_USERNAME, LOGIN_PASSWORD
+from ..config import Config, LOGIN_USERNAME, LOGIN_PASSWORD, SERVER_BROWSER_WINDOW_SIZE, SERVER_BROWSER_BLOCKED_URLS
 
 logger = logging.getLogger(__name__)
 
 driver: Optional[webdriver.Chrome] = None
 automation_lock = threading.Lock()
 
-def get_chrome_driver(username: str = "default") -> Optional[webdriver.Chrome]:
+BROWSER_PROFILE_DESKTOP = "desktop"
+BROWSER_PROFILE_SERVER = "server"
+
+
+def build_chrome_options(profile_dir: Optional[str] = None, profile: Optional[str] = None) -> Options:
+    """Chrome options theo launch profile: "desktop" (có giao diện) hoặc "server" (headless, tối giản tài nguyên)"""
+    profile = profile or Config.BROWSER_PROFILE
+    options = Options()
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={profile_dir}")
+    options.add_argument("--disable-notifications")
+    options.add_argument("--disable-popup-blocking")
+    options.add_experimental_option("excludeSwitches", ["enable-logging"])
+    
+    # Thêm các tùy chọn bảo mật
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    
+    if profile == BROWSER_PROFILE_SERVER:
+        options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={SERVER_BROWSER_WINDOW_SIZE}")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--mute-audio")
+        options.add_argument("--no-first-run")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-component-update")
+        options.add_argument("--disable-sync")
+        # Chặn ảnh ngay từ content settings (Network.setBlockedURLs chặn thêm font/CSS sau khi khởi động)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    else:
+        options.add_argument("--start-maximized")
+    return options
+
+
+def apply_browser_profile(drv, profile: Optional[str] = None) -> None:
+    """Áp dụng phần cấu hình cần CDP sau khi Chrome đã chạy (profile "server": chặn ảnh/font/CSS)"""
+    profile = profile or Config.BROWSER_PROFILE
+    if profile != BROWSER_PROFILE_SERVER or not SERVER_BROWSER_BLOCKED_URLS:
+        return
+    try:
+        drv.execute_cdp_cmd("Network.enable", {})
+        drv.execute_cdp_cmd("Network.setBlockedURLs", {"urls": SERVER_BROWSER_BLOCKED_URLS})
+    except Exception as e:
+        logger.warning(f"Không chặn được tài nguyên qua CDP: {e}")
+
+
+def get_chrome_driver(username: str = "default", profile: Optional[str] = None) -> Optional[webdriver.Chrome]:
     """Tạo Chrome driver"""
     try:
         profile_dir = os.path.join(os.getcwd(), "chrome_profile", username)
         os.makedirs(profile_dir, exist_ok=True)
         
-        options = Options()
-        options.add_argument(f"--user-data-dir={profile_dir}")
-        options.add_argument("--start-maximized")
-        options.add_argument("--disable-notifications")
-        options.add_argument("--disable-popup-blocking")
-        options.add_experimental_option("excludeSwitches", ["enable-logging"])
-        
-        # Thêm các tùy chọn bảo mật
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        
+        options = build_chrome_options(profile_dir, profile)
         driver = webdriver.Chrome(options=options)
+        apply_browser_profile(driver, profile)
         return driver
     except Exception as e:
         logger.error(f"Lỗi khởi tạo Chrome Driver: {e}")
@@ -50,6 +88,12 @@ def initialize_browser(username="default"):
 def cleanup():
     global driver
     if driver:
+        try:
+            if is_logged_in(driver):
+                from .session_manager import get_session_manager
+                get_session_manager().snapshot(driver, LOGIN_USERNAME or "default")
+        except Exception as e:
+            logger.warning(f"Lỗi lưu phiên đăng nhập: {e}")
         try:
             driver.quit()
         except Exception as e:
@@ -57,20 +101,28 @@ def cleanup():
         finally:
             driver = None
 
-def is_logged_in(driver):
-    # Bỏ qua kiểm tra trạng thái đăng nhập: luôn cho phép chạy
-    return True
+def is_logged_in(driver) -> bool:
+    """Đã đăng nhập nếu đang ở kpp.bankplus.vn và trang không có form đăng nhập"""
+    if driver is None:
+        return False
+    try:
+        if not (driver.current_url or "").startswith(Config.DRIVER_LINK):
+            return False
+        return not driver.find_elements(By.ID, "loginForm:userName")
+    except Exception:
+        return False
 
-def login_process():
-    """Đăng nhập tự động khi mở trình duyệt bằng tài khoản cấu hình."""
+def login_process(drv=None, username: Optional[str] = None, password: Optional[str] = None):
+    """Đăng nhập tự động khi mở trình duyệt bằng tài khoản cấu hình (hoặc tài khoản truyền vào)."""
+    drv = drv or driver
     try:
-        inp_usr = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "loginForm:userName")))
+        inp_usr = WebDriverWait(drv, 5).until(EC.presence_of_element_located((By.ID, "loginForm:userName")))
         inp_usr.clear() 
-        inp_usr.send_keys(LOGIN_USERNAME)
-        inp_pwd = WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.ID, "loginForm:password")))
+        inp_usr.send_keys(username or LOGIN_USERNAME)
+        inp_pwd = WebDriverWait(drv, 5).until(EC.presence_of_element_located((By.ID, "loginForm:password")))
         inp_pwd.clear() 
-        inp_pwd.send_keys(LOGIN_PASSWORD)
-        print("[LOGIN] Đã điền thông tin đăng nhập")
+        inp_pwd.send_keys(password or LOGIN_PASSWORD)
+        logger.info("[LOGIN] Đã điền thông tin đăng nhập")
     except Exception as e:
         logger.warning(f"Lỗi đăng nhập: {e}")
         pass
@@ -86,6 +138,9 @@ def ensure_driver_and_login() -> bool:
             if not driver:
                 logger.error("❌ Không thể khởi tạo trình duyệt")
                 return False
+            # Khôi phục phiên đã lưu; nếu hết hạn thì điền form đăng nhập và snapshot khi đăng nhập xong
+            from .session_manager import get_session_manager
+            get_session_manager().ensure_session(driver, username)
             logger.info("✅ Chrome driver đã được khởi tạo thành công")
         else:
             logger.info("✅ Chrome driver đã sẵn sàng")
@@ -94,10 +149,10 @@ def ensure_driver_and_login() -> bool:
         logger.error(f"❌ Lỗi ensure_driver_and_login: {e}")
         return False
 
-def get_error_alert_text() -> Optional[str]:
+def get_error_alert_text(drv=None) -> Optional[str]:
     """Trả về nội dung thông báo lỗi (role="alert") nếu có - chỉ text thuần, không có HTML tags."""
     try:
-        elements = driver.find_elements(By.CSS_SELECTOR, "li[role='alert'] span.ui-messages-error-summary")
+        elements = (drv or driver).find_elements(By.CSS_SELECTOR, "li[role='alert'] span.ui-messages-error-summary")
         for el in elements:
             text_val = (el.text or "").strip()
             if text_val:
@@ -113,10 +168,10 @@ def get_error_alert_text() -> Optional[str]:
         pass
     return None
 
-def get_info_alert_text() -> Optional[str]:
+def get_info_alert_text(drv=None) -> Optional[str]:
     """Trả về nội dung thông báo info (role="alert") nếu có - chỉ text thuần, không có HTML tags."""
     try:
-        elements = driver.find_elements(By.CSS_SELECTOR, "li[role='alert'] span.ui-messages-info-summary")
+        elements = (drv or driver).find_elements(By.CSS_SELECTOR, "li[role='alert'] span.ui-messages-info-summary")
         for el in elements:
             text_val = (el.text or "").strip()
             if text_val:
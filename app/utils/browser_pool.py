@@ -0,0 +1,271 @@
+"""Pool nhiều Chrome độc lập (mỗi instance 1 profile + 1 phiên đăng nhập) để chạy song song các dịch vụ"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import (
+    Config,
+    LOGIN_USERNAME,
+    LOGIN_PASSWORD,
+    BROWSER_POOL_SIZE,
+    BROWSER_POOL_ACCOUNTS,
+    BROWSER_POOL_MAX_USES,
+    BROWSER_POOL_LEASE_TIMEOUT,
+    SESSION_LOGIN_TIMEOUT,
+)
+from .browser import get_chrome_driver, is_logged_in
+from .session_manager import get_session_manager
+from .page_state import get_page_tracker
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolError(Exception):
+    """Không mượn được Chrome từ pool"""
+
+
+@dataclass
+class BrowserSlot:
+    """1 Chrome instance trong pool"""
+    slot_id: int
+    username: str
+    password: str
+    profile_name: str
+    driver: Any = None
+    in_use: bool = False
+    uses: int = 0
+    failures: int = 0
+    recycles: int = 0
+    created_at: float = 0.0
+    leased_at: float = 0.0
+    busy_seconds: float = 0.0
+
+
+def parse_accounts(raw: str) -> List[Tuple[str, str]]:
+    """Đọc BROWSER_POOL_ACCOUNTS dạng "user1:pass1,user2:pass2" """
+    accounts = []
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item or ":" not in item:
+            continue
+        user, password = item.split(":", 1)
+        accounts.append((user.strip(), password.strip()))
+    return accounts or [(LOGIN_USERNAME, LOGIN_PASSWORD)]
+
+
+class BrowserPool:
+    """
+    Quản lý N Chrome độc lập, cho các job mượn (lease) rồi trả lại.
+
+    Driver được tạo lười khi có job cần; driver lỗi hoặc đã dùng quá max_uses
+    sẽ bị đóng và tạo lại (recycle) ở lần mượn sau.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, accounts: Optional[List[Tuple[str, str]]] = None,
+                 max_uses: int = BROWSER_POOL_MAX_USES, lease_timeout: float = BROWSER_POOL_LEASE_TIMEOUT,
+                 first_slot: int = 0):
+        """first_slot: pool con của tiến trình shard k dùng slot k.. để account/profile không trùng tiến trình khác"""
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+        accounts = accounts or parse_accounts(BROWSER_POOL_ACCOUNTS)
+
+        # Chrome không cho 2 instance dùng chung user-data-dir => mỗi slot 1 thư mục riêng,
+        # tiền tố pool_ để không trùng chrome_profile/<user> của driver GUI (get_chrome_driver(LOGIN_USERNAME))
+        per_account: Dict[str, int] = {}
+        self._slots: List[BrowserSlot] = []
+        for i in range(first_slot + self.size):
+            user, password = accounts[i % len(accounts)]
+            idx = per_account.get(user, 0)
+            per_account[user] = idx + 1
+            if i < first_slot:
+                continue
+            profile_name = f"pool_{user}_{idx}"
+            self._slots.append(BrowserSlot(slot_id=i, username=user, password=password, profile_name=profile_name))
+
+        self._cond = threading.Condition()
+        self._started_at = time.monotonic()
+        self._leases = 0
+        self._lease_timeouts = 0
+        self._total_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Vòng đời driver
+    # ------------------------------------------------------------------
+
+    def _start_driver(self, slot: BrowserSlot) -> None:
+        logger.info(f"[BROWSER POOL] 🌐 Khởi động Chrome slot {slot.slot_id} ({slot.profile_name})")
+        drv = get_chrome_driver(slot.profile_name)
+        if drv is None:
+            raise BrowserPoolError(f"Không khởi tạo được Chrome cho slot {slot.slot_id}")
+        drv.get(Config.DRIVER_LINK)
+        # Dùng lại phiên đã snapshot nếu còn hạn, chỉ đăng nhập lại khi cần
+        if not get_session_manager().ensure_session(drv, slot.username, slot.password, wait=SESSION_LOGIN_TIMEOUT):
+            logger.warning(f"[BROWSER POOL] Slot {slot.slot_id} ({slot.username}) chưa đăng nhập được")
+        slot.driver = drv
+        slot.uses = 0
+        slot.created_at = time.monotonic()
+
+    def _quit_driver(self, slot: BrowserSlot) -> None:
+        if slot.driver is not None:
+            # Lưu lại cookie mới nhất trước khi đóng để lần khởi động sau khỏi đăng nhập
+            if is_logged_in(slot.driver):
+                get_session_manager().snapshot(slot.driver, slot.username)
+            get_page_tracker().forget(slot.driver)
+            try:
+                slot.driver.quit()
+            except Exception as e:
+                logger.warning(f"[BROWSER POOL] Lỗi đóng Chrome slot {slot.slot_id}: {e}")
+        slot.driver = None
+
+    @staticmethod
+    def _is_healthy(drv) -> bool:
+        try:
+            return drv.execute_script("return document.readyState") is not None
+        except Exception:
+            return False
+
+    def _prepare(self, slot: BrowserSlot) -> None:
+        """Đảm bảo slot có driver còn sống; recycle nếu hỏng hoặc đã dùng quá nhiều"""
+        if slot.driver is not None and self.max_uses and slot.uses >= self.max_uses:
+            logger.info(f"[BROWSER POOL] ♻️ Slot {slot.slot_id} đã dùng {slot.uses} lần, khởi động lại")
+            self._quit_driver(slot)
+            slot.recycles += 1
+        elif slot.driver is not None and not self._is_healthy(slot.driver):
+            logger.warning(f"[BROWSER POOL] ♻️ Slot {slot.slot_id} không phản hồi, khởi động lại")
+            self._quit_driver(slot)
+            slot.recycles += 1
+        if slot.driver is None:
+            self._start_driver(slot)
+
+    # ------------------------------------------------------------------
+    # Lease
+    # ------------------------------------------------------------------
+
+    def _acquire(self, timeout: float) -> BrowserSlot:
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            while True:
+                free = [s for s in self._slots if not s.in_use]
+                if free:
+                    # Ưu tiên slot đã có Chrome sẵn để khỏi khởi động mới
+                    slot = next((s for s in free if s.driver is not None), free[0])
+                    slot.in_use = True
+                    slot.leased_at = time.monotonic()
+                    self._leases += 1
+                    self._total_wait += slot.leased_at - started
+                    return slot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._lease_timeouts += 1
+                    raise BrowserPoolError(f"Hết {timeout}s chờ Chrome rảnh (pool={self.size})")
+                self._cond.wait(remaining)
+
+    def _release(self, slot: BrowserSlot, failed: bool) -> None:
+        slot.uses += 1
+        if failed:
+            slot.failures += 1
+            if slot.driver is not None and not self._is_healthy(slot.driver):
+                self._quit_driver(slot)
+                slot.recycles += 1
+        with self._cond:
+            slot.busy_seconds += time.monotonic() - slot.leased_at
+            slot.in_use = False
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Mượn 1 Chrome đã đăng nhập: `with pool.lease() as driver:`"""
+        slot = self._acquire(self.lease_timeout if timeout is None else timeout)
+        failed = False
+        try:
+            try:
+                self._prepare(slot)
+            except Exception:
+                failed = True
+                self._quit_driver(slot)
+                raise
+            yield slot.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(slot, failed)
+
+    # ------------------------------------------------------------------
+    # Thống kê / đóng
+    # ------------------------------------------------------------------
+
+    def utilisation(self) -> Dict[str, Any]:
+        """Tỉ lệ bận của pool và từng slot"""
+        now = time.monotonic()
+        uptime = max(now - self._started_at, 1e-6)
+        with self._cond:
+            slots = []
+            total_busy = 0.0
+            for s in self._slots:
+                busy = s.busy_seconds + (now - s.leased_at if s.in_use else 0.0)
+                total_busy += busy
+                slots.append({
+                    'slot_id': s.slot_id,
+                    'profile': s.profile_name,
+                    'alive': s.driver is not None,
+                    'in_use': s.in_use,
+                    'uses': s.uses,
+                    'failures': s.failures,
+                    'recycles': s.recycles,
+                    'busy_ratio': round(busy / uptime, 3),
+                })
+            return {
+                'size': self.size,
+                'busy': sum(1 for s in self._slots if s.in_use),
+                'alive': sum(1 for s in self._slots if s.driver is not None),
+                'leases': self._leases,
+                'lease_timeouts': self._lease_timeouts,
+                'avg_wait_ms': round(self._total_wait / self._leases * 1000, 2) if self._leases else 0.0,
+                'utilisation': round(total_busy / (uptime * self.size), 3),
+                'slots': slots,
+            }
+
+    def shutdown(self) -> None:
+        """Đóng toàn bộ Chrome trong pool"""
+        with self._cond:
+            for slot in self._slots:
+                self._quit_driver(slot)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """BrowserPool dùng chung cho tiến trình"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+    return _pool
+
+
+def shutdown_browser_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+__all__ = [
+    "BrowserPoolError",
+    "BrowserSlot",
+    "BrowserPool",
+    "parse_accounts",
+    "get_browser_pool",
+    "shutdown_browser_pool",
+]
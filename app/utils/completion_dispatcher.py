@@ -0,0 +1,298 @@
+"""Gọi API mark_bill_completed chạy nền qua hàng đợi SQLite, tách khỏi transaction DB và vòng lặp Selenium"""
+
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import (
+    COMPLETION_QUEUE_FILE,
+    COMPLETION_WORKERS,
+    COMPLETION_MAX_ATTEMPTS,
+    COMPLETION_BACKOFF_BASE,
+    COMPLETION_BACKOFF_MAX,
+    COMPLETION_LEASE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_IN_FLIGHT = 'in_flight'
+STATUS_DONE = 'done'
+STATUS_DEAD = 'dead'
+
+
+class CompletionDispatcher:
+    """
+    Hàng đợi bền vững (SQLite) cho mark_bill_completed.
+
+    - Idempotent theo order_id: enqueue lại order đã có trong hàng đợi sẽ bị bỏ qua.
+    - N worker thread (bounded concurrency), mỗi worker giữ 1 requests.Session keep-alive.
+    - Thất bại thì retry với exponential backoff + jitter, quá max_attempts chuyển sang 'dead'.
+    - Nhiều tiến trình (shard) dùng chung file: nhận job bằng 1 transaction BEGIN IMMEDIATE kèm
+      owner + lease_until; job in_flight chỉ được nhận lại khi lease đã hết hạn.
+    """
+
+    def __init__(self, db_path: str = COMPLETION_QUEUE_FILE, workers: int = COMPLETION_WORKERS,
+                 max_attempts: int = COMPLETION_MAX_ATTEMPTS, backoff_base: float = COMPLETION_BACKOFF_BASE,
+                 backoff_max: float = COMPLETION_BACKOFF_MAX, request_timeout: int = 10,
+                 lease_seconds: float = COMPLETION_LEASE_SECONDS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        self.lease_seconds = max(float(request_timeout), lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # timeout: chờ khóa ghi khi tiến trình khác đang giữ (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completion_queue (
+                order_id TEXT PRIMARY KEY,
+                code TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        # File tạo từ bản cũ (chưa có owner / lease_until)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(completion_queue)")}
+        for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE completion_queue ADD COLUMN {column} {kind}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_completion_queue_due ON completion_queue(status, next_attempt_at)"
+        )
+        # Job đang chạy dở của tiến trình đã chết (lease hết hạn) => đưa lại về pending;
+        # job của tiến trình khác còn đang chạy thì giữ nguyên
+        self._conn.execute(
+            """
+            UPDATE completion_queue SET status = ?, owner = NULL, lease_until = NULL
+            WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)
+            """,
+            (STATUS_PENDING, STATUS_IN_FLIGHT, time.time()),
+        )
+
+    # ------------------------------------------------------------------
+    # Producer
+    # ------------------------------------------------------------------
+
+    def enqueue(self, order_id: str, code: Optional[str] = None) -> bool:
+        """Đưa order vào hàng đợi; trả về False nếu order đã có (idempotent)"""
+        order_id = (order_id or "").strip()
+        if not order_id:
+            return False
+        now = time.time()
+        with self._db_lock:
+            cur = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO completion_queue
+                    (order_id, code, status, attempts, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, 0, ?, ?, ?)
+                """,
+                (order_id, code, STATUS_PENDING, now, now, now),
+            )
+            inserted = cur.rowcount == 1
+        if inserted:
+            logger.info(f"[COMPLETION] Đã xếp hàng mark_bill_completed cho {code or order_id}")
+            with self._wakeup:
+                self._wakeup.notify()
+        else:
+            logger.debug(f"[COMPLETION] Bỏ qua order {order_id}: đã có trong hàng đợi")
+        return inserted
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            self._local.session = session
+        return session
+
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """Nhận 1 job đến hạn (pending, hoặc in_flight đã hết lease); SELECT + UPDATE trong 1 transaction ghi"""
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT order_id, code, attempts
+                    FROM completion_queue
+                    WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?)
+                    ORDER BY next_attempt_at
+                    LIMIT 1
+                    """,
+                    (STATUS_PENDING, now, STATUS_IN_FLIGHT, now),
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        """
+                        UPDATE completion_queue SET status = ?, owner = ?, lease_until = ?, updated_at = ?
+                        WHERE order_id = ?
+                        """,
+                        (STATUS_IN_FLIGHT, self.owner, now + self.lease_seconds, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        return {'order_id': row[0], 'code': row[1], 'attempts': row[2]}
+
+    def _next_due_in(self) -> float:
+        with self._db_lock:
+            row = self._conn.execute(
+                """
+                SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE lease_until END)
+                FROM completion_queue WHERE status IN (?, ?)
+                """,
+                (STATUS_PENDING, STATUS_PENDING, STATUS_IN_FLIGHT),
+            ).fetchone()
+        if not row or row[0] is None:
+            return 5.0
+        return max(0.05, min(5.0, row[0] - time.time()))
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _finish(self, job: Dict[str, Any], success: bool, error: Optional[str]) -> None:
+        now = time.time()
+        attempts = job['attempts'] + 1
+        if success:
+            status, next_at = STATUS_DONE, now
+        elif attempts >= self.max_attempts:
+            status, next_at = STATUS_DEAD, now
+        else:
+            status, next_at = STATUS_PENDING, now + self._backoff(attempts)
+        with self._db_lock:
+            cur = self._conn.execute(
+                """
+                UPDATE completion_queue
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?,
+                    owner = NULL, lease_until = NULL
+                WHERE order_id = ? AND owner = ?
+                """,
+                (status, attempts, next_at, error, now, job['order_id'], self.owner),
+            )
+        label = job['code'] or job['order_id']
+        if cur.rowcount == 0:
+            # Lease đã hết và tiến trình khác nhận lại job: không ghi đè trạng thái của họ
+            logger.warning(f"[COMPLETION] Job {label} không còn thuộc tiến trình này (lease hết hạn), bỏ kết quả")
+            return
+        if success:
+            logger.info(f"[COMPLETION] ✅ mark_bill_completed thành công cho {label}")
+        elif status == STATUS_DEAD:
+            logger.error(f"[COMPLETION] 💥 Bỏ cuộc {label} sau {attempts} lần: {error}")
+        else:
+            logger.warning(f"[COMPLETION] ⚠️ Lần {attempts} thất bại cho {label}, thử lại sau {next_at - now:.1f}s: {error}")
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        try:
+            from ..test1 import mark_bill_completed
+            result = mark_bill_completed(job['order_id'], timeout=self.request_timeout, session=self._session())
+            success = bool(result and result.get('success'))
+            self._finish(job, success, None if success else (result or {}).get('msg', 'Unknown error'))
+        except Exception as e:
+            self._finish(job, False, str(e))
+
+    def _worker_loop(self) -> None:
+        while not self._stop_event.is_set():
+            job = self._claim_next()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self._next_due_in())
+                continue
+            self._process(job)
+
+    def start(self) -> None:
+        """Khởi động worker thread (gọi nhiều lần không tạo thêm thread)"""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"completion-worker-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"[COMPLETION] Đã khởi động {self.workers} worker")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Dừng worker; job chưa xong vẫn nằm trong SQLite cho lần chạy sau"""
+        self._stop_event.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def stats(self) -> Dict[str, int]:
+        """Số job theo trạng thái"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM completion_queue GROUP BY status"
+            ).fetchall()
+        counts = {STATUS_PENDING: 0, STATUS_IN_FLIGHT: 0, STATUS_DONE: 0, STATUS_DEAD: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+
+_dispatcher: Optional[CompletionDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_completion_dispatcher() -> CompletionDispatcher:
+    """Dispatcher dùng chung, tự khởi động worker ở lần gọi đầu"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                dispatcher = CompletionDispatcher()
+                dispatcher.start()
+                _dispatcher = dispatcher
+    return _dispatcher
+
+
+def enqueue_bill_completed(order_id: str, code: Optional[str] = None) -> bool:
+    """Xếp hàng gọi mark_bill_completed cho order (không chờ upstream)"""
+    return get_completion_dispatcher().enqueue(order_id, code)
+
+
+__all__ = [
+    "CompletionDispatcher",
+    "get_completion_dispatcher",
+    "enqueue_bill_completed",
+]
@@ -0,0 +1,219 @@
+"""Connection pool PostgreSQL dùng chung (thread-safe) cho app/db.py"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from ..config import (
+    DB_DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Hết thời gian chờ lấy connection từ pool"""
+
+
+class DatabasePool:
+    """Pool connection có giới hạn min/max, health check và metrics"""
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 8,
+                 timeout: float = 10.0, health_check_interval: float = 30.0):
+        self.dsn = dsn
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._pool: Optional[pg_pool.ThreadedConnectionPool] = None
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Semaphore giới hạn số connection đang cho mượn => chờ thay vì PoolError
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._last_used: Dict[int, float] = {}
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._broken = 0
+        self._active = 0
+        self._peak_active = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _ensure_pool(self) -> pg_pool.ThreadedConnectionPool:
+        """Khởi tạo pool lần đầu khi cần (không mở connection lúc import)"""
+        if self._pool is None:
+            with self._init_lock:
+                if self._pool is None:
+                    self._pool = pg_pool.ThreadedConnectionPool(self.min_size, self.max_size, self.dsn)
+                    logger.info(f"[DB POOL] Khởi tạo pool min={self.min_size} max={self.max_size}")
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        """Kiểm tra connection còn sống; chỉ ping khi đã idle quá health_check_interval"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Mượn 1 connection; chờ tối đa timeout giây nếu pool đã đầy"""
+        wait_timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=wait_timeout):
+            with self._stats_lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"Không lấy được connection sau {wait_timeout}s (max={self.max_size})")
+
+        try:
+            db_pool = self._ensure_pool()
+            conn = db_pool.getconn()
+            if not self._is_healthy(conn):
+                with self._stats_lock:
+                    self._broken += 1
+                logger.warning("[DB POOL] Connection hỏng, mở connection mới")
+                self._last_used.pop(id(conn), None)
+                db_pool.putconn(conn, close=True)
+                conn = db_pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            self._checkouts += 1
+            self._active += 1
+            self._peak_active = max(self._peak_active, self._active)
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Trả connection về pool (close=True để bỏ connection hỏng)"""
+        try:
+            if conn.closed:
+                close = True
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            if self._pool is not None:
+                self._pool.putconn(conn, close=close)
+        finally:
+            with self._stats_lock:
+                self._active = max(0, self._active - 1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Context manager: commit khi thành công, rollback khi lỗi, luôn trả connection"""
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def stats(self) -> Dict[str, Any]:
+        """Metrics của pool: checkouts, active, thời gian chờ..."""
+        with self._stats_lock:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'active': self._active,
+                'peak_active': self._peak_active,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'broken_connections': self._broken,
+                'avg_wait_ms': round(self._total_wait / self._checkouts * 1000, 2) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 2),
+            }
+
+    def closeall(self) -> None:
+        """Đóng tất cả connection"""
+        with self._init_lock:
+            if self._pool is not None:
+                try:
+                    self._pool.closeall()
+                except Exception as e:
+                    logger.warning(f"[DB POOL] Lỗi đóng pool: {e}")
+                self._pool = None
+                self._last_used.clear()
+
+
+_pool: Optional[DatabasePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> DatabasePool:
+    """Pool dùng chung cho toàn bộ tiến trình"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DatabasePool(
+                    os.getenv('DATABASE_URL', DB_DATABASE_URL),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                )
+    return _pool
+
+
+def db_connection(timeout: Optional[float] = None):
+    """Mượn connection từ pool dùng chung: `with db_connection() as conn:`"""
+    return get_pool().connection(timeout)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Metrics của pool dùng chung"""
+    return get_pool().stats()
+
+
+def close_pool() -> None:
+    """Đóng pool dùng chung (gọi khi tắt ứng dụng)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+__all__ = [
+    "PoolTimeout",
+    "DatabasePool",
+    "get_pool",
+    "db_connection",
+    "get_pool_stats",
+    "close_pool",
+]
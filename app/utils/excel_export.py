@@ -1,54 +1,148 @@
-from typing import List, Tuple
+"""Xuất kết quả ra Excel/CSV dạng streaming: ghi từng dòng khi mã xử lý xong, bộ nhớ không tăng theo số dòng"""
+
+import csv
+import logging
+import os
 from datetime import datetime
+from typing import Any, Iterable, Optional, Sequence
+
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill
-import os
-from tkinter import messagebox
-import logging
 
 from ..config import Config
 
 logger = logging.getLogger(__name__)
 
-def export_excel(data: List[Tuple[str, any, str]], name_dir: str) -> bool:
-    """Xuất dữ liệu ra file Excel"""
-    today = datetime.now().strftime("%H%M-%d-%m-%Y")
+RESULT_HEADERS = ('Số thuê bao', 'Số tiền', 'Ghi chú')
+HISTORY_HEADERS = ('Số thuê bao', 'Số tiền', 'Ghi chú', 'Trạng thái', 'Dịch vụ', 'Cập nhật')
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+_HEADER_FONT = Font(bold=True)
+_HEADER_FILL = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
+
+
+def result_export_path(name_dir: str, fmt: str = 'xlsx', stamp: Optional[str] = None) -> str:
+    """ket_qua/<name_dir>/<HHMM-dd-mm-YYYY>.<fmt> (tạo thư mục nếu chưa có)"""
+    export_dir = os.path.join(os.getcwd(), Config.FOLDER_RESULT, name_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    return os.path.join(export_dir, f"{stamp or datetime.now().strftime('%H%M-%d-%m-%Y')}.{fmt}")
+
+
+class ResultExporter:
+    """
+    Ghi file kết quả theo từng dòng: cột STT + các cột trong headers.
+    xlsx dùng Workbook(write_only=True) (openpyxl đẩy dòng ra file tạm, không giữ cell trong bộ nhớ);
+    csv ghi và flush ngay từng dòng nên mở file được khi batch còn đang chạy.
+    """
+
+    def __init__(self, path: str, headers: Sequence[str] = RESULT_HEADERS, fmt: Optional[str] = None):
+        self.path = path
+        self.fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower() or 'xlsx'
+        if self.fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Định dạng xuất không hỗ trợ: {self.fmt}")
+        self.rows = 0
+        self._file = None
+        self._csv = None
+        self._wb = None
+        self._ws = None
+        header_row = ['STT', *headers]
+        if self.fmt == 'csv':
+            # utf-8-sig để Excel mở đúng tiếng Việt
+            self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(header_row)
+        else:
+            self._wb = Workbook(write_only=True)
+            self._ws = self._wb.create_sheet()
+            self._ws.append([self._header_cell(value) for value in header_row])
+
+    def _header_cell(self, value: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self._ws, value=value)
+        cell.font = _HEADER_FONT
+        cell.fill = _HEADER_FILL
+        return cell
+
+    def write(self, *values: Any) -> None:
+        """Ghi 1 dòng (STT tự tăng)"""
+        self.rows += 1
+        if self._csv is not None:
+            self._csv.writerow([self.rows, *values])
+            self._file.flush()
+        else:
+            self._ws.append([self.rows, *values])
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> int:
+        """Ghi lần lượt các dòng từ iterator (list, generator, cursor DB...), trả về số dòng đã ghi"""
+        before = self.rows
+        for row in rows:
+            self.write(*row)
+        return self.rows - before
+
+    def close(self) -> str:
+        """Hoàn tất file, trả về đường dẫn"""
+        if self._wb is not None:
+            self._wb.save(self.path)
+            self._wb = self._ws = None
+        if self._file is not None:
+            self._file.close()
+            self._file = self._csv = None
+        return self.path
+
+    def __enter__(self) -> "ResultExporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def open_result_exporter(name_dir: str, fmt: str = 'xlsx', headers: Sequence[str] = RESULT_HEADERS) -> ResultExporter:
+    """ResultExporter ghi vào ket_qua/<name_dir>/<thời điểm>.<fmt>"""
+    return ResultExporter(result_export_path(name_dir, fmt), headers, fmt)
+
+
+def export_rows(rows: Iterable[Sequence[Any]], name_dir: str, fmt: str = 'xlsx',
+                headers: Sequence[str] = RESULT_HEADERS) -> Optional[str]:
+    """Xuất các dòng từ iterator ra file, trả về đường dẫn (None nếu lỗi)"""
     try:
-        export_dir = os.path.join(os.getcwd(), f"{Config.FOLDER_RESULT}\\{name_dir}")
-        os.makedirs(export_dir, exist_ok=True)
-        
-        file_name = f"{today}.xlsx"
-        file_path = os.path.join(export_dir, file_name)
-
-        wb = Workbook()
-        ws = wb.active
-        
-        # Định dạng header
-        headers = ['STT', 'Số thuê bao', 'Số tiền', 'Ghi chú']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')
-
-        # Ghi dữ liệu
-        for idx, (phone, amount, note) in enumerate(data, start=2):
-            ws.cell(row=idx, column=1, value=idx - 1)
-            ws.cell(row=idx, column=2, value=phone)
-            ws.cell(row=idx, column=3, value=amount)
-            ws.cell(row=idx, column=4, value=note)
-            
-        wb.save(file_path)
-        
-        # Hỏi người dùng có muốn mở file không
-        # if messagebox.askyesno(Config.TITLE, f"Dữ liệu được lưu tại: \n{Config.FOLDER_RESULT}/{name_dir}/{today}"):
-        #     try:
-        #         os.startfile(file_path)
-        #     except Exception as e:
-        #         logger.warning(f"Không thể mở file Excel: {e}")
-                
-        return True
-        
+        with open_result_exporter(name_dir, fmt, headers) as exporter:
+            count = exporter.write_rows(rows)
+        logger.info(f"📄 Đã xuất {count} dòng ra {exporter.path}")
+        return exporter.path
     except Exception as e:
-        logger.error(f"Lỗi xuất Excel: {e}")
-        #messagebox.showerror(Config.TITLE, f"Lỗi xuất Excel: {e}")
-        return False
+        logger.error(f"Lỗi xuất {fmt}: {e}")
+        return None
+
+
+def export_excel(data: Iterable[Sequence[Any]], name_dir: str) -> bool:
+    """Xuất dữ liệu (số thuê bao, số tiền, ghi chú) ra file Excel"""
+    return export_rows(data, name_dir, 'xlsx') is not None
+
+
+def _history_row(row: Sequence[Any]) -> list:
+    # Excel không lưu được datetime có timezone (timestamptz) => đổi về giờ địa phương không tz
+    return [value.astimezone().replace(tzinfo=None) if isinstance(value, datetime) and value.tzinfo else value
+            for value in row]
+
+
+def export_history(service_type: Optional[str] = None, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, fmt: str = 'xlsx',
+                   name_dir: str = 'Báo cáo lịch sử') -> Optional[str]:
+    """Báo cáo lịch sử: đọc thẳng từ server-side cursor DB và ghi ra file, không nạp toàn bộ kết quả"""
+    from ..db import db_iter_transaction_results
+
+    rows = (_history_row(row) for row in db_iter_transaction_results(service_type, since, until))
+    return export_rows(rows, name_dir, fmt, HISTORY_HEADERS)
+
+
+__all__ = [
+    "RESULT_HEADERS",
+    "HISTORY_HEADERS",
+    "EXPORT_FORMATS",
+    "result_export_path",
+    "ResultExporter",
+    "open_result_exporter",
+    "export_rows",
+    "export_excel",
+    "export_history",
+]
@@ -0,0 +1,285 @@
+"""Lập lịch job định kỳ: hàng đợi ưu tiên + pool worker thread, khóa theo service và gộp các lượt chạy bị lỡ"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScheduledJob:
+    """
+    1 job định kỳ (priority nhỏ = ưu tiên cao, giống cron_config.json).
+
+    interval_fn(now) -> giây: interval thay đổi theo giờ (vd. giờ cao điểm);
+    active_fn(now) -> bool: ngoài khung giờ cho phép thì bỏ qua lượt đến hạn.
+    func trả về True = còn việc (backlog) => xếp thêm 1 lượt nối tiếp phía sau
+    các job đang chờ để chia sẻ worker công bằng.
+    """
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    priority: int = 100
+    next_run: float = 0.0
+    last_due: Optional[float] = None
+    interval_fn: Optional[Callable[[float], float]] = None
+    active_fn: Optional[Callable[[float], bool]] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    queued: bool = False
+    running: bool = False
+    rerun: bool = False
+    runs: int = 0
+    failures: int = 0
+    coalesced: int = 0
+    skipped: int = 0
+    continuations: int = 0
+    last_started: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_wait: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class JobScheduler:
+    """
+    Thread lập lịch đưa job đến hạn vào hàng đợi ưu tiên; max_workers thread lấy ra chạy.
+
+    - Cùng 1 job không bao giờ chạy chồng (khóa theo job); đang chờ/đang chạy
+      mà lại đến hạn thì gộp thành 1 lượt (coalesced) thay vì xếp thêm.
+    - Bị trễ nhiều chu kỳ (máy bận, job trước chạy lâu) chỉ chạy bù 1 lần rồi
+      tính lịch tiếp theo từ hiện tại.
+    - Metrics: độ sâu hàng đợi, thời gian chờ trong hàng đợi, số lượt gộp.
+    """
+
+    def __init__(self, max_workers: int = 2, tick: float = 1.0):
+        self.max_workers = max(1, int(max_workers))
+        self.tick = tick
+        self._jobs: Dict[str, ScheduledJob] = {}
+        # (tier, priority, seq, name, queued_at): tier 0 = lượt theo lịch, 1 = lượt nối tiếp backlog
+        self._queue: List[Tuple[int, int, int, str, float]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.max_queue_depth = 0
+
+    # ------------------------------------------------------------------
+    # Đăng ký / đưa vào hàng đợi
+    # ------------------------------------------------------------------
+
+    def add_job(self, name: str, func: Callable[[], Any], interval: float, priority: int = 100,
+                first_run: Optional[float] = None, interval_fn: Optional[Callable[[float], float]] = None,
+                active_fn: Optional[Callable[[float], bool]] = None) -> ScheduledJob:
+        """Đăng ký job chạy mỗi interval giây; first_run (time.time()) mặc định = sau 1 interval"""
+        job = ScheduledJob(name=name, func=func, interval=float(interval), priority=int(priority),
+                           next_run=first_run if first_run is not None else time.time() + interval,
+                           interval_fn=interval_fn, active_fn=active_fn)
+        with self._cond:
+            self._jobs[name] = job
+        return job
+
+    def remove_job(self, name: str) -> None:
+        with self._cond:
+            self._jobs.pop(name, None)
+
+    def clear(self) -> None:
+        with self._cond:
+            self._jobs.clear()
+            self._queue.clear()
+
+    def _enqueue_locked(self, job: ScheduledJob, tier: int = 0) -> bool:
+        if job.queued or job.running:
+            job.coalesced += 1
+            logger.info(f"[SCHEDULER] {job.name} vẫn đang {'chạy' if job.running else 'chờ'}, gộp lượt chạy")
+            return False
+        job.queued = True
+        heapq.heappush(self._queue, (tier, job.priority, next(self._seq), job.name, time.monotonic()))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._cond.notify()
+        return True
+
+    def trigger(self, name: str, rerun_if_running: bool = False) -> bool:
+        """
+        Đưa job vào hàng đợi ngay (ngoài lịch); False nếu job đang chờ/chạy hoặc không tồn tại.
+
+        rerun_if_running: job đang chạy (đã lấy dữ liệu xong) thì chạy thêm 1 lượt
+        ngay sau khi xong, để việc mới đến giữa chừng không phải chờ lịch kế tiếp.
+        """
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                logger.warning(f"[SCHEDULER] Không có job {name}")
+                return False
+            if rerun_if_running and job.running and not job.queued:
+                job.rerun = True
+                return True
+            return self._enqueue_locked(job)
+
+    def _interval(self, job: ScheduledJob, now: float) -> float:
+        if job.interval_fn is None:
+            return job.interval
+        try:
+            return float(job.interval_fn(now))
+        except Exception as e:
+            logger.warning(f"[SCHEDULER] interval_fn của {job.name} lỗi, dùng interval gốc: {e}")
+            return job.interval
+
+    def _enqueue_due(self) -> None:
+        now = time.time()
+        with self._cond:
+            for job in self._jobs.values():
+                interval = self._interval(job, now)
+                # Interval vừa ngắn lại (vào giờ cao điểm) => kéo lượt kế tiếp lên sớm
+                if job.last_due is not None and interval > 0 and job.last_due + interval < job.next_run:
+                    job.next_run = max(now, job.last_due + interval)
+                if job.next_run > now:
+                    continue
+                missed = int((now - job.next_run) // interval) if interval > 0 else 0
+                if missed:
+                    job.coalesced += missed
+                    logger.info(f"[SCHEDULER] {job.name} lỡ {missed} lượt, chỉ chạy bù 1 lần")
+                job.last_due = job.next_run + missed * interval
+                job.next_run = job.last_due + interval if interval > 0 else float('inf')
+                if job.active_fn is not None and not job.active_fn(now):
+                    job.skipped += 1
+                    logger.info(f"[SCHEDULER] {job.name} ngoài khung giờ chạy, bỏ qua lượt này")
+                    continue
+                self._enqueue_locked(job)
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _next_job(self) -> Optional[Tuple[ScheduledJob, float]]:
+        with self._cond:
+            while not self._queue and not self._stop.is_set():
+                self._cond.wait(self.tick)
+            if self._stop.is_set():
+                return None
+            _tier, _priority, _seq, name, queued_at = heapq.heappop(self._queue)
+            job = self._jobs.get(name)
+            if job is None:
+                # Job đã bị gỡ trong lúc chờ => worker quay lại vòng lặp
+                return None
+            job.queued = False
+            job.running = True
+            return job, time.monotonic() - queued_at
+
+    def _run_job(self, job: ScheduledJob, waited: float) -> None:
+        started = time.monotonic()
+        job.last_wait = waited
+        job.last_started = time.time()
+        has_more = False
+        try:
+            with job.lock:
+                has_more = job.func() is True
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"[SCHEDULER] ❌ Job {job.name} lỗi: {e}")
+        finally:
+            job.last_duration = time.monotonic() - started
+            with self._cond:
+                job.running = False
+                job.runs += 1
+                rerun, job.rerun = job.rerun, False
+                if (has_more or rerun) and not self._stop.is_set() and self._jobs.get(job.name) is job:
+                    if has_more:
+                        job.continuations += 1
+                    self._enqueue_locked(job, tier=1 if has_more else 0)
+            logger.info(f"[SCHEDULER] {job.name} xong sau {job.last_duration:.1f}s (chờ hàng đợi {waited:.1f}s)")
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            item = self._next_job()
+            if item is None:
+                continue
+            self._run_job(*item)
+
+    def _scheduler_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._enqueue_due()
+            except Exception as e:
+                logger.error(f"[SCHEDULER] Lỗi vòng lập lịch: {e}")
+            self._stop.wait(self.tick)
+
+    # ------------------------------------------------------------------
+    # Điều khiển
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads.append(threading.Thread(target=self._scheduler_loop, name="scheduler-tick", daemon=True))
+        for i in range(self.max_workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f"scheduler-worker-{i + 1}", daemon=True))
+        for t in self._threads:
+            t.start()
+        logger.info(f"[SCHEDULER] Đã khởi động {self.max_workers} worker, {len(self._jobs)} job")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Dừng nhận job mới; chờ các job đang chạy kết thúc tối đa timeout giây"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Chờ hàng đợi rỗng và không còn job đang chạy"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                busy = bool(self._queue) or any(j.running for j in self._jobs.values())
+            if not busy:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+
+    def running(self) -> List[str]:
+        with self._cond:
+            return [j.name for j in self._jobs.values() if j.running]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Độ sâu hàng đợi + thống kê từng job"""
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'workers': self.max_workers,
+                'queued': [item[3] for item in sorted(self._queue)],
+                'jobs': {
+                    j.name: {
+                        'priority': j.priority,
+                        'interval': j.interval,
+                        'next_run': j.next_run,
+                        'queued': j.queued,
+                        'running': j.running,
+                        'runs': j.runs,
+                        'failures': j.failures,
+                        'coalesced': j.coalesced,
+                        'skipped': j.skipped,
+                        'continuations': j.continuations,
+                        'last_started': j.last_started,
+                        'last_duration': j.last_duration,
+                        'last_wait': j.last_wait,
+                        'last_error': j.last_error,
+                    }
+                    for j in self._jobs.values()
+                },
+            }
+
+
+__all__ = [
+    "ScheduledJob",
+    "JobScheduler",
+]
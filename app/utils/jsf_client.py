@@ -0,0 +1,214 @@
+"""Gọi form JSF/PrimeFaces trực tiếp qua HTTP (replay POST partial-ajax) bằng cookie đã đăng nhập của Chrome"""
+
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from ..config import LOOKUP_HTTP_CONCURRENCY, LOOKUP_HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+VIEW_STATE = "javax.faces.ViewState"
+
+_SKIP_INPUT_TYPES = ('submit', 'button', 'image', 'reset', 'file')
+
+
+class JsfLookupError(Exception):
+    """Replay HTTP không dùng được (phiên hết hạn, ViewState lỗi, response lạ...) => quay về Selenium"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class JsfView:
+    """1 view JSF đã mở: URL submit, dữ liệu form mặc định và ViewState hiện tại"""
+    url: str
+    form_id: str
+    action_url: str
+    fields: List[Tuple[str, str]]
+    view_state: str
+
+
+def serialize_form(form, check_ids: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """Giá trị mặc định của form như trình duyệt gửi đi; check_ids = radio/checkbox cần chọn thêm"""
+    check_ids = set(check_ids)
+    checked_names = set()
+    for el in form.find_all('input'):
+        if el.get('id') in check_ids and el.get('name'):
+            checked_names.add(el['name'])
+
+    fields: List[Tuple[str, str]] = []
+    for el in form.find_all(['input', 'select', 'textarea']):
+        name = el.get('name')
+        if not name or name == VIEW_STATE or el.has_attr('disabled'):
+            continue
+        if el.name == 'input':
+            kind = (el.get('type') or 'text').lower()
+            if kind in _SKIP_INPUT_TYPES:
+                continue
+            if kind in ('radio', 'checkbox'):
+                if el.get('id') in check_ids:
+                    fields.append((name, el.get('value', 'on')))
+                elif el.has_attr('checked') and name not in checked_names:
+                    fields.append((name, el.get('value', 'on')))
+                continue
+            fields.append((name, el.get('value', '')))
+        elif el.name == 'select':
+            options = el.find_all('option')
+            selected = [o for o in options if o.has_attr('selected')] or options[:1]
+            for option in selected:
+                fields.append((name, option.get('value', option.get_text())))
+        else:
+            fields.append((name, el.get_text()))
+    return fields
+
+
+def parse_partial_response(content: bytes) -> Dict[str, str]:
+    """Đọc <partial-response>: trả về {id: html} của các <update>; lỗi/redirect => JsfLookupError"""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError as e:
+        raise JsfLookupError(f"Response không phải partial-response XML: {e}")
+    if root.tag != 'partial-response':
+        raise JsfLookupError(f"Response không phải partial-response (<{root.tag}>)")
+
+    redirect = root.find('redirect')
+    if redirect is not None:
+        # Thường là bị đẩy về trang đăng nhập
+        raise JsfLookupError(f"Server redirect: {redirect.get('url')}")
+    error = root.find('error')
+    if error is not None:
+        raise JsfLookupError(f"{error.findtext('error-name', '')}: {error.findtext('error-message', '')}".strip(': '))
+
+    updates: Dict[str, str] = {}
+    for update in root.iter('update'):
+        updates[update.get('id', '')] = update.text or ''
+    return updates
+
+
+class JsfClient:
+    """
+    requests.Session dùng chung cookie với Chrome đã đăng nhập.
+
+    open_view() GET trang để lấy form + ViewState, partial_submit() replay đúng
+    POST mà PrimeFaces gửi khi bấm nút (Faces-Request: partial/ajax). Session có
+    connection pool cỡ LOOKUP_HTTP_CONCURRENCY để nhiều luồng lookup song song;
+    mỗi luồng nên giữ view riêng (xem thread_view).
+    """
+
+    def __init__(self, cookies: Iterable[Dict[str, Any]], user_agent: Optional[str] = None,
+                 pool_size: int = LOOKUP_HTTP_CONCURRENCY, timeout: float = LOOKUP_HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'],
+                                     domain=cookie.get('domain'), path=cookie.get('path', '/'))
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self._local = threading.local()
+
+    @classmethod
+    def from_driver(cls, drv, **kwargs) -> "JsfClient":
+        """Tạo client từ cookie + User-Agent của Chrome đang đăng nhập"""
+        try:
+            cookies = drv.get_cookies()
+            user_agent = drv.execute_script("return navigator.userAgent")
+        except Exception as e:
+            raise JsfLookupError(f"Không đọc được cookie từ Chrome: {e}")
+        if not cookies:
+            raise JsfLookupError("Chrome chưa có cookie phiên")
+        return cls(cookies, user_agent, **kwargs)
+
+    def open_view(self, url: str, form_id: str, check_ids: Iterable[str] = ()) -> JsfView:
+        """GET trang và đọc form + ViewState"""
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise JsfLookupError(f"GET {url} lỗi: {e}", getattr(e.response, 'status_code', None))
+
+        soup = BeautifulSoup(response.text, 'html.parser')
+        if soup.find(id='loginForm:userName'):
+            raise JsfLookupError("Phiên đăng nhập đã hết hạn")
+        form = soup.find('form', id=form_id)
+        if form is None:
+            raise JsfLookupError(f"Không thấy form {form_id} trên {url}")
+        view_state = soup.find('input', attrs={'name': VIEW_STATE})
+        if view_state is None or not view_state.get('value'):
+            raise JsfLookupError(f"Không thấy {VIEW_STATE} trên {url}")
+
+        return JsfView(
+            url=url,
+            form_id=form_id,
+            action_url=urljoin(response.url, form.get('action') or response.url),
+            fields=serialize_form(form, check_ids),
+            view_state=view_state['value'],
+        )
+
+    def thread_view(self, url: str, form_id: str, check_ids: Iterable[str] = ()) -> JsfView:
+        """View riêng cho luồng hiện tại (mở lần đầu, sau đó dùng lại)"""
+        views: Dict[Tuple[str, str], JsfView] = self._local.__dict__.setdefault('views', {})
+        view = views.get((url, form_id))
+        if view is None:
+            view = self.open_view(url, form_id, check_ids)
+            views[(url, form_id)] = view
+        return view
+
+    def drop_thread_view(self, url: str, form_id: str) -> None:
+        """Bỏ view của luồng hiện tại (lần sau sẽ GET lại trang)"""
+        self._local.__dict__.get('views', {}).pop((url, form_id), None)
+
+    def partial_submit(self, view: JsfView, source_id: str, values: Dict[str, Any],
+                       render: str = '@all') -> Dict[str, str]:
+        """POST partial-ajax như khi bấm nút source_id; trả về {id: html} của các vùng được render lại"""
+        data = [(k, v) for k, v in view.fields if k not in values]
+        data += [(k, str(v)) for k, v in values.items()]
+        data += [
+            ('javax.faces.partial.ajax', 'true'),
+            ('javax.faces.source', source_id),
+            ('javax.faces.partial.execute', '@all'),
+            ('javax.faces.partial.render', render),
+            (source_id, source_id),
+            (VIEW_STATE, view.view_state),
+        ]
+        headers = {
+            'Faces-Request': 'partial/ajax',
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': 'application/xml, text/xml, */*; q=0.01',
+            'Referer': view.url,
+        }
+        try:
+            response = self.session.post(view.action_url, data=data, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise JsfLookupError(f"POST {view.action_url} lỗi: {e}", getattr(e.response, 'status_code', None))
+
+        updates = parse_partial_response(response.content)
+        for update_id, html in updates.items():
+            if VIEW_STATE in update_id and html.strip():
+                view.view_state = html.strip()
+        return updates
+
+    def close(self) -> None:
+        self.session.close()
+
+
+__all__ = [
+    "JsfLookupError",
+    "JsfView",
+    "JsfClient",
+    "serialize_form",
+    "parse_partial_response",
+]
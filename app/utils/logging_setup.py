@@ -0,0 +1,144 @@
+"""Cấu hình logging dùng chung: QueueHandler/QueueListener (I/O ngoài luồng automation), file JSON lines có xoay vòng, mức log theo module"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from ..config import (
+    LOG_LEVEL,
+    LOG_MODULE_LEVELS,
+    LOG_FILE,
+    LOG_JSON,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_ROTATE_WHEN,
+)
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Thuộc tính có sẵn của LogRecord; phần còn lại (extra=...) được ghi thêm vào dòng JSON
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_EXC_FORMATTER = logging.Formatter()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """1 bản ghi = 1 dòng JSON: ts, level, logger, thread, msg (+ exc, + các key truyền qua extra)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Chỉ ghép msg % args và text exception (để bản ghi dùng được ở luồng khác) rồi đẩy vào hàng đợi;
+    format, ghi file và stdout do QueueListener làm ở luồng riêng.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(path: str) -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN,
+                                                         backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES,
+                                                backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+
+def apply_module_levels(levels: Dict[str, str]) -> None:
+    """Đặt mức log riêng cho từng logger (vd. {'app.services.pipeline': 'DEBUG'})"""
+    for name, level in levels.items():
+        try:
+            logging.getLogger(name).setLevel(level)
+        except (ValueError, TypeError):
+            logging.getLogger(__name__).warning(f"[LOGGING] Mức log không hợp lệ cho {name}: {level}")
+
+
+def setup_logging(log_file: Optional[str] = LOG_FILE, level: str = LOG_LEVEL, console: bool = True,
+                  json_lines: bool = LOG_JSON, force: bool = False) -> Optional[logging.handlers.QueueListener]:
+    """
+    Cấu hình root logger: 1 QueueHandler, còn console + file (xoay vòng) chạy trong QueueListener.
+    Như logging.basicConfig: root đã có handler thì không làm gì (trừ khi force=True).
+    """
+    global _listener
+    with _setup_lock:
+        root = logging.getLogger()
+        if root.handlers and not force:
+            return _listener
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        handlers = []
+        if console:
+            stream = logging.StreamHandler()
+            stream.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+            handlers.append(stream)
+        if log_file:
+            file_handler = _file_handler(log_file)
+            file_handler.setFormatter(JsonLineFormatter() if json_lines
+                                      else logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            handlers.append(file_handler)
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        root.addHandler(_RecordQueueHandler(log_queue))
+        root.setLevel(level)
+        apply_module_levels(LOG_MODULE_LEVELS)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def stop_logging() -> None:
+    """Ghi nốt bản ghi còn trong hàng đợi rồi dừng listener"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(stop_logging)
+
+
+__all__ = [
+    "CONSOLE_FORMAT",
+    "JsonLineFormatter",
+    "apply_module_levels",
+    "setup_logging",
+    "stop_logging",
+]
@@ -0,0 +1,220 @@
+"""Nhận đơn mới qua PostgreSQL LISTEN/NOTIFY (trigger trong notify_new_orders.sql) và đánh thức worker dịch vụ tương ứng"""
+
+import json
+import logging
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import psycopg2
+
+from ..config import (
+    DB_DATABASE_URL,
+    ORDER_NOTIFY_CHANNEL,
+    ORDER_LISTENER_DEBOUNCE,
+)
+
+logger = logging.getLogger(__name__)
+
+# callback(service_type, order_ids); service_type=None = có thể đã lỡ NOTIFY (vừa kết nối lại) => quét tất cả
+OrderCallback = Callable[[Optional[str], List[str]], None]
+
+
+def parse_notify_payload(payload: str) -> Optional[Dict[str, str]]:
+    """Payload JSON của trigger -> {'service_type', 'order_id'} (None nếu không hợp lệ)"""
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or not data.get('service_type'):
+        return None
+    return {'service_type': str(data['service_type']), 'order_id': str(data.get('order_id') or '')}
+
+
+class OrderListener:
+    """
+    1 connection riêng (autocommit) LISTEN trên kênh NOTIFY, chạy trong thread nền.
+
+    NOTIFY đến trong cửa sổ debounce được gom theo service_type rồi gọi các
+    callback 1 lần (đơn lớn được Node chèn nhiều câu liên tiếp vẫn chỉ đánh
+    thức 1 lần). Mất kết nối thì kết nối lại với backoff; sau khi kết nối lại
+    gọi callback(None, []) vì NOTIFY trong lúc mất kết nối không được giữ lại.
+    """
+
+    def __init__(self, dsn: str = DB_DATABASE_URL, channel: str = ORDER_NOTIFY_CHANNEL,
+                 debounce: float = ORDER_LISTENER_DEBOUNCE, poll_timeout: float = 5.0,
+                 max_backoff: float = 60.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.debounce = max(0.0, debounce)
+        self.poll_timeout = poll_timeout
+        self.max_backoff = max_backoff
+        self._callbacks: List[OrderCallback] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = None
+
+        self.notifications = 0
+        self.dispatches = 0
+        self.reconnects = 0
+        self.last_notify_at: Optional[float] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def subscribe(self, callback: OrderCallback) -> None:
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: OrderCallback) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    # ------------------------------------------------------------------
+    # Kết nối
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            # Tên kênh là identifier, không truyền được qua tham số
+            cur.execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _close(self) -> None:
+        self._connected.clear()
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # Vòng lặp
+    # ------------------------------------------------------------------
+
+    def _dispatch(self, service_type: Optional[str], order_ids: List[str]) -> None:
+        with self._lock:
+            callbacks = list(self._callbacks)
+        self.dispatches += 1
+        for callback in callbacks:
+            try:
+                callback(service_type, order_ids)
+            except Exception as e:
+                logger.error(f"[ORDER LISTENER] Callback lỗi ({service_type}): {e}")
+
+    def _drain(self, pending: Dict[str, Set[str]]) -> None:
+        """Đọc hết NOTIFY đang có trên connection vào pending"""
+        self._conn.poll()
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            self.notifications += 1
+            self.last_notify_at = time.time()
+            data = parse_notify_payload(notify.payload)
+            if data is None:
+                logger.warning(f"[ORDER LISTENER] Bỏ qua payload lạ: {notify.payload!r}")
+                continue
+            ids = pending.setdefault(data['service_type'], set())
+            if data['order_id']:
+                ids.add(data['order_id'])
+
+    def _listen_loop(self) -> None:
+        pending: Dict[str, Set[str]] = {}
+        flush_at: Optional[float] = None
+        while not self._stop.is_set():
+            timeout = self.poll_timeout if flush_at is None else max(0.0, flush_at - time.monotonic())
+            readable, _, _ = select.select([self._conn], [], [], timeout)
+            if readable:
+                self._drain(pending)
+                if pending and flush_at is None:
+                    flush_at = time.monotonic() + self.debounce
+            if flush_at is not None and time.monotonic() >= flush_at:
+                batch, pending, flush_at = pending, {}, None
+                for service_type, order_ids in batch.items():
+                    logger.info(f"[ORDER LISTENER] 🔔 {service_type}: {len(order_ids)} đơn mới")
+                    self._dispatch(service_type, sorted(order_ids))
+
+    def _run(self) -> None:
+        backoff = 1.0
+        ever_connected = False
+        while not self._stop.is_set():
+            try:
+                self._conn = self._connect()
+                self._connected.set()
+                logger.info(f"[ORDER LISTENER] ✅ Đang LISTEN kênh {self.channel}")
+                if ever_connected:
+                    self.reconnects += 1
+                    self._dispatch(None, [])
+                ever_connected = True
+                backoff = 1.0
+                self._listen_loop()
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"[ORDER LISTENER] Mất kết nối ({e}), thử lại sau {backoff:.0f}s")
+                self._close()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        self._close()
+
+    # ------------------------------------------------------------------
+    # Điều khiển
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="order-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'channel': self.channel,
+            'connected': self.connected,
+            'notifications': self.notifications,
+            'dispatches': self.dispatches,
+            'reconnects': self.reconnects,
+            'last_notify_at': self.last_notify_at,
+        }
+
+
+_listener: Optional[OrderListener] = None
+_listener_lock = threading.Lock()
+
+
+def get_order_listener() -> OrderListener:
+    """OrderListener dùng chung cho tiến trình (chưa start)"""
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = OrderListener()
+    return _listener
+
+
+__all__ = [
+    "OrderCallback",
+    "OrderListener",
+    "parse_notify_payload",
+    "get_order_listener",
+]
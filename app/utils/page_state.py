@@ -0,0 +1,153 @@
+"""Theo dõi form JSF đang mở trên mỗi Chrome: reset form tại chỗ, chỉ tải lại trang khi ViewState hết hạn"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from ..config import PAGE_VIEW_MAX_AGE
+from .waits import wait_ajax_idle
+
+logger = logging.getLogger(__name__)
+
+# '' = form còn dùng được; khác rỗng = lý do phải tải lại trang
+_VIEW_PROBLEM_JS = """
+if (!document.querySelector("input[name='javax.faces.ViewState']")) { return 'no_viewstate'; }
+if (document.getElementById('loginForm:userName')) { return 'login'; }
+var text = ((document.body && document.body.innerText) || '').toLowerCase();
+if (text.indexOf('viewexpiredexception') >= 0 || text.indexOf('view could not be restored') >= 0) { return 'view_expired'; }
+var ids = arguments[0] || [];
+for (var i = 0; i < ids.length; i++) { if (!document.getElementById(ids[i])) { return 'missing:' + ids[i]; } }
+return '';
+"""
+
+_RESET_FORM_JS = """
+var ids = arguments[0] || [];
+ids.forEach(function (id) {
+    var el = document.getElementById(id);
+    if (el) { el.value = ''; }
+});
+// Xoá thông báo PrimeFaces của mã trước để không bị đọc nhầm cho mã sau
+document.querySelectorAll('.ui-messages, .ui-message, .ui-growl-item-container').forEach(function (el) { el.innerHTML = ''; });
+// Đóng dialog còn mở và overlay modal còn sót
+var pf = window.PrimeFaces;
+if (pf && pf.widgets) {
+    Object.keys(pf.widgets).forEach(function (name) {
+        var w = pf.widgets[name];
+        try {
+            if (w && w.jq && w.jq.hasClass('ui-dialog') && w.jq.is(':visible') && typeof w.hide === 'function') { w.hide(); }
+        } catch (e) {}
+    });
+}
+document.querySelectorAll('.ui-widget-overlay').forEach(function (el) { el.style.display = 'none'; });
+"""
+
+
+@dataclass
+class PageState:
+    """Form đang mở trên 1 driver"""
+    key: str
+    url: str
+    loaded_at: float
+    resets: int = 0
+
+
+class PageStateTracker:
+    """Ghi nhớ form đang mở theo từng driver và quyết định reset tại chỗ hay tải lại"""
+
+    def __init__(self, max_age: float = PAGE_VIEW_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._states: Dict[int, PageState] = {}
+        self.loads = 0
+        self.resets = 0
+        self.expired_reloads = 0
+
+    def get(self, driver) -> Optional[PageState]:
+        with self._lock:
+            return self._states.get(id(driver))
+
+    def forget(self, driver) -> None:
+        """Bỏ trạng thái (gọi khi driver bị đóng hoặc trang bị điều hướng ngoài tracker)"""
+        with self._lock:
+            self._states.pop(id(driver), None)
+
+    def view_problem(self, driver, input_ids: Iterable[str] = ()) -> str:
+        """Lý do form không dùng lại được ('' nếu vẫn dùng được)"""
+        try:
+            return driver.execute_script(_VIEW_PROBLEM_JS, list(input_ids)) or ''
+        except Exception as e:
+            return f"error:{e}"
+
+    def reset_form(self, driver, input_ids: Iterable[str], step: str) -> None:
+        """Xoá input + thông báo + dialog của lần xử lý trước, giữ nguyên trang"""
+        driver.execute_script(_RESET_FORM_JS, list(input_ids))
+        wait_ajax_idle(driver, f"{step}.reset")
+
+    def load_form(self, driver, key: str, url: str, ready_id: str, open_page: Callable[[Any], None],
+                  after_open: Optional[Callable[[Any], None]] = None, input_ids: Iterable[str] = (),
+                  step: str = "form", force: bool = False) -> bool:
+        """
+        Đảm bảo form `key` sẵn sàng trên driver. Trả về True nếu đã tải lại trang.
+
+        Cùng URL và cùng dịch vụ thì reset tại chỗ; tải lại khi force, khác URL, đổi dịch vụ
+        (FTTH và TV-Internet chung URL nhưng FTTH chọn sẵn radio "Số thuê bao" mà reset không bỏ được),
+        ViewState/phiên hết hạn hoặc form đã mở quá PAGE_VIEW_MAX_AGE.
+        """
+        input_ids = list(input_ids)
+        state = self.get(driver)
+        reason = ""
+        if force:
+            reason = "force"
+        elif state is None or state.url != url:
+            reason = "new_page"
+        elif state.key != key:
+            reason = "switch_service"
+        elif self.max_age and time.monotonic() - state.loaded_at > self.max_age:
+            reason = "max_age"
+        else:
+            reason = self.view_problem(driver, [ready_id])
+
+        if not reason:
+            self.reset_form(driver, input_ids, step)
+            with self._lock:
+                state.resets += 1
+                self.resets += 1
+            return False
+
+        if reason not in ("new_page", "switch_service", "force"):
+            logger.info(f"[PAGE STATE] {key}: tải lại trang ({reason})")
+            with self._lock:
+                self.expired_reloads += 1
+        open_page(driver)
+        if after_open:
+            after_open(driver)
+        with self._lock:
+            self._states[id(driver)] = PageState(key=key, url=url, loaded_at=time.monotonic())
+            self.loads += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'tracked_drivers': len(self._states),
+                'loads': self.loads,
+                'resets': self.resets,
+                'expired_reloads': self.expired_reloads,
+            }
+
+
+_tracker = PageStateTracker()
+
+
+def get_page_tracker() -> PageStateTracker:
+    """PageStateTracker dùng chung cho tiến trình"""
+    return _tracker
+
+
+__all__ = [
+    "PageState",
+    "PageStateTracker",
+    "get_page_tracker",
+]
@@ -0,0 +1,391 @@
+"""Điều tốc theo portal (kpp.bankplus.vn, thuhohpk.com): token bucket + AIMD số request song song, tự lùi khi bị chặn và tăng lại khi ổn định"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+try:
+    import httpx
+except ImportError:  # httpx chỉ cần cho bản ASGI của proxy
+    httpx = None
+
+from ..config import (
+    GOVERNOR_BANKPLUS_RATE,
+    GOVERNOR_BANKPLUS_CONCURRENCY,
+    GOVERNOR_THUHO_RATE,
+    GOVERNOR_THUHO_CONCURRENCY,
+    GOVERNOR_BACKOFF,
+    GOVERNOR_COOLDOWN,
+    GOVERNOR_LATENCY_FACTOR,
+    GOVERNOR_ALERT_PATTERNS,
+)
+
+logger = logging.getLogger(__name__)
+
+PORTAL_BANKPLUS = "bankplus"
+PORTAL_THUHO = "thuhohpk"
+
+# Mỗi lần thành công tăng lại tốc độ thêm 5% mức cấu hình
+_RATE_STEP = 0.05
+# Số mẫu tối thiểu trước khi xét độ trễ; hệ số làm mượt EWMA
+_LATENCY_MIN_SAMPLES = 5
+_LATENCY_ALPHA = 0.2
+
+# Lỗi mạng tới portal = dấu hiệu quá tải. Không gồm lỗi Selenium (TimeoutException khi mã sai / chưa có
+# kết quả) hay lỗi kết nối tới chromedriver local: đó không phải phản hồi của portal.
+_TIMEOUT_ERRORS: Tuple[type, ...] = (requests.Timeout,) + ((httpx.TimeoutException,) if httpx else ())
+_NETWORK_ERRORS: Tuple[type, ...] = _TIMEOUT_ERRORS + (requests.ConnectionError,) + (
+    (httpx.NetworkError,) if httpx else ())
+
+
+def is_throttle_alert(text: Optional[str]) -> bool:
+    """Alert lỗi của portal có phải dấu hiệu bị giới hạn/quá tải (theo GOVERNOR_ALERT_PATTERNS) không"""
+    lowered = (text or "").lower()
+    return bool(lowered) and any(pattern in lowered for pattern in GOVERNOR_ALERT_PATTERNS)
+
+
+def is_throttle_status(status_code: Optional[int]) -> bool:
+    """HTTP 429 hoặc 5xx"""
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None and isinstance(exc, requests.RequestException) and exc.response is not None:
+        status_code = exc.response.status_code
+    if status_code is None and httpx is not None and isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+    return status_code
+
+
+def classify_exception(exc: BaseException) -> Tuple[bool, Optional[str]]:
+    """
+    (portal có phản hồi/lỗi mạng không, lý do bị chặn) của exception thoát khỏi slot.
+    Xét cả exception gốc (JsfLookupError bọc requests.Timeout...). (False, None) = lỗi không liên quan
+    portal (Selenium, parse, mã sai) => trả lượt mà không tính vào AIMD.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        status_code = _status_code(exc)
+        if status_code is not None:
+            return True, f"http_{status_code}" if is_throttle_status(status_code) else None
+        if isinstance(exc, _NETWORK_ERRORS):
+            return True, "timeout" if isinstance(exc, _TIMEOUT_ERRORS) else "network"
+        exc = exc.__cause__ or exc.__context__
+    return False, None
+
+
+class GovernorSlot:
+    """1 lượt gọi portal đã được cấp phép; người gọi báo kết quả qua http()/alert()/throttle()"""
+
+    def __init__(self, governor: "RateGovernor", waited: float):
+        self.governor = governor
+        self.waited = waited
+        self.reason: Optional[str] = None
+        self._started = time.monotonic()
+
+    def http(self, status_code: Optional[int]) -> None:
+        if is_throttle_status(status_code):
+            self.reason = f"http_{status_code}"
+
+    def alert(self, text: Optional[str]) -> None:
+        if is_throttle_alert(text):
+            self.reason = "alert"
+
+    def throttle(self, reason: str) -> None:
+        self.reason = reason
+
+    def __enter__(self) -> "GovernorSlot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if isinstance(exc, asyncio.CancelledError):
+            # Client bỏ đi / task bị hủy: không phải phản hồi của portal, chỉ trả lượt
+            self.governor.release_unused()
+            return False
+        latency = time.monotonic() - self._started
+        reason = self.reason
+        if reason is None and exc is not None:
+            # Có status_code => xét như response; timeout/mất kết nối tới portal = bị chặn
+            responded, reason = classify_exception(exc)
+            if not responded:
+                self.governor.release_unused()
+                return False
+        self.governor.release(latency, reason)
+        return False
+
+
+class RateGovernor:
+    """
+    Giới hạn tốc độ + số request song song tới 1 portal, dùng chung cho mọi luồng trong tiến trình.
+
+    - Token bucket: tối đa rate_per_minute lượt/phút (0 = không giới hạn), cho phép dồn tối đa
+      max_concurrency lượt.
+    - AIMD: thành công thì tăng dần số luồng (+1 sau mỗi `limit` lượt) và tốc độ (+5%); gặp 429/5xx,
+      alert quá tải, lỗi mạng hoặc độ trễ vượt latency_factor x mức nền thì nhân cả hai với backoff
+      (tối đa 1 lần mỗi cooldown giây để 1 đợt lỗi không đạp về tối thiểu).
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, max_concurrency: int,
+                 min_concurrency: int = 1, backoff: float = GOVERNOR_BACKOFF,
+                 cooldown: float = GOVERNOR_COOLDOWN, latency_factor: float = GOVERNOR_LATENCY_FACTOR):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.base_rate = max(0.0, rate_per_minute) / 60.0
+        self.min_rate = self.base_rate / 20.0
+        self.backoff = min(max(backoff, 0.1), 0.95)
+        self.cooldown = cooldown
+        self.latency_factor = latency_factor
+
+        self._cond = threading.Condition()
+        self._limit = float(self.max_concurrency)
+        self._rate = self.base_rate
+        self._tokens = float(self.max_concurrency)
+        self._refilled_at = time.monotonic()
+        self._inflight = 0
+        self._last_backoff = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._latency_base: Optional[float] = None
+        # Coroutine đang chờ lượt (aslot): (event loop, future đánh thức)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+
+        self.acquired = 0
+        self.succeeded = 0
+        self.throttled: Dict[str, int] = {}
+        self.backoffs = 0
+        self.wait_seconds = 0.0
+        self.max_inflight = 0
+
+    # ------------------------------------------------------------------
+    # Cấp phép
+    # ------------------------------------------------------------------
+
+    def _refill(self, now: float) -> None:
+        if self._rate > 0:
+            self._tokens = min(float(self.max_concurrency), self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+
+    def _take(self) -> None:
+        # Gọi khi đang giữ self._cond và đã còn luồng + token
+        if self._rate > 0:
+            self._tokens -= 1.0
+        self._inflight += 1
+        self.acquired += 1
+        self.max_inflight = max(self.max_inflight, self._inflight)
+
+    def _available(self) -> bool:
+        return (self._inflight < max(self.min_concurrency, int(self._limit))
+                and (self._rate <= 0 or self._tokens >= 1.0))
+
+    def _token_delay(self) -> Optional[float]:
+        """Còn luồng trống, chỉ thiếu token => số giây tới token kế tiếp; hết luồng => None (chờ release)"""
+        if self._inflight < max(self.min_concurrency, int(self._limit)):
+            return (1.0 - self._tokens) / self._rate
+        return None
+
+    def _wake_async_waiters(self) -> None:
+        # Gọi khi đang giữ self._cond; waiter tự thử lấy lượt lại trên event loop của nó
+        for loop, wakeup in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(lambda f=wakeup: f.done() or f.set_result(None))
+            except RuntimeError:
+                pass  # event loop đã đóng
+        self._async_waiters = []
+
+    def acquire(self) -> float:
+        """Chờ tới khi còn luồng trống và còn token; trả về số giây đã chờ"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill(time.monotonic())
+                if self._available():
+                    break
+                self._cond.wait(self._token_delay())
+            self._take()
+            waited = time.monotonic() - started
+            self.wait_seconds += waited
+        return waited
+
+    def try_acquire(self) -> bool:
+        """Lấy lượt ngay nếu còn luồng + token (không chờ)"""
+        with self._cond:
+            self._refill(time.monotonic())
+            if not self._available():
+                return False
+            self._take()
+            return True
+
+    def slot(self) -> GovernorSlot:
+        """with governor.slot() as slot: ... gọi portal, slot.http(status) / slot.alert(text) ..."""
+        return GovernorSlot(self, self.acquire())
+
+    async def aslot(self) -> GovernorSlot:
+        """
+        Bản asyncio của slot(): `with await governor.aslot() as slot:`. Chờ ngay trên event loop
+        (future được release() đánh thức, hoặc hẹn giờ tới token kế tiếp), không chiếm thread nào.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                self._refill(time.monotonic())
+                if self._available():
+                    self._take()
+                    waited = time.monotonic() - started
+                    self.wait_seconds += waited
+                    return GovernorSlot(self, waited)
+                delay = self._token_delay()
+                wakeup = loop.create_future()
+                self._async_waiters.append((loop, wakeup))
+            try:
+                # Hủy khi đang chờ: chưa lấy lượt nên không có gì phải trả
+                await asyncio.wait_for(wakeup, delay)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    if (loop, wakeup) in self._async_waiters:
+                        self._async_waiters.remove((loop, wakeup))
+
+    # ------------------------------------------------------------------
+    # Phản hồi (AIMD)
+    # ------------------------------------------------------------------
+
+    def _observe_latency(self, latency: float) -> bool:
+        """Cập nhật EWMA độ trễ; True nếu chậm bất thường so với mức nền"""
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma += _LATENCY_ALPHA * (latency - self._latency_ewma)
+        if self.succeeded < _LATENCY_MIN_SAMPLES:
+            return False
+        if self._latency_base is None or self._latency_ewma < self._latency_base:
+            self._latency_base = self._latency_ewma
+        else:
+            # Mức nền trôi lên chậm để không kẹt ở 1 lần nhanh bất thường
+            self._latency_base *= 1.001
+        return self._latency_ewma > self._latency_base * self.latency_factor
+
+    def _increase(self) -> None:
+        self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+        if self.base_rate > 0:
+            self._rate = min(self.base_rate, self._rate + self.base_rate * _RATE_STEP)
+
+    def _decrease(self, reason: str, now: float) -> None:
+        self.throttled[reason] = self.throttled.get(reason, 0) + 1
+        if now - self._last_backoff < self.cooldown:
+            return
+        self._last_backoff = now
+        self.backoffs += 1
+        self._limit = max(float(self.min_concurrency), self._limit * self.backoff)
+        if self.base_rate > 0:
+            self._rate = max(self.min_rate, self._rate * self.backoff)
+        if reason == "latency" and self._latency_ewma is not None:
+            # Chấp nhận mức trễ mới làm nền, tránh lùi liên tục khi portal chậm kéo dài
+            self._latency_base = self._latency_ewma
+        logger.warning(f"[GOVERNOR] {self.name}: lùi tốc độ ({reason}) => {int(self._limit)} luồng, "
+                       f"{self._rate * 60:.1f}/phút")
+
+    def release(self, latency: float, reason: Optional[str] = None) -> None:
+        """Kết thúc 1 lượt; reason != None = bị chặn/quá tải"""
+        with self._cond:
+            self._inflight = max(0, self._inflight - 1)
+            now = time.monotonic()
+            if reason is None:
+                self.succeeded += 1
+                if self._observe_latency(latency):
+                    self._decrease("latency", now)
+                else:
+                    self._increase()
+            else:
+                self._decrease(reason, now)
+            self._cond.notify_all()
+            self._wake_async_waiters()
+
+    def release_unused(self) -> None:
+        """Trả lượt mà không tính vào AIMD / độ trễ (lượt bị hủy, không có phản hồi thật của portal)"""
+        with self._cond:
+            self._inflight = max(0, self._inflight - 1)
+            self._cond.notify_all()
+            self._wake_async_waiters()
+
+    # ------------------------------------------------------------------
+    # Thống kê
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'name': self.name,
+                'concurrency_limit': int(self._limit),
+                'max_concurrency': self.max_concurrency,
+                'rate_per_minute': round(self._rate * 60, 2),
+                'max_rate_per_minute': round(self.base_rate * 60, 2),
+                'inflight': self._inflight,
+                'max_inflight': self.max_inflight,
+                'acquired': self.acquired,
+                'succeeded': self.succeeded,
+                'throttled': dict(self.throttled),
+                'backoffs': self.backoffs,
+                'wait_seconds': round(self.wait_seconds, 2),
+                'latency_ewma': round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+                'latency_base': round(self._latency_base, 3) if self._latency_base is not None else None,
+            }
+
+
+_PORTAL_LIMITS = {
+    PORTAL_BANKPLUS: (GOVERNOR_BANKPLUS_RATE, GOVERNOR_BANKPLUS_CONCURRENCY),
+    PORTAL_THUHO: (GOVERNOR_THUHO_RATE, GOVERNOR_THUHO_CONCURRENCY),
+}
+
+_governors: Dict[str, RateGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(portal: str) -> RateGovernor:
+    """Governor dùng chung cho portal trong tiến trình"""
+    governor = _governors.get(portal)
+    if governor is None:
+        with _governors_lock:
+            governor = _governors.get(portal)
+            if governor is None:
+                rate, concurrency = _PORTAL_LIMITS.get(portal, (0.0, 1))
+                governor = RateGovernor(portal, rate, concurrency)
+                _governors[portal] = governor
+    return governor
+
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    """Thống kê mọi governor đã dùng trong tiến trình"""
+    with _governors_lock:
+        governors = list(_governors.values())
+    return {g.name: g.stats() for g in governors}
+
+
+def format_governor_stats(stats: Dict[str, Any]) -> str:
+    """1 dòng tóm tắt cho log"""
+    throttled = ", ".join(f"{k}={v}" for k, v in sorted(stats['throttled'].items())) or "0"
+    return (f"{stats['name']}: {stats['concurrency_limit']}/{stats['max_concurrency']} luồng, "
+            f"{stats['rate_per_minute']:g}/{stats['max_rate_per_minute']:g} lượt/phút | "
+            f"{stats['succeeded']}/{stats['acquired']} ok, bị chặn {throttled}, lùi {stats['backoffs']} lần, "
+            f"chờ {stats['wait_seconds']:.1f}s")
+
+
+__all__ = [
+    "PORTAL_BANKPLUS",
+    "PORTAL_THUHO",
+    "is_throttle_alert",
+    "is_throttle_status",
+    "classify_exception",
+    "GovernorSlot",
+    "RateGovernor",
+    "get_governor",
+    "governor_stats",
+    "format_governor_stats",
+]
@@ -0,0 +1,272 @@
+"""Ghi kết quả xử lý theo batch (multi-row UPDATE) kèm write-ahead file chống mất dữ liệu"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from ..config import RESULT_BATCH_SIZE, RESULT_FLUSH_INTERVAL, RESULT_WAL_FILE, RESULT_DEAD_LETTER_FILE
+from ..db import db_update_results_batch, MARK_BILL_COMPLETED_SERVICES
+from .completion_dispatcher import enqueue_bill_completed
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+# Lỗi do chính dữ liệu của bản ghi (cast enum/numeric hỏng, vi phạm ràng buộc, không serialize được):
+# thử lại không bao giờ thành công. Lỗi khác (mất kết nối, pool hết...) thì giữ batch để thử lại.
+_DATA_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError, TypeError)
+
+
+class ResultWriter:
+    """
+    Buffer kết quả từng mã và ghi xuống DB theo batch.
+
+    Mỗi kết quả được append + fsync vào WAL trước khi vào buffer; WAL chỉ được
+    cắt bớt sau khi batch đã commit, nên Chrome/tiến trình chết giữa chừng
+    thì lần khởi động sau recover() sẽ ghi lại phần còn thiếu.
+
+    Batch bị DB từ chối vì dữ liệu thì chia đôi dần tới từng dòng: dòng hợp lệ vẫn được ghi,
+    dòng lỗi chuyển sang file dead-letter thay vì chặn mọi kết quả sau nó.
+    """
+
+    def __init__(self, wal_path: str = RESULT_WAL_FILE, batch_size: int = RESULT_BATCH_SIZE,
+                 flush_interval: float = RESULT_FLUSH_INTERVAL, dead_letter_path: str = RESULT_DEAD_LETTER_FILE):
+        self.wal_path = wal_path
+        self.dead_letter_path = dead_letter_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._timer_thread: Optional[threading.Thread] = None
+
+        self.flush_count = 0
+        self.written_count = 0
+        self.failed_flushes = 0
+        self.dead_letter_count = 0
+
+    # ------------------------------------------------------------------
+    # WAL
+    # ------------------------------------------------------------------
+
+    def _append_wal(self, record: Dict[str, Any]) -> None:
+        wal_dir = os.path.dirname(self.wal_path)
+        if wal_dir:
+            os.makedirs(wal_dir, exist_ok=True)
+        with open(self.wal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_wal(self, records: List[Dict[str, Any]]) -> None:
+        """Ghi lại WAL chỉ với các bản ghi chưa flush (atomic qua file tạm)"""
+        if not records:
+            try:
+                os.remove(self.wal_path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = f"{self.wal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.wal_path)
+
+    def _append_dead_letter(self, record: Dict[str, Any], error: BaseException) -> None:
+        dead_dir = os.path.dirname(self.dead_letter_path)
+        if dead_dir:
+            os.makedirs(dead_dir, exist_ok=True)
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({**record, 'error': f"{type(error).__name__}: {error}", 'dead_at': time.time()},
+                               ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def recover(self) -> int:
+        """Nạp lại các kết quả còn trong WAL (sau crash) và flush xuống DB"""
+        if not os.path.exists(self.wal_path):
+            return 0
+        recovered = []
+        with open(self.wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    recovered.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"[RESULT WRITER] Bỏ qua dòng WAL hỏng: {line[:80]}")
+        with self._lock:
+            self._buffer = recovered + self._buffer
+        if recovered:
+            logger.info(f"[RESULT WRITER] Khôi phục {len(recovered)} kết quả từ WAL")
+            self.flush()
+        return len(recovered)
+
+    # ------------------------------------------------------------------
+    # Ghi / flush
+    # ------------------------------------------------------------------
+
+    def write(self, order_id: Optional[str], code: str, status: str, amount: Any,
+              notes: str, details: Optional[Dict[str, Any]] = None) -> bool:
+        """Thêm 1 kết quả vào batch (thay cho update_database_immediately)"""
+        if not order_id:
+            logger.warning(f"[RESULT WRITER] Không có order_id, bỏ qua kết quả cho {code}")
+            return False
+        record = {
+            'order_id': order_id,
+            'code': code,
+            'status': status,
+            'amount': amount,
+            'notes': notes,
+            'details': details,
+            'ts': time.time(),
+        }
+        with self._lock:
+            self._append_wal(record)
+            self._buffer.append(record)
+            should_flush = len(self._buffer) >= self.batch_size
+        self._ensure_timer()
+        if should_flush:
+            self.flush()
+        return True
+
+    def _commit(self, batch: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[tuple],
+                                                            List[Dict[str, Any]], Optional[Exception]]:
+        """
+        Ghi batch; DB từ chối vì dữ liệu thì chia đôi tới từng dòng, dòng vẫn lỗi => dead-letter.
+        Trả về (đã ghi, (order_id, service_type) đã cập nhật, còn lại cần thử lại, lỗi tạm thời).
+        """
+        try:
+            with span("db", "result_flush", rows=len(batch)):
+                return batch, db_update_results_batch(batch), [], None
+        except _DATA_ERRORS as e:
+            if len(batch) == 1:
+                logger.error(f"[RESULT WRITER] DB từ chối kết quả {batch[0].get('code')} "
+                             f"(order {batch[0].get('order_id')}), chuyển dead-letter: {e}")
+                self._append_dead_letter(batch[0], e)
+                self.dead_letter_count += 1
+                return [], [], [], None
+            error = e
+        except Exception as e:
+            return [], [], batch, e
+
+        logger.warning(f"[RESULT WRITER] Batch {len(batch)} kết quả bị từ chối ({error}), chia nhỏ để tìm dòng lỗi")
+        mid = len(batch) // 2
+        written, updated, retry, transient = self._commit(batch[:mid])
+        if transient is not None:
+            return written, updated, retry + batch[mid:], transient
+        written2, updated2, retry2, transient = self._commit(batch[mid:])
+        return written + written2, updated + updated2, retry2, transient
+
+    def flush(self) -> int:
+        """Ghi toàn bộ buffer xuống DB; lỗi kết nối thì giữ phần chưa ghi (vẫn còn trong WAL) để thử lại"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._buffer
+                self._buffer = []
+            if not batch:
+                return 0
+            written, updated, retry, transient = self._commit(batch)
+            if transient is not None:
+                self.failed_flushes += 1
+                logger.error(f"[RESULT WRITER] Lỗi flush {len(retry)} kết quả, sẽ thử lại: {transient}")
+
+            with self._lock:
+                self._buffer = retry + self._buffer
+                if len(retry) < len(batch):
+                    try:
+                        self._rewrite_wal(self._buffer)
+                    except Exception as e:
+                        logger.warning(f"[RESULT WRITER] Không cắt được WAL: {e}")
+            if written:
+                self.flush_count += 1
+                self.written_count += len(written)
+
+        if written:
+            self._after_commit(written, updated)
+        return len(written)
+
+    def _after_commit(self, batch: List[Dict[str, Any]], updated: List[tuple]) -> None:
+        """Xếp hàng mark_bill_completed cho các order thành công thuộc dịch vụ được phép"""
+        service_by_order = dict(updated)
+        for rec in batch:
+            if rec.get('status') != 'success':
+                continue
+            order_id = rec['order_id']
+            if service_by_order.get(order_id) not in MARK_BILL_COMPLETED_SERVICES:
+                continue
+            try:
+                enqueue_bill_completed(order_id, rec.get('code'))
+            except Exception as e:
+                logger.error(f"[RESULT WRITER] Lỗi xếp hàng mark_bill_completed cho {rec.get('code')}: {e}")
+
+    # ------------------------------------------------------------------
+    # Flush theo thời gian
+    # ------------------------------------------------------------------
+
+    def _ensure_timer(self) -> None:
+        if self.flush_interval <= 0:
+            return
+        if self._timer_thread and self._timer_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._timer_thread = threading.Thread(target=self._timer_loop, name="result-writer-flush", daemon=True)
+        self._timer_thread.start()
+
+    def _timer_loop(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            with self._lock:
+                pending = bool(self._buffer)
+            if pending:
+                self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def close(self) -> None:
+        """Dừng timer và flush phần còn lại"""
+        self._stop_event.set()
+        if self._timer_thread:
+            self._timer_thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+_writer: Optional[ResultWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_result_writer() -> ResultWriter:
+    """ResultWriter dùng chung; lần đầu sẽ recover WAL còn sót lại"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = ResultWriter()
+                try:
+                    writer.recover()
+                except Exception as e:
+                    logger.error(f"[RESULT WRITER] Lỗi recover WAL: {e}")
+                _writer = writer
+    return _writer
+
+
+__all__ = [
+    "ResultWriter",
+    "get_result_writer",
+]
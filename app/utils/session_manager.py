@@ -0,0 +1,257 @@
+"""Lưu/khôi phục phiên đăng nhập kpp.bankplus.vn (cookie + localStorage) để Chrome mới không phải đăng nhập lại"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin
+
+from ..config import (
+    Config,
+    LOGIN_USERNAME,
+    SESSION_SNAPSHOT_DIR,
+    SESSION_MAX_AGE,
+    SESSION_PROBE_PATH,
+    SESSION_LOGIN_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+_COOKIE_KEYS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+_DUMP_LOCAL_STORAGE_JS = """
+var data = {};
+try {
+    for (var i = 0; i < window.localStorage.length; i++) {
+        var k = window.localStorage.key(i);
+        data[k] = window.localStorage.getItem(k);
+    }
+} catch (e) {}
+return data;
+"""
+
+_RESTORE_LOCAL_STORAGE_JS = """
+var data = arguments[0] || {};
+try {
+    Object.keys(data).forEach(function (k) { window.localStorage.setItem(k, data[k]); });
+} catch (e) {}
+"""
+
+
+def _clean_cookie(cookie: Dict[str, Any]) -> Dict[str, Any]:
+    """Chỉ giữ các trường add_cookie chấp nhận (expiry phải là int, sameSite hợp lệ)"""
+    cleaned = {k: cookie[k] for k in _COOKIE_KEYS if k in cookie}
+    if 'expiry' in cleaned:
+        cleaned['expiry'] = int(cleaned['expiry'])
+    if cleaned.get('sameSite') not in ('Strict', 'Lax', 'None'):
+        cleaned.pop('sameSite', None)
+    return cleaned
+
+
+class SessionManager:
+    """
+    Snapshot phiên đăng nhập theo tài khoản vào SESSION_SNAPSHOT_DIR/<username>.json.
+
+    Khi Chrome mới khởi động: thử phiên hiện tại -> khôi phục snapshot -> chỉ
+    khi cả hai không hợp lệ mới điền form đăng nhập và chờ đăng nhập xong để
+    snapshot lại. Các Chrome trong pool dùng chung tài khoản sẽ dùng chung snapshot.
+    """
+
+    def __init__(self, snapshot_dir: str = SESSION_SNAPSHOT_DIR, max_age: float = SESSION_MAX_AGE,
+                 probe_path: str = SESSION_PROBE_PATH):
+        self.snapshot_dir = snapshot_dir
+        self.max_age = max_age
+        self.probe_url = urljoin(Config.DRIVER_LINK.rstrip('/') + '/', probe_path.lstrip('/'))
+        self._lock = threading.Lock()
+        self._watchers: Dict[int, threading.Thread] = {}
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+
+    def _path(self, username: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in (username or "default"))
+        return os.path.join(self.snapshot_dir, f"{safe}.json")
+
+    def snapshot(self, drv, username: str) -> bool:
+        """Lưu cookie + localStorage của phiên hiện tại (gọi sau khi đã đăng nhập)"""
+        try:
+            data = {
+                'username': username,
+                'saved_at': time.time(),
+                'url': drv.current_url,
+                'cookies': [_clean_cookie(c) for c in drv.get_cookies()],
+                'local_storage': drv.execute_script(_DUMP_LOCAL_STORAGE_JS) or {},
+            }
+        except Exception as e:
+            logger.warning(f"[SESSION] Không đọc được cookie/localStorage: {e}")
+            return False
+        if not data['cookies']:
+            return False
+
+        path = self._path(username)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            try:
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                # Snapshot chứa cookie phiên => chỉ chủ sở hữu được đọc
+                try:
+                    os.chmod(tmp_path, 0o600)
+                except OSError:
+                    pass
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"[SESSION] Lỗi ghi snapshot {path}: {e}")
+                return False
+        logger.info(f"[SESSION] 💾 Đã lưu phiên đăng nhập của {username} ({len(data['cookies'])} cookie)")
+        return True
+
+    def load(self, username: str) -> Optional[Dict[str, Any]]:
+        """Đọc snapshot còn hạn (None nếu không có hoặc đã quá SESSION_MAX_AGE)"""
+        path = self._path(username)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[SESSION] Snapshot hỏng {path}: {e}")
+            return None
+        age = time.time() - float(data.get('saved_at', 0))
+        if self.max_age and age > self.max_age:
+            logger.info(f"[SESSION] Snapshot của {username} đã cũ ({age / 3600:.1f}h), bỏ qua")
+            return None
+        return data
+
+    def discard(self, username: str) -> None:
+        try:
+            os.remove(self._path(username))
+        except FileNotFoundError:
+            pass
+
+    def restore(self, drv, username: str) -> bool:
+        """Nạp cookie + localStorage từ snapshot vào driver (chưa kiểm tra phiên)"""
+        data = self.load(username)
+        if not data:
+            return False
+        try:
+            # add_cookie yêu cầu đang ở đúng domain
+            if not (drv.current_url or "").startswith(Config.DRIVER_LINK):
+                drv.get(Config.DRIVER_LINK)
+            for cookie in data.get('cookies', []):
+                try:
+                    drv.add_cookie(cookie)
+                except Exception as e:
+                    logger.debug(f"[SESSION] Bỏ qua cookie {cookie.get('name')}: {e}")
+            if data.get('local_storage'):
+                drv.execute_script(_RESTORE_LOCAL_STORAGE_JS, data['local_storage'])
+            return True
+        except Exception as e:
+            logger.warning(f"[SESSION] Lỗi khôi phục phiên {username}: {e}")
+            return False
+
+    # ------------------------------------------------------------------
+    # Kiểm tra phiên / đăng nhập
+    # ------------------------------------------------------------------
+
+    def probe(self, drv) -> bool:
+        """Mở 1 trang cần đăng nhập và kiểm tra có bị đẩy về form đăng nhập không"""
+        from .browser import is_logged_in
+        try:
+            drv.get(self.probe_url)
+            return is_logged_in(drv)
+        except Exception as e:
+            logger.warning(f"[SESSION] Lỗi kiểm tra phiên: {e}")
+            return False
+
+    def wait_for_login(self, drv, timeout: float) -> bool:
+        """Chờ đăng nhập hoàn tất (người dùng nhập captcha/bấm đăng nhập)"""
+        from .browser import is_logged_in
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if is_logged_in(drv):
+                    return True
+            except Exception:
+                return False
+            time.sleep(1)
+        return False
+
+    def _watch_login(self, drv, username: str, timeout: float) -> None:
+        try:
+            if self.wait_for_login(drv, timeout):
+                self.snapshot(drv, username)
+            else:
+                logger.info(f"[SESSION] Chưa thấy {username} đăng nhập sau {timeout:.0f}s, không lưu phiên")
+        finally:
+            with self._lock:
+                self._watchers.pop(id(drv), None)
+
+    def watch_and_snapshot(self, drv, username: str, timeout: float = SESSION_LOGIN_TIMEOUT) -> None:
+        """Theo dõi nền: khi đăng nhập xong thì snapshot (không chặn luồng GUI)"""
+        with self._lock:
+            existing = self._watchers.get(id(drv))
+            if existing and existing.is_alive():
+                return
+            t = threading.Thread(target=self._watch_login, args=(drv, username, timeout),
+                                 name=f"session-watch-{username}", daemon=True)
+            self._watchers[id(drv)] = t
+        t.start()
+
+    def ensure_session(self, drv, username: Optional[str] = None, password: Optional[str] = None,
+                       wait: float = 0) -> bool:
+        """
+        Đảm bảo driver đã đăng nhập: phiên sẵn có -> snapshot -> đăng nhập lại.
+
+        wait > 0: chờ tối đa wait giây cho bước đăng nhập rồi snapshot (dùng cho pool/cron).
+        wait = 0: điền form rồi theo dõi nền, trả về False ngay (dùng cho GUI).
+        """
+        from .browser import login_process
+        username = username or LOGIN_USERNAME
+        started = time.monotonic()
+
+        if self.probe(drv):
+            logger.info(f"[SESSION] ✅ Phiên của {username} vẫn còn hiệu lực")
+            return True
+
+        if self.restore(drv, username):
+            if self.probe(drv):
+                logger.info(f"[SESSION] ♻️ Khôi phục phiên {username} từ snapshot ({time.monotonic() - started:.1f}s)")
+                return True
+            logger.info(f"[SESSION] Snapshot của {username} đã hết hiệu lực, đăng nhập lại")
+            self.discard(username)
+
+        drv.get(Config.DRIVER_LINK)
+        login_process(drv, username, password)
+        if wait <= 0:
+            self.watch_and_snapshot(drv, username)
+            return False
+        if self.wait_for_login(drv, wait):
+            self.snapshot(drv, username)
+            return True
+        logger.warning(f"[SESSION] {username} chưa đăng nhập xong sau {wait:.0f}s")
+        return False
+
+
+_manager: Optional[SessionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager() -> SessionManager:
+    """SessionManager dùng chung cho tiến trình"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SessionManager()
+    return _manager
+
+
+__all__ = [
+    "SessionManager",
+    "get_session_manager",
+]
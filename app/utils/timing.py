@@ -0,0 +1,195 @@
+"""Đo thời gian từng bước (span) khi xử lý mã: histogram p50/p95/p99 theo dịch vụ + ghi JSON lines để xem lại bằng timing_report.py"""
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..config import TIMING_ENABLED, TIMING_LOG_FILE, TIMING_MAX_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+# Ghi xuống file khi buffer đủ số dòng hoặc quá số giây này (và khi flush()/cuối batch/thoát tiến trình)
+_FLUSH_LINES = 200
+_FLUSH_SECONDS = 5.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: Dict[Tuple[str, str], Iterable[float]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """{(service, step): [ms]} -> {service: {step: {count, total_s, p50_ms, p95_ms, p99_ms, max_ms}}}"""
+    result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for (service, step), values in samples.items():
+        ordered = sorted(values)
+        if not ordered:
+            continue
+        stat: Dict[str, Any] = {'count': len(ordered), 'total_s': round(sum(ordered) / 1000.0, 3)}
+        for pct in PERCENTILES:
+            stat[f'p{pct}_ms'] = round(percentile(ordered, pct), 1)
+        stat['max_ms'] = round(ordered[-1], 1)
+        result.setdefault(service, {})[step] = stat
+    return result
+
+
+def format_summary(summary: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    """Bảng theo dịch vụ, bước tốn nhiều thời gian nhất lên đầu"""
+    if not summary:
+        return "   (chưa có span nào)"
+    lines = []
+    for service in sorted(summary):
+        lines.append(f"   [{service}]")
+        lines.append(f"   {'Bước':<26}{'Lần':>7}{'Tổng(s)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'Max(ms)':>10}")
+        rows = sorted(summary[service].items(), key=lambda item: item[1]['total_s'], reverse=True)
+        for step, stat in rows:
+            lines.append(
+                f"   {step:<26}{stat['count']:>7}{stat['total_s']:>10.2f}{stat['p50_ms']:>10.1f}"
+                f"{stat['p95_ms']:>10.1f}{stat['p99_ms']:>10.1f}{stat['max_ms']:>10.1f}"
+            )
+    return "\n".join(lines)
+
+
+class SpanRecorder:
+    """
+    Gom span theo (service, step): giữ tối đa max_samples mẫu gần nhất cho mỗi cặp để tính
+    percentile, và append từng span thành 1 dòng JSON vào log_path (buffer trong bộ nhớ,
+    ghi bằng O_APPEND theo từng khối dòng hoàn chỉnh nên nhiều tiến trình shard ghi chung 1 file được).
+    """
+
+    def __init__(self, log_path: Optional[str] = TIMING_LOG_FILE, max_samples: int = TIMING_MAX_SAMPLES,
+                 enabled: bool = TIMING_ENABLED):
+        self.log_path = log_path
+        self.max_samples = max(1, max_samples)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lines: List[str] = []
+        self._flushed_at = time.monotonic()
+
+    def record(self, service: str, step: str, seconds: float, ok: bool = True, **attrs: Any) -> None:
+        if not self.enabled:
+            return
+        ms = seconds * 1000.0
+        line = None
+        if self.log_path:
+            entry = {'ts': round(time.time(), 3), 'service': service, 'step': step, 'ms': round(ms, 1), 'ok': ok}
+            entry.update({k: v for k, v in attrs.items() if v is not None})
+            entry['pid'] = os.getpid()
+            line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            samples = self._samples.get((service, step))
+            if samples is None:
+                samples = self._samples[(service, step)] = deque(maxlen=self.max_samples)
+            samples.append(ms)
+            if line is not None:
+                self._lines.append(line)
+                should_flush = (len(self._lines) >= _FLUSH_LINES
+                                or time.monotonic() - self._flushed_at >= _FLUSH_SECONDS)
+            else:
+                should_flush = False
+        if should_flush:
+            self.flush()
+
+    @contextmanager
+    def span(self, service: str, step: str, **attrs: Any) -> Iterator[None]:
+        """with span('ftth', 'navigate', code=...): ... (exception => ok=False rồi raise lại)"""
+        started = time.monotonic()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.record(service, step, time.monotonic() - started, ok, **attrs)
+
+    def flush(self) -> None:
+        """Ghi các dòng JSON đang buffer xuống file"""
+        with self._lock:
+            lines, self._lines = self._lines, []
+            self._flushed_at = time.monotonic()
+        if not lines or not self.log_path:
+            return
+        try:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning(f"[TIMING] Không ghi được {self.log_path}: {e}")
+
+    def summary(self, service: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()
+                       if service is None or key[0] == service}
+        return summarize(samples)
+
+    def format(self, service: Optional[str] = None) -> str:
+        return format_summary(self.summary(service))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_recorder = SpanRecorder()
+atexit.register(_recorder.flush)
+
+
+def get_span_recorder() -> SpanRecorder:
+    """SpanRecorder dùng chung cho tiến trình"""
+    return _recorder
+
+
+def span(service: str, step: str, **attrs: Any):
+    """Đo 1 bước bằng recorder dùng chung"""
+    return _recorder.span(service, step, **attrs)
+
+
+def load_spans(path: str = TIMING_LOG_FILE, service: Optional[str] = None,
+               since: Optional[float] = None) -> Dict[Tuple[str, str], List[float]]:
+    """Đọc file JSON lines -> {(service, step): [ms]} (bỏ qua dòng hỏng)"""
+    samples: Dict[Tuple[str, str], List[float]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                key = (entry['service'], entry['step'])
+                ms = float(entry['ms'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if service is not None and key[0] != service:
+                continue
+            if since is not None and entry.get('ts', 0) < since:
+                continue
+            samples.setdefault(key, []).append(ms)
+    return samples
+
+
+__all__ = [
+    "PERCENTILES",
+    "percentile",
+    "summarize",
+    "format_summary",
+    "SpanRecorder",
+    "get_span_recorder",
+    "span",
+    "load_spans",
+]
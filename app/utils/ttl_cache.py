@@ -0,0 +1,165 @@
+"""Cache TTL ngắn có gộp request (single-flight): nhiều lời gọi cùng key đồng thời chỉ tốn 1 lần gọi upstream"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SOURCE_HIT = "hit"
+SOURCE_MISS = "miss"
+SOURCE_COALESCED = "coalesced"
+
+
+class _Flight:
+    """1 lần load đang chạy; các lời gọi cùng key chờ event rồi dùng chung kết quả"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Cache theo key, mỗi giá trị sống ttl giây, tối đa max_entries key (bỏ key cũ nhất khi đầy).
+    get_or_load(): hết hạn/chưa có => chỉ 1 luồng gọi loader, các luồng cùng key chờ và nhận chung kết quả
+    (kể cả exception). cacheable(value) = False thì kết quả chỉ chia cho các luồng đang chờ, không lưu lại.
+    get_or_load_async(): như trên cho coroutine; loader chạy trong task riêng mà mọi lời gọi cùng key
+    (kể cả lời gọi đầu tiên) chỉ await qua shield, nên 1 client bỏ đi không hủy lần load của người khác.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.cacheable = cacheable
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._async_inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._errors = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # Gọi khi đang giữ self._lock
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._hits += 1
+                return True, entry[1]
+            del self._entries[key]
+        return False, None
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0 or (self.cacheable is not None and not self.cacheable(value)):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        """Trả về (giá trị, nguồn): nguồn = 'hit' | 'miss' | 'coalesced'"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value, SOURCE_HIT
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, SOURCE_COALESCED
+
+        try:
+            flight.value = loader()
+            self._store(key, flight.value)
+            return flight.value, SOURCE_MISS
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def _load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self._store(key, value)
+            return value
+        except BaseException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._async_inflight.pop(key, None)
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Bản asyncio của get_or_load(): loader là hàm trả về coroutine"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                return value, SOURCE_HIT
+            task = self._async_inflight.get(key)
+            leader = task is None
+            if leader:
+                task = self._async_inflight[key] = asyncio.ensure_future(self._load_async(key, loader))
+                # Mọi người chờ đều đã bỏ đi thì exception của task vẫn coi như đã đọc (tránh cảnh báo của asyncio)
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        # shield: hủy 1 lời gọi (client ngắt kết nối) chỉ hủy việc chờ của nó, lần load vẫn chạy cho người khác
+        value = await asyncio.shield(task)
+        return value, SOURCE_MISS if leader else SOURCE_COALESCED
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Xóa các key thỏa predicate (None = xóa hết), trả về số key đã xóa"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'inflight': len(self._inflight) + len(self._async_inflight),
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced,
+                'errors': self._errors,
+                'hit_ratio': round((self._hits + self._coalesced) / lookups, 3) if lookups else 0.0,
+            }
+
+
+__all__ = [
+    "SOURCE_HIT",
+    "SOURCE_MISS",
+    "SOURCE_COALESCED",
+    "TTLCache",
+]
@@ -0,0 +1,167 @@
+"""Chờ theo điều kiện trên trang (modal PrimeFaces, AJAX jQuery, DOM ổn định) thay cho time.sleep cố định"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from ..config import WAIT_AJAX_TIMEOUT, WAIT_MODAL_TIMEOUT, WAIT_DOM_QUIET_MS, WAIT_DOM_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Modal "Đang xử lý" PrimeFaces dùng chung cho các form thanh toán
+PRIMEFACES_MODAL_ID = "payMoneyForm:j_idt6_modal"
+
+_AJAX_IDLE_JS = """
+if (document.readyState !== 'complete') { return false; }
+if (window.jQuery && window.jQuery.active > 0) { return false; }
+var pf = window.PrimeFaces;
+if (pf && pf.ajax && pf.ajax.Queue && typeof pf.ajax.Queue.isEmpty === 'function' && !pf.ajax.Queue.isEmpty()) { return false; }
+return true;
+"""
+
+# Cài MutationObserver 1 lần cho mỗi document, trả về số ms kể từ lần DOM thay đổi gần nhất
+_DOM_QUIET_JS = """
+if (!window.__agnObserver) {
+    window.__agnLastMutation = Date.now();
+    window.__agnObserver = new MutationObserver(function () { window.__agnLastMutation = Date.now(); });
+    window.__agnObserver.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return Date.now() - window.__agnLastMutation;
+"""
+
+
+class WaitReport:
+    """Thống kê thời gian chờ theo từng bước (số lần, tổng, trung bình, max, số lần timeout)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps: Dict[str, Dict[str, float]] = {}
+
+    def record(self, step: str, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            stat = self._steps.setdefault(step, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['max'] = max(stat['max'], seconds)
+            if timed_out:
+                stat['timeouts'] += 1
+
+    def summary(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                step: {
+                    'count': int(stat['count']),
+                    'total_s': round(stat['total'], 3),
+                    'avg_ms': round(stat['total'] / stat['count'] * 1000, 1) if stat['count'] else 0.0,
+                    'max_ms': round(stat['max'] * 1000, 1),
+                    'timeouts': int(stat['timeouts']),
+                }
+                for step, stat in sorted(self._steps.items())
+                if step.startswith(prefix)
+            }
+
+    def format(self, prefix: str = "") -> str:
+        """Bảng tóm tắt, bước tốn nhiều thời gian nhất lên đầu"""
+        rows = sorted(self.summary(prefix).items(), key=lambda item: item[1]['total_s'], reverse=True)
+        if not rows:
+            return "   (chưa có dữ liệu chờ)"
+        lines = [f"   {'Bước':<28}{'Lần':>6}{'Tổng(s)':>10}{'TB(ms)':>10}{'Max(ms)':>10}{'Timeout':>9}"]
+        for step, stat in rows:
+            lines.append(
+                f"   {step:<28}{stat['count']:>6}{stat['total_s']:>10.2f}"
+                f"{stat['avg_ms']:>10.1f}{stat['max_ms']:>10.1f}{stat['timeouts']:>9}"
+            )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._steps.clear()
+
+
+_report = WaitReport()
+
+
+def get_wait_report() -> WaitReport:
+    """WaitReport dùng chung cho tiến trình"""
+    return _report
+
+
+@contextmanager
+def timed_wait(step: str) -> Iterator[None]:
+    """Đo thời gian 1 đoạn chờ và ghi vào report (timeout vẫn được ghi nhận rồi raise lại)"""
+    started = time.monotonic()
+    timed_out = False
+    try:
+        yield
+    except TimeoutException:
+        timed_out = True
+        raise
+    finally:
+        _report.record(step, time.monotonic() - started, timed_out)
+
+
+def wait_ajax_idle(driver, step: str = "ajax_idle", timeout: float = WAIT_AJAX_TIMEOUT) -> bool:
+    """Chờ trang load xong và không còn request AJAX (jQuery.active == 0, hàng đợi PrimeFaces rỗng)"""
+    try:
+        with timed_wait(step):
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script(_AJAX_IDLE_JS))
+        return True
+    except TimeoutException:
+        logger.warning(f"[WAIT] {step}: AJAX chưa idle sau {timeout}s, tiếp tục")
+        return False
+
+
+def wait_dom_settled(driver, step: str = "dom_settled", quiet_ms: int = WAIT_DOM_QUIET_MS,
+                     timeout: float = WAIT_DOM_TIMEOUT) -> bool:
+    """Chờ DOM ngừng thay đổi trong quiet_ms (MutationObserver)"""
+    try:
+        with timed_wait(step):
+            WebDriverWait(driver, timeout, poll_frequency=0.05).until(
+                lambda d: (d.execute_script(_DOM_QUIET_JS) or 0) >= quiet_ms
+            )
+        return True
+    except TimeoutException:
+        logger.warning(f"[WAIT] {step}: DOM vẫn thay đổi sau {timeout}s, tiếp tục")
+        return False
+
+
+def wait_modal_hidden(driver, step: str = "modal_hidden", modal_id: str = PRIMEFACES_MODAL_ID,
+                      timeout: float = WAIT_MODAL_TIMEOUT) -> None:
+    """Chờ modal loading PrimeFaces ẩn đi; hết thời gian thì raise TimeoutException như trước"""
+    with timed_wait(step):
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(EC.invisibility_of_element_located((By.ID, modal_id)))
+
+
+def wait_page_ready(driver, step: str = "page_ready", timeout: float = WAIT_AJAX_TIMEOUT) -> bool:
+    """Sau khi điều hướng: chờ AJAX idle rồi chờ DOM ổn định (thay cho sleep 2s)"""
+    idle = wait_ajax_idle(driver, f"{step}.ajax", timeout)
+    settled = wait_dom_settled(driver, f"{step}.dom")
+    return idle and settled
+
+
+def wait_after_action(driver, step: str = "after_action", modal_id: Optional[str] = PRIMEFACES_MODAL_ID,
+                      timeout: float = WAIT_MODAL_TIMEOUT) -> None:
+    """Sau khi click nút submit: chờ request AJAX xong rồi chờ modal ẩn (thay cho sleep 1s + wait modal)"""
+    wait_ajax_idle(driver, f"{step}.ajax", timeout)
+    if modal_id:
+        wait_modal_hidden(driver, f"{step}.modal", modal_id, timeout)
+
+
+__all__ = [
+    "PRIMEFACES_MODAL_ID",
+    "WaitReport",
+    "get_wait_report",
+    "timed_wait",
+    "wait_ajax_idle",
+    "wait_dom_settled",
+    "wait_modal_hidden",
+    "wait_page_ready",
+    "wait_after_action",
+]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+So sánh Chrome launch profile "desktop" và "server": thời gian khởi động, thời gian load trang và RSS
+Chạy: python benchmark_chrome_profile.py --runs 3 --url https://kpp.bankplus.vn
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from selenium import webdriver
+
+from app.config import Config
+from app.utils.browser import build_chrome_options, apply_browser_profile
+
+
+def _children_from_proc(pid):
+    """Lấy toàn bộ tiến trình con (đệ quy) qua /proc khi không có psutil"""
+    result = []
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        task_dir = f"/proc/{current}/task"
+        if not os.path.isdir(task_dir):
+            continue
+        for tid in os.listdir(task_dir):
+            try:
+                with open(f"{task_dir}/{tid}/children") as f:
+                    kids = [int(k) for k in f.read().split()]
+            except OSError:
+                kids = []
+            result.extend(kids)
+            stack.extend(kids)
+    return result
+
+
+def _rss_from_proc(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss_mb(root_pid):
+    """Tổng RSS (MB) của chromedriver + toàn bộ tiến trình Chrome con"""
+    try:
+        import psutil
+        root = psutil.Process(root_pid)
+        procs = [root] + root.children(recursive=True)
+        total = 0
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+    except ImportError:
+        if not os.path.isdir("/proc"):
+            return float('nan')
+        pids = [root_pid] + _children_from_proc(root_pid)
+        return sum(_rss_from_proc(p) for p in pids) / (1024 * 1024)
+
+
+def run_once(profile, url):
+    profile_dir = tempfile.mkdtemp(prefix=f"bench_{profile}_")
+    drv = None
+    try:
+        started = time.perf_counter()
+        drv = webdriver.Chrome(options=build_chrome_options(profile_dir, profile))
+        apply_browser_profile(drv, profile)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        drv.get(url)
+        while drv.execute_script("return document.readyState") != "complete":
+            time.sleep(0.05)
+        page_load = time.perf_counter() - started
+
+        rss = tree_rss_mb(drv.service.process.pid)
+        return startup, page_load, rss
+    finally:
+        if drv is not None:
+            try:
+                drv.quit()
+            except Exception:
+                pass
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chrome launch profile")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--url", default=Config.DRIVER_LINK)
+    parser.add_argument("--profiles", default="desktop,server")
+    args = parser.parse_args()
+
+    print("🚀 Benchmark Chrome launch profile")
+    print(f"   • URL: {args.url}")
+    print(f"   • Số lần chạy mỗi profile: {args.runs}")
+    print("=" * 60)
+
+    summary = {}
+    for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        samples = []
+        for i in range(args.runs):
+            try:
+                startup, page_load, rss = run_once(profile, args.url)
+            except Exception as e:
+                print(f"   ❌ [{profile}] lần {i + 1} lỗi: {e}")
+                continue
+            samples.append((startup, page_load, rss))
+            print(f"   [{profile}] lần {i + 1}: khởi động {startup:.2f}s | load trang {page_load:.2f}s | RSS {rss:.0f} MB")
+        if samples:
+            summary[profile] = tuple(statistics.median(col) for col in zip(*samples))
+
+    print("\n📊 [KẾT QUẢ] Trung vị:")
+    print(f"   {'Profile':<10}{'Khởi động(s)':>14}{'Load trang(s)':>15}{'RSS(MB)':>10}")
+    for profile, (startup, page_load, rss) in summary.items():
+        print(f"   {profile:<10}{startup:>14.2f}{page_load:>15.2f}{rss:>10.0f}")
+
+    if "desktop" in summary and "server" in summary:
+        d, s = summary["desktop"], summary["server"]
+        print(f"\n   ⚡ Khởi động nhanh hơn: {d[0] / s[0]:.2f}x | Load trang: {d[1] / s[1]:.2f}x | RSS giảm: {d[2] - s[2]:.0f} MB/phiên")
+
+
+if __name__ == "__main__":
+    main()
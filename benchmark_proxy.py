@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Load test proxy bản Flask (sync) và bản ASGI (async) trên upstream giả lập chạy local (độ trễ cố định)
+So sánh requests/giây và p50/p95 độ trễ; thêm đo endpoint batch (nhiều service_type song song / 1 request)
+Chạy: python benchmark_proxy.py --requests 200 --concurrency 40 --latency 1.0 --sync-workers 8
+(máy ít nhân: để --latency cao, nếu không load generator và server tranh CPU thay vì chờ upstream)
+Mặc định đo với giới hạn governor thật (GOVERNOR_THUHO_RATE / GOVERNOR_THUHO_CONCURRENCY trong app/config.py):
+thuhohpk sync/async và server_proxy async cùng bị chặn ở mức đó. --uncapped bỏ giới hạn governor để đo riêng phần proxy
+Cần: flask, flask-cors, requests, fastapi, uvicorn, httpx
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+# Đo chính proxy: tắt cache / span trước khi import app (config đọc env lúc import)
+os.environ.setdefault('PROXY_LIST_CACHE_TTL', '0')
+os.environ.setdefault('TIMING_ENABLED', '0')
+
+# --uncapped: bỏ giới hạn governor thuhohpk.com (không phải cấu hình chạy thật)
+UNCAPPED_ENV = {
+    'GOVERNOR_THUHO_RATE': '0',
+    'GOVERNOR_THUHO_CONCURRENCY': '10000',
+    'GOVERNOR_LATENCY_FACTOR': '1000',
+    'PROXY_POOL_MAXSIZE': '100',
+}
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+sys.path.insert(0, os.path.join(PARENT_DIR, "thuhohpk_like_api"))
+
+import httpx
+import uvicorn
+
+from app.config import GOVERNOR_THUHO_CONCURRENCY, GOVERNOR_THUHO_RATE
+from app.utils.timing import percentile
+
+TOKEN = "c0d2e27448f511b41dd1477781025053"
+HEADERS = {'Token': TOKEN, 'X-Username': 'Demodiemthu', 'X-Password': '123456'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def stub_upstream(latency):
+    """ASGI app giả lập thuhohpk.com: mọi request trả JSON sau `latency` giây"""
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        await asyncio.sleep(latency)
+        body = json.dumps({"status": True, "data": [], "path": scope['path']}).encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+    return app
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI server với số worker thread cố định (như gunicorn sync workers): request chờ upstream giữ 1 worker"""
+
+    workers = 8
+
+    def server_bind(self):
+        super().server_bind()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_asgi(app, port):
+    uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning')).run()
+
+
+def serve_wsgi(app, port, workers):
+    server_class = type('Server', (PooledWSGIServer,), {'workers': workers})
+    make_server('127.0.0.1', port, app, server_class=server_class, handler_class=_QuietHandler).serve_forever()
+
+
+def run_server(name, port, upstream, latency, workers):
+    """Tiến trình riêng cho từng server (load generator không tranh GIL với proxy)"""
+    if name == "upstream":
+        return serve_asgi(stub_upstream(latency), port)
+    if name.startswith("thuhohpk"):
+        module = __import__("main_async" if name.endswith("async") else "main")
+        module.EXTERNAL_API_BASE = upstream
+    else:
+        module = __import__("server_api_proxy_async" if name.endswith("async") else "server_api_proxy")
+        module.THUHOHPK_API_BASE = upstream
+        # server_api_proxy.py in từng phản hồi ra stdout: bỏ để không đo thời gian in
+        module.print = lambda *a, **k: None
+    if name.endswith("async"):
+        serve_asgi(module.app, port)
+    else:
+        serve_wsgi(module.app, port, workers)
+
+
+def start_server(name, port, upstream, latency, workers):
+    process = mp.get_context("spawn").Process(target=run_server, args=(name, port, upstream, latency, workers),
+                                              daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Không khởi động được {name}")
+
+
+async def load(url_for, total, concurrency, headers=None):
+    """Bắn `total` request với `concurrency` request song song: (req/s, p50 ms, p95 ms, số lỗi)"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url_for(i), headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return total / elapsed, percentile(latencies, 50), percentile(latencies, 95), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test proxy sync (Flask) vs async (ASGI)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=1.0, help="Độ trễ upstream giả lập (giây)")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Số worker thread của bản Flask")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="Bỏ giới hạn governor thuhohpk.com (đo riêng proxy, không phải cấu hình chạy thật)")
+    args = parser.parse_args()
+    if args.uncapped:
+        # Tiến trình server (spawn) nhận env của tiến trình cha
+        os.environ.update(UNCAPPED_ENV)
+
+    upstream_port = free_port()
+    upstream = f"http://127.0.0.1:{upstream_port}/api"
+    start_server("upstream", upstream_port, upstream, args.latency, 0)
+    servers = {}
+    for name in ("thuhohpk sync", "thuhohpk async", "server_proxy sync", "server_proxy async"):
+        port = free_port()
+        start_server(name, port, upstream, args.latency, args.sync_workers)
+        servers[name] = f"http://127.0.0.1:{port}"
+
+    if args.uncapped:
+        limits = "governor: KHÔNG giới hạn (--uncapped)"
+    else:
+        limits = (f"governor: {GOVERNOR_THUHO_RATE:g} req/phút, {GOVERNOR_THUHO_CONCURRENCY} song song "
+                  f"(server_proxy sync không qua governor)")
+    print(f"📊 {args.requests} request, {args.concurrency} song song, upstream trễ {args.latency * 1000:.0f}ms, "
+          f"Flask {args.sync_workers} worker, {limits}")
+    print(f"   {'Proxy':<22}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'lỗi':>6}")
+    rows = [
+        # service_type khác nhau mỗi request => không gộp request, đo đúng 1 lần gọi upstream / request
+        ("thuhohpk sync", lambda i: f"{servers['thuhohpk sync']}/api/list-bill-not-completed?service_type=s{i}", HEADERS),
+        ("thuhohpk async", lambda i: f"{servers['thuhohpk async']}/api/list-bill-not-completed?service_type=s{i}", HEADERS),
+        ("server_proxy sync", lambda i: f"{servers['server_proxy sync']}/api/proxy/thuhohpk/s{i}", None),
+        ("server_proxy async", lambda i: f"{servers['server_proxy async']}/api/proxy/thuhohpk/s{i}", None),
+    ]
+    results = {}
+    for name, url_for, headers in rows:
+        rps, p50, p95, errors = asyncio.run(load(url_for, args.requests, args.concurrency, headers))
+        results[name] = rps
+        print(f"   {name:<22}{rps:>10.1f}{p50:>10.1f}{p95:>10.1f}{errors:>6}")
+    for prefix in ("thuhohpk", "server_proxy"):
+        sync_rps = results[f"{prefix} sync"]
+        print(f"   => {prefix}: async x{results[f'{prefix} async'] / sync_rps if sync_rps else 0:.1f} req/s")
+
+    # Batch: 6 service_type trong 1 request (song song) so với gọi lần lượt từng service_type
+    from server_api_proxy_async import SERVICE_TYPES
+    services = ",".join(SERVICE_TYPES)
+    batch = asyncio.run(load(lambda i: f"{servers['thuhohpk async']}/api/list-bill-not-completed/batch?"
+                                       f"service_types={services}", 20, 1, HEADERS))
+    one_by_one = asyncio.run(load(lambda i: f"{servers['thuhohpk sync']}/api/list-bill-not-completed?"
+                                            f"service_type={list(SERVICE_TYPES)[i % 6]}", 60, 1, HEADERS))
+    print(f"\n📦 {len(SERVICE_TYPES)} service_type / dashboard: batch async p50 {batch[1]:.0f}ms"
+          f" | lần lượt từng service (sync) {one_by_one[1] * len(SERVICE_TYPES):.0f}ms")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
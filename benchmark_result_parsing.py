@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+So sánh chi phí đọc kết quả mỗi mã: cách cũ (outerHTML/page_source + BeautifulSoup) với snapshot JS
+(JSON gọn) và các parser HTML dự phòng (selectolax, lxml, html.parser) trên HTML mẫu trong fixtures/result_pages
+Chạy: python benchmark_result_parsing.py --runs 200 [--chrome]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from bs4 import BeautifulSoup
+
+from app.services.result_parsers import (
+    RESULT_BLOCK_ID,
+    _HTML_BACKENDS,
+    _RESULT_SNAPSHOT_JS,
+    amount_from_groups,
+    details_from_pairs,
+    parse_result_html,
+)
+
+FIXTURE_DIR = os.path.join(PARENT_DIR, "fixtures", "result_pages")
+
+# (file, mã cần tìm, có lấy chi tiết FTTH không, kết quả mong đợi (đủ tiền?, số tiền))
+CASES = [
+    ("ftth_lookup_page.html", "t008_gftth_ngvanan", True, (True, 170000)),
+    ("evn_bill_page.html", "PE089788049615", False, (True, 456000)),
+    ("evn_bill_page.html", "PE099999999999", False, (False, "Không tìm thấy mã thuê bao")),
+]
+
+
+def legacy_amount(cbil, html_content):
+    """amount_by_cbil trước đây: BeautifulSoup trên outerHTML của khối kết quả"""
+    amount = "Không tìm thấy mã thuê bao"
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for group in soup.find_all("div", class_="row pay-content mb-3"):
+        p_tags = group.find_all("p")
+        if any(cbil in p_tag.text for p_tag in p_tags):
+            for p_tag in p_tags:
+                if "VND" in p_tag.text:
+                    amount = int(p_tag.text.split("VND")[0].strip().replace(",", ""))
+                    return amount >= 5000, amount
+    return False, amount
+
+
+def legacy_details(page_source):
+    """extract_ftth_details_from_page trước đây: BeautifulSoup trên toàn bộ page_source"""
+    _groups, pairs = _HTML_BACKENDS["html.parser"](page_source, None, True)
+    return details_from_pairs(pairs)
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def snapshot_json(page, with_details):
+    """JSON mà _RESULT_SNAPSHOT_JS trả về cho trang này (dựng lại bằng parser Python để đo phía Python)"""
+    groups, pairs = parse_result_html(page, RESULT_BLOCK_ID, labels=with_details)
+    return json.dumps({"found": groups is not None, "groups": groups or [], "pairs": pairs}, ensure_ascii=False)
+
+
+def run_python(runs):
+    print(f"📊 Chi phí parse phía Python mỗi mã (median {runs} lần, ms)")
+    print(f"   {'Fixture':<28}{'Cách':<22}{'ms':>10}{'x nhanh hơn':>14}")
+    ok = True
+    for name, code, with_details, expected in CASES:
+        with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+            page = f.read()
+        block_html = str(BeautifulSoup(page, 'html.parser').find(id=RESULT_BLOCK_ID))
+
+        def legacy():
+            result = legacy_amount(code, block_html)
+            details = legacy_details(page) if with_details else None
+            return result, details
+
+        legacy_result, legacy_detail = legacy()
+        if legacy_result != expected:
+            print(f"   ❌ {name}: cách cũ trả về {legacy_result}, mong đợi {expected}")
+            ok = False
+        baseline = timed(legacy, runs)
+        print(f"   {name:<28}{'bs4 (cũ)':<22}{baseline:>10.3f}{'1.0':>14}")
+
+        raw = snapshot_json(page, with_details)
+
+        def from_snapshot():
+            data = json.loads(raw)
+            amount = amount_from_groups(code, data["groups"])
+            return amount, details_from_pairs(data["pairs"]) if with_details else None
+
+        variants = [("snapshot JS (JSON)", from_snapshot)]
+        for parser in _HTML_BACKENDS:
+            try:
+                parse_result_html("<div></div>", parser=parser)
+            except Exception:
+                continue  # parser chưa cài
+
+            def fallback(parser=parser):
+                groups, pairs = parse_result_html(page, RESULT_BLOCK_ID, labels=with_details, parser=parser)
+                return amount_from_groups(code, groups or []), details_from_pairs(pairs) if with_details else None
+
+            variants.append((f"HTML {parser}", fallback))
+
+        for label, fn in variants:
+            (is_amount, amount, _pid), details = fn()
+            if (is_amount, amount) != expected or (with_details and details != legacy_detail):
+                print(f"   ❌ {name}: {label} lệch kết quả cũ ({is_amount}, {amount}, {details})")
+                ok = False
+            ms = timed(fn, runs)
+            print(f"   {'':<28}{label:<22}{ms:>10.3f}{baseline / ms if ms else 0:>14.1f}")
+    return ok
+
+
+def run_chrome(runs):
+    """Đo cả round-trip WebDriver: outerHTML + page_source + bs4 so với 1 lần execute_script"""
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        print(f"\n🌐 Round-trip trên Chrome headless (median {runs} lần, ms)")
+        for name, code, with_details, _expected in CASES:
+            driver.get("file://" + os.path.join(FIXTURE_DIR, name))
+            element = driver.find_element(By.ID, RESULT_BLOCK_ID)
+
+            def legacy():
+                legacy_amount(code, element.get_attribute('outerHTML'))
+                if with_details:
+                    legacy_details(driver.page_source)
+
+            def snapshot():
+                data = json.loads(driver.execute_script(_RESULT_SNAPSHOT_JS, None, RESULT_BLOCK_ID,
+                                                        ["Mã hợp đồng:"] if with_details else None))
+                amount_from_groups(code, data["groups"])
+
+            before, after = timed(legacy, runs), timed(snapshot, runs)
+            print(f"   {name:<28} cũ {before:>8.2f} | snapshot {after:>8.2f} | x{before / after if after else 0:.1f}")
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đọc kết quả tra cứu")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--chrome", action="store_true", help="Đo thêm round-trip thật trên Chrome headless")
+    args = parser.parse_args()
+    ok = run_python(args.runs)
+    if args.chrome:
+        run_chrome(max(1, args.runs // 10))
+    print("\n✅ Mọi cách đọc cho cùng kết quả" if ok else "\n❌ Có cách đọc lệch kết quả")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,15 @@
+-- Migration: cột claim/lease cho service_transactions (nhận việc bằng SELECT ... FOR UPDATE SKIP LOCKED)
+-- Đã khai báo trong shared/schema.ts (npm run db:push); chạy tay nếu không dùng Drizzle:
+--   psql "$DATABASE_URL" -f claim_leases.sql
+
+-- 1. Worker đang giữ giao dịch và thời điểm hết lease
+ALTER TABLE service_transactions ADD COLUMN IF NOT EXISTS claimed_by VARCHAR;
+ALTER TABLE service_transactions ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
+-- 2. Index cho reaper / claim tìm lease hết hạn (chỉ các dòng đang processing)
+CREATE INDEX IF NOT EXISTS idx_service_transactions_lease
+    ON service_transactions (lease_expires_at)
+    WHERE status = 'processing';
+
+-- 3. Kiểm tra
+SELECT status, claimed_by, count(*) FROM service_transactions GROUP BY status, claimed_by;
@@ -7,7 +7,6 @@ Chạy: python cron_runner.py
 import os
 import sys
 import signal
-import time
 import logging
 from datetime import datetime
 
@@ -17,16 +16,9 @@ if PARENT_DIR not in sys.path:
     sys.path.insert(0, PARENT_DIR)
 
 def setup_logging():
-    """Thiết lập logging"""
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.FileHandler('cron.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    """Thiết lập logging: cron.log (JSON lines, xoay vòng) + console qua QueueListener"""
+    from app.utils.logging_setup import setup_logging as setup_app_logging
+    setup_app_logging(log_file='cron.log')
     return logging.getLogger(__name__)
 
 def signal_handler(signum, frame):
@@ -36,13 +28,6 @@ def signal_handler(signum, frame):
 
 def check_dependencies():
     """Kiểm tra các dependency cần thiết"""
-    try:
-        import schedule
-        logger.info("✅ Thư viện schedule đã sẵn sàng")
-    except ImportError:
-        logger.error("❌ Thiếu thư viện schedule. Cài đặt: pip install schedule")
-        return False
-    
     try:
         from app.cron_manager import CronManager
         logger.info("✅ CronManager đã sẵn sàng")
@@ -35,7 +35,7 @@ def demo_chrome_test_mode():
         print(f"   • Max concurrent: {cron.max_concurrent}")
         print(f"   • Test mode: {cron.test_mode}")
         print(f"   • Test interval: {cron.test_interval} giây")
-        print(f"   • Chrome ready: {cron.chrome_driver is not None}")
+        print(f"   • BrowserPool: {cron.get_status()['browser_pool']['size']} slot")
         
         # Hiển thị services
         print(f"\n📋 Services có sẵn:")
@@ -96,33 +96,30 @@ def demo_chrome_navigation():
         if not cron:
             return False
         
-        # Lấy Chrome driver
-        driver = cron.get_chrome_driver()
-        if not driver:
-            print("   ❌ Chrome driver không sẵn sàng")
-            return False
-        
-        print("   🌐 Test navigation...")
-        
-        # Test navigation
-        driver.get("https://www.google.com")
-        time.sleep(2)
-        
-        title = driver.title
-        print(f"   • Title: {title}")
-        
-        # Test tìm element
-        print("   🔍 Test tìm element...")
-        try:
-            search_box = driver.find_element("name", "q")
-            if search_box:
-                print("   ✅ Tìm thấy search box")
-                search_box.send_keys("AutoGachno Test")
-                time.sleep(1)
-            else:
-                print("   ❌ Không tìm thấy search box")
-        except Exception as e:
-            print(f"   ⚠️ Lỗi tìm element: {e}")
+        # Mượn 1 Chrome từ BrowserPool (cùng pool với các service)
+        from app.utils.browser_pool import get_browser_pool
+        with get_browser_pool().lease() as driver:
+            print("   🌐 Test navigation...")
+        
+            # Test navigation
+            driver.get("https://www.google.com")
+            time.sleep(2)
+        
+            title = driver.title
+            print(f"   • Title: {title}")
+        
+            # Test tìm element
+            print("   🔍 Test tìm element...")
+            try:
+                search_box = driver.find_element("name", "q")
+                if search_box:
+                    print("   ✅ Tìm thấy search box")
+                    search_box.send_keys("AutoGachno Test")
+                    time.sleep(1)
+                else:
+                    print("   ❌ Không tìm thấy search box")
+            except Exception as e:
+                print(f"   ⚠️ Lỗi tìm element: {e}")
         
         print("✅ Demo Chrome navigation thành công!")
         return True
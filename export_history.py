@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Xuất báo cáo lịch sử kết quả (service_transactions) ra Excel/CSV, đọc từ DB bằng server-side cursor
+Chạy: python export_history.py [--service tra_cuu_ftth] [--days 30 | --since 2025-01-01 --until 2025-02-01] [--format csv]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.utils.excel_export import EXPORT_FORMATS, export_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xuất báo cáo lịch sử kết quả xử lý mã")
+    parser.add_argument("--service", help="service_type trong DB (vd. tra_cuu_ftth, gach_dien_evn)")
+    parser.add_argument("--days", type=float, help="Chỉ lấy kết quả cập nhật trong N ngày gần nhất")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Từ thời điểm (YYYY-MM-DD[ HH:MM])")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Đến trước thời điểm (YYYY-MM-DD[ HH:MM])")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="xlsx")
+    args = parser.parse_args()
+
+    since = args.since or (datetime.now() - timedelta(days=args.days) if args.days else None)
+    path = export_history(args.service, since, args.until, args.format)
+    if not path:
+        print("❌ Xuất báo cáo thất bại (xem log)")
+        return False
+    print(f"✅ Đã xuất báo cáo: {path}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
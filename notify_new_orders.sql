@@ -0,0 +1,38 @@
+-- Migration: báo đơn mới cho tool Python qua LISTEN/NOTIFY (thay cho polling theo interval)
+-- Chạy sau npm run db:push (Drizzle không quản lý trigger):
+--   psql "$DATABASE_URL" -f notify_new_orders.sql
+-- Kênh mặc định 'new_service_work' (ORDER_NOTIFY_CHANNEL trong app/config.py)
+
+-- 1. Hàm trigger: gom theo order_id trong cùng 1 câu INSERT => 1 NOTIFY / đơn
+--    payload: {"order_id": "...", "service_type": "tra_cuu_ftth", "codes": 25}
+CREATE OR REPLACE FUNCTION notify_new_service_work() RETURNS trigger AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN
+        SELECT n.order_id, o.service_type, count(*) AS codes
+        FROM new_rows n
+        JOIN orders o ON o.id = n.order_id
+        WHERE n.status IN ('pending', 'processing')
+        GROUP BY n.order_id, o.service_type
+    LOOP
+        PERFORM pg_notify('new_service_work', json_build_object(
+            'order_id', r.order_id,
+            'service_type', r.service_type,
+            'codes', r.codes
+        )::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. Trigger theo câu lệnh (statement-level) để INSERT nhiều mã không bắn NOTIFY theo từng dòng
+DROP TRIGGER IF EXISTS service_transactions_notify_insert ON service_transactions;
+CREATE TRIGGER service_transactions_notify_insert
+    AFTER INSERT ON service_transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_new_service_work();
+
+-- 3. Kiểm tra
+SELECT tgname, tgenabled FROM pg_trigger WHERE tgname = 'service_transactions_notify_insert';
@@ -0,0 +1,28 @@
+-- Migration: index cho các truy vấn lấy việc pending (app/db.py) khi lịch sử lên hàng triệu dòng
+-- Đã khai báo trong shared/schema.ts (npm run db:push); chạy tay nếu không dùng Drizzle:
+--   psql "$DATABASE_URL" -f pending_work_indexes.sql
+-- CONCURRENTLY => không khóa ghi bảng đang chạy (psql chạy từng lệnh ngoài transaction)
+-- Kiểm tra kế hoạch truy vấn: python test_query_plans.py
+
+-- 1. Tìm theo mã (db_find_order_id, db_check_pending_orders_for_code, DISTINCT ON code của db_fetch_service_data)
+--    Partial index: chỉ chứa các giao dịch chưa xong nên nhỏ, không lớn theo lịch sử
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_transactions_pending_code
+    ON service_transactions (status, code, created_at)
+    WHERE status IN ('pending', 'processing');
+
+-- 2. Lấy việc cũ nhất trước (db_claim_service_work: ORDER BY created_at LIMIT n)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_transactions_pending_created
+    ON service_transactions (created_at)
+    WHERE status IN ('pending', 'processing');
+
+-- 3. Ghi kết quả theo order_id (db_update_results_batch, update_database_immediately, db_get_code_by_order_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_service_transactions_order_id
+    ON service_transactions (order_id);
+
+-- 4. Lọc đơn theo dịch vụ khi join
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_service_type_id
+    ON orders (service_type, id);
+
+-- 5. Cập nhật thống kê cho planner
+ANALYZE service_transactions;
+ANALYZE orders;
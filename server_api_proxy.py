@@ -18,6 +18,7 @@ CORS(app)  # Enable CORS for all routes
 USERNAME = "Demodiemthu"
 PASSWORD = "123456"
 CREDENTIALS = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+THUHOHPK_API_BASE = "https://thuhohpk.com/api"
 
 # Service types mapping
 SERVICE_TYPES = {
@@ -33,7 +34,7 @@ def call_thuhohpk_api(service_type):
     """Gọi API thuhohpk.com từ server side"""
     try:
         api_service_type = SERVICE_TYPES.get(service_type, service_type)
-        url = f"https://thuhohpk.com/api/list-bill-not-completed?service_type={api_service_type}"
+        url = f"{THUHOHPK_API_BASE}/list-bill-not-completed?service_type={api_service_type}"
         
         headers = {
             'Authorization': f'Basic {CREDENTIALS}',
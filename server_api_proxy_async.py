@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Bản asyncio (ASGI, FastAPI + httpx.AsyncClient) của server_api_proxy.py: cùng các route, thêm
+/api/proxy/thuhohpk/batch gọi nhiều service_type song song trong 1 request
+Chạy: python server_api_proxy_async.py   (hoặc uvicorn server_api_proxy_async:app --port 5000)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.utils.rate_governor import PORTAL_THUHO, get_governor
+
+logger = logging.getLogger(__name__)
+
+# Basic Authentication credentials (giống server_api_proxy.py)
+USERNAME = "Demodiemthu"
+PASSWORD = "123456"
+THUHOHPK_API_BASE = "https://thuhohpk.com/api"
+UPSTREAM_TIMEOUT = float(os.getenv('PROXY_UPSTREAM_TIMEOUT', '30'))
+
+# Service types mapping
+SERVICE_TYPES = {
+    'tra_cuu_ftth': 'check_ftth',
+    'gach_dien_evn': 'env',
+    'nap_tien_da_mang': 'deposit',
+    'nap_tien_viettel': 'deposit_viettel',
+    'thanh_toan_tv_internet': 'payment_tv',
+    'tra_cuu_no_tra_sau': 'check_debt'
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """AsyncClient keep-alive dùng chung"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            auth=(USERNAME, PASSWORD),
+            headers={
+                'Content-Type': 'application/json',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            },
+            timeout=UPSTREAM_TIMEOUT,
+        )
+    return _client
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+app = FastAPI(title="API Proxy (async)", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def call_thuhohpk_api(service_type):
+    """Gọi API thuhohpk.com (bản async của server_api_proxy.call_thuhohpk_api)"""
+    try:
+        api_service_type = SERVICE_TYPES.get(service_type, service_type)
+        with await get_governor(PORTAL_THUHO).aslot() as slot:
+            response = await get_client().get(f"{THUHOHPK_API_BASE}/list-bill-not-completed",
+                                              params={'service_type': api_service_type})
+            slot.http(response.status_code)
+        if response.status_code == 200:
+            return response.json()
+        logger.warning("thuhohpk %s: HTTP %s", api_service_type, response.status_code)
+        return {"error": f"HTTP {response.status_code}: {response.text}"}
+    except Exception as e:
+        logger.warning("thuhohpk %s: %s", service_type, e)
+        return {"error": str(e)}
+
+
+@app.get('/api/proxy/thuhohpk/batch')
+async def proxy_api_batch(service_types: Optional[str] = None):
+    """Nhiều service_type (cách nhau bởi dấu phẩy, trống = tất cả SERVICE_TYPES) gọi song song"""
+    requested = [s.strip() for s in (service_types or '').split(',') if s.strip()] or list(SERVICE_TYPES)
+    results = await asyncio.gather(*(call_thuhohpk_api(name) for name in requested))
+    return {
+        "status": "success",
+        "service_types": requested,
+        "data": dict(zip(requested, results)),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.get('/api/proxy/thuhohpk/{service_type}')
+async def proxy_api(service_type: str):
+    """Proxy endpoint để gọi API thuhohpk.com"""
+    try:
+        result = await call_thuhohpk_api(service_type)
+        return {
+            "status": "success",
+            "service_type": service_type,
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        return JSONResponse({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.now().isoformat()
+        }, status_code=500)
+
+
+@app.get('/api/proxy/test')
+async def test_proxy():
+    """Test endpoint để kiểm tra proxy hoạt động"""
+    return {
+        "status": "success",
+        "message": "Proxy server is running",
+        "timestamp": datetime.now().isoformat(),
+        "available_services": list(SERVICE_TYPES.keys())
+    }
+
+
+@app.get('/api/proxy/health')
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+if __name__ == '__main__':
+    import uvicorn
+    from app.utils.logging_setup import setup_logging
+
+    setup_logging(log_file='proxy.log')
+    logger.info("🚀 Starting API Proxy Server (async) on http://localhost:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000, log_config=None)
@@ -74,30 +74,52 @@ export const transactionStatusEnum = pgEnum('transaction_status', [
 ]);
 
 // Orders table
-export const orders = pgTable("orders", {
-  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
-  userId: varchar("user_id").notNull().references(() => users.id),
-  serviceType: serviceTypeEnum("service_type").notNull(),
-  status: orderStatusEnum("status").notNull().default('pending'),
-  totalAmount: decimal("total_amount", { precision: 15, scale: 2 }),
-  inputData: text("input_data").notNull(), // JSON string of input data
-  resultData: text("result_data"), // JSON string of results
-  createdAt: timestamp("created_at").defaultNow(),
-  updatedAt: timestamp("updated_at").defaultNow(),
-});
+export const orders = pgTable(
+  "orders",
+  {
+    id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+    userId: varchar("user_id").notNull().references(() => users.id),
+    serviceType: serviceTypeEnum("service_type").notNull(),
+    status: orderStatusEnum("status").notNull().default('pending'),
+    totalAmount: decimal("total_amount", { precision: 15, scale: 2 }),
+    inputData: text("input_data").notNull(), // JSON string of input data
+    resultData: text("result_data"), // JSON string of results
+    createdAt: timestamp("created_at").defaultNow(),
+    updatedAt: timestamp("updated_at").defaultNow(),
+  },
+  (table) => [index("idx_orders_service_type_id").on(table.serviceType, table.id)],
+);
 
 // Service transactions table
-export const serviceTransactions = pgTable("service_transactions", {
-  id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
-  orderId: varchar("order_id").notNull().references(() => orders.id),
-  code: varchar("code").notNull(), // Phone number, bill code, etc.
-  status: transactionStatusEnum("status").notNull().default('pending'),
-  amount: decimal("amount", { precision: 15, scale: 2 }),
-  notes: text("notes"),
-  processingData: text("processing_data"), // JSON for additional data
-  createdAt: timestamp("created_at").defaultNow(),
-  updatedAt: timestamp("updated_at").defaultNow(),
-});
+// Partial indexes only cover unfinished rows, so they stay small as history grows (see pending_work_indexes.sql)
+export const serviceTransactions = pgTable(
+  "service_transactions",
+  {
+    id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),
+    orderId: varchar("order_id").notNull().references(() => orders.id),
+    code: varchar("code").notNull(), // Phone number, bill code, etc.
+    status: transactionStatusEnum("status").notNull().default('pending'),
+    amount: decimal("amount", { precision: 15, scale: 2 }),
+    notes: text("notes"),
+    processingData: text("processing_data"), // JSON for additional data
+    claimedBy: varchar("claimed_by"), // Worker (host-pid) holding the transaction
+    leaseExpiresAt: timestamp("lease_expires_at"), // Other workers may reclaim after this
+    createdAt: timestamp("created_at").defaultNow(),
+    updatedAt: timestamp("updated_at").defaultNow(),
+  },
+  (table) => [
+    index("idx_service_transactions_pending_code")
+      .on(table.status, table.code, table.createdAt)
+      .where(sql`status IN ('pending', 'processing')`),
+    index("idx_service_transactions_pending_created")
+      .on(table.createdAt)
+      .where(sql`status IN ('pending', 'processing')`),
+    index("idx_service_transactions_order_id").on(table.orderId),
+    index("idx_service_transactions_lease")
+      .on(table.leaseExpiresAt)
+      .where(sql`status = 'processing'`),
+  ],
+);
 
 // System configuration table
 export const systemConfig = pgTable("system_config", {
@@ -29,16 +29,10 @@ def test_chrome_cron_manager():
         
         print("✅ Khởi tạo thành công")
         
-        # Kiểm tra Chrome driver
-        print(f"\n🌐 Kiểm tra Chrome driver:")
-        chrome_ready = cron.get_chrome_driver() is not None
-        print(f"   • Chrome ready: {chrome_ready}")
-        
-        if chrome_ready:
-            print("   ✅ Chrome driver sẵn sàng")
-        else:
-            print("   ❌ Chrome driver không sẵn sàng")
-            return False
+        # Kiểm tra BrowserPool (Chrome được tạo lười khi service cần)
+        print(f"\n🌐 Kiểm tra BrowserPool:")
+        pool = cron.get_status()['browser_pool']
+        print(f"   • Số slot: {pool['size']} | Chrome đang mở: {pool['alive']}")
         
         # Kiểm tra status
         print(f"\n📋 Status hiện tại:")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test hàng đợi mark_bill_completed (app/utils/completion_dispatcher.py): idempotent, backoff,
+lease và nhận job an toàn khi nhiều tiến trình dùng chung 1 file SQLite
+Chạy: python test_completion_dispatcher.py
+"""
+
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.utils.completion_dispatcher import (
+    CompletionDispatcher,
+    STATUS_DEAD,
+    STATUS_DONE,
+    STATUS_IN_FLIGHT,
+    STATUS_PENDING,
+)
+
+
+class FakeDispatcher(CompletionDispatcher):
+    """Không gọi API: ghi order_id đã xử lý vào file log, outcome quyết định thành công/thất bại"""
+
+    def __init__(self, db_path, log_path=None, outcome=True, **kwargs):
+        super().__init__(db_path=db_path, **kwargs)
+        self.log_path = log_path
+        self.outcome = outcome
+
+    def _process(self, job):
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(f"{job['order_id']}\n")
+        time.sleep(0.01)
+        self._finish(job, self.outcome, None if self.outcome else "fake error")
+
+
+def _row(dispatcher, order_id):
+    return dispatcher._conn.execute(
+        "SELECT status, attempts, next_attempt_at, owner, lease_until FROM completion_queue WHERE order_id = ?",
+        (order_id,),
+    ).fetchone()
+
+
+def test_enqueue_idempotent():
+    """Test enqueue cùng order 2 lần chỉ tạo 1 job"""
+    print("🧪 Test 1: enqueue idempotent")
+    with tempfile.TemporaryDirectory() as tmp:
+        dispatcher = FakeDispatcher(os.path.join(tmp, 'queue.db'))
+        assert dispatcher.enqueue('order-1', '0912345678')
+        assert not dispatcher.enqueue('order-1', '0912345678'), "order đã có phải bị bỏ qua"
+        assert not dispatcher.enqueue('  '), "order_id rỗng không được xếp hàng"
+        assert dispatcher.stats()[STATUS_PENDING] == 1
+        dispatcher._conn.close()
+    print("✅ 1 job cho 2 lần enqueue")
+
+
+def test_backoff_and_dead():
+    """Test thất bại => pending với backoff tăng dần, quá max_attempts => dead"""
+    print("\n🧪 Test 2: backoff + dead")
+    with tempfile.TemporaryDirectory() as tmp:
+        dispatcher = FakeDispatcher(os.path.join(tmp, 'queue.db'), outcome=False, max_attempts=3,
+                                    backoff_base=10, backoff_max=15)
+        dispatcher.enqueue('order-1')
+        delays = []
+        for attempt in range(1, 4):
+            # Cho job đến hạn ngay để không phải chờ backoff thật
+            dispatcher._conn.execute("UPDATE completion_queue SET next_attempt_at = 0")
+            job = dispatcher._claim_next()
+            assert job is not None and job['attempts'] == attempt - 1
+            assert _row(dispatcher, 'order-1')[0] == STATUS_IN_FLIGHT
+            assert dispatcher._claim_next() is None, "job in_flight còn lease không được nhận lại"
+            dispatcher._process(job)
+            status, attempts, next_at, owner, lease_until = _row(dispatcher, 'order-1')
+            assert attempts == attempt and owner is None and lease_until is None
+            delays.append(next_at - time.time())
+        assert status == STATUS_DEAD, f"quá max_attempts phải là dead, nhận {status}"
+        assert 10 * 0.8 - 1 <= delays[0] <= 10 * 1.2, f"lần 1 chờ ~backoff_base, nhận {delays[0]:.1f}s"
+        assert delays[1] <= 15 * 1.2, f"backoff phải bị chặn bởi backoff_max, nhận {delays[1]:.1f}s"
+        dispatcher._conn.close()
+    print(f"✅ Backoff {delays[0]:.1f}s -> {delays[1]:.1f}s, sau 3 lần => dead")
+
+
+def test_lease_recovery():
+    """Test khởi động chỉ trả lại job in_flight đã hết lease, không đụng job của tiến trình đang chạy"""
+    print("\n🧪 Test 3: lease")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'queue.db')
+        first = FakeDispatcher(path, lease_seconds=60)
+        first.enqueue('alive')
+        first.enqueue('crashed')
+        alive = first._claim_next()
+        crashed = first._claim_next()
+        first._conn.execute("UPDATE completion_queue SET lease_until = ? WHERE order_id = ?",
+                            (time.time() - 1, crashed['order_id']))
+
+        second = FakeDispatcher(path, lease_seconds=60)
+        assert _row(second, alive['order_id'])[0] == STATUS_IN_FLIGHT, "job còn lease phải giữ nguyên"
+        assert _row(second, crashed['order_id'])[0] == STATUS_PENDING, "job hết lease phải về pending"
+        job = second._claim_next()
+        assert job['order_id'] == crashed['order_id'] and second._claim_next() is None
+
+        # Job hết lease đã bị tiến trình khác nhận => kết quả của chủ cũ không ghi đè
+        first._conn.execute("UPDATE completion_queue SET lease_until = 0 WHERE order_id = ?", (alive['order_id'],))
+        stolen = second._claim_next()
+        assert stolen['order_id'] == alive['order_id']
+        first._finish(alive, True, None)
+        assert _row(second, alive['order_id'])[0] == STATUS_IN_FLIGHT
+        second._finish(stolen, True, None)
+        assert _row(second, alive['order_id'])[0] == STATUS_DONE
+        first._conn.close()
+        second._conn.close()
+    print("✅ Chỉ job hết lease được nhận lại, chủ cũ không ghi đè")
+
+
+def _run_dispatcher(db_path, log_path, seconds):
+    dispatcher = FakeDispatcher(db_path, log_path=log_path, workers=3)
+    dispatcher.start()
+    time.sleep(seconds)
+    dispatcher.stop()
+
+
+def test_multi_process_claim():
+    """Test 3 tiến trình x 3 worker cùng 1 file: mỗi order chỉ được xử lý đúng 1 lần"""
+    print("\n🧪 Test 4: nhiều tiến trình")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'queue.db')
+        log_path = os.path.join(tmp, 'processed.log')
+        producer = FakeDispatcher(db_path)
+        orders = [f"order-{i}" for i in range(150)]
+        for order_id in orders:
+            producer.enqueue(order_id)
+
+        ctx = mp.get_context("spawn")
+        processes = [ctx.Process(target=_run_dispatcher, args=(db_path, log_path, 4.0)) for _ in range(3)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join(timeout=60)
+
+        with open(log_path, encoding='utf-8') as f:
+            processed = [line.strip() for line in f if line.strip()]
+        duplicates = len(processed) - len(set(processed))
+        assert duplicates == 0, f"{duplicates} order bị xử lý trùng"
+        assert sorted(processed) == sorted(orders), f"xử lý {len(set(processed))}/{len(orders)} order"
+        assert producer.stats()[STATUS_DONE] == len(orders)
+        producer._conn.close()
+    print(f"✅ {len(orders)} order, 3 tiến trình, không trùng")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test CompletionDispatcher...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_enqueue_idempotent,
+        test_backoff_and_dead,
+        test_lease_recovery,
+        test_multi_process_claim,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -99,12 +99,77 @@ def test_schedule_setup():
         print(f"❌ Lỗi thiết lập lịch trình: {e}")
         return False
 
+def test_job_scheduler():
+    """Test hàng đợi ưu tiên: job chạy song song, không chạy chồng, gộp lượt bị lỡ"""
+    print("\n🧪 Test 5: JobScheduler")
+    try:
+        from app.utils.job_scheduler import JobScheduler
+        
+        started = []
+        def make_job(name, seconds):
+            def job():
+                started.append(name)
+                time.sleep(seconds)
+            return job
+        
+        scheduler = JobScheduler(max_workers=2, tick=0.05)
+        now = time.time()
+        scheduler.add_job('slow', make_job('slow', 0.6), 0.1, priority=1, first_run=now)
+        scheduler.add_job('fast', make_job('fast', 0.05), 0.2, priority=2, first_run=now)
+        scheduler.start()
+        time.sleep(0.4)
+        running = scheduler.running()
+        time.sleep(0.6)
+        scheduler.stop(timeout=2)
+        
+        metrics = scheduler.metrics()
+        slow, fast = metrics['jobs']['slow'], metrics['jobs']['fast']
+        assert started[0] == 'slow', "job ưu tiên cao phải chạy trước"
+        assert fast['runs'] >= 2 and 'slow' in running, "fast phải chạy song song khi slow đang chạy"
+        assert slow['coalesced'] > 0, "slow bị lỡ lượt phải được gộp"
+        
+        # Đơn mới (NOTIFY) đến khi job đang chạy => chạy thêm 1 lượt ngay sau đó
+        started.clear()
+        scheduler = JobScheduler(max_workers=1, tick=0.05)
+        scheduler.add_job('notify', make_job('notify', 0.3), 0, first_run=float('inf'))
+        scheduler.start()
+        scheduler.trigger('notify')
+        time.sleep(0.1)
+        scheduler.trigger('notify', rerun_if_running=True)
+        scheduler.wait_idle(timeout=3)
+        scheduler.stop(timeout=2)
+        assert started == ['notify', 'notify'], "trigger khi đang chạy phải chạy lại 1 lượt"
+        print(f"✅ slow: {slow['runs']} lượt, gộp {slow['coalesced']} | fast: {fast['runs']} lượt | hàng đợi cao nhất {metrics['max_queue_depth']}")
+        return True
+    except Exception as e:
+        print(f"❌ Lỗi JobScheduler: {e}")
+        return False
+
+def test_time_windows():
+    """Test khung giờ cao điểm và lịch bắt đầu theo start_time"""
+    print("\n🧪 Test 6: Khung giờ / start_time")
+    try:
+        from app.cron_manager import in_time_window, next_aligned_run
+        
+        ts = datetime(2025, 1, 16, 9, 30).timestamp()
+        peak = {"start": "09:00", "end": "11:00", "enabled": True}
+        assert in_time_window(peak, ts), "09:30 phải nằm trong giờ cao điểm"
+        assert not in_time_window({**peak, "enabled": False}, ts), "khung giờ tắt thì bỏ qua"
+        assert in_time_window({"start": "22:00", "end": "10:00", "enabled": True}, ts), "khung qua đêm"
+        
+        first = datetime.fromtimestamp(next_aligned_run("09:45", 30 * 60, ts))
+        assert (first.hour, first.minute) == (9, 45), f"lượt đầu phải là 09:45, nhận {first}"
+        print(f"✅ Giờ cao điểm + start_time đúng (lượt đầu {first.strftime('%H:%M')})")
+        return True
+    except Exception as e:
+        print(f"❌ Lỗi khung giờ: {e}")
+        return False
+
 def test_dependencies():
     """Test các dependency"""
-    print("\n🧪 Test 5: Kiểm tra dependencies")
+    print("\n🧪 Test 7: Kiểm tra dependencies")
     
     dependencies = [
-        ('schedule', 'schedule'),
         ('json', 'json'),
         ('threading', 'threading'),
         ('datetime', 'datetime')
@@ -132,6 +197,8 @@ def main():
         test_cron_manager_import,
         test_service_control,
         test_schedule_setup,
+        test_job_scheduler,
+        test_time_windows,
         test_dependencies
     ]
     
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test phần đọc/ghi form của JsfClient (app/utils/jsf_client.py): serialize_form gửi đúng các field như
+trình duyệt, parse_partial_response đọc <update> và báo lỗi/redirect bằng JsfLookupError
+Chạy: python test_jsf_client.py
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from bs4 import BeautifulSoup
+
+from app.utils.jsf_client import JsfLookupError, parse_partial_response, serialize_form
+
+FORM_HTML = """
+<form id="form" action="/pages/newInternetTelevisionViettel.jsf" method="post">
+  <input type="hidden" name="form" value="form">
+  <input type="text" id="form:code" name="form:code" value="">
+  <input type="text" name="form:note">
+  <input type="text" name="form:locked" value="x" disabled>
+  <input type="radio" id="form:type:0" name="form:type" value="PREPAID" checked>
+  <input type="radio" id="form:type:1" name="form:type" value="POSTPAID">
+  <input type="checkbox" id="form:agree" name="form:agree">
+  <input type="checkbox" id="form:remember" name="form:remember" value="yes" checked>
+  <select name="form:province">
+    <option value="HN">Hà Nội</option>
+    <option value="HCM" selected>TP.HCM</option>
+  </select>
+  <select name="form:bank"><option value="VTB">Vietinbank</option><option value="BIDV">BIDV</option></select>
+  <textarea name="form:memo">ghi chú</textarea>
+  <input type="submit" name="form:search" value="Tra cứu">
+  <button type="button" name="form:clear">Xóa</button>
+  <input type="file" name="form:upload">
+  <input type="hidden" name="javax.faces.ViewState" value="-123:456">
+</form>
+"""
+
+PARTIAL_OK = b"""<?xml version="1.0" encoding="UTF-8"?>
+<partial-response id="j_id1"><changes>
+<update id="form:result"><![CDATA[<div id="form:result"><span>N\xe1\xbb\xa3 c\xc6\xb0\xe1\xbb\x9bc: 150.000</span></div>]]></update>
+<update id="form:messages"><![CDATA[]]></update>
+<update id="j_id1:javax.faces.ViewState:0"><![CDATA[-987:654]]></update>
+</changes></partial-response>"""
+
+
+def _form():
+    return BeautifulSoup(FORM_HTML, "html.parser").find("form")
+
+
+def test_serialize_defaults():
+    """Test giá trị mặc định: bỏ ViewState, disabled, nút bấm, file; radio/checkbox/select như trình duyệt"""
+    print("🧪 Test 1: serialize_form mặc định")
+    fields = serialize_form(_form())
+    assert fields == [
+        ("form", "form"),
+        ("form:code", ""),
+        ("form:note", ""),
+        ("form:type", "PREPAID"),
+        ("form:remember", "yes"),
+        ("form:province", "HCM"),
+        ("form:bank", "VTB"),
+        ("form:memo", "ghi chú"),
+    ], fields
+    print(f"✅ {len(fields)} field")
+
+
+def test_serialize_check_ids():
+    """Test check_ids: chọn radio khác thay cho radio mặc định, tick thêm checkbox"""
+    print("\n🧪 Test 2: serialize_form với check_ids")
+    fields = dict(serialize_form(_form(), check_ids=["form:type:1", "form:agree"]))
+    assert fields["form:type"] == "POSTPAID", "radio được chọn phải thay radio checked sẵn"
+    assert fields["form:agree"] == "on", "checkbox không có value gửi 'on'"
+    assert [name for name, _ in serialize_form(_form(), check_ids=["form:type:1"])].count("form:type") == 1
+    print("✅ Radio POSTPAID, checkbox agree=on")
+
+
+def test_parse_updates():
+    """Test đọc các <update> (CDATA, tiếng Việt, ViewState mới)"""
+    print("\n🧪 Test 3: parse_partial_response")
+    updates = parse_partial_response(PARTIAL_OK)
+    assert set(updates) == {"form:result", "form:messages", "j_id1:javax.faces.ViewState:0"}
+    assert "Nợ cước: 150.000" in updates["form:result"]
+    assert updates["form:messages"] == ""
+    assert updates["j_id1:javax.faces.ViewState:0"] == "-987:654"
+    print(f"✅ {len(updates)} update")
+
+
+def test_parse_errors():
+    """Test redirect (hết phiên), <error> của server, HTML thay vì XML => JsfLookupError"""
+    print("\n🧪 Test 4: parse_partial_response báo lỗi")
+    cases = {
+        "redirect": b'<partial-response><redirect url="/login.jsf"/></partial-response>',
+        "error": b"<partial-response><error><error-name>javax.faces.application.ViewExpiredException"
+                 b"</error-name><error-message>View could not be restored</error-message></error>"
+                 b"</partial-response>",
+        "html": b"<html><body>Login</body></html>",
+        "not_xml": b"<!DOCTYPE html><html><body><input></body></html>",
+    }
+    messages = {}
+    for name, content in cases.items():
+        try:
+            parse_partial_response(content)
+            raise AssertionError(f"{name}: phải ném JsfLookupError")
+        except JsfLookupError as e:
+            messages[name] = str(e)
+    assert "/login.jsf" in messages["redirect"]
+    assert "ViewExpiredException" in messages["error"] and "could not be restored" in messages["error"]
+    assert "<html>" in messages["html"]
+    print(f"✅ {len(cases)} trường hợp lỗi đều ném JsfLookupError")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test JsfClient (form + partial-response)...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_serialize_defaults,
+        test_serialize_check_ids,
+        test_parse_updates,
+        test_parse_errors,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
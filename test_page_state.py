@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test PageStateTracker.load_form (app/utils/page_state.py): reset form tại chỗ khi cùng trang + cùng dịch vụ,
+tải lại khi khác URL, đổi dịch vụ, force, ViewState/phiên hết hạn hoặc form quá PAGE_VIEW_MAX_AGE
+Chạy: python test_page_state.py
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.navigate import EVN_URL, FTTH_URL, TV_INTERNET_URL
+from app.process import FTTH_SPEC, TV_INTERNET_SPEC
+from app.utils.page_state import PageStateTracker
+
+
+class FakeDriver:
+    """Thay Chrome: problem = kết quả kiểm tra ViewState, ghi lại các lần reset form"""
+
+    def __init__(self):
+        self.problem = ''
+        self.resets = []
+
+    def execute_script(self, script, *args):
+        if 'javax.faces.ViewState' in script:
+            return self.problem
+        if 'ids.forEach' in script:
+            self.resets.append(list(args[0]))
+            return None
+        # wait_ajax_idle: trang luôn idle
+        return True
+
+
+class Recorder:
+    """open_page / after_open giả: đếm số lần được gọi"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, driver):
+        self.calls += 1
+
+
+def _load(tracker, driver, key, url, open_page, after_open=None, **kwargs):
+    return tracker.load_form(driver, key, url, ready_id="form:code", open_page=open_page,
+                             after_open=after_open, input_ids=["form:code"], step=key, **kwargs)
+
+
+def test_reset_in_place():
+    """Test lần đầu tải trang, các lần sau cùng URL chỉ reset form"""
+    print("🧪 Test 1: reset tại chỗ")
+    tracker = PageStateTracker(max_age=600)
+    driver = FakeDriver()
+    open_page = Recorder()
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is True
+    for _ in range(5):
+        assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is False
+    assert open_page.calls == 1 and len(driver.resets) == 5
+    assert driver.resets[0] == ["form:code"]
+    stats = tracker.stats()
+    assert stats == {'tracked_drivers': 1, 'loads': 1, 'resets': 5, 'expired_reloads': 0}, stats
+    print(f"✅ 1 lần tải trang, 5 lần reset: {stats}")
+
+
+def test_switch_service_same_page():
+    """Test FTTH -> TV-Internet (chung URL): phải tải lại trang để bỏ radio "Số thuê bao" FTTH đã chọn"""
+    print("\n🧪 Test 2: đổi dịch vụ cùng trang")
+    assert FTTH_SPEC.url == TV_INTERNET_SPEC.url == TV_INTERNET_URL
+    assert FTTH_SPEC.after_navigate is not None and TV_INTERNET_SPEC.after_navigate is None
+    tracker = PageStateTracker(max_age=600)
+    driver = FakeDriver()
+    open_page = Recorder()
+    select_radio = Recorder()
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page, select_radio) is True
+    assert _load(tracker, driver, 'tv_internet', TV_INTERNET_URL, open_page) is True, \
+        "đổi dịch vụ không được chỉ reset tại chỗ"
+    assert open_page.calls == 2 and select_radio.calls == 1 and driver.resets == []
+    assert tracker.get(driver).key == 'tv_internet'
+    assert _load(tracker, driver, 'tv_internet', TV_INTERNET_URL, open_page) is False, "cùng dịch vụ chỉ reset"
+
+    # Quay lại FTTH: tải lại và chọn lại radio
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page, select_radio) is True
+    assert open_page.calls == 3 and select_radio.calls == 2
+
+    assert _load(tracker, driver, 'evn', EVN_URL, open_page) is True
+    assert open_page.calls == 4 and tracker.get(driver).url == EVN_URL
+    assert tracker.stats()['expired_reloads'] == 0, "khác URL / đổi dịch vụ không tính là hết hạn"
+    print("✅ Đổi dịch vụ tải lại trang, cùng dịch vụ chỉ reset")
+
+
+def test_reload_reasons():
+    """Test ViewState hết hạn, về trang đăng nhập, quá max_age, force => tải lại"""
+    print("\n🧪 Test 3: lý do tải lại")
+    tracker = PageStateTracker(max_age=600)
+    driver = FakeDriver()
+    open_page = Recorder()
+    _load(tracker, driver, 'ftth', FTTH_URL, open_page)
+
+    for problem in ('view_expired', 'login', 'missing:form:code'):
+        driver.problem = problem
+        assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is True, problem
+    driver.problem = ''
+
+    tracker.get(driver).loaded_at = time.monotonic() - 601
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is True, "form quá max_age phải tải lại"
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page, force=True) is True
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is False
+    stats = tracker.stats()
+    assert open_page.calls == 6 and stats['expired_reloads'] == 4 and driver.resets == [["form:code"]], stats
+
+    # Driver bị đóng => quên trạng thái, lần sau tải lại
+    tracker.forget(driver)
+    assert _load(tracker, driver, 'ftth', FTTH_URL, open_page) is True
+    print(f"✅ {stats}")
+
+
+def test_drivers_tracked_separately():
+    """Test mỗi Chrome có trạng thái riêng"""
+    print("\n🧪 Test 4: nhiều driver")
+    tracker = PageStateTracker(max_age=0)
+    first, second = FakeDriver(), FakeDriver()
+    open_page = Recorder()
+    assert _load(tracker, first, 'ftth', FTTH_URL, open_page) is True
+    assert _load(tracker, second, 'ftth', FTTH_URL, open_page) is True
+    assert _load(tracker, first, 'ftth', FTTH_URL, open_page) is False, "max_age=0 là không giới hạn tuổi"
+    assert tracker.stats()['tracked_drivers'] == 2 and open_page.calls == 2
+    print("✅ 2 driver, mỗi driver tải trang 1 lần")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test PageStateTracker...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_reset_in_place,
+        test_switch_service_same_page,
+        test_reload_reasons,
+        test_drivers_tracked_separately,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
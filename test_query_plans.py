@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Test kế hoạch truy vấn (EXPLAIN) cho các truy vấn lấy việc pending trong app/db.py
+Chạy: python test_query_plans.py [số dòng lịch sử, mặc định 500000]
+(pytest chạy test_pending_work_plans với SEED_ROWS, bỏ qua nếu không có DB / chưa tạo index)
+
+Seed dữ liệu giả trong 1 transaction (lịch sử lớn đã xong + ít mã pending), ANALYZE,
+EXPLAIN từng truy vấn rồi ROLLBACK => database không bị thay đổi.
+Cần chạy pending_work_indexes.sql (hoặc npm run db:push) trước.
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+import psycopg2
+
+from app.config import DB_DATABASE_URL
+from app.db import _pending_work_query, _pending_orders_for_code_query, _claim_query
+
+SEED_ROWS = 500000
+PENDING_EVERY = 1000  # 1/1000 giao dịch còn pending, còn lại là lịch sử đã xong
+TEST_USER_ID = 'query-plan-test-user'
+
+SEED_SQL = [
+    """
+    INSERT INTO users (id, "user", first_name, last_name, role, status)
+    VALUES (%(user_id)s, %(user_id)s, 'Query', 'Plan', 'user', 'active')
+    """,
+    """
+    INSERT INTO orders (id, user_id, service_type, status, input_data, created_at, updated_at)
+    SELECT 'qp-o-' || g, %(user_id)s,
+           (ARRAY['tra_cuu_ftth','gach_dien_evn','nap_tien_da_mang','nap_tien_viettel',
+                  'thanh_toan_tv_internet','tra_cuu_no_tra_sau'])[1 + g %% 6]::service_type,
+           (CASE WHEN g %% %(pending_every)s = 0 THEN 'pending' ELSE 'completed' END)::order_status,
+           'qp', NOW() - make_interval(secs => g), NOW() - make_interval(secs => g)
+    FROM generate_series(1, %(rows)s) g
+    """,
+    """
+    INSERT INTO service_transactions (id, order_id, code, status, created_at, updated_at)
+    SELECT 'qp-t-' || g, 'qp-o-' || g,
+           CASE WHEN g %% 6 = 2 AND g %% 4 = 0 THEN '09' || lpad((g %% 100000000)::text, 8, '0') || '|50000'
+                ELSE '09' || lpad((g %% 100000000)::text, 8, '0') END,
+           (CASE WHEN g %% %(pending_every)s = 0 THEN 'pending' ELSE 'success' END)::transaction_status,
+           NOW() - make_interval(secs => g), NOW() - make_interval(secs => g)
+    FROM generate_series(1, %(rows)s) g
+    """,
+    "ANALYZE users",
+    "ANALYZE orders",
+    "ANALYZE service_transactions",
+]
+
+# Bảng -> index được phép dùng (không chấp nhận Seq Scan trên bảng lớn)
+EXPECTED_INDEXES = {
+    'service_transactions': {
+        'idx_service_transactions_pending_code',
+        'idx_service_transactions_pending_created',
+        'idx_service_transactions_order_id',
+    },
+    'orders': {
+        'orders_pkey',
+        'idx_orders_service_type_id',
+    },
+}
+
+
+def plan_scans(plan, scans=None):
+    """Duyệt cây EXPLAIN (FORMAT JSON) -> [(node_type, relation, index)]"""
+    if scans is None:
+        scans = []
+    if 'Relation Name' in plan:
+        index_name = plan.get('Index Name')
+        if plan['Node Type'] == 'Bitmap Heap Scan':
+            # Index nằm ở node con Bitmap Index Scan (có thể qua BitmapOr)
+            stack = list(plan.get('Plans', []))
+            while stack and index_name is None:
+                child = stack.pop()
+                index_name = child.get('Index Name')
+                stack.extend(child.get('Plans', []))
+        scans.append((plan['Node Type'], plan['Relation Name'], index_name))
+    for child in plan.get('Plans', []):
+        plan_scans(child, scans)
+    return scans
+
+
+def explain(cur, sql, params):
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    raw = cur.fetchone()[0]
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    return data[0]['Plan']
+
+
+def check_plan(name, plan):
+    """True nếu mọi scan trên bảng lớn đều đi qua index mong đợi"""
+    ok = True
+    for node_type, relation, index_name in plan_scans(plan):
+        allowed = EXPECTED_INDEXES.get(relation)
+        if allowed is None:
+            continue
+        if node_type == 'Seq Scan' or index_name not in allowed:
+            ok = False
+            print(f"   ❌ {name}: {node_type} trên {relation} (index={index_name})")
+        else:
+            print(f"   • {name}: {node_type} {relation} dùng {index_name}")
+    print(f"{'✅' if ok else '❌'} {name} (chi phí ước tính {plan['Total Cost']:.0f})")
+    return ok
+
+
+def hot_queries():
+    """Các truy vấn nóng, SQL lấy trực tiếp từ app/db.py"""
+    code = '09' + str(PENDING_EVERY * 6).zfill(8)
+    return [
+        ("fetch ftth", *_pending_work_query('tra_cuu_ftth')),
+        ("fetch ftth (limit 50)", *_pending_work_query('tra_cuu_ftth', limit=50)),
+        ("fetch đa mạng trả trước", *_pending_work_query('nap_tien_da_mang', 'prepaid', 50)),
+        ("fetch đa mạng trả sau", *_pending_work_query('nap_tien_da_mang', 'postpaid', 50)),
+        ("find order_id", *_pending_orders_for_code_query('tra_cuu_ftth', code, latest_only=True)),
+        ("check pending theo user", *_pending_orders_for_code_query('tra_cuu_ftth', code, TEST_USER_ID)),
+        ("claim evn", *_claim_query('gach_dien_evn', 'query-plan-test', 50)),
+        ("ghi kết quả theo order_id",
+         "UPDATE service_transactions SET notes = notes WHERE order_id = %s", ('qp-o-6000',)),
+    ]
+
+
+def missing_prerequisites(conn):
+    """Index trong EXPECTED_INDEXES / cột lease (claim_leases.sql) chưa có trên DB"""
+    expected = sorted(set().union(*EXPECTED_INDEXES.values()))
+    with conn.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)", (expected,))
+        found = {row[0] for row in cur.fetchall()}
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = 'service_transactions' AND column_name IN ('claimed_by', 'lease_expires_at')"
+        )
+        columns = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+    missing = [name for name in expected if name not in found]
+    missing += [f"service_transactions.{c}" for c in ('claimed_by', 'lease_expires_at') if c not in columns]
+    return missing
+
+
+def run_plan_checks(conn, seed_rows):
+    """Seed trong 1 transaction, EXPLAIN các truy vấn nóng rồi ROLLBACK; trả về tên các truy vấn không dùng index"""
+    failed = []
+    try:
+        with conn.cursor() as cur:
+            params = {'user_id': TEST_USER_ID, 'rows': seed_rows, 'pending_every': PENDING_EVERY}
+            for sql in SEED_SQL:
+                cur.execute(sql, params)
+            for name, sql, query_params in hot_queries():
+                if not check_plan(name, explain(cur, sql, query_params)):
+                    failed.append(name)
+    finally:
+        # Không để lại dữ liệu seed
+        conn.rollback()
+    return failed
+
+
+def test_pending_work_plans():
+    """pytest: truy vấn nóng phải dùng index (bỏ qua khi không có DB hoặc chưa chạy pending_work_indexes.sql)"""
+    import pytest  # chỉ cần khi chạy qua pytest, chạy script không đòi pytest
+
+    try:
+        conn = psycopg2.connect(DB_DATABASE_URL, connect_timeout=5)
+    except Exception as e:
+        pytest.skip(f"Không kết nối được DB_DATABASE_URL: {e}")
+    try:
+        missing = missing_prerequisites(conn)
+        if missing:
+            pytest.skip(f"DB chưa có {', '.join(missing)} (chạy pending_work_indexes.sql / claim_leases.sql)")
+        failed = run_plan_checks(conn, SEED_ROWS)
+    finally:
+        conn.close()
+    assert not failed, f"Truy vấn quét toàn bảng: {', '.join(failed)}"
+
+
+def main(seed_rows=SEED_ROWS):
+    print("🚀 Bắt đầu test kế hoạch truy vấn...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🌱 Seed {seed_rows} giao dịch ({seed_rows // PENDING_EVERY} pending)")
+    print("=" * 50)
+
+    conn = psycopg2.connect(DB_DATABASE_URL)
+    total = len(hot_queries())
+    try:
+        missing = missing_prerequisites(conn)
+        if missing:
+            print(f"⚠️ DB chưa có: {', '.join(missing)}")
+        failed = run_plan_checks(conn, seed_rows)
+    except Exception as e:
+        print(f"❌ Lỗi EXPLAIN: {e}")
+        return False
+    finally:
+        conn.close()
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {total - len(failed)}/{total} truy vấn dùng index")
+    if failed:
+        print("⚠️ Có truy vấn quét toàn bảng, kiểm tra pending_work_indexes.sql đã chạy chưa")
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main(int(sys.argv[1]) if len(sys.argv) > 1 else SEED_ROWS)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Test RateGovernor (app/utils/rate_governor.py): token bucket, giới hạn luồng song song, AIMD lùi/tăng tốc độ,
+chỉ lỗi mạng / HTTP 429-5xx mới tính là bị chặn, bản asyncio aslot() (chờ trên event loop, hủy task không bị
+tính là thành công)
+Chạy: python test_rate_governor.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+import requests
+from selenium.common.exceptions import TimeoutException
+
+from app.utils.jsf_client import JsfLookupError
+from app.utils.rate_governor import RateGovernor, is_throttle_alert
+
+
+class _PortalError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_token_bucket():
+    """Test 600 lượt/phút, dồn tối đa 2: 12 lượt liên tiếp mất ~1s (2 lượt đầu không chờ)"""
+    print("🧪 Test 1: token bucket")
+    governor = RateGovernor("test", rate_per_minute=600, max_concurrency=2)
+    started = time.monotonic()
+    for _ in range(12):
+        with governor.slot():
+            pass
+    elapsed = time.monotonic() - started
+    assert 0.9 <= elapsed <= 1.6, f"12 lượt ở 10/s phải mất ~1s, nhận {elapsed:.2f}s"
+    assert governor.stats()['succeeded'] == 12
+    print(f"✅ 12 lượt trong {elapsed:.2f}s")
+
+
+def test_concurrency_limit():
+    """Test 8 luồng cùng gọi nhưng tối đa 3 lượt song song"""
+    print("\n🧪 Test 2: giới hạn luồng song song")
+    governor = RateGovernor("test", rate_per_minute=0, max_concurrency=3)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal active, peak
+        for _ in range(5):
+            with governor.slot():
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.01)
+                with lock:
+                    active -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = governor.stats()
+    assert peak <= 3 and stats['max_inflight'] <= 3, f"vượt giới hạn: {peak} luồng"
+    assert stats['succeeded'] == 40 and stats['inflight'] == 0
+    print(f"✅ 40 lượt, tối đa {peak} song song")
+
+
+def test_aimd_backoff_and_recovery():
+    """Test bị chặn => nhân luồng/tốc độ với backoff (1 lần / cooldown), thành công => tăng dần lại"""
+    print("\n🧪 Test 3: AIMD")
+    governor = RateGovernor("test", rate_per_minute=6000, max_concurrency=8, backoff=0.5, cooldown=60)
+    try:
+        with governor.slot():
+            raise _PortalError(429)
+    except _PortalError:
+        pass
+    stats = governor.stats()
+    assert stats['concurrency_limit'] == 4 and stats['rate_per_minute'] == 3000, stats
+    assert stats['throttled'] == {'http_429': 1} and stats['backoffs'] == 1
+
+    # Trong cooldown: vẫn đếm lý do nhưng không lùi thêm
+    with governor.slot() as slot:
+        slot.alert("Hệ thống đang quá tải, vui lòng thử lại sau")
+    with governor.slot() as slot:
+        slot.http(503)
+    stats = governor.stats()
+    assert stats['backoffs'] == 1 and stats['concurrency_limit'] == 4, stats
+    assert stats['throttled'] == {'http_429': 1, 'alert': 1, 'http_503': 1}
+
+    # Lỗi có status_code 4xx (không phải 429) là phản hồi bình thường, không tính là bị chặn
+    try:
+        with governor.slot():
+            raise _PortalError(404)
+    except _PortalError:
+        pass
+    assert governor.stats()['succeeded'] == 1
+
+    # Độ trễ cố định (slot() đo thời gian thật, ~0s trong test) để chỉ xét phần tăng tốc độ
+    for _ in range(40):
+        governor.acquire()
+        governor.release(0.1)
+    stats = governor.stats()
+    assert stats['concurrency_limit'] == 8 and stats['rate_per_minute'] == 6000, stats
+    assert is_throttle_alert("quá tải") and not is_throttle_alert("Mã không hợp lệ")
+    print(f"✅ Lùi về 4 luồng / 3000 mỗi phút rồi tăng lại {stats['concurrency_limit']} luồng")
+
+
+def _raise_in_slot(governor, make_error):
+    try:
+        with governor.slot():
+            raise make_error()
+    except Exception:
+        pass
+
+
+def _jsf_wrapping(error):
+    """JsfLookupError bọc lỗi requests như JsfClient.open_view / partial_submit"""
+    def make():
+        try:
+            raise error
+        except requests.RequestException as e:
+            raise JsfLookupError(f"GET lỗi: {e}", getattr(e.response, 'status_code', None))
+    return make
+
+
+def test_non_portal_errors_not_throttling():
+    """Test lỗi Selenium / parse / phiên hết hạn không làm governor lùi; lỗi mạng, 429/5xx thì có"""
+    print("\n🧪 Test 4: phân loại exception")
+    governor = RateGovernor("test", rate_per_minute=6000, max_concurrency=4, backoff=0.5, cooldown=0)
+    # Mã sai / chưa có kết quả: Selenium chờ khối kết quả hết giờ
+    for _ in range(5):
+        _raise_in_slot(governor, lambda: TimeoutException("no result block"))
+    _raise_in_slot(governor, lambda: ValueError("không đọc được số tiền"))
+    _raise_in_slot(governor, lambda: JsfLookupError("Phiên đăng nhập đã hết hạn"))
+    stats = governor.stats()
+    assert stats['backoffs'] == 0 and stats['throttled'] == {}, stats
+    assert stats['concurrency_limit'] == 4 and stats['rate_per_minute'] == 6000, stats
+    assert stats['succeeded'] == 0 and stats['inflight'] == 0 and stats['latency_ewma'] is None, \
+        "lỗi không do portal không được tính là thành công / mẫu độ trễ"
+
+    _raise_in_slot(governor, lambda: requests.Timeout("read timed out"))
+    _raise_in_slot(governor, _jsf_wrapping(requests.ConnectionError("connection reset")))
+    _raise_in_slot(governor, lambda: JsfLookupError("POST lỗi", 503))
+    stats = governor.stats()
+    assert stats['throttled'] == {'timeout': 1, 'network': 1, 'http_503': 1}, stats
+    assert stats['backoffs'] == 3 and stats['concurrency_limit'] == 1, stats
+    print(f"✅ 7 lỗi ngoài portal không lùi, 3 lỗi mạng/5xx lùi: {stats['throttled']}")
+
+
+def test_latency_backoff():
+    """Test độ trễ vượt latency_factor x mức nền => lùi với lý do 'latency'"""
+    print("\n🧪 Test 5: lùi theo độ trễ")
+    governor = RateGovernor("test", rate_per_minute=0, max_concurrency=4, backoff=0.5, cooldown=60,
+                            latency_factor=2.5)
+    for _ in range(10):
+        governor.acquire()
+        governor.release(0.1)
+    assert governor.stats()['backoffs'] == 0
+    for _ in range(10):
+        governor.acquire()
+        governor.release(2.0)
+    stats = governor.stats()
+    assert stats['throttled'].get('latency') and stats['backoffs'] == 1, stats
+    assert stats['concurrency_limit'] == 2
+    print(f"✅ EWMA {stats['latency_ewma']}s so với nền {stats['latency_base']}s => lùi")
+
+
+def test_async_slot():
+    """Test aslot(): giới hạn song song trên event loop, hủy khi đang giữ/đang chờ lượt không tính thành công"""
+    print("\n🧪 Test 6: aslot")
+    governor = RateGovernor("test", rate_per_minute=600, max_concurrency=2)
+
+    async def scenario():
+        active = 0
+        peak = 0
+
+        async def call():
+            nonlocal active, peak
+            with await governor.aslot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.02)
+                active -= 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(12)))
+        elapsed = time.monotonic() - started
+
+        async def hold():
+            with await governor.aslot():
+                await asyncio.sleep(10)
+
+        holders = [asyncio.ensure_future(hold()) for _ in range(2)]
+        await asyncio.sleep(0.3)
+        waiter = asyncio.ensure_future(governor.aslot())
+        await asyncio.sleep(0.05)
+        assert governor._async_waiters, "coroutine chờ lượt phải đăng ký waiter"
+        waiter.cancel()
+        for task in holders:
+            task.cancel()
+        await asyncio.gather(waiter, *holders, return_exceptions=True)
+        return peak, elapsed
+
+    peak, elapsed = asyncio.run(scenario())
+    stats = governor.stats()
+    assert peak <= 2, f"vượt giới hạn: {peak} coroutine"
+    assert 0.9 <= elapsed <= 1.8, f"12 lượt ở 10/s phải mất ~1s, nhận {elapsed:.2f}s"
+    assert stats['inflight'] == 0 and not governor._async_waiters, stats
+    assert stats['acquired'] == 14 and stats['succeeded'] == 12, "lượt bị hủy không được tính là thành công"
+    assert stats['throttled'] == {} and stats['backoffs'] == 0
+    print(f"✅ 12 lượt async trong {elapsed:.2f}s, tối đa {peak} song song, 2 lượt bị hủy được trả lại")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test RateGovernor...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_token_bucket,
+        test_concurrency_limit,
+        test_aimd_backoff_and_recovery,
+        test_non_portal_errors_not_throttling,
+        test_latency_backoff,
+        test_async_slot,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test ResultWriter (app/utils/result_writer.py): khôi phục từ WAL, thử lại khi mất kết nối DB,
+dòng bị DB từ chối vì dữ liệu chuyển sang dead-letter mà không chặn các kết quả khác
+Chạy: python test_result_writer.py
+"""
+
+import json
+import os
+from contextlib import contextmanager
+import sys
+import tempfile
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+import psycopg2
+
+import app.utils.result_writer as result_writer
+from app.utils.result_writer import ResultWriter
+
+
+class FakeDB:
+    """
+    Thay db_update_results_batch: down=True (hoặc quá down_after lần gọi) => lỗi kết nối;
+    status 'bogus' => lỗi cast enum
+    """
+
+    def __init__(self, down_after=None):
+        self.down = False
+        self.down_after = down_after
+        self.rows = []
+        self.calls = 0
+
+    def __call__(self, records):
+        self.calls += 1
+        if self.down or (self.down_after is not None and self.calls > self.down_after):
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        for rec in records:
+            if rec['status'] not in ('success', 'failed'):
+                raise psycopg2.DataError(f'invalid input value for enum transaction_status: "{rec["status"]}"')
+        self.rows.extend(records)
+        return [(rec['order_id'], 'tra_cuu_ftth') for rec in records]
+
+
+@contextmanager
+def _patched(fake):
+    """Thay DB + hàng đợi mark_bill_completed trong lúc test, trả lại bản thật khi xong"""
+    saved = result_writer.db_update_results_batch, result_writer.enqueue_bill_completed
+    result_writer.db_update_results_batch = fake
+    result_writer.enqueue_bill_completed = lambda order_id, code=None: True
+    try:
+        yield
+    finally:
+        result_writer.db_update_results_batch, result_writer.enqueue_bill_completed = saved
+
+
+def _writer(tmp, **kwargs):
+    return ResultWriter(wal_path=os.path.join(tmp, 'wal.jsonl'), batch_size=1000, flush_interval=0,
+                        dead_letter_path=os.path.join(tmp, 'dead.jsonl'), **kwargs)
+
+
+def _wal_lines(writer):
+    if not os.path.exists(writer.wal_path):
+        return 0
+    with open(writer.wal_path, encoding='utf-8') as f:
+        return len([line for line in f if line.strip()])
+
+
+def test_wal_recovery():
+    """Test kết quả chưa flush (tiến trình chết) được recover() ghi lại từ WAL"""
+    print("🧪 Test 1: recover WAL")
+    fake = FakeDB()
+    with _patched(fake), tempfile.TemporaryDirectory() as tmp:
+        crashed = _writer(tmp)
+        for i in range(5):
+            crashed.write(f"order-{i}", f"code-{i}", 'success', 1000 * i, 'ok')
+        assert fake.calls == 0 and _wal_lines(crashed) == 5
+        with open(crashed.wal_path, 'a', encoding='utf-8') as f:
+            f.write('{"order_id": "half-written\n')
+
+        restarted = _writer(tmp)
+        assert restarted.recover() == 5, "dòng WAL hỏng phải bị bỏ qua"
+        assert [rec['order_id'] for rec in fake.rows] == [f"order-{i}" for i in range(5)]
+        assert not os.path.exists(restarted.wal_path), "WAL phải được xóa sau khi ghi xong"
+    print("✅ 5 kết quả được ghi lại, WAL đã xóa")
+
+
+def test_retry_on_connection_error():
+    """Test mất kết nối: batch giữ nguyên trong buffer + WAL, flush sau ghi đủ"""
+    print("\n🧪 Test 2: thử lại khi mất kết nối")
+    fake = FakeDB()
+    with _patched(fake), tempfile.TemporaryDirectory() as tmp:
+        writer = _writer(tmp)
+        fake.down = True
+        for i in range(4):
+            writer.write(f"order-{i}", f"code-{i}", 'failed', None, 'x')
+        assert writer.flush() == 0 and writer.pending() == 4 and _wal_lines(writer) == 4
+        assert fake.calls == 1, "lỗi kết nối không được chia nhỏ batch"
+        assert not os.path.exists(writer.dead_letter_path)
+
+        fake.down = False
+        writer.write("order-4", "code-4", 'success', 5000, 'ok')
+        assert writer.flush() == 5 and writer.pending() == 0
+        assert [rec['order_id'] for rec in fake.rows] == [f"order-{i}" for i in range(5)], "giữ đúng thứ tự"
+        assert not os.path.exists(writer.wal_path)
+    print("✅ Batch được giữ lại rồi ghi đủ khi DB có lại")
+
+
+def test_poison_row_dead_letter():
+    """Test 1 dòng status sai kiểu không chặn các dòng khác, được chuyển sang dead-letter"""
+    print("\n🧪 Test 3: dead-letter")
+    fake = FakeDB()
+    with _patched(fake), tempfile.TemporaryDirectory() as tmp:
+        writer = _writer(tmp)
+        for i in range(20):
+            writer.write(f"order-{i}", f"code-{i}", 'bogus' if i in (3, 17) else 'success', i, 'ok')
+        assert writer.flush() == 18
+        assert writer.pending() == 0 and not os.path.exists(writer.wal_path), "không còn gì chờ thử lại"
+        assert len(fake.rows) == 18 and writer.dead_letter_count == 2
+        with open(writer.dead_letter_path, encoding='utf-8') as f:
+            dead = [json.loads(line) for line in f]
+        assert [rec['order_id'] for rec in dead] == ['order-3', 'order-17']
+        assert 'DataError' in dead[0]['error']
+
+        # Kết quả sau đó không bị chặn
+        writer.write("order-20", "code-20", 'success', 1, 'ok')
+        assert writer.flush() == 1
+    print(f"✅ 18/20 dòng ghi được, 2 dòng vào dead-letter sau {fake.calls} lần gọi DB")
+
+
+def test_connection_lost_while_bisecting():
+    """Test mất kết nối giữa lúc chia đôi: phần đã ghi không ghi lại, phần còn lại chờ thử lại"""
+    print("\n🧪 Test 4: mất kết nối khi đang chia đôi")
+    # Lần 1: cả batch lỗi dữ liệu; lần 2: nửa đầu ghi được; lần 3: DB rớt
+    fake = FakeDB(down_after=2)
+    with _patched(fake), tempfile.TemporaryDirectory() as tmp:
+        writer = _writer(tmp)
+        for i in range(8):
+            writer.write(f"order-{i}", f"code-{i}", 'bogus' if i == 6 else 'success', i, 'ok')
+        written = writer.flush()
+        assert written == 4 and writer.pending() == 4, f"ghi {written}, chờ {writer.pending()}"
+        assert _wal_lines(writer) == 4 and writer.dead_letter_count == 0
+
+        fake.down_after = None
+        assert writer.flush() == 3 and writer.dead_letter_count == 1 and writer.pending() == 0
+        assert sorted(rec['order_id'] for rec in fake.rows) == sorted(f"order-{i}" for i in range(8) if i != 6)
+    print("✅ Không mất / không dead-letter nhầm khi DB rớt giữa chừng")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test ResultWriter...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_wal_recovery,
+        test_retry_on_connection_error,
+        test_poison_row_dead_letter,
+        test_connection_lost_while_bisecting,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test TTLCache (app/utils/ttl_cache.py): hết hạn theo TTL, gộp request (single-flight) cho luồng và coroutine,
+chia chung exception, client bị hủy không hủy lần load của các client khác
+Chạy: python test_ttl_cache.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.utils.ttl_cache import SOURCE_COALESCED, SOURCE_HIT, SOURCE_MISS, TTLCache
+
+
+def test_ttl_and_eviction():
+    """Test giá trị hết hạn sau ttl, cacheable=False không lưu, quá max_entries bỏ key cũ nhất"""
+    print("🧪 Test 1: TTL + giới hạn key")
+    cache = TTLCache(ttl=0.2, max_entries=2, cacheable=lambda value: value is not None)
+    assert cache.get_or_load('a', lambda: 1) == (1, SOURCE_MISS)
+    assert cache.get_or_load('a', lambda: 2) == (1, SOURCE_HIT)
+    time.sleep(0.25)
+    assert cache.get_or_load('a', lambda: 3) == (3, SOURCE_MISS), "giá trị hết hạn phải load lại"
+
+    assert cache.get_or_load('none', lambda: None) == (None, SOURCE_MISS)
+    assert cache.get_or_load('none', lambda: 'x') == ('x', SOURCE_MISS), "cacheable=False không được lưu"
+    cache.get_or_load('b', lambda: 'b')
+    assert cache.stats()['entries'] == 2
+    assert cache.get_or_load('a', lambda: 4) == (4, SOURCE_MISS), "key cũ nhất phải bị bỏ khi đầy"
+    assert cache.invalidate(lambda key: key == 'b') == 1
+    print(f"✅ {cache.stats()}")
+
+
+def test_single_flight_threads():
+    """Test 20 luồng cùng key khi chưa có cache: chỉ 1 lần gọi upstream, mọi luồng nhận chung kết quả"""
+    print("\n🧪 Test 2: single-flight (luồng)")
+    cache = TTLCache(ttl=60)
+    calls = 0
+    barrier = threading.Barrier(20)
+    results = []
+
+    def loader():
+        nonlocal calls
+        calls += 1
+        time.sleep(0.2)
+        return {'data': [1, 2, 3]}
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_load('list', loader))
+
+    threads = [threading.Thread(target=worker) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sources = [source for _, source in results]
+    assert calls == 1, f"upstream bị gọi {calls} lần"
+    assert sources.count(SOURCE_MISS) == 1 and sources.count(SOURCE_COALESCED) == 19, sources
+    assert all(value is results[0][0] for value, _ in results)
+    stats = cache.stats()
+    assert stats['misses'] == 1 and stats['coalesced'] == 19 and stats['inflight'] == 0
+    print(f"✅ 20 luồng, 1 lần gọi upstream, hit_ratio {stats['hit_ratio']}")
+
+
+def test_error_shared_and_not_cached():
+    """Test loader lỗi: mọi luồng đang chờ nhận chung exception, lỗi không được lưu vào cache"""
+    print("\n🧪 Test 3: chia chung exception")
+    cache = TTLCache(ttl=60)
+    calls = 0
+    barrier = threading.Barrier(5)
+    errors = []
+
+    def failing():
+        nonlocal calls
+        calls += 1
+        time.sleep(0.2)
+        raise ConnectionError("upstream timeout")
+
+    def worker():
+        barrier.wait()
+        try:
+            cache.get_or_load('list', failing)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == 1 and len(errors) == 5, f"{calls} lần gọi, {len(errors)} lỗi"
+    assert cache.stats()['errors'] == 1
+    assert cache.get_or_load('list', lambda: 'ok') == ('ok', SOURCE_MISS), "lỗi không được cache"
+    print("✅ 5 luồng nhận chung 1 lỗi, lần sau load lại")
+
+
+def test_single_flight_async():
+    """Test coroutine: gộp request, chia chung exception"""
+    print("\n🧪 Test 4: single-flight (asyncio)")
+    cache = TTLCache(ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return 'value'
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        raise ConnectionError("upstream timeout")
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_load_async('k', loader) for _ in range(10)))
+        hit = await cache.get_or_load_async('k', loader)
+        errors = await asyncio.gather(*(cache.get_or_load_async('bad', failing) for _ in range(5)),
+                                      return_exceptions=True)
+        return results, hit, errors
+
+    results, hit, errors = asyncio.run(scenario())
+    sources = [source for _, source in results]
+    assert calls == 2, f"upstream bị gọi {calls} lần"
+    assert sources.count(SOURCE_MISS) == 1 and sources.count(SOURCE_COALESCED) == 9
+    assert hit == ('value', SOURCE_HIT)
+    assert all(isinstance(e, ConnectionError) for e in errors) and len({id(e) for e in errors}) == 1
+    print("✅ 10 coroutine 1 lần gọi, 5 coroutine nhận chung 1 lỗi")
+
+
+def test_async_cancelled_caller():
+    """Test client đầu tiên (đã khởi động lần load) bị hủy: các client khác vẫn nhận kết quả, không gọi lại"""
+    print("\n🧪 Test 5: hủy lời gọi async")
+    cache = TTLCache(ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return 'value'
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_load_async('k', loader))
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(cache.get_or_load_async('k', loader))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        try:
+            await first
+            raise AssertionError("lời gọi bị hủy phải ném CancelledError")
+        except asyncio.CancelledError:
+            pass
+        coalesced = await second
+
+        # Mọi client đều bỏ đi: lần load vẫn chạy xong và lưu vào cache
+        orphan = asyncio.ensure_future(cache.get_or_load_async('orphan', loader))
+        await asyncio.sleep(0.02)
+        orphan.cancel()
+        await asyncio.sleep(0.3)
+        return coalesced, await cache.get_or_load_async('orphan', loader)
+
+    coalesced, orphan = asyncio.run(scenario())
+    assert coalesced == ('value', SOURCE_COALESCED), coalesced
+    assert orphan == ('value', SOURCE_HIT), orphan
+    stats = cache.stats()
+    assert calls == 2 and stats['errors'] == 0 and stats['inflight'] == 0, stats
+    print("✅ Client bị hủy không làm hỏng kết quả của client khác")
+
+
+def main():
+    """Hàm chính test"""
+    print("🚀 Bắt đầu test TTLCache...")
+    print(f"📅 Thời gian: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 50)
+
+    tests = [
+        test_ttl_and_eviction,
+        test_single_flight_threads,
+        test_error_shared_and_not_cached,
+        test_single_flight_async,
+        test_async_cancelled_caller,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"❌ Test bị lỗi: {e!r}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Kết quả test: {passed}/{len(tests)} passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
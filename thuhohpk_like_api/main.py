@@ -2,9 +2,24 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import json
 import base64
+import hashlib
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
 from functools import wraps
 
+# Dùng chung governor thuhohpk.com với tool (app/utils/rate_governor.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.rate_governor import PORTAL_THUHO, get_governor, governor_stats
+from app.utils.timing import get_span_recorder, span
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
@@ -14,8 +29,79 @@ VALID_TOKEN = "c0d2e27448f511b41dd1477781025053"
 # External API configuration
 EXTERNAL_API_BASE = "https://thuhohpk.com/api"
 EXTERNAL_TOKEN = "c0d2e27448f511b41dd1477781025053"
+EXTERNAL_TIMEOUT = float(os.getenv('PROXY_UPSTREAM_TIMEOUT', '30'))
+
+# Keep-alive: 1 requests.Session (pool kết nối TLS) cho mỗi cặp credential, tối đa PROXY_MAX_SESSIONS cặp
+PROXY_MAX_SESSIONS = int(os.getenv('PROXY_MAX_SESSIONS', '32'))
+PROXY_POOL_MAXSIZE = int(os.getenv('PROXY_POOL_MAXSIZE', '10'))
+# Cache list-bill-not-completed theo (username, password, service_type); 0 = tắt cache (vẫn gộp request trùng)
+PROXY_LIST_CACHE_TTL = float(os.getenv('PROXY_LIST_CACHE_TTL', '5'))
+PROXY_LIST_CACHE_MAX = int(os.getenv('PROXY_LIST_CACHE_MAX', '256'))
+
+
+def _credential_key(username, password):
+    # Không giữ mật khẩu dạng rõ trong key cache / pool
+    return (username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+
+
+class UpstreamSessions:
+    """requests.Session keep-alive theo cặp credential (LRU, đóng session cũ nhất khi vượt max_sessions)"""
+
+    def __init__(self, max_sessions=PROXY_MAX_SESSIONS, pool_maxsize=PROXY_POOL_MAXSIZE):
+        self.max_sessions = max(1, max_sessions)
+        self.pool_maxsize = max(1, pool_maxsize)
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._created = 0
+
+    def get(self, username, password):
+        key = _credential_key(username, password)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                return session
+            session = requests.Session()
+            session.auth = (username, password)
+            session.headers.update({'Token': EXTERNAL_TOKEN, 'Content-Type': 'application/json'})
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._sessions[key] = session
+            self._created += 1
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return session
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions), 'created': self._created, 'max_sessions': self.max_sessions}
+
+
+upstream_sessions = UpstreamSessions()
+# Chỉ cache phản hồi 200 thành công; lỗi chỉ chia cho các request đang chờ cùng lúc
+list_bill_cache = TTLCache(
+    PROXY_LIST_CACHE_TTL,
+    PROXY_LIST_CACHE_MAX,
+    cacheable=lambda resp: resp.get('success') and resp.get('status_code') == 200,
+)
 
 
+def _log_api_response(label, api_response):
+    """Chi tiết phản hồi upstream, chỉ format khi bật DEBUG"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug("📡 %s: success=%s status=%s error=%s", label, api_response.get('success'),
+                 api_response.get('status_code', 'N/A'), api_response.get('error'))
+    data = api_response.get('data')
+    if isinstance(data, str):
+        logger.debug("   Data (%d ký tự): %s...", len(data), data[:200])
+    elif data is not None:
+        logger.debug("   Data: %s", data)
+
 
 def verify_token(f):
     """Decorator to verify token authentication"""
@@ -51,8 +137,6 @@ def list_bill_not_completed():
             "message": "X-Username and X-Password headers are required"
         }), 400
     
-    print(f"🔐 Using credentials from headers: {username}:{password[:3]}***")
-    
     # Get query parameters
     service_type = request.args.get('service_type')
     
@@ -61,38 +145,24 @@ def list_bill_not_completed():
     if service_type:
         params['service_type'] = service_type
     
-    # Call external API with credentials from headers
-    print(f"Calling external API: {EXTERNAL_API_BASE}/list-bill-not-completed with params: {params}")
-    
-    api_response = call_external_api('list-bill-not-completed', username, password, method='GET', params=params)
-    
-    # Log chi tiết api_response
-    print("=" * 50)
-    print("📡 API RESPONSE DETAILS:")
-    print(f"   Success: {api_response.get('success')}")
-    print(f"   Status Code: {api_response.get('status_code', 'N/A')}")
-    print(f"   Error: {api_response.get('error', 'None')}")
-    
-    if 'data' in api_response:
-        print(f"   Data Type: {type(api_response['data'])}")
-        if isinstance(api_response['data'], dict):
-            print(f"   Data Keys: {list(api_response['data'].keys())}")
-            print(f"   Data Content: {api_response['data']}")
-        elif isinstance(api_response['data'], str):
-            print(f"   Data Length: {len(api_response['data'])}")
-            print(f"   Data Preview: {api_response['data'][:200]}...")
-        else:
-            print(f"   Data: {api_response['data']}")
-    
-    if 'headers' in api_response:
-        print(f"   Response Headers: {api_response['headers']}")
-    
-    print("=" * 50)
+    # Cùng credential + service_type trong PROXY_LIST_CACHE_TTL giây => dùng lại phản hồi;
+    # nhiều request trùng đến cùng lúc => chỉ 1 lần gọi upstream (dashboard refresh dồn dập)
+    cache_key = (*_credential_key(username, password), service_type or '')
+    api_response, cache_source = list_bill_cache.get_or_load(
+        cache_key,
+        lambda: call_external_api('list-bill-not-completed', username, password, method='GET', params=params),
+    )
+    logger.debug("list-bill-not-completed %s service_type=%s cache=%s", username, service_type, cache_source)
+    _log_api_response("list-bill-not-completed", api_response)
     
+    response = _proxy_response(api_response, username)
+    response[0].headers['X-Cache'] = cache_source
+    return response
+
+
+def _proxy_response(api_response, username):
+    """Phản hồi của proxy theo kết quả gọi upstream: (response, status)"""
     if api_response['success']:
-        # Successfully got response from external API
-        print(f"External API response status: {api_response['status_code']}")
-        
         if api_response['status_code'] == 200:
             # Return the external API response
             return jsonify({
@@ -100,9 +170,10 @@ def list_bill_not_completed():
                 "external_status": api_response['status_code'],
                 "credentials_used": f"{username}:***",
                 **api_response['data']  # Spread the external API response
-            })
+            }), 200
         else:
             # External API returned error status
+            logger.warning("External API returned status %s", api_response['status_code'])
             return jsonify({
                 "source": "external_api_error",
                 "external_status": api_response['status_code'],
@@ -113,7 +184,7 @@ def list_bill_not_completed():
     
     else:
         # External API call failed, return error
-        print(f"External API failed: {api_response['error']}")
+        logger.warning("External API failed: %s", api_response['error'])
         return jsonify({
             "source": "external_api_failed",
             "error": "Failed to connect to external API",
@@ -124,41 +195,26 @@ def list_bill_not_completed():
 def call_external_api(endpoint, username, password, method='GET', params=None, data=None):
     """
     Helper function to call external API
-    Uses credentials provided as parameters
+    Uses credentials provided as parameters (keep-alive session riêng cho mỗi cặp credential)
     """
     url = f"{EXTERNAL_API_BASE}/{endpoint}"
-    headers = {
-        'Token': EXTERNAL_TOKEN,
-        'Content-Type': 'application/json'
-    }
-    
-    # Use credentials passed as parameters
-    auth = (username, password)
-    
-    print(f"🔐 Calling external API with credentials: {username}:{password[:3]}***")
     
     try:
-        if method.upper() == 'GET':
-            response = requests.get(url, headers=headers, auth=auth, params=params, timeout=30)
-        elif method.upper() == 'POST':
-            response = requests.post(url, headers=headers, auth=auth, json=data, timeout=30)
-        else:
+        if method.upper() not in ('GET', 'POST'):
             raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        # Log raw response details
-        print(f"🌐 Raw External API Response:")
-        print(f"   Status Code: {response.status_code}")
-        print(f"   Headers: {dict(response.headers)}")
-        print(f"   Content Type: {response.headers.get('content-type', 'unknown')}")
+        session = upstream_sessions.get(username, password)
+        with get_governor(PORTAL_THUHO).slot() as slot, span(PORTAL_THUHO, f"upstream_{endpoint}"):
+            if method.upper() == 'GET':
+                response = session.get(url, params=params, timeout=EXTERNAL_TIMEOUT)
+            else:
+                response = session.post(url, json=data, timeout=EXTERNAL_TIMEOUT)
+            slot.http(response.status_code)
         
         # Parse response data
         if response.headers.get('content-type', '').startswith('application/json'):
             response_data = response.json()
-            print(f"   JSON Data: {response_data}")
         else:
             response_data = response.text
-            print(f"   Text Data Length: {len(response_data)}")
-            print(f"   Text Data Preview: {response_data[:200]}...")
         
         # Return response data
         return {
@@ -208,76 +264,24 @@ def tool_bill_completed():
                 "message": "X-Username and X-Password headers are required"
             }), 400
         
-        print(f"🔐 Using credentials from headers: {username}:{password[:3]}***")
-        
         # Get JSON data from request
         data = request.get_json()
         
         if not data or 'account' not in data:
             return jsonify({"error": "Account number is required"}), 400
         
-        account = data['account']
-        
-        print(f"Calling external API: {EXTERNAL_API_BASE}/tool-bill-completed with account: {account}")
+        logger.debug("tool-bill-completed %s account=%s", username, data['account'])
         
         # Call external API with credentials from headers
         api_response = call_external_api('tool-bill-completed', username, password, method='POST', data=data)
+        _log_api_response("tool-bill-completed", api_response)
         
-        # Log chi tiết api_response
-        print("=" * 50)
-        print("📡 TOOL BILL COMPLETED API RESPONSE:")
-        print(f"   Success: {api_response.get('success')}")
-        print(f"   Status Code: {api_response.get('status_code', 'N/A')}")
-        print(f"   Error: {api_response.get('error', 'None')}")
-        print(f"   Fallback Available: {api_response.get('fallback_available', 'N/A')}")
-        
-        if 'data' in api_response:
-            print(f"   Data Type: {type(api_response['data'])}")
-            if isinstance(api_response['data'], dict):
-                print(f"   Data Keys: {list(api_response['data'].keys())}")
-                print(f"   Data Content: {api_response['data']}")
-            elif isinstance(api_response['data'], str):
-                print(f"   Data Length: {len(api_response['data'])}")
-                print(f"   Data Preview: {api_response['data'][:200]}...")
-            else:
-                print(f"   Data: {api_response['data']}")
-        
-        if 'headers' in api_response:
-            print(f"   Response Headers: {api_response['headers']}")
+        if api_response['success'] and api_response['status_code'] == 200:
+            # Danh sách bill chưa hoàn thành của tài khoản này đã đổi => bỏ cache của nó
+            user_key = _credential_key(username, password)
+            list_bill_cache.invalidate(lambda key: key[:2] == user_key)
         
-        print("=" * 50)
-        
-        if api_response['success']:
-            # Successfully got response from external API
-            print(f"External API response status: {api_response['status_code']}")
-            
-            if api_response['status_code'] == 200:
-                # Return the external API response
-                return jsonify({
-                    "source": "external_api",
-                    "external_status": api_response['status_code'],
-                    "credentials_used": f"{username}:***",
-                    **api_response['data']  # Spread the external API response
-                })
-            else:
-                # External API returned error status
-                return jsonify({
-                    "source": "external_api_error",
-                    "external_status": api_response['status_code'],
-                    "external_response": api_response['data'],
-                    "credentials_used": f"{username}:***",
-                    "error": f"External API returned status {api_response['status_code']}"
-                }), api_response['status_code']
-        
-        else:
-            # External API call failed, return error
-            print(f"External API failed: {api_response['error']}")
-            return jsonify({
-                "source": "external_api_failed", 
-                "error": "Failed to connect to external API",
-                "external_api_error": api_response['error'],
-                "credentials_used": f"{username}:***"
-            }), 503
+        return _proxy_response(api_response, username)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -289,7 +293,11 @@ def health_check():
         "status": "healthy",
         "service": "App Vien Thong API Proxy",
         "version": "1.1.0",
-        "external_api": EXTERNAL_API_BASE
+        "external_api": EXTERNAL_API_BASE,
+        "governors": governor_stats(),
+        "sessions": upstream_sessions.stats(),
+        "list_bill_cache": list_bill_cache.stats(),
+        "upstream_latency": get_span_recorder().summary(PORTAL_THUHO).get(PORTAL_THUHO, {})
     })
 
 @app.route('/api/test-external', methods=['GET'])
@@ -312,34 +320,9 @@ def test_external_connection():
             "message": "X-Username and X-Password headers are required"
         }), 400
     
-    print(f"🔐 Testing external API with credentials: {username}:{password[:3]}***")
-    
     # Call external API with credentials from headers
     api_response = call_external_api('list-bill-not-completed', username, password, method='GET')
-    
-    # Log chi tiết api_response
-    print("=" * 50)
-    print("📡 TEST EXTERNAL CONNECTION API RESPONSE:")
-    print(f"   Success: {api_response.get('success')}")
-    print(f"   Status Code: {api_response.get('status_code', 'N/A')}")
-    print(f"   Error: {api_response.get('error', 'None')}")
-    print(f"   Fallback Available: {api_response.get('fallback_available', 'N/A')}")
-    
-    if 'data' in api_response:
-        print(f"   Data Type: {type(api_response['data'])}")
-        if isinstance(api_response['data'], dict):
-            print(f"   Data Keys: {list(api_response['data'].keys())}")
-            print(f"   Data Content: {api_response['data']}")
-        elif isinstance(api_response['data'], str):
-            print(f"   Data Length: {len(api_response['data'])}")
-            print(f"   Data Preview: {api_response['data'][:200]}...")
-        else:
-            print(f"   Data: {api_response['data']}")
-    
-    if 'headers' in api_response:
-        print(f"   Response Headers: {api_response['headers']}")
-    
-    print("=" * 50)
+    _log_api_response("test-external", api_response)
     
     return jsonify({
         "external_api_url": EXTERNAL_API_BASE,
@@ -361,19 +344,13 @@ def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
-    print("Starting App Vien Thong API Proxy Server...")
-    print(f"Proxying to external API: {EXTERNAL_API_BASE}")
-    print("Available endpoints:")
-    print("- GET  /api/list-bill-not-completed (proxies to external API)")
-    print("- POST /api/tool-bill-completed (proxies to external API)")
-    print("- GET  /api/test-external (test external API connection)")
-    print("- GET  /health")
-    print("\nAuthentication required:")
-    print(f"- Token header: {VALID_TOKEN}")
-    print("- X-Username header: username for external API")
-    print("- X-Password header: password for external API")
-    print("\nNote: Credentials are passed via headers for each request")
-    print("      This allows dynamic authentication per request")
-    print("Note: If external API fails, system will return error response")
+    from app.utils.logging_setup import setup_logging
+    setup_logging(log_file='proxy.log')
+    logger.info("Starting App Vien Thong API Proxy Server...")
+    logger.info("Proxying to external API: %s (list cache TTL %ss, max %d sessions)",
+                EXTERNAL_API_BASE, PROXY_LIST_CACHE_TTL, PROXY_MAX_SESSIONS)
+    logger.info("Endpoints: GET /api/list-bill-not-completed | POST /api/tool-bill-completed | "
+                "GET /api/test-external | GET /health")
+    logger.info("Auth: Token header + X-Username/X-Password headers (credentials per request)")
     
-    app.run(debug=True, host='0.0.0.0', port=3000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=3000, threaded=True)
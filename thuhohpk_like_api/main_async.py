@@ -0,0 +1,288 @@
+"""
+Bản asyncio (ASGI, FastAPI + httpx.AsyncClient) của main.py: cùng các route, cùng định dạng phản hồi,
+1 request chờ upstream không giữ 1 worker thread. Thêm /api/list-bill-not-completed/batch gọi nhiều
+service_type song song trong 1 request.
+Chạy: uvicorn main_async:app --host 0.0.0.0 --port 3000   (trong thư mục thuhohpk_like_api)
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Header, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+# Dùng chung governor / span / cache với tool và main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.rate_governor import PORTAL_THUHO, get_governor, governor_stats
+from app.utils.timing import get_span_recorder, span
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Token / upstream giống main.py
+VALID_TOKEN = "c0d2e27448f511b41dd1477781025053"
+EXTERNAL_API_BASE = "https://thuhohpk.com/api"
+EXTERNAL_TOKEN = "c0d2e27448f511b41dd1477781025053"
+EXTERNAL_TIMEOUT = float(os.getenv('PROXY_UPSTREAM_TIMEOUT', '30'))
+PROXY_POOL_MAXSIZE = int(os.getenv('PROXY_POOL_MAXSIZE', '10'))
+PROXY_LIST_CACHE_TTL = float(os.getenv('PROXY_LIST_CACHE_TTL', '5'))
+PROXY_LIST_CACHE_MAX = int(os.getenv('PROXY_LIST_CACHE_MAX', '256'))
+
+# service_type trong DB -> service_type của thuhohpk.com (như server_api_proxy.py)
+SERVICE_TYPES = {
+    'tra_cuu_ftth': 'check_ftth',
+    'gach_dien_evn': 'env',
+    'nap_tien_da_mang': 'deposit',
+    'nap_tien_viettel': 'deposit_viettel',
+    'thanh_toan_tv_internet': 'payment_tv',
+    'tra_cuu_no_tra_sau': 'check_debt'
+}
+
+list_bill_cache = TTLCache(
+    PROXY_LIST_CACHE_TTL,
+    PROXY_LIST_CACHE_MAX,
+    cacheable=lambda resp: resp.get('success') and resp.get('status_code') == 200,
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _credential_key(username, password):
+    # Không giữ mật khẩu dạng rõ trong key cache
+    return (username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+
+
+def get_client() -> httpx.AsyncClient:
+    """AsyncClient keep-alive dùng chung (auth truyền theo từng request)"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={'Token': EXTERNAL_TOKEN, 'Content-Type': 'application/json'},
+            timeout=EXTERNAL_TIMEOUT,
+            limits=httpx.Limits(max_connections=PROXY_POOL_MAXSIZE * 4,
+                                max_keepalive_connections=PROXY_POOL_MAXSIZE),
+        )
+    return _client
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+app = FastAPI(title="App Vien Thong API Proxy (async)", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error(_request, exc):
+    # Cùng thông báo lỗi với bản Flask
+    messages = {404: "Endpoint not found", 405: "Method not allowed"}
+    return JSONResponse({"error": messages.get(exc.status_code, str(exc.detail))}, status_code=exc.status_code)
+
+
+def _missing_credentials():
+    return JSONResponse({
+        "error": "Missing credentials",
+        "message": "X-Username and X-Password headers are required"
+    }, status_code=400)
+
+
+def _invalid_token(token):
+    if not token or token != VALID_TOKEN:
+        return JSONResponse({"error": "Invalid token"}, status_code=401)
+    return None
+
+
+async def call_external_api(endpoint, username, password, method='GET', params=None, data=None):
+    """Bản async của main.call_external_api (cùng dict kết quả)"""
+    url = f"{EXTERNAL_API_BASE}/{endpoint}"
+    try:
+        if method.upper() not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        with await get_governor(PORTAL_THUHO).aslot() as slot, span(PORTAL_THUHO, f"upstream_{endpoint}"):
+            if method.upper() == 'GET':
+                response = await get_client().get(url, params=params, auth=(username, password))
+            else:
+                response = await get_client().post(url, json=data, auth=(username, password))
+            slot.http(response.status_code)
+
+        if response.headers.get('content-type', '').startswith('application/json'):
+            response_data = response.json()
+        else:
+            response_data = response.text
+        return {
+            'success': True,
+            'status_code': response.status_code,
+            'data': response_data,
+            'headers': dict(response.headers)
+        }
+    except httpx.HTTPError as e:
+        return {'success': False, 'error': str(e), 'fallback_available': False}
+    except Exception as e:
+        return {'success': False, 'error': f"Unexpected error: {str(e)}", 'fallback_available': False}
+
+
+def _proxy_body(api_response, username):
+    """(body, status) giống main._proxy_response"""
+    if api_response['success']:
+        if api_response['status_code'] == 200:
+            return {
+                "source": "external_api",
+                "external_status": api_response['status_code'],
+                "credentials_used": f"{username}:***",
+                **api_response['data']
+            }, 200
+        logger.warning("External API returned status %s", api_response['status_code'])
+        return {
+            "source": "external_api_error",
+            "external_status": api_response['status_code'],
+            "external_response": api_response['data'],
+            "credentials_used": f"{username}:***",
+            "error": f"External API returned status {api_response['status_code']}"
+        }, api_response['status_code']
+    logger.warning("External API failed: %s", api_response['error'])
+    return {
+        "source": "external_api_failed",
+        "error": "Failed to connect to external API",
+        "external_api_error": api_response['error'],
+        "credentials_used": f"{username}:***"
+    }, 503
+
+
+async def _list_bills(username, password, service_type):
+    """list-bill-not-completed qua cache TTL + gộp request trùng: (api_response, cache_source)"""
+    params = {'service_type': service_type} if service_type else {}
+    return await list_bill_cache.get_or_load_async(
+        (*_credential_key(username, password), service_type or ''),
+        lambda: call_external_api('list-bill-not-completed', username, password, method='GET', params=params),
+    )
+
+
+@app.get('/api/list-bill-not-completed')
+async def list_bill_not_completed(service_type: Optional[str] = None, token: Optional[str] = Header(None),
+                                  x_username: Optional[str] = Header(None),
+                                  x_password: Optional[str] = Header(None)):
+    """Proxy https://thuhohpk.com/api/list-bill-not-completed (header Token, X-Username, X-Password)"""
+    error = _invalid_token(token)
+    if error is not None:
+        return error
+    if not x_username or not x_password:
+        return _missing_credentials()
+    api_response, cache_source = await _list_bills(x_username, x_password, service_type)
+    body, status = _proxy_body(api_response, x_username)
+    return JSONResponse(body, status_code=status, headers={'X-Cache': cache_source})
+
+
+@app.get('/api/list-bill-not-completed/batch')
+async def list_bill_not_completed_batch(service_types: Optional[str] = None, token: Optional[str] = Header(None),
+                                        x_username: Optional[str] = Header(None),
+                                        x_password: Optional[str] = Header(None)):
+    """
+    Nhiều service_type trong 1 request, gọi upstream song song (vẫn qua governor + cache).
+    service_types: danh sách cách nhau bởi dấu phẩy, tên DB (tra_cuu_ftth) hoặc tên thuhohpk (check_ftth);
+    bỏ trống = mọi service trong SERVICE_TYPES.
+    """
+    error = _invalid_token(token)
+    if error is not None:
+        return error
+    if not x_username or not x_password:
+        return _missing_credentials()
+    requested = [s.strip() for s in (service_types or '').split(',') if s.strip()] or list(SERVICE_TYPES)
+    started = time.monotonic()
+    responses = await asyncio.gather(*(
+        _list_bills(x_username, x_password, SERVICE_TYPES.get(name, name)) for name in requested
+    ))
+    results = {}
+    for name, (api_response, cache_source) in zip(requested, responses):
+        body, status = _proxy_body(api_response, x_username)
+        body.pop("credentials_used", None)
+        results[name] = {"status": status, "cache": cache_source, **body}
+    return {
+        "source": "external_api_batch",
+        "credentials_used": f"{x_username}:***",
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "results": results,
+    }
+
+
+@app.post('/api/tool-bill-completed')
+async def tool_bill_completed(request: Request, token: Optional[str] = Header(None),
+                              x_username: Optional[str] = Header(None),
+                              x_password: Optional[str] = Header(None)):
+    """Proxy https://thuhohpk.com/api/tool-bill-completed (JSON body có 'account')"""
+    error = _invalid_token(token)
+    if error is not None:
+        return error
+    try:
+        if not x_username or not x_password:
+            return _missing_credentials()
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or 'account' not in data:
+            return JSONResponse({"error": "Account number is required"}, status_code=400)
+
+        api_response = await call_external_api('tool-bill-completed', x_username, x_password, method='POST', data=data)
+        if api_response['success'] and api_response['status_code'] == 200:
+            user_key = _credential_key(x_username, x_password)
+            list_bill_cache.invalidate(lambda key: key[:2] == user_key)
+        body, status = _proxy_body(api_response, x_username)
+        return JSONResponse(body, status_code=status)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.get('/health')
+async def health_check():
+    """Simple health check endpoint"""
+    return {
+        "status": "healthy",
+        "service": "App Vien Thong API Proxy (async)",
+        "version": "1.1.0",
+        "external_api": EXTERNAL_API_BASE,
+        "governors": governor_stats(),
+        "list_bill_cache": list_bill_cache.stats(),
+        "upstream_latency": get_span_recorder().summary(PORTAL_THUHO).get(PORTAL_THUHO, {})
+    }
+
+
+@app.get('/api/test-external')
+async def test_external_connection(token: Optional[str] = Header(None), x_username: Optional[str] = Header(None),
+                                   x_password: Optional[str] = Header(None)):
+    """Test endpoint to check external API connectivity (không qua cache)"""
+    error = _invalid_token(token)
+    if error is not None:
+        return error
+    if not x_username or not x_password:
+        return _missing_credentials()
+    api_response = await call_external_api('list-bill-not-completed', x_username, x_password, method='GET')
+    return {
+        "external_api_url": EXTERNAL_API_BASE,
+        "connection_test": api_response,
+        "credentials_used": f"{x_username}:***",
+        "timestamp": "2024-08-19"
+    }
+
+
+if __name__ == '__main__':
+    import uvicorn
+    from app.utils.logging_setup import setup_logging
+
+    setup_logging(log_file='proxy.log')
+    logger.info("Starting App Vien Thong API Proxy Server (async) -> %s", EXTERNAL_API_BASE)
+    uvicorn.run(app, host='0.0.0.0', port=3000, log_config=None)
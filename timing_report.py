@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tổng hợp span thời gian từng bước (app/timing.jsonl do pipeline ghi): p50/p95/p99 theo dịch vụ
+Chạy: python timing_report.py [--file app/timing.jsonl] [--service ftth] [--hours 24] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Thêm thư mục gốc vào sys.path
+PARENT_DIR = os.path.dirname(os.path.abspath(__file__))
+if PARENT_DIR not in sys.path:
+    sys.path.insert(0, PARENT_DIR)
+
+from app.config import TIMING_LOG_FILE
+from app.utils.timing import load_spans, summarize, format_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tổng hợp thời gian từng bước xử lý mã")
+    parser.add_argument("--file", default=TIMING_LOG_FILE, help="File JSON lines (mặc định TIMING_LOG_FILE)")
+    parser.add_argument("--service", help="Chỉ 1 dịch vụ (key của ServiceSpec, vd. ftth, evn, db, thuhohpk)")
+    parser.add_argument("--hours", type=float, help="Chỉ lấy span trong N giờ gần nhất")
+    parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"❌ Không thấy file {args.file} (chạy pipeline với TIMING_ENABLED=1 trước)")
+        return False
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    summary = summarize(load_spans(args.file, args.service, since))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return True
+
+    spans = sum(stat['count'] for steps in summary.values() for stat in steps.values())
+    print(f"📊 {spans} span từ {args.file}" + (f" ({args.hours:g} giờ gần nhất)" if args.hours else ""))
+    print("=" * 50)
+    print(format_summary(summary))
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)